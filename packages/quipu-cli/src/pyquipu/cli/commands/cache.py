@@ -4,6 +4,7 @@ from typing import Annotated
 
 import typer
 from pyquipu.common.messaging import bus
+from pyquipu.engine.hydrator import Hydrator
 
 from ..config import DEFAULT_WORK_DIR
 from ..logger_config import setup_logging
@@ -23,14 +24,19 @@ def cache_sync(
             "--work-dir", "-w", help="操作执行的根目录（工作区）", file_okay=False, dir_okay=True, resolve_path=True
         ),
     ] = DEFAULT_WORK_DIR,
+    with_content: Annotated[
+        bool, typer.Option("--with-content", help="同时批量回填所有节点的计划内容缓存 (用于导出、预览与全文检索)。")
+    ] = False,
 ):
     """
     将 Git 历史增量同步到 SQLite 缓存。
     """
     bus.info("cache.sync.info.hydrating")
     try:
-        with engine_context(work_dir):
-            pass
+        with engine_context(work_dir) as engine:
+            if with_content and engine.db_manager:
+                count = Hydrator(engine.git_db, engine.db_manager).hydrate_content()
+                bus.info("cache.sync.info.contentHydrated", count=count)
         bus.success("cache.sync.success")
     except Exception as e:
         logger.error("数据同步失败", exc_info=True)
@@ -1,8 +1,13 @@
+import hashlib
+import json
 import logging
+import os
 import re
 import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Annotated, Dict, List, Optional, Set
+from typing import Annotated, Dict, Iterator, List, Optional, Set, Tuple
 
 import typer
 import yaml
@@ -16,6 +21,13 @@ from .helpers import engine_context, filter_nodes, filter_reachable_nodes
 
 logger = logging.getLogger(__name__)
 
+# 增量导出的清单文件，记录每个节点对应的文件名与内容指纹
+MANIFEST_FILE = ".quipu-export.json"
+MANIFEST_VERSION = 1
+# 每批从存储中加载内容的节点数
+CONTENT_BATCH_SIZE = 1000
+EXPORT_WORKERS = min(8, os.cpu_count() or 1)
+
 
 def _sanitize_summary(summary: str) -> str:
     """净化摘要以用作安全的文件名部分。"""
@@ -100,36 +112,67 @@ def _generate_navbar(
     return "\n\n" + "> [!nav] 节点导航\n" + "\n".join(nav_links)
 
 
-def _generate_file_content(
-    node: QuipuNode,
-    engine: Engine,
-    no_frontmatter: bool,
-    no_nav: bool,
-    exported_hashes_set: Set[str],
-    filename_map: Dict[str, str],
-    hidden_link_types: Set[str],
-) -> str:
+def _render_file(header: str, public_content: str, private_content: Optional[str], navbar: str) -> str:
     """构建单个 Markdown 文件的完整内容。"""
     parts = []
-    if not no_frontmatter:
-        parts.append(_format_frontmatter(node))
+    if header:
+        parts.append(header)
 
-    public_content = engine.reader.get_node_content(node) or ""
     parts.append("# content.md")
     parts.append(public_content.strip())
 
-    private_content = engine.reader.get_private_data(node.commit_hash)
     if private_content:
         parts.append("# 开发者意图")
         parts.append(private_content.strip())
 
-    content_str = "\n\n".join(parts)
-
-    if not no_nav:
-        navbar_str = _generate_navbar(node, exported_hashes_set, filename_map, hidden_link_types)
-        content_str += navbar_str
-
-    return content_str
+    return "\n\n".join(parts) + navbar
+
+
+def _render_digest(node: QuipuNode, header: str, private_content: Optional[str], navbar: str) -> str:
+    """
+    计算文件内容的指纹。节点的公共内容由 commit_hash 唯一确定 (内容寻址)，
+    因此只需对 commit_hash 与其余可变部分求摘要，无需读取内容本身即可判断文件是否需要重写。
+    """
+    digest = hashlib.sha256()
+    for part in (node.commit_hash, header, private_content or "", navbar):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _load_manifest(output_dir: Path) -> Dict[str, Dict[str, str]]:
+    """读取增量导出的清单 {commit_hash: {"file": 文件名, "digest": 指纹}}，不存在或损坏时返回空字典。"""
+    manifest_path = output_dir / MANIFEST_FILE
+    try:
+        data = json.loads(manifest_path.read_text(encoding="utf-8"))
+        return data.get("nodes", {}) if data.get("version") == MANIFEST_VERSION else {}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def _save_manifest(output_dir: Path, entries: Dict[str, Dict[str, str]]):
+    manifest_path = output_dir / MANIFEST_FILE
+    manifest_path.write_text(json.dumps({"version": MANIFEST_VERSION, "nodes": entries}, indent=2), encoding="utf-8")
+
+
+def _iter_rendered(
+    engine: Engine, nodes: List[QuipuNode], headers: Dict[str, str], private: Dict[str, str], navbars: Dict[str, str]
+) -> Iterator[Tuple[QuipuNode, str]]:
+    """分块批量加载节点内容并渲染，避免一次性在内存中保留全部导出文件。"""
+    for i in range(0, len(nodes), CONTENT_BATCH_SIZE):
+        chunk = nodes[i : i + CONTENT_BATCH_SIZE]
+        contents = engine.reader.get_node_contents(chunk)
+        for node in chunk:
+            commit_hash = node.commit_hash
+            yield (
+                node,
+                _render_file(
+                    headers[commit_hash],
+                    contents.get(commit_hash) or "",
+                    private.get(commit_hash),
+                    navbars[commit_hash],
+                ),
+            )
 
 
 def register(app: typer.Typer):
@@ -157,10 +200,18 @@ def register(app: typer.Typer):
         reachable_only: Annotated[
             bool, typer.Option("--reachable-only", help="仅导出与当前工作区状态直接相关的节点。")
         ] = False,
+        incremental: Annotated[
+            bool,
+            typer.Option("--incremental", help="增量导出: 保留导出目录，只重写新增或发生变化的节点。"),
+        ] = False,
     ):
         """将 Quipu 历史记录导出为一组人类可读的 Markdown 文件。"""
         hidden_types = set(hide_link_type) if hide_link_type else set()
 
+        if incremental and zip_output:
+            bus.error("export.error.incrementalZip")
+            ctx.exit(1)
+
         with engine_context(work_dir) as engine:
             if not engine.history_graph:
                 bus.info("export.info.emptyHistory")
@@ -184,7 +235,32 @@ def register(app: typer.Typer):
                 bus.info("export.info.noMatchingNodes")
                 ctx.exit(0)
 
-            if output_dir.exists() and any(output_dir.iterdir()):
+            # 预计算文件名、节点集合与各文件中除公共内容以外的部分
+            filename_map = {node.commit_hash: _generate_filename(node) for node in nodes_to_export}
+            exported_hashes_set = {node.commit_hash for node in nodes_to_export}
+            private = engine.reader.get_private_data_many(list(exported_hashes_set))
+            headers = {n.commit_hash: "" if no_frontmatter else _format_frontmatter(n) for n in nodes_to_export}
+            navbars = {
+                n.commit_hash: "" if no_nav else _generate_navbar(n, exported_hashes_set, filename_map, hidden_types)
+                for n in nodes_to_export
+            }
+
+            if zip_output:
+                # 直接流式写入压缩包，不经过临时目录
+                zip_path = output_dir.with_suffix(".zip")
+                bus.info("export.info.starting", count=len(nodes_to_export), path=zip_path)
+                bus.info("export.info.zipping")
+                zip_path.parent.mkdir(parents=True, exist_ok=True)
+                with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                    rendered = _iter_rendered(engine, nodes_to_export, headers, private, navbars)
+                    with typer.progressbar(rendered, length=len(nodes_to_export), label="导出进度") as progress:
+                        for node, content in progress:
+                            zf.writestr(filename_map[node.commit_hash], content)
+                bus.success("export.success.zip", path=str(zip_path))
+                return
+
+            manifest = _load_manifest(output_dir) if incremental else {}
+            if not incremental and output_dir.exists() and any(output_dir.iterdir()):
                 prompt = bus.get("export.prompt.overwrite", path=output_dir)
                 if not prompt_for_confirmation(prompt, default=False):
                     bus.warning("common.prompt.cancel")
@@ -192,24 +268,44 @@ def register(app: typer.Typer):
                 shutil.rmtree(output_dir)
             output_dir.mkdir(parents=True, exist_ok=True)
 
-            bus.info("export.info.starting", count=len(nodes_to_export), path=output_dir)
-
-            # 预计算文件名和节点集合以供导航栏使用
-            filename_map = {node.commit_hash: _generate_filename(node) for node in nodes_to_export}
-            exported_hashes_set = {node.commit_hash for node in nodes_to_export}
-
-            with typer.progressbar(nodes_to_export, label="导出进度") as progress:
-                for node in progress:
-                    filename = filename_map[node.commit_hash]
-                    content = _generate_file_content(
-                        node, engine, no_frontmatter, no_nav, exported_hashes_set, filename_map, hidden_types
-                    )
-                    (output_dir / filename).write_text(content, encoding="utf-8")
-
-            if zip_output:
-                bus.info("export.info.zipping")
-                zip_path = shutil.make_archive(str(output_dir), "zip", output_dir)
-                shutil.rmtree(output_dir)
-                bus.success("export.success.zip", path=zip_path)
-            else:
-                bus.success("export.success.dir")
+            entries: Dict[str, Dict[str, str]] = {}
+            for node in nodes_to_export:
+                commit_hash = node.commit_hash
+                digest = _render_digest(node, headers[commit_hash], private.get(commit_hash), navbars[commit_hash])
+                entries[commit_hash] = {"file": filename_map[commit_hash], "digest": digest}
+            changed = [
+                node
+                for node in nodes_to_export
+                if manifest.get(node.commit_hash) != entries[node.commit_hash]
+                or not (output_dir / filename_map[node.commit_hash]).exists()
+            ]
+
+            if incremental:
+                # 清单中已不再导出的文件视为过期，予以删除
+                current_files = set(filename_map.values())
+                stale = {entry.get("file") for entry in manifest.values()} - current_files
+                for filename in stale:
+                    # 只删除导出目录下的普通文件名，防止被篡改的清单越界
+                    if isinstance(filename, str) and filename and Path(filename).name == filename:
+                        (output_dir / filename).unlink(missing_ok=True)
+                bus.info(
+                    "export.info.incremental",
+                    changed=len(changed),
+                    skipped=len(nodes_to_export) - len(changed),
+                    removed=len(stale),
+                )
+
+            bus.info("export.info.starting", count=len(changed), path=output_dir)
+
+            # 内容读取与渲染在主线程中进行 (存储连接不跨线程共享)，文件写入交给线程池
+            with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as pool:
+                futures = [
+                    pool.submit((output_dir / filename_map[node.commit_hash]).write_text, content, encoding="utf-8")
+                    for node, content in _iter_rendered(engine, changed, headers, private, navbars)
+                ]
+                with typer.progressbar(as_completed(futures), length=len(futures), label="导出进度") as progress:
+                    for future in progress:
+                        future.result()
+
+            _save_manifest(output_dir, entries)
+            bus.success("export.success.dir")
@@ -2,10 +2,11 @@ import logging
 from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Generator, List, Optional
+from typing import Dict, Generator, List, Optional, Set
 
 import typer
 from pyquipu.common.messaging import bus
+from pyquipu.engine.history_graph import CompactHistoryGraph, HistoryGraph
 from pyquipu.engine.state_machine import Engine
 from pyquipu.interfaces.models import QuipuNode
 
@@ -16,12 +17,12 @@ logger = logging.getLogger(__name__)
 
 
 @contextmanager
-def engine_context(work_dir: Path) -> Generator[Engine, None, None]:
+def engine_context(work_dir: Path, lazy: bool = False, lazy_graph: bool = False) -> Generator[Engine, None, None]:
     """Context manager to set up logging, create, and automatically close a Quipu engine."""
     setup_logging()
     engine = None
     try:
-        engine = create_engine(work_dir)
+        engine = create_engine(work_dir, lazy=lazy, lazy_graph=lazy_graph)
         yield engine
     finally:
         if engine:
@@ -31,10 +32,11 @@ def engine_context(work_dir: Path) -> Generator[Engine, None, None]:
 def _find_current_node(engine: Engine, graph: Dict[str, QuipuNode]) -> Optional[QuipuNode]:
     """在图中查找与当前工作区状态匹配的节点"""
     current_hash = engine.git_db.get_tree_hash()
-    # 修复：直接从 graph 中通过 output_tree hash 查找
-    for node in graph.values():
-        if node.output_tree == current_hash:
-            return node
+    if not isinstance(graph, (HistoryGraph, CompactHistoryGraph)):
+        graph = HistoryGraph(graph)
+    node = graph.find_by_output_tree(current_hash)
+    if node:
+        return node
 
     bus.warning("navigation.warning.workspaceDirty")
     bus.info("navigation.info.saveHint")
@@ -53,23 +55,27 @@ def _execute_visit(ctx: typer.Context, engine: Engine, target_hash: str, msg_id:
         ctx.exit(1)
 
 
+def parse_time_option(value: Optional[str], name: str) -> Optional[datetime]:
+    """解析 --since / --until 选项 (YYYY-MM-DD HH:MM)，格式无效时抛出 typer.BadParameter。"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace(" ", "T"))
+    except ValueError:
+        raise typer.BadParameter(f"无效的 '{name}' 时间戳格式。请使用 'YYYY-MM-DD HH:MM'。")
+
+
 def filter_nodes(
     nodes: List[QuipuNode], limit: Optional[int], since: Optional[str], until: Optional[str]
 ) -> List[QuipuNode]:
     """根据时间戳和数量过滤节点列表。"""
     filtered = nodes
-    if since:
-        try:
-            since_dt = datetime.fromisoformat(since.replace(" ", "T"))
-            filtered = [n for n in filtered if n.timestamp >= since_dt]
-        except ValueError:
-            raise typer.BadParameter("无效的 'since' 时间戳格式。请使用 'YYYY-MM-DD HH:MM'。")
-    if until:
-        try:
-            until_dt = datetime.fromisoformat(until.replace(" ", "T"))
-            filtered = [n for n in filtered if n.timestamp <= until_dt]
-        except ValueError:
-            raise typer.BadParameter("无效的 'until' 时间戳格式。请使用 'YYYY-MM-DD HH:MM'。")
+    since_dt = parse_time_option(since, "since")
+    if since_dt:
+        filtered = [n for n in filtered if n.timestamp >= since_dt]
+    until_dt = parse_time_option(until, "until")
+    if until_dt:
+        filtered = [n for n in filtered if n.timestamp <= until_dt]
     if limit is not None and limit > 0:
         filtered = filtered[:limit]
     return filtered
@@ -82,10 +88,24 @@ def filter_reachable_nodes(engine: Engine, nodes: List[QuipuNode]) -> List[Quipu
         # 如果工作区是脏的，无法确定起点，返回所有节点
         return nodes
 
-    current_hash = current_node.output_tree
-    ancestors = engine.reader.get_ancestor_output_trees(current_hash)
-    descendants = engine.reader.get_descendant_output_trees(current_hash)
-    reachable_set = ancestors.union(descendants)
-    reachable_set.add(current_hash)
+    graph = engine.history_graph
+    if isinstance(graph, CompactHistoryGraph) and engine.graph_complete:
+        # 紧凑图谱直接在数组上遍历，无需再次查询存储
+        reachable_set = graph.reachable_output_trees(current_node.output_tree)
+    else:
+        reachable_set = engine.reader.get_reachable_output_trees(current_node.output_tree)
 
     return [node for node in nodes if node.output_tree in reachable_set]
+
+
+def reachable_output_trees(engine: Engine) -> Optional[Set[str]]:
+    """
+    在不物化图谱的情况下，通过点查询计算与当前工作区状态直接相关的 output_tree 集合。
+    工作区是脏的时返回 None (不做过滤)。
+    """
+    current_node = engine.find_node_by_output_tree(engine.git_db.get_tree_hash())
+    if not current_node:
+        bus.warning("navigation.warning.workspaceDirty")
+        bus.info("navigation.info.saveHint")
+        return None
+    return engine.reader.get_reachable_output_trees(current_node.output_tree)
@@ -28,10 +28,8 @@ def register(app: typer.Typer):
         """
         将工作区恢复到指定的历史节点状态。
         """
-        with engine_context(work_dir) as engine:
-            graph = engine.history_graph
-
-            matches = [node for node in graph.values() if node.output_tree.startswith(hash_prefix)]
+        with engine_context(work_dir, lazy_graph=True) as engine:
+            matches = engine.find_nodes_by_output_tree_prefix(hash_prefix)
             if not matches:
                 bus.error("navigation.checkout.error.notFound", hash_prefix=hash_prefix)
                 ctx.exit(1)
@@ -1,40 +1,42 @@
 import dataclasses
+import itertools
 import json
 from datetime import datetime
 from pathlib import Path
-from typing import Annotated, List, Optional
+from typing import Annotated, Any, Dict, Iterable, List, Optional
 
 import typer
 from pyquipu.common.messaging import bus
 from pyquipu.interfaces.models import QuipuNode
 
 from ..config import DEFAULT_WORK_DIR
-from .helpers import engine_context, filter_nodes, filter_reachable_nodes
+from .helpers import engine_context, parse_time_option, reachable_output_trees
 
 
-def _nodes_to_json_str(nodes: List[QuipuNode]) -> str:
+def _node_to_dict(node: QuipuNode) -> Dict[str, Any]:
     """
-    Dynamically serializes a list of QuipuNode objects to a JSON string,
+    Dynamically serializes a QuipuNode to a dict,
     avoiding hardcoded fields for better maintainability.
     """
     EXCLUDED_FIELDS = {"parent", "children", "content", "filename"}
-    node_list = []
-    for node in nodes:
-        node_dict = {}
-        for field in dataclasses.fields(node):
-            if field.name in EXCLUDED_FIELDS:
-                continue
-            value = getattr(node, field.name)
-            if isinstance(value, datetime):
-                node_dict[field.name] = value.isoformat()
-            else:
-                node_dict[field.name] = value
+    node_dict = {}
+    for field in dataclasses.fields(node):
+        if field.name in EXCLUDED_FIELDS:
+            continue
+        value = getattr(node, field.name)
+        if isinstance(value, datetime):
+            node_dict[field.name] = value.isoformat()
+        else:
+            node_dict[field.name] = value
+
+    # Explicitly add properties
+    node_dict["short_hash"] = node.short_hash
+    return node_dict
 
-        # Explicitly add properties
-        node_dict["short_hash"] = node.short_hash
-        node_list.append(node_dict)
 
-    return json.dumps(node_list, indent=2)
+def _nodes_to_json_str(nodes: List[QuipuNode]) -> str:
+    """Serializes a list of QuipuNode objects to a JSON array string."""
+    return json.dumps([_node_to_dict(node) for node in nodes], indent=2)
 
 
 def register(app: typer.Typer):
@@ -50,55 +52,70 @@ def register(app: typer.Typer):
         limit: Annotated[Optional[int], typer.Option("--limit", "-n", help="限制显示的节点数量。")] = None,
         since: Annotated[Optional[str], typer.Option("--since", help="起始时间戳 (YYYY-MM-DD HH:MM)。")] = None,
         until: Annotated[Optional[str], typer.Option("--until", help="截止时间戳 (YYYY-MM-DD HH:MM)。")] = None,
+        node_type: Annotated[
+            Optional[str], typer.Option("--type", "-t", help="仅显示指定类型的节点 ('plan' 或 'capture')。")
+        ] = None,
+        owner: Annotated[Optional[str], typer.Option("--owner", help="仅显示指定所有者的节点。")] = None,
         reachable_only: Annotated[
             bool, typer.Option("--reachable-only", help="仅显示与当前工作区状态直接相关的节点。")
         ] = False,
         json_output: Annotated[bool, typer.Option("--json", help="以 JSON 格式输出结果。")] = False,
+        json_lines: Annotated[
+            bool, typer.Option("--json-lines", help="以 JSON Lines 格式逐行输出结果 (每行一个节点)。")
+        ] = False,
     ):
         """
         显示 Quipu 历史图谱日志。
-        """
-        with engine_context(work_dir) as engine:
-            graph = engine.history_graph
 
-            if not graph:
-                if json_output:
-                    bus.data("[]")
-                else:
-                    bus.info("query.info.emptyHistory")
-                raise typer.Exit(0)
-
-            nodes_to_process = sorted(graph.values(), key=lambda n: n.timestamp, reverse=True)
+        节点按时间倒序从存储中流式读取，过滤条件下推到存储层，
+        因此 `-n` 限制下的代价与历史规模无关。
+        """
+        try:
+            since_dt = parse_time_option(since, "since")
+            until_dt = parse_time_option(until, "until")
+        except typer.BadParameter as e:
+            bus.error("common.error.invalidConfig", error=str(e))
+            ctx.exit(1)
+
+        # 日志只需流式读取节点，无需对齐工作区 (Git 后端的对齐会加载全部节点)；
+        # SQLite 后端仍需补水，以读到其他设备同步来的历史
+        with engine_context(work_dir, lazy=True) as engine:
+            engine.hydrate()
+            nodes: Iterable[QuipuNode] = engine.reader.iter_nodes(
+                since=since_dt, until=until_dt, node_type=node_type, owner_id=owner
+            )
 
             if reachable_only:
-                nodes_to_process = filter_reachable_nodes(engine, nodes_to_process)
+                reachable_set = reachable_output_trees(engine)
+                if reachable_set is not None:
+                    nodes = (node for node in nodes if node.output_tree in reachable_set)
 
-            try:
-                nodes = filter_nodes(nodes_to_process, limit, since, until)
-            except typer.BadParameter as e:
-                bus.error("common.error.invalidConfig", error=str(e))
-                ctx.exit(1)
-
-            if not nodes:
-                if json_output:
-                    bus.data("[]")
-                else:
-                    bus.info("query.info.noResults")
-                raise typer.Exit(0)
+            if limit is not None and limit > 0:
+                nodes = itertools.islice(nodes, limit)
 
             if json_output:
-                bus.data(_nodes_to_json_str(nodes))
+                bus.data(_nodes_to_json_str(list(nodes)))
                 raise typer.Exit(0)
 
-            bus.info("query.log.ui.header")
+            emitted = 0
             for node in nodes:
-                ts = node.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-                tag = f"[{node.node_type.upper()}]"
-                summary = node.summary
-                # Note: Coloring is a presentation detail handled by renderer, or omitted for data.
-                # Here we pass the uncolored data string to the bus.
-                data_line = f"{ts} {tag:<9} {node.short_hash} - {summary}"
-                bus.data(data_line)
+                if json_lines:
+                    bus.data(json.dumps(_node_to_dict(node)))
+                else:
+                    if emitted == 0:
+                        bus.info("query.log.ui.header")
+                    ts = node.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+                    tag = f"[{node.node_type.upper()}]"
+                    # Note: Coloring is a presentation detail handled by renderer, or omitted for data.
+                    # Here we pass the uncolored data string to the bus.
+                    bus.data(f"{ts} {tag:<9} {node.short_hash} - {node.summary}")
+                emitted += 1
+
+            if emitted == 0 and not json_lines:
+                if not engine.has_history():
+                    bus.info("query.info.emptyHistory")
+                else:
+                    bus.info("query.info.noResults")
 
     @app.command(name="find")
     def find_command(
@@ -109,6 +126,10 @@ def register(app: typer.Typer):
         node_type: Annotated[
             Optional[str], typer.Option("--type", "-t", help="节点类型 ('plan' 或 'capture')。")
         ] = None,
+        text: Annotated[
+            Optional[str],
+            typer.Option("--text", "-x", help="在摘要、计划内容和元数据中全文检索 (多个词需全部命中，按相关度排序)。"),
+        ] = None,
         limit: Annotated[int, typer.Option("--limit", "-n", help="返回的最大结果数量。")] = 10,
         work_dir: Annotated[Path, typer.Option("--work-dir", "-w", help="工作区根目录。")] = DEFAULT_WORK_DIR,
         json_output: Annotated[bool, typer.Option("--json", help="以 JSON 格式输出结果。")] = False,
@@ -124,7 +145,7 @@ def register(app: typer.Typer):
                     bus.info("query.info.emptyHistory")
                 ctx.exit(0)
 
-            nodes = engine.find_nodes(summary_regex=summary_regex, node_type=node_type, limit=limit)
+            nodes = engine.find_nodes(summary_regex=summary_regex, node_type=node_type, limit=limit, text=text)
 
             if not nodes:
                 if json_output:
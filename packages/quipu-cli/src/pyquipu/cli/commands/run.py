@@ -2,14 +2,16 @@ import inspect
 import logging
 import sys
 from pathlib import Path
-from typing import Annotated, Optional
+from typing import Annotated, List, Optional
 
 import typer
 from pyquipu.common.messaging import bus
+from pyquipu.interfaces.result import QuipuResult
 from pyquipu.runtime.executor import Executor
 
-from ..config import DEFAULT_ENTRY_FILE, DEFAULT_WORK_DIR
-from ..controller import run_quipu
+from ..config import DAEMON_SOCKET, DEFAULT_ENTRY_FILE, DEFAULT_WORK_DIR
+from ..controller import run_quipu, run_quipu_batch, run_quipu_stream
+from ..daemon import DaemonClient, DaemonUnavailable
 from ..logger_config import setup_logging
 
 logger = logging.getLogger(__name__)
@@ -19,8 +21,9 @@ def register(app: typer.Typer):
     @app.command(name="run")
     def run_command(
         ctx: typer.Context,
-        file: Annotated[
-            Optional[Path], typer.Argument(help="包含 Markdown 指令的文件路径。", resolve_path=True)
+        files: Annotated[
+            Optional[List[Path]],
+            typer.Argument(help="包含 Markdown 指令的文件路径。使用 --batch 时可以传入多个。", resolve_path=True),
         ] = None,
         work_dir: Annotated[
             Path,
@@ -33,6 +36,15 @@ def register(app: typer.Typer):
             bool, typer.Option("--yolo", "-y", help="跳过所有确认步骤，直接执行 (You Only Look Once)。")
         ] = False,
         list_acts: Annotated[bool, typer.Option("--list-acts", "-l", help="列出所有可用的操作指令及其说明。")] = False,
+        batch: Annotated[
+            bool, typer.Option("--batch", "-b", help="在同一个会话中按顺序执行多个 Plan 文件，每个文件生成一个节点。")
+        ] = False,
+        no_daemon: Annotated[
+            bool, typer.Option("--no-daemon", help="即使 quipu serve 正在运行，也在当前进程中执行。")
+        ] = False,
+        stream: Annotated[
+            bool, typer.Option("--stream", help="边读取边执行：每条指令一旦完整就立即执行，适用于较大的管道输入。")
+        ] = False,
     ):
         """
         Quipu: 执行 Markdown 文件中的操作指令。
@@ -57,6 +69,15 @@ def register(app: typer.Typer):
                 bus.data(f"{indented_doc}\n")
             ctx.exit(0)
 
+        if batch:
+            _run_batch(ctx, files or [], work_dir, parser_name, yolo)
+        if files and len(files) > 1:
+            bus.error("run.error.multipleFiles")
+            ctx.exit(1)
+        file = files[0] if files else None
+        if stream:
+            _run_stream(ctx, file, work_dir, parser_name, yolo)
+
         content = ""
         source_desc = ""
         if file:
@@ -93,17 +114,86 @@ def register(app: typer.Typer):
         logger.info(f"工作区根目录: {work_dir}")
         if yolo:
             bus.warning("run.warning.yoloEnabled")
-        result = run_quipu(content=content, work_dir=work_dir, parser_name=parser_name, yolo=yolo)
-
-        if result.message:
-            kwargs = result.msg_kwargs or {}
-            if result.exit_code == 2:  # OperationCancelledError
-                bus.warning(result.message, **kwargs)
-            elif not result.success:
-                bus.error(result.message, **kwargs)
-            else:
-                bus.success(result.message, **kwargs)
-
-        if result.data:
-            bus.data(result.data)
-        ctx.exit(result.exit_code)
+        result = None
+        # 守护进程无法向调用方发起确认，因此只转发 yolo 执行
+        if yolo and not no_daemon:
+            try:
+                result = DaemonClient(DAEMON_SOCKET).run(content=content, work_dir=work_dir, parser_name=parser_name)
+                logger.info("已由常驻守护进程执行。")
+            except DaemonUnavailable as e:
+                # 只有请求未发出时才回退；请求发出后的失败已作为结果返回，重新执行会重复应用计划
+                logger.debug(f"守护进程不可用，回退到本地执行: {e}")
+        if result is None:
+            result = run_quipu(content=content, work_dir=work_dir, parser_name=parser_name, yolo=yolo)
+        _exit_with_result(ctx, result)
+
+
+def _exit_with_result(ctx: typer.Context, result: QuipuResult):
+    """展示执行结果并以其退出码结束。"""
+    if result.message:
+        kwargs = result.msg_kwargs or {}
+        if result.exit_code == 2:  # OperationCancelledError
+            bus.warning(result.message, **kwargs)
+        elif not result.success:
+            bus.error(result.message, **kwargs)
+        else:
+            bus.success(result.message, **kwargs)
+
+    if result.data:
+        bus.data(result.data)
+    ctx.exit(result.exit_code)
+
+
+def _run_stream(ctx: typer.Context, file: Optional[Path], work_dir: Path, parser_name: str, yolo: bool):
+    """逐行读取 Plan (文件、管道或默认入口文件) 并边读边执行。守护进程需要完整内容，因此不参与。"""
+    if file and not file.is_file():
+        bus.error("common.error.fileNotFound", path=file)
+        ctx.exit(1)
+    source = file
+    if source is None and sys.stdin.isatty():
+        if not DEFAULT_ENTRY_FILE.exists():
+            bus.warning("run.warning.noInput", filename=DEFAULT_ENTRY_FILE.name)
+            bus.info("run.info.usageHint")
+            ctx.exit(0)
+        source = DEFAULT_ENTRY_FILE
+
+    logger.info(f"以流式模式加载指令源: {source or 'STDIN (管道流)'}")
+    logger.info(f"工作区根目录: {work_dir}")
+    if yolo:
+        bus.warning("run.warning.yoloEnabled")
+    if source is None:
+        result = run_quipu_stream(sys.stdin, work_dir=work_dir, parser_name=parser_name, yolo=yolo)
+    else:
+        with open(source, encoding="utf-8") as f:
+            result = run_quipu_stream(f, work_dir=work_dir, parser_name=parser_name, yolo=yolo)
+    _exit_with_result(ctx, result)
+
+
+def _run_batch(ctx: typer.Context, files: List[Path], work_dir: Path, parser_name: str, yolo: bool):
+    """按顺序在同一个会话中执行多个 Plan 文件，并以首个失败的 Plan 的退出码结束。"""
+    if not files:
+        bus.error("run.batch.error.noFiles")
+        ctx.exit(1)
+    for file in files:
+        if not file.is_file():
+            bus.error("common.error.fileNotFound", path=file)
+            ctx.exit(1)
+
+    contents = [file.read_text(encoding="utf-8") for file in files]
+    logger.info(f"批量执行 {len(files)} 个 Plan，工作区根目录: {work_dir}")
+    if yolo:
+        bus.warning("run.warning.yoloEnabled")
+    results = run_quipu_batch(contents, work_dir=work_dir, parser_name=parser_name, yolo=yolo)
+
+    last = results[-1]
+    if last.success:
+        bus.success("run.batch.success", count=len(results))
+        ctx.exit(0)
+
+    kwargs = last.msg_kwargs or {}
+    if last.exit_code == 2:
+        bus.warning(last.message, **kwargs)
+    else:
+        bus.error(last.message, **kwargs)
+    bus.error("run.batch.error.stopped", path=files[len(results) - 1], done=len(results) - 1, total=len(files))
+    ctx.exit(last.exit_code)
@@ -0,0 +1,55 @@
+import logging
+from pathlib import Path
+from typing import Annotated
+
+import typer
+from pyquipu.common.messaging import bus
+
+from ..config import DAEMON_SOCKET
+from ..daemon import DaemonClient, DaemonError, DaemonUnavailable, is_supported, serve_forever
+from ..logger_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def register(app: typer.Typer):
+    @app.command()
+    def serve(
+        ctx: typer.Context,
+        socket_path: Annotated[
+            Path, typer.Option("--socket", help="守护进程监听的 Unix Socket 路径。", resolve_path=True)
+        ] = DAEMON_SOCKET,
+        max_workspaces: Annotated[int, typer.Option("--max-workspaces", help="最多保持预热的工作区数量。")] = 32,
+        stop: Annotated[bool, typer.Option("--stop", help="停止正在运行的守护进程。")] = False,
+    ):
+        """
+        在前台运行常驻守护进程，为多个工作区保留预热的 Engine。
+
+        守护进程运行期间，`quipu run --yolo` 会将计划转发给它执行，省去每次调用的启动开销。
+        """
+        setup_logging()
+        if not is_supported():
+            bus.error("serve.error.unsupported")
+            ctx.exit(1)
+
+        if stop:
+            try:
+                DaemonClient(socket_path).call("shutdown")
+            except DaemonUnavailable:
+                bus.warning("serve.warning.notRunning", path=socket_path)
+                ctx.exit(1)
+            except DaemonError as e:
+                bus.error("serve.error.stopFailed", error=str(e))
+                ctx.exit(1)
+            bus.success("serve.success.stopRequested")
+            ctx.exit(0)
+
+        bus.info("serve.info.started", path=socket_path)
+        try:
+            serve_forever(socket_path, max_workspaces=max_workspaces)
+        except OSError as e:
+            bus.error("serve.error.startFailed", error=str(e))
+            ctx.exit(1)
+        except KeyboardInterrupt:
+            pass
+        bus.info("serve.info.stopped")
@@ -5,6 +5,8 @@ from typing import Annotated, Dict, List, Optional
 
 import typer
 from pyquipu.common.messaging import bus
+from pyquipu.engine.history_graph import CompactHistoryGraph, HistoryGraph
+from pyquipu.interfaces.models import QuipuNode
 from rich.console import Console
 from rich.syntax import Syntax
 
@@ -16,11 +18,9 @@ logger = logging.getLogger(__name__)
 
 def _find_target_node(graph: Dict, hash_prefix: str):
     """辅助函数，用于在图中查找唯一的节点。"""
-    matches = [
-        node
-        for node in graph.values()
-        if node.commit_hash.startswith(hash_prefix) or node.output_tree.startswith(hash_prefix)
-    ]
+    if not isinstance(graph, (HistoryGraph, CompactHistoryGraph)):
+        graph = HistoryGraph(graph)
+    matches = graph.find_by_prefix(hash_prefix)
     if not matches:
         bus.error("show.error.notFound", hash_prefix=hash_prefix)
         raise typer.Exit(1)
@@ -30,11 +30,90 @@ def _find_target_node(graph: Dict, hash_prefix: str):
     return matches[0]
 
 
+def _resolve_range(graph: Dict, range_spec: str) -> List[QuipuNode]:
+    """
+    解析 `A..B` 形式的范围: 返回 A (不含) 到 B (含) 之间祖先链上的节点，按时间正序排列。
+    """
+    base_prefix, tip_prefix = range_spec.split("..", 1)
+    base = _find_target_node(graph, base_prefix)
+    tip = _find_target_node(graph, tip_prefix)
+    chain = []
+    node = tip
+    while node is not None and node.commit_hash != base.commit_hash:
+        chain.append(node)
+        node = node.parent
+    if node is None:
+        bus.error("show.error.notAncestor", range_spec=range_spec, base=base.short_hash, tip=tip.short_hash)
+        raise typer.Exit(1)
+    return chain[::-1]
+
+
+def _resolve_targets(graph: Dict, specs: List[str]) -> List[QuipuNode]:
+    """将哈希前缀与范围解析为去重后的节点列表，保持参数顺序。"""
+    targets: Dict[str, QuipuNode] = {}
+    for spec in specs:
+        nodes = _resolve_range(graph, spec) if ".." in spec else [_find_target_node(graph, spec)]
+        for node in nodes:
+            targets.setdefault(node.commit_hash, node)
+    return list(targets.values())
+
+
+def _decode_files(blobs: Dict[str, bytes], extract: Optional[List[str]]) -> Dict[str, str]:
+    """按需筛选节点内的文件并解码为文本，二进制内容以占位描述代替。"""
+    output_data = {}
+    files_to_process = extract if extract else sorted(blobs.keys())
+
+    for filename in files_to_process:
+        if filename not in blobs:
+            bus.error("show.error.fileNotInNode", filename=filename)
+            bus.info("show.info.availableFiles", file_list=", ".join(blobs.keys()))
+            raise typer.Exit(1)
+
+        content_bytes = blobs[filename]
+        try:
+            output_data[filename] = content_bytes.decode("utf-8")
+        except UnicodeDecodeError:
+            output_data[filename] = f"<binary data, {len(content_bytes)} bytes>"
+    return output_data
+
+
+def _render_node(console: Console, node: QuipuNode, output_data: Dict[str, str], extract: Optional[List[str]]):
+    if extract:
+        # User explicitly extracted files, show them directly
+        for filename, content in output_data.items():
+            if len(extract) > 1:
+                console.rule(f"[bold]{filename}[/bold]", style="blue")
+
+            # Per user directive, completely disable rich formatting for --extract
+            # to guarantee raw, unmodified output.
+            console.print(content, end="")
+        return
+
+    # Default view: show summary and all files prettified
+    ts = node.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+    tag = f"[{node.node_type.upper()}]"
+    bus.data(bus.get("show.ui.header", ts=ts, tag=f"{tag:<9}", short_hash=node.short_hash, summary=node.summary))
+
+    for filename, content in output_data.items():
+        console.rule(f"[bold]{filename}[/bold]", style="blue")
+        if filename.endswith(".json"):
+            syntax = Syntax(content, "json", theme="default", line_numbers=False, word_wrap=False)
+            console.print(syntax)
+        else:
+            console.print(content.strip())
+        console.print()
+
+
 def register(app: typer.Typer):
     @app.command()
     def show(
         ctx: typer.Context,
-        hash_prefix: Annotated[str, typer.Argument(help="目标状态节点的 commit_hash 或 output_tree 的哈希前缀。")],
+        hash_prefixes: Annotated[
+            List[str],
+            typer.Argument(
+                help="目标节点的 commit_hash 或 output_tree 哈希前缀，可指定多个，或使用 A..B 表示祖先链上的范围。"
+            ),
+        ],
         work_dir: Annotated[
             Path,
             typer.Option(
@@ -48,67 +127,41 @@ def register(app: typer.Typer):
     ):
         """
         显示指定历史节点的详细信息，包括所有内部文件。
+
+        指定多个节点时，所有节点的文件通过一次批量读取获得；
+        JSON 输出为以 commit_hash 为键的对象。
         """
         with engine_context(work_dir) as engine:
-            target_node = _find_target_node(engine.history_graph, hash_prefix)
-            blobs = engine.reader.get_node_blobs(target_node.commit_hash)
+            targets = _resolve_targets(engine.history_graph, hash_prefixes)
+            all_blobs = engine.reader.get_nodes_blobs([node.commit_hash for node in targets])
+
+            if len(targets) == 1:
+                target_node = targets[0]
+                blobs = all_blobs.get(target_node.commit_hash)
+                if not blobs:
+                    if json_output:
+                        bus.data("{}")
+                    else:
+                        bus.info("show.info.noContent")
+                    raise typer.Exit()
 
-            if not blobs:
+                output_data = _decode_files(blobs, extract)
                 if json_output:
-                    bus.data("{}")
+                    bus.data(json.dumps(output_data, indent=2, ensure_ascii=False))
                 else:
-                    bus.info("show.info.noContent")
-                raise typer.Exit()
-
-            # --- Phase 1: Build output dictionary ---
-            output_data = {}
-            files_to_process = extract if extract else sorted(blobs.keys())
-
-            for filename in files_to_process:
-                if filename not in blobs:
-                    bus.error("show.error.fileNotInNode", filename=filename)
-                    bus.info("show.info.availableFiles", file_list=", ".join(blobs.keys()))
-                    raise typer.Exit(1)
-
-                content_bytes = blobs[filename]
-                try:
-                    output_data[filename] = content_bytes.decode("utf-8")
-                except UnicodeDecodeError:
-                    output_data[filename] = f"<binary data, {len(content_bytes)} bytes>"
-
-            # --- Phase 2: Render output ---
+                    _render_node(Console(), target_node, output_data, extract)
+                return
+
+            # --- Multiple nodes ---
+            outputs = {
+                node.commit_hash: _decode_files(all_blobs.get(node.commit_hash) or {}, extract) for node in targets
+            }
             if json_output:
-                bus.data(json.dumps(output_data, indent=2, ensure_ascii=False))
-            else:
-                console = Console()
+                bus.data(json.dumps(outputs, indent=2, ensure_ascii=False))
+                return
+
+            console = Console()
+            for node in targets:
                 if extract:
-                    # User explicitly extracted files, show them directly
-                    for filename, content in output_data.items():
-                        if len(extract) > 1:
-                            console.rule(f"[bold]{filename}[/bold]", style="blue")
-
-                        # Per user directive, completely disable rich formatting for --extract
-                        # to guarantee raw, unmodified output.
-                        console.print(content, end="")
-                else:
-                    # Default view: show summary and all files prettified
-                    ts = target_node.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-                    tag = f"[{target_node.node_type.upper()}]"
-                    bus.data(
-                        bus.get(
-                            "show.ui.header",
-                            ts=ts,
-                            tag=f"{tag:<9}",
-                            short_hash=target_node.short_hash,
-                            summary=target_node.summary,
-                        )
-                    )
-
-                    for filename, content in output_data.items():
-                        console.rule(f"[bold]{filename}[/bold]", style="blue")
-                        if filename.endswith(".json"):
-                            syntax = Syntax(content, "json", theme="default", line_numbers=False, word_wrap=False)
-                            console.print(syntax)
-                        else:
-                            console.print(content.strip())
-                        console.print()
+                    console.rule(f"[bold]{node.short_hash}[/bold]", style="green")
+                _render_node(console, node, outputs[node.commit_hash], extract)
@@ -0,0 +1,48 @@
+import logging
+from pathlib import Path
+from typing import Annotated
+
+import typer
+from pyquipu.common.messaging import bus
+from pyquipu.engine.watcher import InotifyWatcher, WatcherUnavailable
+
+from ..config import DEFAULT_WORK_DIR
+from ..logger_config import setup_logging
+from ..utils import find_git_repository_root
+
+logger = logging.getLogger(__name__)
+
+
+def register(app: typer.Typer):
+    @app.command()
+    def watch(
+        ctx: typer.Context,
+        work_dir: Annotated[
+            Path,
+            typer.Option(
+                "--work-dir", "-w", help="操作执行的根目录（工作区）", file_okay=False, dir_okay=True, resolve_path=True
+            ),
+        ] = DEFAULT_WORK_DIR,
+    ):
+        """
+        在前台监控工作区的文件变更 (仅限 Linux)。
+
+        运行期间，其他 quipu 命令计算工作区快照时只需重新哈希变更过的文件。
+        """
+        setup_logging()
+        project_root = find_git_repository_root(work_dir) or work_dir
+        try:
+            watcher = InotifyWatcher(project_root)
+        except (WatcherUnavailable, OSError) as e:
+            bus.error("watch.error.unavailable", error=str(e))
+            ctx.exit(1)
+
+        bus.info("watch.info.started", path=project_root)
+        try:
+            watcher.run_forever()
+        except WatcherUnavailable as e:
+            bus.error("watch.error.unavailable", error=str(e))
+            ctx.exit(1)
+        except KeyboardInterrupt:
+            pass
+        bus.info("watch.info.stopped")
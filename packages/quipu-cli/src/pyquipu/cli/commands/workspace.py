@@ -24,11 +24,11 @@ def register(app: typer.Typer):
         """
         捕获当前工作区的状态，创建一个“微提交”快照。
         """
-        with engine_context(work_dir) as engine:
+        with engine_context(work_dir, lazy_graph=True) as engine:
             current_tree_hash = engine.git_db.get_tree_hash()
             is_node_clean = (engine.current_node is not None) and (engine.current_node.output_tree == current_tree_hash)
             EMPTY_TREE_HASH = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
-            is_genesis_clean = (not engine.history_graph) and (current_tree_hash == EMPTY_TREE_HASH)
+            is_genesis_clean = (not engine.has_history()) and (current_tree_hash == EMPTY_TREE_HASH)
 
             if is_node_clean or is_genesis_clean:
                 bus.success("workspace.save.noChanges")
@@ -65,13 +65,10 @@ def register(app: typer.Typer):
             target_tree_hash = engine._read_head()
             latest_node = None
             if target_tree_hash:
-                for node in graph.values():
-                    if node.output_tree == target_tree_hash:
-                        latest_node = node
-                        break
+                latest_node = graph.find_by_output_tree(target_tree_hash)
 
             if not latest_node:
-                latest_node = max(graph.values(), key=lambda n: n.timestamp)
+                latest_node = graph.latest_node()
                 target_tree_hash = latest_node.output_tree
                 bus.warning("workspace.discard.warning.headMissing", short_hash=latest_node.short_hash)
 
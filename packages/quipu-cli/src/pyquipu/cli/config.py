@@ -1,4 +1,6 @@
+import getpass
 import os
+import tempfile
 from pathlib import Path
 
 # 全局配置中心
@@ -40,3 +42,12 @@ DEFAULT_ENTRY_FILE: Path = Path(os.getenv("AXON_ENTRY_FILE", "o.md"))
 # 日志级别
 # 使用项目特定的环境变量 QUIPU_LOG_LEVEL，并确保其值为大写
 LOG_LEVEL: str = os.getenv("QUIPU_LOG_LEVEL", "INFO").upper()
+
+# 常驻守护进程 (quipu serve) 的 Unix Socket 路径
+# 可通过环境变量 QUIPU_DAEMON_SOCKET 覆盖；默认位于每个用户独立的运行时目录中
+_RUNTIME_DIR: Path = (
+    Path(os.environ["XDG_RUNTIME_DIR"]) / "quipu"
+    if os.getenv("XDG_RUNTIME_DIR")
+    else Path(tempfile.gettempdir()) / f"quipu-{getpass.getuser()}"
+)
+DAEMON_SOCKET: Path = Path(os.getenv("QUIPU_DAEMON_SOCKET") or _RUNTIME_DIR / "daemon.sock")
@@ -1,15 +1,18 @@
 import logging
 import re
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Sequence
 
 from pyquipu.acts import register_core_acts
+from pyquipu.engine.async_engine import run_blocking
+from pyquipu.engine.config import ConfigManager
 from pyquipu.engine.state_machine import Engine
 from pyquipu.interfaces.exceptions import ExecutionError as CoreExecutionError
 from pyquipu.interfaces.exceptions import OperationCancelledError
 from pyquipu.interfaces.result import QuipuResult
+from pyquipu.interfaces.types import Statement
 from pyquipu.runtime.executor import Executor
-from pyquipu.runtime.parser import detect_best_parser, get_parser
+from pyquipu.runtime.parser import detect_best_parser, detect_best_parser_from_lines, get_parser
 
 from .factory import create_engine
 from .plugin_manager import PluginManager
@@ -39,10 +42,16 @@ class QuipuApplication:
     负责协调 Engine, Parser, Executor。
     """
 
-    def __init__(self, work_dir: Path, yolo: bool = False):
+    def __init__(self, work_dir: Path, yolo: bool = False, engine: Optional[Engine] = None):
         self.work_dir = work_dir
         self.yolo = yolo
-        self.engine: Engine = create_engine(work_dir)
+        # run 只关心当前状态是否匹配某个节点，无需物化完整图谱。
+        # 常驻进程 (quipu serve) 会注入一个已预热并重新对齐过的 Engine。
+        self.engine: Engine = engine if engine is not None else create_engine(work_dir, lazy_graph=True)
+        # 执行器 (含核心 acts 与插件) 在同一会话的多个 Plan 之间复用
+        self._executor: Optional[Executor] = None
+        # 上一个 Plan 执行后的 Tree Hash。批量执行时下一个 Plan 直接以它为起点，无需重新计算
+        self._known_tree_hash: Optional[str] = None
         logger.info(f"Operation boundary set to: {self.work_dir}")
 
     def _prepare_workspace(self) -> str:
@@ -50,7 +59,8 @@ class QuipuApplication:
         检查并准备工作区，处理状态漂移。
         返回执行前的 input_tree_hash。
         """
-        current_hash = self.engine.git_db.get_tree_hash()
+        current_hash = self._known_tree_hash or self.engine.git_db.get_tree_hash()
+        self._known_tree_hash = None
 
         # 1. 正常 Clean: current_node 存在且与当前 hash 一致
         is_node_clean = (self.engine.current_node is not None) and (
@@ -59,7 +69,7 @@ class QuipuApplication:
 
         # 2. 创世 Clean: 历史为空 且 当前是空树 (即没有任何文件被追踪)
         EMPTY_TREE_HASH = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
-        is_genesis_clean = (not self.engine.history_graph) and (current_hash == EMPTY_TREE_HASH)
+        is_genesis_clean = (not self.engine.has_history()) and (current_hash == EMPTY_TREE_HASH)
 
         is_clean = is_node_clean or is_genesis_clean
 
@@ -72,12 +82,16 @@ class QuipuApplication:
             return current_hash
 
     def _setup_executor(self) -> Executor:
-        """创建、配置并返回一个 Executor 实例，并注入 UI 依赖。"""
+        """创建、配置并返回一个 Executor 实例，并注入 UI 依赖。同一会话内只创建一次。"""
+        if self._executor is not None:
+            return self._executor
 
+        config = ConfigManager(self.engine.root_dir)
         executor = Executor(
             root_dir=self.work_dir,
             yolo=self.yolo,
             confirmation_handler=confirmation_handler_for_executor,
+            transactional=bool(config.get("run.transactional", False)),
         )
 
         # 加载核心 acts
@@ -87,8 +101,28 @@ class QuipuApplication:
         plugin_manager = PluginManager()
         plugin_manager.load_from_sources(executor, self.work_dir)
 
+        self._executor = executor
         return executor
 
+    def _compute_output_tree(self, input_tree_hash: str, executor: Executor) -> str:
+        """
+        计算执行后的 Tree Hash。执行器报告了确切的变更集时，只在输入树之上更新这些路径；
+        否则 (执行过 shell 等无法预知影响范围的 act) 重新扫描整个工作区。
+        """
+        git_db = self.engine.git_db
+        changed = executor.changed_paths
+        if changed is None:
+            return git_db.get_tree_hash()
+
+        root = git_db.root.resolve()
+        rel_paths = set()
+        for path in changed:
+            try:
+                rel_paths.add(path.relative_to(root).as_posix())
+            except ValueError:
+                return git_db.get_tree_hash()
+        return git_db.update_tree(input_tree_hash, rel_paths)
+
     def run(self, content: str, parser_name: str) -> QuipuResult:
         """
         执行一个完整的 Plan。
@@ -120,18 +154,70 @@ class QuipuApplication:
 
         # 3.3 Execute
         executor.execute(statements)
+        # Acts 已修改工作区，丢弃执行前缓存的 Tree Hash
+        self.engine.git_db.invalidate_tree_hash()
 
         # --- Phase 4: Recording (Plan Crystallization) ---
+        return self._record_plan(input_tree_hash, content, statements[0], executor)
+
+    def run_stream(self, lines: Iterable[str], parser_name: str) -> QuipuResult:
+        """
+        边读取边执行一个 Plan：逐行解析输入，每条语句一旦完整就立即交给执行器，
+        无需等待整个输入到达。读入的文本仍会完整记录到计划节点中。
+        """
+        input_tree_hash = self._prepare_workspace()
+
+        received: List[str] = []
+
+        def record(source: Iterable[str]) -> Iterator[str]:
+            for line in source:
+                received.append(line)
+                yield line
+
+        source: Iterator[str] = record(lines)
+        final_parser_name = parser_name
+        if parser_name == "auto":
+            final_parser_name, source = detect_best_parser_from_lines(source)
+            if final_parser_name != "backtick":
+                logger.info(f"🔍 自动检测到解析器: {final_parser_name}")
+
+        parser = get_parser(final_parser_name)
+        first: List[Statement] = []
+
+        def track(statements: Iterable[Statement]) -> Iterator[Statement]:
+            for stmt in statements:
+                if not first:
+                    first.append(stmt)
+                yield stmt
+
+        executor = self._setup_executor()
+        executor.execute_stream(track(parser.iter_parse(source)))
+
+        if not first:
+            return QuipuResult(
+                success=True,
+                exit_code=0,
+                message="axon.warning.noStatements",
+                msg_kwargs={"parser": final_parser_name},
+            )
+        self.engine.git_db.invalidate_tree_hash()
+
+        return self._record_plan(input_tree_hash, "".join(received), first[0], executor)
+
+    def _record_plan(
+        self, input_tree_hash: str, content: str, first_statement: Statement, executor: Executor
+    ) -> QuipuResult:
+        """为执行完毕的 Plan 计算输出树并创建计划节点。"""
         final_summary = None
         # 优先级 1: 从 Markdown 内容中提取 # 标题
         title_match = re.search(r"^\s*#{1,6}\s+(.*)", content, re.MULTILINE)
         if title_match:
             final_summary = title_match.group(1).strip()
         # 优先级 2: 从第一个 act 指令生成摘要
-        elif statements:
-            final_summary = executor.summarize_statement(statements[0])
+        else:
+            final_summary = executor.summarize_statement(first_statement)
 
-        output_tree_hash = self.engine.git_db.get_tree_hash()
+        output_tree_hash = self._compute_output_tree(input_tree_hash, executor)
 
         self.engine.create_plan_node(
             input_tree=input_tree_hash,
@@ -139,40 +225,108 @@ class QuipuApplication:
             plan_content=content,
             summary_override=final_summary,
         )
+        self._known_tree_hash = output_tree_hash
 
         return QuipuResult(success=True, exit_code=0, message="run.success")
 
 
-def run_quipu(content: str, work_dir: Path, parser_name: str = "auto", yolo: bool = False) -> QuipuResult:
+def _result_from_exception(e: Exception) -> QuipuResult:
+    """将执行过程中的异常转化为 QuipuResult。"""
+    if isinstance(e, OperationCancelledError):
+        logger.info(f"🚫 操作已取消: {e}")
+        return QuipuResult(
+            success=False, exit_code=2, message="run.error.cancelled", msg_kwargs={"error": str(e)}, error=e
+        )
+    if isinstance(e, CoreExecutionError):
+        logger.error(f"❌ 操作失败: {e}")
+        return QuipuResult(
+            success=False, exit_code=1, message="run.error.execution", msg_kwargs={"error": str(e)}, error=e
+        )
+    logger.error(f"运行时错误: {e}", exc_info=True)
+    return QuipuResult(success=False, exit_code=1, message="run.error.system", msg_kwargs={"error": str(e)}, error=e)
+
+
+def run_quipu(
+    content: str, work_dir: Path, parser_name: str = "auto", yolo: bool = False, engine: Optional[Engine] = None
+) -> QuipuResult:
     """
     Quipu 核心业务逻辑的入口包装器。
 
     实例化并运行 QuipuApplication，捕获所有异常并转化为 QuipuResult。
-    确保资源被安全释放。
+    确保资源被安全释放。传入 engine 时复用该实例，其生命周期由调用方负责。
     """
     app = None
     try:
-        app = QuipuApplication(work_dir=work_dir, yolo=yolo)
+        app = QuipuApplication(work_dir=work_dir, yolo=yolo, engine=engine)
         return app.run(content=content, parser_name=parser_name)
+    except Exception as e:
+        return _result_from_exception(e)
+    finally:
+        # 确保无论成功或失败，自行创建的引擎资源都被关闭
+        if engine is None and app and hasattr(app, "engine") and app.engine:
+            app.engine.close()
 
-    except OperationCancelledError as e:
-        logger.info(f"🚫 操作已取消: {e}")
-        return QuipuResult(
-            success=False, exit_code=2, message="run.error.cancelled", msg_kwargs={"error": str(e)}, error=e
-        )
-
-    except CoreExecutionError as e:
-        logger.error(f"❌ 操作失败: {e}")
-        return QuipuResult(
-            success=False, exit_code=1, message="run.error.execution", msg_kwargs={"error": str(e)}, error=e
-        )
 
+def run_quipu_stream(
+    lines: Iterable[str], work_dir: Path, parser_name: str = "auto", yolo: bool = False
+) -> QuipuResult:
+    """
+    run_quipu 的流式版本：lines 可以是逐行产出的管道输入 (例如 sys.stdin)，
+    各条语句在输入仍在到达时即开始执行。
+    """
+    app = None
+    try:
+        app = QuipuApplication(work_dir=work_dir, yolo=yolo)
+        return app.run_stream(lines, parser_name=parser_name)
     except Exception as e:
-        logger.error(f"运行时错误: {e}", exc_info=True)
-        return QuipuResult(
-            success=False, exit_code=1, message="run.error.system", msg_kwargs={"error": str(e)}, error=e
-        )
+        return _result_from_exception(e)
     finally:
-        # 确保无论成功或失败，引擎资源都被关闭
         if app and hasattr(app, "engine") and app.engine:
             app.engine.close()
+
+
+def run_quipu_batch(
+    contents: Sequence[str],
+    work_dir: Path,
+    parser_name: str = "auto",
+    yolo: bool = False,
+    engine: Optional[Engine] = None,
+) -> List[QuipuResult]:
+    """
+    在同一个会话中按顺序执行多个 Plan，每个 Plan 生成一个节点。
+
+    Engine、Executor 与插件只初始化一次，前一个 Plan 的输出 Tree Hash 直接作为下一个的输入。
+    遇到第一个失败的 Plan 即停止，返回已执行的各 Plan 的结果 (最后一个即为失败的结果)。
+    """
+    results: List[QuipuResult] = []
+    app = None
+    try:
+        app = QuipuApplication(work_dir=work_dir, yolo=yolo, engine=engine)
+        for index, content in enumerate(contents, 1):
+            logger.info(f"批量执行: 第 {index}/{len(contents)} 个 Plan")
+            try:
+                result = app.run(content=content, parser_name=parser_name)
+            except Exception as e:
+                # 失败的 Plan 可能已部分修改工作区，丢弃缓存的状态
+                app._known_tree_hash = None
+                app.engine.git_db.invalidate_tree_hash()
+                result = _result_from_exception(e)
+            results.append(result)
+            if not result.success:
+                break
+    except Exception as e:
+        results.append(_result_from_exception(e))
+    finally:
+        if engine is None and app and hasattr(app, "engine") and app.engine:
+            app.engine.close()
+    return results
+
+
+async def run_quipu_async(content: str, work_dir: Path, parser_name: str = "auto", yolo: bool = False) -> QuipuResult:
+    """
+    run_quipu 的异步版本，供在事件循环中并发驱动多个工作区的服务使用。
+
+    执行在 AsyncEngine 共享的有界线程池中进行，同一工作区的并发调用按顺序执行。
+    服务场景下没有交互终端，调用方通常应传入 yolo=True。
+    """
+    return await run_blocking(work_dir, run_quipu, content, work_dir, parser_name=parser_name, yolo=yolo)
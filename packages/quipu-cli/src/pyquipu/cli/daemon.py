@@ -0,0 +1,383 @@
+"""
+常驻守护进程 (`quipu serve`)：为多个工作区保留预热的 Engine 实例。
+
+每次 CLI 调用都要重新构建 Engine (导入、解析配置、初始化 GitDB、补水、计算 Tree Hash)。
+守护进程在本地 Unix Socket 上提供 JSON-RPC 2.0 服务，按项目根目录缓存 Engine；
+`quipu run` 等命令在检测到守护进程时作为瘦客户端，只需付出执行本身的代价。
+
+协议: 每个连接发送一行 JSON-RPC 请求，并接收一行响应。
+
+- `ping`                                 -> {"pid", "workspaces"}
+- `run` {content, work_dir, parser_name} -> {"result": QuipuResult, "messages": [[level, text], ...]}
+- `shutdown`                             -> 停止服务
+
+执行期间通过消息总线输出的内容被按请求捕获，随响应返回给客户端重放。
+守护进程没有交互终端，因此只接受无需确认的 (yolo) 执行请求。
+"""
+
+import contextvars
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyquipu.common.messaging import bus
+from pyquipu.engine.state_machine import Engine
+from pyquipu.interfaces.result import QuipuResult
+
+from .factory import create_engine
+from .rendering import TyperRenderer
+from .utils import find_git_repository_root
+
+logger = logging.getLogger(__name__)
+
+# JSON-RPC 2.0 错误码
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# 客户端连接与等待响应的超时 (秒)。run 的耗时取决于计划本身，因此不设读超时。
+CONNECT_TIMEOUT = 0.5
+
+
+class DaemonUnavailable(Exception):
+    """守护进程未运行或无法连接，请求没有发出。调用方应回退到本地执行。"""
+
+    pass
+
+
+class DaemonError(Exception):
+    """
+    请求已经发出，但守护进程返回了错误、无效的响应或中途断开。
+    守护进程可能已经执行了部分甚至全部计划，调用方不能回退到本地重新执行。
+    """
+
+    pass
+
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+class _CapturingRenderer:
+    """
+    按请求捕获消息总线输出的渲染器。
+    处理请求的线程开启捕获后，其输出被记录下来随响应返回；其他输出交给后备渲染器。
+    捕获状态保存在上下文变量中，执行器的工作线程继承请求的上下文，因此并行 act 的输出同样会被捕获。
+    """
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+        self._messages: contextvars.ContextVar[Optional[List[Tuple[str, str]]]] = contextvars.ContextVar(
+            "quipu_daemon_messages", default=None
+        )
+
+    def start(self):
+        self._messages.set([])
+
+    def stop(self) -> List[Tuple[str, str]]:
+        messages = self._messages.get() or []
+        self._messages.set(None)
+        return messages
+
+    def _emit(self, level: str, message: str):
+        messages = self._messages.get()
+        if messages is not None:
+            messages.append((level, message))
+        else:
+            getattr(self._fallback, level)(message)
+
+    def success(self, message: str) -> None:
+        self._emit("success", message)
+
+    def info(self, message: str) -> None:
+        self._emit("info", message)
+
+    def warning(self, message: str) -> None:
+        self._emit("warning", message)
+
+    def error(self, message: str) -> None:
+        self._emit("error", message)
+
+    def data(self, data_string: str) -> None:
+        self._emit("data", data_string)
+
+
+class _WarmWorkspace:
+    """一个工作区的预热 Engine 及其互斥锁。"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.lock = threading.Lock()
+        self.engine: Optional[Engine] = None
+        self.config_mtime: Optional[float] = None
+
+    def _config_mtime(self) -> Optional[float]:
+        try:
+            return (self.root / ".quipu" / "config.yml").stat().st_mtime
+        except OSError:
+            return None
+
+    def acquire_engine(self) -> Engine:
+        """返回与工作区当前状态对齐的 Engine。配置文件变化时重建。必须在 lock 内调用。"""
+        mtime = self._config_mtime()
+        if self.engine is not None and mtime != self.config_mtime:
+            logger.info(f"配置已变化，重建 Engine: {self.root}")
+            self.close()
+        if self.engine is None:
+            self.engine = create_engine(self.root, lazy_graph=True)
+            self.config_mtime = mtime
+            return self.engine
+
+        # 工作区与历史可能已被其他进程修改: 丢弃缓存的 Tree Hash 并重新对齐
+        self.engine.git_db.invalidate_tree_hash()
+        self.engine.align(lazy=True)
+        return self.engine
+
+    def close(self):
+        if self.engine is not None:
+            try:
+                self.engine.close()
+            except Exception as e:
+                logger.warning(f"关闭 Engine 失败 ({self.root}): {e}")
+            self.engine = None
+
+
+class QuipuDaemon:
+    """
+    守护进程的请求处理核心，与传输层无关，便于测试。
+    """
+
+    def __init__(self, max_workspaces: int = 32):
+        self.max_workspaces = max_workspaces
+        self._workspaces: "OrderedDict[Path, _WarmWorkspace]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._renderer = _CapturingRenderer(TyperRenderer())
+        self.shutdown_requested = threading.Event()
+
+    def install_renderer(self):
+        bus.set_renderer(self._renderer)
+
+    def _workspace(self, work_dir: Path) -> _WarmWorkspace:
+        root = (find_git_repository_root(work_dir) or work_dir).resolve()
+        with self._lock:
+            workspace = self._workspaces.get(root)
+            if workspace is None:
+                workspace = self._workspaces[root] = _WarmWorkspace(root)
+            self._workspaces.move_to_end(root)
+            evicted = []
+            while len(self._workspaces) > self.max_workspaces:
+                _, old = self._workspaces.popitem(last=False)
+                evicted.append(old)
+        for old in evicted:
+            with old.lock:
+                old.close()
+        return workspace
+
+    def close(self):
+        with self._lock:
+            workspaces = list(self._workspaces.values())
+            self._workspaces.clear()
+        for workspace in workspaces:
+            with workspace.lock:
+                workspace.close()
+
+    # --- RPC 方法 ---
+
+    def rpc_ping(self) -> Dict[str, Any]:
+        with self._lock:
+            workspaces = [str(root) for root in self._workspaces]
+        return {"pid": os.getpid(), "workspaces": workspaces}
+
+    def rpc_run(self, content: str, work_dir: str, parser_name: str = "auto", yolo: bool = True) -> Dict[str, Any]:
+        from .controller import run_quipu
+
+        if not yolo:
+            raise ValueError("守护进程无法进行交互式确认，只接受 yolo 执行。")
+
+        path = Path(work_dir)
+        workspace = self._workspace(path)
+        self._renderer.start()
+        try:
+            with workspace.lock:
+                try:
+                    engine = workspace.acquire_engine()
+                except Exception:
+                    workspace.close()
+                    raise
+                result = run_quipu(content=content, work_dir=path, parser_name=parser_name, yolo=True, engine=engine)
+        finally:
+            messages = self._renderer.stop()
+        return {"result": result_to_dict(result), "messages": messages}
+
+    def rpc_shutdown(self) -> Dict[str, Any]:
+        self.shutdown_requested.set()
+        return {"ok": True}
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """处理一个 JSON-RPC 请求对象，返回响应对象。"""
+        request_id = request.get("id")
+        method = getattr(self, f"rpc_{request.get('method')}", None)
+        if method is None:
+            return _error(request_id, METHOD_NOT_FOUND, f"Unknown method: {request.get('method')}")
+        params = request.get("params") or {}
+        try:
+            return {"jsonrpc": "2.0", "id": request_id, "result": method(**params)}
+        except (TypeError, ValueError) as e:
+            return _error(request_id, INVALID_PARAMS, str(e))
+        except Exception as e:
+            logger.error(f"守护进程处理请求失败: {e}", exc_info=True)
+            return _error(request_id, INTERNAL_ERROR, str(e))
+
+
+def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def result_to_dict(result: QuipuResult) -> Dict[str, Any]:
+    return {
+        "success": result.success,
+        "exit_code": result.exit_code,
+        "message": result.message,
+        "msg_kwargs": {k: str(v) for k, v in (result.msg_kwargs or {}).items()},
+        "data": result.data if isinstance(result.data, (str, int, float, bool, type(None))) else str(result.data),
+        "error": str(result.error) if result.error else None,
+    }
+
+
+def result_from_dict(data: Dict[str, Any]) -> QuipuResult:
+    error = data.get("error")
+    return QuipuResult(
+        success=data["success"],
+        exit_code=data["exit_code"],
+        message=data.get("message", ""),
+        data=data.get("data"),
+        error=RuntimeError(error) if error else None,
+        msg_kwargs=data.get("msg_kwargs") or {},
+    )
+
+
+# --- 传输层 ---
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            response = self.server.daemon.handle(request)
+        except ValueError as e:
+            response = _error(None, -32700, f"Parse error: {e}")
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+        if self.server.daemon.shutdown_requested.is_set():
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, daemon: QuipuDaemon):
+        self.socket_path = socket_path
+        self.daemon = daemon
+        socket_path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        if socket_path.exists():
+            if _is_alive(socket_path):
+                raise OSError(f"守护进程已在运行: {socket_path}")
+            # 上一个进程异常退出遗留的 socket 文件
+            socket_path.unlink()
+        super().__init__(str(socket_path), _RequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            self.socket_path.unlink()
+        except OSError:
+            pass
+
+
+def _is_alive(socket_path: Path) -> bool:
+    try:
+        DaemonClient(socket_path).call("ping")
+        return True
+    except DaemonError:
+        # 有进程在监听，只是响应异常
+        return True
+    except DaemonUnavailable:
+        return False
+
+
+class DaemonClient:
+    """守护进程的瘦客户端。"""
+
+    def __init__(self, socket_path: Path):
+        self.socket_path = socket_path
+
+    def call(self, method: str, **params: Any) -> Any:
+        """
+        发送一个请求并返回 result 字段。
+        连接建立之前的失败抛出 DaemonUnavailable；请求发出之后的任何失败都抛出 DaemonError。
+        """
+        if not is_supported() or not self.socket_path.exists():
+            raise DaemonUnavailable(f"守护进程未运行: {self.socket_path}")
+        request = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.settimeout(CONNECT_TIMEOUT)
+                sock.connect(str(self.socket_path))
+            except OSError as e:
+                raise DaemonUnavailable(f"无法连接守护进程: {e}") from e
+            try:
+                sock.settimeout(None)
+                sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+                with sock.makefile("rb") as f:
+                    line = f.readline()
+            except OSError as e:
+                raise DaemonError(f"与守护进程通信失败: {e}") from e
+        if not line:
+            raise DaemonError("守护进程未返回响应即关闭了连接。")
+        try:
+            response = json.loads(line)
+        except ValueError as e:
+            raise DaemonError(f"守护进程返回了无效的响应: {e}") from e
+        if not isinstance(response, dict):
+            raise DaemonError("守护进程返回了无效的响应。")
+        if "error" in response:
+            error = response["error"]
+            raise DaemonError(error.get("message", "unknown error") if isinstance(error, dict) else str(error))
+        return response.get("result")
+
+    def run(self, content: str, work_dir: Path, parser_name: str = "auto") -> QuipuResult:
+        """
+        在守护进程中执行计划 (yolo)，并在本地重放执行期间的消息输出。
+        只有守护进程不可用时抛出 DaemonUnavailable；请求发出后的失败作为失败的 QuipuResult 返回。
+        """
+        try:
+            payload = self.call("run", content=content, work_dir=str(work_dir), parser_name=parser_name, yolo=True)
+            messages = [(level, message) for level, message in payload.get("messages", [])]
+            result = result_from_dict(payload["result"])
+        except (DaemonError, AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"守护进程执行失败: {e}")
+            return QuipuResult(success=False, exit_code=1, message="run.error.daemon", msg_kwargs={"error": str(e)})
+        for level, message in messages:
+            bus.emit(level, message)
+        return result
+
+
+def serve_forever(socket_path: Path, max_workspaces: int = 32):
+    """在前台运行守护进程，直到收到 shutdown 请求或被中断。"""
+    daemon = QuipuDaemon(max_workspaces=max_workspaces)
+    daemon.install_renderer()
+    server = DaemonServer(socket_path, daemon)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        daemon.close()
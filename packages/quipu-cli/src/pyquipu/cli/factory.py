@@ -21,7 +21,7 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
-def create_engine(work_dir: Path, lazy: bool = False) -> Engine:
+def create_engine(work_dir: Path, lazy: bool = False, lazy_graph: bool = False) -> Engine:
     """
     实例化完整的 Engine 堆栈。
 
@@ -32,12 +32,17 @@ def create_engine(work_dir: Path, lazy: bool = False) -> Engine:
         work_dir: 操作的工作区目录。
         lazy: 如果为 True，则不立即加载完整的历史图谱 (不调用 align)。
               这对于需要快速启动并按需加载数据的场景 (如 UI) 至关重要。
+        lazy_graph: 如果为 True，则以惰性模式对齐：不物化完整图谱，只通过点查询定位当前节点。
+              适用于 run/save/checkout 这类只关心当前状态的命令。
     """
     project_root = find_git_repository_root(work_dir) or work_dir
     config = ConfigManager(project_root)
     storage_type = config.get("storage.type", "git_object")
     logger.debug(f"Engine factory configured with storage type: '{storage_type}'")
-    git_db = GitDB(project_root)
+    read_backend = config.get("storage.git_read_backend", "cli")
+    # CLI 命令是短生命周期的进程，工作区只会通过受控的路径被修改，
+    # 因此可以安全地在进程内缓存 Tree Hash (修改后由调用方负责失效)。
+    git_db = GitDB(project_root, read_backend=read_backend, memoize_tree_hash=True)
     db_manager = None
 
     # 默认和备用后端
@@ -49,7 +54,7 @@ def create_engine(work_dir: Path, lazy: bool = False) -> Engine:
             raise ImportError("SQLite dependencies could not be loaded. Please check your installation.")
 
         logger.debug("Using SQLite storage format for reads and writes.")
-        db_manager = DatabaseManager(project_root)
+        db_manager = DatabaseManager(project_root, profile=config.get("storage.sqlite"))
         db_manager.init_schema()
 
         # 切换到 SQLite 后端
@@ -60,8 +65,16 @@ def create_engine(work_dir: Path, lazy: bool = False) -> Engine:
         raise NotImplementedError(f"Storage type '{storage_type}' is not supported.")
 
     # 将所有资源注入 Engine
-    engine = Engine(project_root, db=git_db, reader=reader, writer=writer, db_manager=db_manager)
+    engine = Engine(
+        project_root,
+        db=git_db,
+        reader=reader,
+        writer=writer,
+        db_manager=db_manager,
+        compact_graph=bool(config.get("storage.compact_graph", False)),
+        graph_snapshot=bool(config.get("storage.graph_snapshot", False)),
+    )
     if not lazy:
-        engine.align()
+        engine.align(lazy=lazy_graph)
 
     return engine
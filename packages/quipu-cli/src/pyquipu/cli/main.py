@@ -3,7 +3,7 @@ import logging
 import typer
 from pyquipu.common.messaging import bus
 
-from .commands import axon, cache, export, navigation, query, remote, run, show, ui, workspace
+from .commands import axon, cache, export, navigation, query, remote, run, serve, show, ui, watch, workspace
 from .rendering import TyperRenderer
 
 # --- Global Setup ---
@@ -37,6 +37,8 @@ run.register(app)
 ui.register(app)
 show.register(app)
 export.register(app)
+watch.register(app)
+serve.register(app)
 
 
 # --- Entry Point ---
@@ -1,5 +1,5 @@
 import math
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 from pyquipu.interfaces.models import QuipuNode
 from pyquipu.interfaces.storage import HistoryReader
@@ -28,12 +28,18 @@ class GraphViewModel:
         self.current_selected_node: Optional[QuipuNode] = None
         self._node_by_key: Dict[str, QuipuNode] = {}
         self.reachable_set: Set[str] = set()
+        # 已加载页面的边界游标: 页码 -> (首节点 commit_hash, 末节点 commit_hash)
+        self._page_bounds: Dict[int, Tuple[str, str]] = {}
+        # HEAD 节点的 (位置, commit_hash)，作为跳转到其所在页的起点
+        self._head_anchor: Optional[Tuple[int, str]] = None
 
     def initialize(self):
         """
         初始化 ViewModel, 获取总数并计算可达性缓存。
         这是一个快速操作，因为它不加载任何节点内容。
         """
+        self._page_bounds = {}
+        self._head_anchor = None
         self.total_nodes = self.reader.get_node_count()
         if self.page_size > 0 and self.total_nodes > 0:
             self.total_pages = math.ceil(self.total_nodes / self.page_size)
@@ -41,13 +47,8 @@ class GraphViewModel:
             self.total_pages = 1
 
         if self.current_output_tree_hash:
-            # 后端直接计算祖先和后代，避免在前端加载整个图谱
-            ancestors = self.reader.get_ancestor_output_trees(self.current_output_tree_hash)
-            descendants = self.reader.get_descendant_output_trees(self.current_output_tree_hash)
-
-            # 合并祖先、后代和当前节点自身，形成完整的可达集合
-            self.reachable_set = ancestors.union(descendants)
-            self.reachable_set.add(self.current_output_tree_hash)
+            # 后端直接计算祖先、后代和当前节点自身形成的可达集合，避免在前端加载整个图谱
+            self.reachable_set = self.reader.get_reachable_output_trees(self.current_output_tree_hash)
 
     def is_reachable(self, output_tree_hash: str) -> bool:
         """检查一个节点哈希是否在可达性集合中。"""
@@ -62,9 +63,13 @@ class GraphViewModel:
         if not self.current_output_tree_hash:
             return 1
 
+        # 页码需要 HEAD 的绝对位置: 由后端按 (timestamp, commit_hash) 索引计数得到
         position = self.reader.get_node_position(self.current_output_tree_hash)
         if position == -1:
             return 1
+        head = self.reader.find_node_by_output_tree(self.current_output_tree_hash)
+        if head is not None:
+            self._head_anchor = (position, head.commit_hash)
 
         # position 是从 0 开始的索引
         # e.g. pos 0 -> page 1; pos 49 -> page 1; pos 50 -> page 2
@@ -80,12 +85,49 @@ class GraphViewModel:
             return []
 
         self.current_page = page_number
-        offset = (self.current_page - 1) * self.page_size
-
-        self.current_page_nodes = self.reader.load_nodes_paginated(limit=self.page_size, offset=offset)
+        self.current_page_nodes = self._fetch_page(page_number)
+        if self.current_page_nodes:
+            self._page_bounds[page_number] = (
+                self.current_page_nodes[0].commit_hash,
+                self.current_page_nodes[-1].commit_hash,
+            )
         self._node_by_key = {str(node.filename): node for node in self.current_page_nodes}
         return self.current_page_nodes
 
+    def _fetch_page(self, page_number: int) -> List[QuipuNode]:
+        """
+        通过游标加载指定页。相邻页直接从已知的页边界继续；
+        跳转到其他页时，先从离该页最近的已知节点 (HEAD、已加载页的边界或列表两端)
+        移动到该页起点之前的节点，代价与移动的距离成正比。
+        """
+        if page_number == 1:
+            return self.reader.load_nodes_page(self.page_size)
+        if page_number - 1 in self._page_bounds:
+            return self.reader.load_nodes_page(self.page_size, before=self._page_bounds[page_number - 1][1])
+        if page_number + 1 in self._page_bounds:
+            return self.reader.load_nodes_page(self.page_size, after=self._page_bounds[page_number + 1][0])
+
+        anchor = self._seek((page_number - 1) * self.page_size - 1)
+        if anchor is None:
+            return []
+        return self.reader.load_nodes_page(self.page_size, before=anchor)
+
+    def _seek(self, position: int) -> Optional[str]:
+        """从离 position 最近的已知节点出发，定位该位置上的节点。"""
+        # (偏移量, 出发节点)；出发节点为 None 表示从列表两端出发
+        candidates: List[Tuple[int, Optional[str]]] = [
+            (position, None),
+            (position - self.total_nodes, None),
+        ]
+        if self._head_anchor is not None:
+            candidates.append((position - self._head_anchor[0], self._head_anchor[1]))
+        for page, (first, last) in self._page_bounds.items():
+            start = (page - 1) * self.page_size
+            end = min(start + self.page_size, self.total_nodes) - 1
+            candidates.extend([(position - start, first), (position - end, last)])
+        offset, commit_hash = min(candidates, key=lambda c: abs(c[0]))
+        return self.reader.get_commit_at_offset(commit_hash, offset)
+
     def toggle_unreachable(self):
         """切换是否显示不可达节点。"""
         self.show_unreachable = not self.show_unreachable
@@ -99,6 +99,13 @@ class MessageBus:
             logger.warning(f"Formatting error for '{msg_id}': missing key {e}")
             return template
 
+    def emit(self, level: str, message: str) -> None:
+        """直接渲染一条已格式化的消息 (例如由守护进程转发回客户端的输出)。"""
+        if not self._renderer:
+            logger.warning("MessageBus renderer not configured. Dropping forwarded message.")
+            return
+        getattr(self._renderer, level)(message)
+
     def data(self, data_string: str) -> None:
         if not self._renderer:
             logger.warning("MessageBus renderer not configured. Dropping data output.")
@@ -0,0 +1,165 @@
+"""
+Engine 的 asyncio 门面，用于在长期运行的服务中并发驱动多个工作区。
+
+Engine 与 GitDB 的内部实现是同步的: 持久化的 cat-file 流、Shadow Index 与 SQLite 连接都以
+阻塞方式工作。AsyncEngine 不在每个工作区上各开一个线程，而是把这些阻塞调用提交到一个
+进程内共享的有界线程池中执行，并用 asyncio.Lock 保证同一工作区的调用按顺序进行
+(Engine 本身不是线程安全的，但可以在不同线程间顺序使用)。线程数量因此与工作区数量无关。
+
+不需要 Engine 内部状态的 git 命令 (例如调用方自己的查询) 可以通过 AsyncEngine.git
+直接使用 asyncio.create_subprocess_exec 执行，完全不占用线程池。
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from pyquipu.interfaces.models import QuipuNode
+
+from .state_machine import Engine
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_shared_executor: Optional[ThreadPoolExecutor] = None
+# {event loop: {工作区根目录: Lock}}，asyncio.Lock 只能在创建它的事件循环中使用
+_workspace_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Path, asyncio.Lock]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def default_executor() -> ThreadPoolExecutor:
+    """获取所有 AsyncEngine 共享的线程池 (按需创建)。"""
+    global _shared_executor
+    if _shared_executor is None:
+        _shared_executor = ThreadPoolExecutor(
+            max_workers=min(32, (os.cpu_count() or 1) + 4), thread_name_prefix="quipu-async"
+        )
+    return _shared_executor
+
+
+def workspace_lock(root_dir: Path) -> asyncio.Lock:
+    """获取当前事件循环中某个工作区的锁。同一工作区的所有异步操作都应在该锁内进行。"""
+    loop = asyncio.get_running_loop()
+    locks = _workspace_locks.setdefault(loop, {})
+    key = Path(root_dir).resolve()
+    if key not in locks:
+        locks[key] = asyncio.Lock()
+    return locks[key]
+
+
+async def run_blocking(root_dir: Path, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    在共享线程池中执行一个针对 root_dir 工作区的阻塞调用，同一工作区的调用互斥。
+
+    等待方被取消 (例如 asyncio.wait_for 超时) 时，线程中的调用无法中止，
+    因此工作区锁会一直持有到该调用真正结束，之后才重新抛出 CancelledError。
+    """
+    async with workspace_lock(root_dir):
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(default_executor(), functools.partial(func, *args, **kwargs))
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            while not fut.done():
+                try:
+                    await asyncio.wait({fut})
+                except asyncio.CancelledError:
+                    continue
+            raise
+
+
+class AsyncEngine:
+    """
+    Engine 的异步包装。所有方法都是协程，阻塞工作在共享线程池中完成。
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.root_dir = engine.root_dir
+
+    @classmethod
+    async def create(cls, factory: Callable[..., Engine], root_dir: Path, *args: Any, **kwargs: Any) -> "AsyncEngine":
+        """
+        在线程池中调用 factory(root_dir, *args, **kwargs) 创建并对齐 Engine。
+        例如: `await AsyncEngine.create(create_engine, work_dir, lazy_graph=True)`。
+        """
+        engine = await run_blocking(root_dir, factory, root_dir, *args, **kwargs)
+        return cls(engine)
+
+    async def _call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await run_blocking(self.root_dir, func, *args, **kwargs)
+
+    async def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """以 func(engine, *args, **kwargs) 的形式在工作区锁内执行任意同步操作。"""
+        return await self._call(func, self.engine, *args, **kwargs)
+
+    # --- 常用操作 ---
+
+    async def align(self, lazy: bool = False) -> str:
+        return await self._call(self.engine.align, lazy=lazy)
+
+    async def get_tree_hash(self) -> str:
+        return await self._call(self.engine.git_db.get_tree_hash)
+
+    async def capture_drift(self, current_hash: Optional[str] = None, message: Optional[str] = None) -> QuipuNode:
+        """捕获工作区漂移。current_hash 为空时在同一次调用内先计算当前 Tree Hash。"""
+
+        def capture() -> QuipuNode:
+            tree_hash = current_hash or self.engine.git_db.get_tree_hash()
+            return self.engine.capture_drift(tree_hash, message=message)
+
+        return await self._call(capture)
+
+    async def create_plan_node(self, input_tree: str, output_tree: str, plan_content: str, **kwargs: Any) -> QuipuNode:
+        return await self._call(self.engine.create_plan_node, input_tree, output_tree, plan_content, **kwargs)
+
+    async def visit(self, target_hash: str):
+        await self._call(self.engine.visit, target_hash)
+
+    async def checkout(self, target_hash: str):
+        await self._call(self.engine.checkout, target_hash)
+
+    async def find_nodes(self, **kwargs: Any) -> List[QuipuNode]:
+        return await self._call(self.engine.find_nodes, **kwargs)
+
+    async def has_history(self) -> bool:
+        return await self._call(self.engine.has_history)
+
+    async def close(self):
+        await self._call(self.engine.close)
+
+    async def __aenter__(self) -> "AsyncEngine":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    # --- 原生异步 git ---
+
+    async def git(self, *args: str, input_data: Optional[bytes] = None) -> bytes:
+        """
+        通过 asyncio.create_subprocess_exec 在工作区中执行一条 git 命令，返回 stdout。
+        不经过线程池，也不持有工作区锁，因此只适用于不依赖 Engine 内部状态的命令。
+        命令失败时抛出 RuntimeError。
+        """
+        proc = await asyncio.create_subprocess_exec(
+            "git",
+            *args,
+            cwd=self.root_dir,
+            stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate(input_data)
+        if proc.returncode != 0:
+            stderr_str = stderr.decode("utf-8", "ignore")
+            logger.error(f"Git plumbing error: {stderr_str}")
+            raise RuntimeError(f"Git command failed: {' '.join(args)}\n{stderr_str}")
+        return stdout
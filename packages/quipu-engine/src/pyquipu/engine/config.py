@@ -11,6 +11,16 @@ logger = logging.getLogger(__name__)
 DEFAULTS = {
     "storage": {
         "type": "sqlite",  # 可选: "git_object", "sqlite"
+        "git_read_backend": "cli",  # 可选: "cli", "native" (进程内解析 .git/objects，无需 fork git)
+        # SQLite 连接调优参数，逐项覆盖 sqlite_db.DEFAULT_PROFILE
+        # (journal_mode, synchronous, cache_size, mmap_size, temp_store, busy_timeout, statement_cache_size)
+        "sqlite": {},
+        # 补水后是否批量回填计划内容缓存: "off", "sync" (对齐时同步完成), "background" (后台线程)
+        "hydrate_content": "off",
+        # 是否以列式的紧凑图谱加载完整历史 (大型历史可显著降低内存与加载时间)
+        "compact_graph": False,
+        # 是否在 .quipu 中维护可内存映射的图谱快照 (隐含 compact_graph)，加速完整图谱的冷启动
+        "graph_snapshot": False,
     },
     "sync": {
         "remote_name": "origin",
@@ -18,6 +28,10 @@ DEFAULTS = {
         "user_id": None,
         "subscriptions": [],
     },
+    "run": {
+        # 事务模式: 计划中的文件修改先暂存，全部成功后一次性落盘；失败时工作区保持不变
+        "transactional": False,
+    },
     "list_files": {"ignore_patterns": [".git", "__pycache__", ".idea", ".vscode", "node_modules", ".quipu"]},
 }
 
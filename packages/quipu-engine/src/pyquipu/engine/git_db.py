@@ -1,24 +1,154 @@
+import json
 import logging
 import os
 import shutil
 import subprocess
+import threading
+import zlib
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 from pyquipu.common.messaging import bus
 from pyquipu.interfaces.exceptions import ExecutionError
 
+from .git_native import NativeObjectStore, NativeStoreUnsupported
+from .watcher import WatchJournal
+
 logger = logging.getLogger(__name__)
 
 
+class GitObjectStream:
+    """
+    一个长驻的 `git cat-file --batch` (或 `--batch-check`) 协进程。
+
+    进程在首次请求时惰性启动，之后所有读取请求都通过同一对管道流式发送，
+    避免了每次读取对象都要 fork/exec 一个新的 git 进程。
+    """
+
+    # 每轮写入的请求数量。必须保证一轮请求的总字节数小于管道缓冲区 (通常为 64KB)，
+    # 否则在 git 因 stdout 写满而阻塞时，我们对 stdin 的写入也会阻塞，形成死锁。
+    CHUNK_SIZE = 256
+
+    def __init__(self, root: Path, check_only: bool = False):
+        self.root = root
+        self.check_only = check_only
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _ensure_started(self) -> subprocess.Popen:
+        if not self.is_running:
+            mode = "--batch-check" if self.check_only else "--batch"
+            self._proc = subprocess.Popen(
+                ["git", "cat-file", mode],
+                cwd=self.root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            logger.debug(f"Started persistent git cat-file {mode} (pid={self._proc.pid})")
+        return self._proc
+
+    def _query_chunk(self, proc: subprocess.Popen, names: List[str]) -> Dict[str, Tuple[str, Union[bytes, int]]]:
+        assert proc.stdin is not None and proc.stdout is not None
+        proc.stdin.write(("\n".join(names) + "\n").encode("utf-8"))
+        proc.stdin.flush()
+
+        results: Dict[str, Tuple[str, Union[bytes, int]]] = {}
+        # 响应与请求严格按顺序一一对应，因此按请求名 (而不是解析出的哈希) 建立映射
+        for name in names:
+            header_line = proc.stdout.readline()
+            if not header_line:
+                raise RuntimeError("git cat-file process terminated unexpectedly")
+
+            header_parts = header_line.split()
+            # 不存在或有歧义的对象: "<name> missing" / "<name> ambiguous"
+            if len(header_parts) != 3:
+                continue
+
+            obj_type = header_parts[1].decode("utf-8")
+            size = int(header_parts[2])
+            if self.check_only:
+                results[name] = (obj_type, size)
+                continue
+
+            content = proc.stdout.read(size)
+            proc.stdout.read(1)  # Consume the trailing LF
+            results[name] = (obj_type, content)
+        return results
+
+    def query(self, names: List[str]) -> Dict[str, Tuple[str, Union[bytes, int]]]:
+        """
+        查询一组对象。
+
+        Returns:
+            Dict[name, (type, payload)]: `--batch` 模式下 payload 为内容字节，
+            `--batch-check` 模式下为对象大小。不存在的对象不会出现在结果中。
+        """
+        unique_names = list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+        if not unique_names:
+            return {}
+
+        results: Dict[str, Tuple[str, Union[bytes, int]]] = {}
+        with self._lock:
+            for i in range(0, len(unique_names), self.CHUNK_SIZE):
+                chunk = unique_names[i : i + self.CHUNK_SIZE]
+                try:
+                    results.update(self._query_chunk(self._ensure_started(), chunk))
+                except (OSError, ValueError, RuntimeError) as e:
+                    # 协进程可能已退出 (例如被信号终止)。重启一次并重试当前批次。
+                    logger.debug(f"git cat-file stream failed ({e}), restarting.")
+                    self._terminate()
+                    results.update(self._query_chunk(self._ensure_started(), chunk))
+        return results
+
+    def _terminate(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            if proc.stdin:
+                proc.stdin.close()
+            proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+        finally:
+            if proc.stdout:
+                proc.stdout.close()
+
+    def close(self):
+        """关闭协进程。之后的请求会重新启动它。"""
+        with self._lock:
+            self._terminate()
+
+    def __del__(self):
+        try:
+            self._terminate()
+        except Exception:
+            pass
+
+
 class GitDB:
     """
     Quipu 的 Git 底层接口 (Plumbing Interface)。
     负责与 Git 对象数据库交互，维护 Shadow Index 和 Refs。
     """
 
-    def __init__(self, root_dir: Path):
+    def __init__(self, root_dir: Path, read_backend: str = "cli", memoize_tree_hash: bool = False):
+        """
+        Args:
+            root_dir: 仓库根目录。
+            read_backend: 对象与引用的读取后端。
+                "cli": 通过 git 命令行 (长驻 cat-file 进程) 读取。
+                "native": 在进程内直接解析 .git/objects 与 refs，不支持的情况自动回退到 "cli"。
+            memoize_tree_hash: 是否在进程内缓存 get_tree_hash 的结果。
+                启用后，任何修改工作区的操作都必须调用 invalidate_tree_hash()。
+        """
         if not shutil.which("git"):
             raise ExecutionError("未找到 'git' 命令。请安装 Git 并确保它在系统的 PATH 中。")
 
@@ -26,6 +156,50 @@ class GitDB:
         self.quipu_dir = self.root / ".quipu"
         self._ensure_git_repo()
 
+        # 长驻的对象读取通道，所有对象读取都通过它们流式进行
+        self._object_stream = GitObjectStream(self.root)
+        self._check_stream = GitObjectStream(self.root, check_only=True)
+
+        self.memoize_tree_hash = memoize_tree_hash
+        self._tree_hash_memo: Optional[str] = None
+        self._watch_journal = WatchJournal(self.quipu_dir)
+
+        self._native: Optional[NativeObjectStore] = None
+        if read_backend == "native":
+            try:
+                self._native = NativeObjectStore(self.root / ".git")
+            except (NativeStoreUnsupported, OSError) as e:
+                logger.debug(f"Native read backend unavailable, using git CLI: {e}")
+        elif read_backend != "cli":
+            logger.warning(f"Unknown git read backend '{read_backend}', using 'cli'.")
+
+    @property
+    def read_backend(self) -> str:
+        return "native" if self._native is not None else "cli"
+
+    def close(self):
+        """关闭所有长驻的 git 协进程以及原生读取器持有的 mmap。"""
+        self._object_stream.close()
+        self._check_stream.close()
+        if self._native is not None:
+            self._native.close()
+
+    def _native_read(self, object_hashes: List[str]) -> Dict[str, Tuple[str, bytes]]:
+        """
+        通过原生读取器读取对象。原生读取器找不到的对象 (或出错时) 回退到 cat-file 通道，
+        例如位于 alternates 中的对象。
+        """
+        results: Dict[str, Tuple[str, bytes]] = {}
+        try:
+            results = self._native.read_objects([h.strip() for h in object_hashes if h and h.strip()])
+        except (NativeStoreUnsupported, OSError, ValueError, KeyError, zlib.error) as e:
+            logger.debug(f"Native object read failed ({e}), falling back to git CLI.")
+
+        missing = [h for h in object_hashes if h and h.strip() and h.strip() not in results]
+        if missing:
+            results.update(self._object_stream.query(missing))
+        return results
+
     def _ensure_git_repo(self):
         """确保目标是一个 Git 仓库"""
         if not (self.root / ".git").is_dir():
@@ -98,11 +272,298 @@ class GitDB:
                 except OSError:
                     logger.warning(f"Failed to cleanup shadow index: {index_path}")
 
+    # 持久化 Shadow Index 的文件位置
+    PERSISTENT_INDEX_NAME = "shadow_index"
+    PERSISTENT_INDEX_STAMP_NAME = "shadow_index.stamp"
+
+    def _ignore_rules_stamp(self) -> List:
+        """
+        收集工作区之外的忽略规则文件以及用户 .git/index 的 stat 信息。
+        这些文件的变化不会体现在持久化索引中，一旦变化就必须重新播种:
+        例如 `git add -f` 强制跟踪的被忽略文件只存在于用户的索引里。
+        """
+        candidates = [self.root / ".git" / "info" / "exclude"]
+        xdg_config = os.environ.get("XDG_CONFIG_HOME") or str(Path.home() / ".config")
+        candidates.append(Path(xdg_config) / "git" / "ignore")
+        candidates.append(self.root / ".git" / "index")
+
+        stamp = []
+        for path in candidates:
+            try:
+                st = path.stat()
+                stamp.append([str(path), st.st_mtime_ns, st.st_size, st.st_ino])
+            except OSError:
+                stamp.append([str(path), None, None, None])
+        return stamp
+
+    def _seed_persistent_index(self, index_path: Path):
+        """用用户的 .git/index 播种持久化索引，使其拥有现成的 stat 信息。"""
+        user_index_path = self.root / ".git" / "index"
+        if user_index_path.exists():
+            shutil.copy2(user_index_path, index_path)
+        elif index_path.exists():
+            index_path.unlink()
+
+    def _tree_hash_with_persistent_index(self) -> str:
+        """
+        使用位于 .quipu/ 下、跨进程复用的持久化 Shadow Index 计算 Tree Hash。
+
+        索引中缓存了每个文件的 stat 信息，因此在没有变更时 `git add -A` 只需一次 stat 遍历。
+        mtime 与索引写入时间相同的 "racy" 条目由 git 自身按内容复核，保证正确性。
+
+        嵌套的 .gitignore 本身是工作区文件，其变化会体现在索引中的 blob 上；
+        一旦检测到变化，就重新播种索引，确保被新规则忽略的文件不会残留在索引中。
+        """
+        self.quipu_dir.mkdir(exist_ok=True)
+        quipu_gitignore = self.quipu_dir / ".gitignore"
+        if not quipu_gitignore.exists():
+            # 持久化索引会长期留在 .quipu/ 中，确保它不会出现在用户的 git status 里
+            quipu_gitignore.write_text("*\n", encoding="utf-8")
+
+        index_path = self.quipu_dir / self.PERSISTENT_INDEX_NAME
+        stamp_path = self.quipu_dir / self.PERSISTENT_INDEX_STAMP_NAME
+        env = {"GIT_INDEX_FILE": str(index_path)}
+
+        try:
+            stored_stamp = json.loads(stamp_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            stored_stamp = {}
+
+        rules_stamp = self._ignore_rules_stamp()
+        reseeded = False
+        if not index_path.exists() or stored_stamp.get("rules") != rules_stamp:
+            self._seed_persistent_index(index_path)
+            reseeded = True
+
+        while True:
+            self._run(["add", "-A", "--ignore-errors"], env=env, log_error=False)
+            self._run(["rm", "--cached", "-r", "-q", "--ignore-unmatch", ".quipu"], env=env, log_error=False)
+
+            ignores = self._run(["ls-files", "-s", "--", ":(glob)**/.gitignore"], env=env, log_error=False).stdout
+            if reseeded or stored_stamp.get("ignores") == ignores:
+                break
+            # 某个 .gitignore 发生了变化：重新播种后再来一次
+            logger.debug("Ignore rules changed, reseeding persistent shadow index.")
+            self._seed_persistent_index(index_path)
+            reseeded = True
+
+        tree_hash = self._run(["write-tree"], env=env, log_error=False).stdout.strip()
+        stamp_path.write_text(json.dumps({"rules": rules_stamp, "ignores": ignores}), encoding="utf-8")
+        return tree_hash
+
     def get_tree_hash(self) -> str:
         """
         计算当前工作区的 Tree Hash (Snapshot)。
         实现 'State is Truth' 的核心。
+
+        优先使用持久化的 Shadow Index；若其被其他进程锁定或已损坏，
+        则回退到一次性的临时索引。启用 memoize_tree_hash 时，结果会在进程内缓存。
+        如果有 `quipu watch` 监控进程在运行，则只重新哈希自上次已知状态以来变更过的路径。
+        """
+        if self.memoize_tree_hash and self._tree_hash_memo:
+            return self._tree_hash_memo
+
+        session = self._watch_journal.active_session()
+        if session:
+            tree_hash = self._tree_hash_from_journal(session)
+        else:
+            tree_hash, _ = self._compute_tree_hash()
+
+        if self.memoize_tree_hash:
+            self._tree_hash_memo = tree_hash
+        return tree_hash
+
+    def _compute_tree_hash(self) -> Tuple[str, bool]:
+        """完整计算 Tree Hash。返回 (tree_hash, 是否使用了持久化索引)。"""
+        try:
+            return self._tree_hash_with_persistent_index(), True
+        except (RuntimeError, OSError) as e:
+            logger.debug(f"Persistent shadow index unavailable ({e}), falling back to a temporary index.")
+            index_path = self.quipu_dir / self.PERSISTENT_INDEX_NAME
+            lock_path = index_path.with_name(index_path.name + ".lock")
+            if not lock_path.exists():
+                # 不是被其他进程锁定，视为损坏：丢弃它，下次重新播种
+                for path in (index_path, self.quipu_dir / self.PERSISTENT_INDEX_STAMP_NAME):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+            return self._tree_hash_with_temporary_index(), False
+
+    # 超过该数量的变更路径时，直接做一次完整的 `git add -A` 更划算
+    MAX_INCREMENTAL_PATHS = 2000
+
+    def _persistent_index_stamp(self) -> Optional[List]:
+        try:
+            st = (self.quipu_dir / self.PERSISTENT_INDEX_NAME).stat()
+        except OSError:
+            return None
+        return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+    def _tree_hash_from_journal(self, session: str) -> str:
+        """
+        借助监控日志计算 Tree Hash。
+
+        基线记录了 (日志偏移量, Tree Hash, 持久化索引的 stat)。若基线仍然有效:
+        - 没有变更: 直接复用基线的 Tree Hash，完全不调用 git；
+        - 少量变更: 只将变更路径更新到持久化索引中再 write-tree。
+        其他情况 (日志溢出、.gitignore 变化、索引被他人改写等) 退回完整计算，并以此建立新基线。
+        """
+        journal = self._watch_journal
+        baseline = journal.load_baseline()
+        baseline_valid = baseline.get("session") == session and isinstance(baseline.get("offset"), int)
+
+        offset = journal.sync(session, start=baseline["offset"] if baseline_valid else 0)
+        if offset is None:
+            logger.debug("Watcher did not acknowledge sync cookie; computing full tree hash.")
+            return self._compute_tree_hash()[0]
+
+        rules_stamp = self._ignore_rules_stamp()
+        if (
+            baseline_valid
+            and baseline.get("rules") == rules_stamp
+            and baseline.get("index") == self._persistent_index_stamp()
+        ):
+            dirty, overflowed = journal.read_changes(session, baseline["offset"], offset)
+            incremental_ok = (
+                not overflowed
+                and len(dirty) <= self.MAX_INCREMENTAL_PATHS
+                and not any(Path(p).name == ".gitignore" for p in dirty)
+            )
+            if incremental_ok:
+                try:
+                    tree_hash = self._update_persistent_index(dirty) if dirty else baseline["tree"]
+                except (RuntimeError, OSError) as e:
+                    logger.debug(f"Incremental shadow index update failed ({e}); computing full tree hash.")
+                else:
+                    journal.save_baseline(
+                        {
+                            "session": session,
+                            "offset": offset,
+                            "tree": tree_hash,
+                            "index": self._persistent_index_stamp(),
+                            "rules": rules_stamp,
+                        }
+                    )
+                    return tree_hash
+
+        tree_hash, used_persistent_index = self._compute_tree_hash()
+        if used_persistent_index:
+            journal.save_baseline(
+                {
+                    "session": session,
+                    "offset": offset,
+                    "tree": tree_hash,
+                    "index": self._persistent_index_stamp(),
+                    "rules": self._ignore_rules_stamp(),
+                }
+            )
+        return tree_hash
+
+    def _update_persistent_index(self, dirty_paths: Set[str]) -> str:
         """
+        只将给定路径的变更同步到持久化 Shadow Index，然后 write-tree。
+        语义与 `git add -A` 一致: 已跟踪的文件总会被更新，未跟踪的文件遵循忽略规则。
+        """
+        env = {"GIT_INDEX_FILE": str(self.quipu_dir / self.PERSISTENT_INDEX_NAME)}
+        # 变更路径是字面路径，不能被当作 glob 解释 (check-ignore 不支持该选项)
+        literal_env = {**env, "GIT_LITERAL_PATHSPECS": "1"}
+
+        candidates: Set[str] = set()
+        vanished: List[str] = []
+        for rel_path in dirty_paths:
+            if rel_path == ".quipu" or rel_path.startswith(".quipu/"):
+                continue
+            abs_path = self.root / rel_path
+            if abs_path.is_symlink() or abs_path.is_file():
+                candidates.add(rel_path)
+            elif abs_path.is_dir():
+                # 新出现的目录: 展开其中的所有文件；目录原先可能是一个文件，因此也检查移除
+                for dirpath, dirnames, filenames in os.walk(abs_path):
+                    if ".git" in dirnames or ".git" in filenames:
+                        raise RuntimeError(f"nested repository under '{rel_path}'")
+                    rel_dir = Path(dirpath).relative_to(self.root).as_posix()
+                    candidates.update(f"{rel_dir}/{name}" for name in filenames)
+                vanished.append(rel_path)
+            else:
+                vanished.append(rel_path)
+
+        updates: Set[str] = set()
+        if vanished:
+            # 找出索引中位于这些路径 (或其下) 的条目，移除已不存在的
+            res = self._run(["ls-files", "-z", "--cached", "--"] + vanished, env=literal_env, log_error=False)
+            for entry in res.stdout.split("\0"):
+                if entry and not (self.root / entry).is_file() and not (self.root / entry).is_symlink():
+                    updates.add(entry)
+
+        if candidates:
+            res = self._run(
+                ["check-ignore", "-z", "--stdin"],
+                env=env,
+                check=False,
+                log_error=False,
+                input_data="\0".join(sorted(candidates)) + "\0",
+            )
+            if res.returncode not in (0, 1):
+                raise RuntimeError(f"git check-ignore failed: {res.stderr}")
+            ignored = {p for p in res.stdout.split("\0") if p}
+            updates.update(candidates - ignored)
+
+        if updates:
+            self._run(
+                ["update-index", "--add", "--remove", "--replace", "-z", "--stdin"],
+                env=env,
+                log_error=False,
+                input_data="\0".join(sorted(updates)) + "\0",
+            )
+        return self._run(["write-tree"], env=env, log_error=False).stdout.strip()
+
+    def update_tree(self, base_tree: str, changed_paths: Iterable[str]) -> str:
+        """
+        在 base_tree 之上只更新给定路径 (相对于仓库根目录)，返回新的 Tree Hash。
+
+        调用方需保证自 base_tree 计算以来，工作区只有 changed_paths 发生了变化
+        (例如执行器报告的变更集)。此时无需重新扫描整个工作区，代价只与变更数量有关。
+        持久化 Shadow Index 与 base_tree 不一致、变更过多或忽略规则变化时，退回完整计算。
+        """
+        paths = set(changed_paths)
+        if not paths:
+            return base_tree
+
+        tree_hash = None
+        index_path = self.quipu_dir / self.PERSISTENT_INDEX_NAME
+        if (
+            len(paths) <= self.MAX_INCREMENTAL_PATHS
+            and not any(Path(p).name == ".gitignore" for p in paths)
+            and index_path.exists()
+        ):
+            env = {"GIT_INDEX_FILE": str(index_path)}
+            try:
+                stamp = json.loads((self.quipu_dir / self.PERSISTENT_INDEX_STAMP_NAME).read_text(encoding="utf-8"))
+                # 索引中带有有效的 cache-tree 时，write-tree 无需重新哈希即可给出索引当前对应的树
+                if (
+                    stamp.get("rules") == self._ignore_rules_stamp()
+                    and self._run(["write-tree"], env=env, log_error=False).stdout.strip() == base_tree
+                ):
+                    tree_hash = self._update_persistent_index(paths)
+                else:
+                    logger.debug("Persistent shadow index does not match base tree; computing full tree hash.")
+            except (RuntimeError, OSError, ValueError) as e:
+                logger.debug(f"Incremental tree update failed ({e}); computing full tree hash.")
+
+        if tree_hash is None:
+            self.invalidate_tree_hash()
+            return self.get_tree_hash()
+        if self.memoize_tree_hash:
+            self._tree_hash_memo = tree_hash
+        return tree_hash
+
+    def invalidate_tree_hash(self):
+        """使进程内缓存的 Tree Hash 失效。任何修改工作区的操作之后都应调用。"""
+        self._tree_hash_memo = None
+
+    def _tree_hash_with_temporary_index(self) -> str:
+        """使用一次性的临时 Shadow Index 计算 Tree Hash。"""
         with self.shadow_index() as env:
             # 阶段 1: 更新索引以匹配工作区。
             # 由于 shadow_index 上下文已经通过复制预热了索引，
@@ -231,6 +692,7 @@ class GitDB:
         使用 read-tree --reset -u 实现高性能的增量更新。
         """
         bus.info("engine.git.info.checkoutStarted", short_hash=new_tree_hash[:7])
+        self.invalidate_tree_hash()
 
         # 1. 高性能检出核心
         # --reset: 类似于 git reset --hard，强制覆盖本地未提交的变更，解决 "not uptodate" 冲突。
@@ -251,11 +713,22 @@ class GitDB:
     def cat_file(self, object_hash: str, object_type: str) -> bytes:
         """
         读取 Git 对象的原始内容，返回字节流。
-        此方法现在以二进制模式运行，以避免数据损坏。
+        通过长驻的 cat-file 通道读取；对象不存在时抛出 RuntimeError。
         """
-        cmd = ["cat-file", object_type, object_hash]
-        result = self._run(cmd, capture_as_text=False)
-        return result.stdout
+        if self._native is not None:
+            obj = self._native_read([object_hash]).get(object_hash.strip())
+        else:
+            obj = self._object_stream.query([object_hash]).get(object_hash.strip())
+        if obj is None:
+            raise RuntimeError(f"Git command failed: cat-file {object_type} {object_hash}\nobject not found")
+
+        actual_type, content = obj
+        if actual_type != object_type:
+            # 类型不一致时 (例如对 commit 请求 tree)，回退到 `git cat-file <type>`，
+            # 以保留其对象解引用语义。
+            result = self._run(["cat-file", object_type, object_hash], capture_as_text=False)
+            return result.stdout
+        return content
 
     def get_blobs_from_tree(self, tree_hash: str) -> Dict[str, bytes]:
         """解析一个 Tree 对象，并返回其包含的所有 blob 文件的 {filename: content_bytes} 字典。"""
@@ -293,78 +766,37 @@ class GitDB:
         if not object_hashes:
             return {}
 
-        # Deduplicate
-        unique_hashes = list(set(object_hashes))
-
-        # Prepare input: <hash>\n
-        input_str = "\n".join(unique_hashes) + "\n"
-
-        results = {}
-
         try:
-            # git cat-file --batch format:
-            # <hash> <type> <size>\n
-            # <content>\n
-            with subprocess.Popen(
-                ["git", "cat-file", "--batch"],
-                cwd=self.root,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                # bufsize=0 is often recommended for binary streams but careful buffering is usually fine
-            ) as proc:
-                # Write requests and close stdin to signal EOF
-                if proc.stdin:
-                    proc.stdin.write(input_str.encode("utf-8"))
-                    proc.stdin.close()
-
-                if not proc.stdout:
-                    return {}
-
-                while True:
-                    # Read header line
-                    header_line = proc.stdout.readline()
-                    if not header_line:
-                        break
-
-                    header_parts = header_line.strip().split()
-                    if not header_parts:
-                        continue
-
-                    obj_hash_bytes = header_parts[0]
-                    obj_hash = obj_hash_bytes.decode("utf-8")
-
-                    # Check for missing object: "<hash> missing"
-                    if len(header_parts) == 2 and header_parts[1] == b"missing":
-                        continue
-
-                    if len(header_parts) < 3:
-                        logger.warning(f"Unexpected git cat-file header: {header_line}")
-                        continue
-
-                    # size is at index 2
-                    try:
-                        size = int(header_parts[2])
-                    except ValueError:
-                        logger.warning(f"Invalid size in header: {header_line}")
-                        continue
-
-                    # Read content bytes + trailing newline
-                    content = proc.stdout.read(size)
-                    proc.stdout.read(1)  # Consume the trailing LF
-
-                    results[obj_hash] = content
-
+            if self._native is not None:
+                objects = self._native_read(object_hashes)
+            else:
+                objects = self._object_stream.query(object_hashes)
         except Exception as e:
             logger.error(f"Batch cat-file failed: {e}")
             raise RuntimeError(f"Git batch operation failed: {e}") from e
 
-        return results
+        return {obj_hash: content for obj_hash, (_, content) in objects.items()}
+
+    def batch_check_objects(self, object_hashes: List[str]) -> Dict[str, Tuple[str, int]]:
+        """
+        批量查询对象的类型和大小，而不读取其内容 (`cat-file --batch-check`)。
+        不存在的对象不会出现在返回字典中。
+        """
+        if not object_hashes:
+            return {}
+        return {h: (obj_type, size) for h, (obj_type, size) in self._check_stream.query(object_hashes).items()}
 
     def get_all_ref_heads(self, prefix: str) -> List[Tuple[str, str]]:
         """
         查找指定前缀下的所有 ref heads。
         返回 (commit_hash, ref_name) 元组列表。
         """
+        if self._native is not None:
+            try:
+                return self._native.list_refs(prefix)
+            except (NativeStoreUnsupported, OSError) as e:
+                logger.debug(f"Native ref listing failed ({e}), falling back to git CLI.")
+
         res = self._run(["for-each-ref", "--format=%(objectname) %(refname)", prefix], check=False)
         if res.returncode != 0 or not res.stdout.strip():
             return []
@@ -382,8 +814,11 @@ class GitDB:
         res = self._run(["show-ref", "--verify", "--quiet", "refs/quipu/"], check=False, log_error=False)
         return res.returncode == 0
 
-    def log_ref(self, ref_names: Union[str, List[str]]) -> List[Dict[str, str]]:
-        """获取指定引用的日志，并解析为结构化数据列表。"""
+    def log_ref(self, ref_names: Union[str, List[str]], exclude: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """
+        获取指定引用的日志，并解析为结构化数据列表。
+        exclude 中的提交及其祖先不会出现在结果中 (等价于 `git log <refs> --not <exclude>`)。
+        """
         # A unique delimiter that's unlikely to appear in commit messages
         DELIMITER = "---QUIPU-LOG-ENTRY---"
         # Format: H=hash, P=parent, T=tree, ct=commit_timestamp, B=body
@@ -397,8 +832,16 @@ class GitDB:
         if not refs_to_log:
             return []
 
+        if self._native is not None:
+            try:
+                return self._native.walk_commits(refs_to_log, exclude=exclude)
+            except (NativeStoreUnsupported, OSError, ValueError, KeyError, zlib.error) as e:
+                logger.debug(f"Native commit walk failed ({e}), falling back to git CLI.")
+
         # Git log on multiple refs will automatically show the union of their histories without duplicates.
         cmd = ["log", f"--format={log_format}"] + refs_to_log
+        if exclude:
+            cmd += ["--not"] + list(exclude)
         res = self._run(cmd, check=False, log_error=False)
 
         if res.returncode != 0:
@@ -423,6 +866,44 @@ class GitDB:
                 )
         return parsed_logs
 
+    def iter_log(self, ref_names: List[str], since: Optional[float] = None) -> Iterator[Dict[str, str]]:
+        """
+        log_ref 的流式版本: 按提交时间倒序逐条产出日志条目。
+        since (Unix 时间戳) 下推为 `git log --since`；调用方提前停止迭代时终止 git 进程，
+        因此只取前 N 条时的代价与历史规模无关。
+        原生对象库的遍历需要一次性完成，这里始终使用 git CLI 的流式输出。
+        """
+        if not ref_names:
+            return
+
+        cmd = ["git", "log", "--date-order", "--format=%H%n%P%n%T%n%ct%n%B%x00"]
+        if since is not None:
+            cmd.append(f"--since=@{int(since)}")
+        proc = subprocess.Popen(cmd + ref_names, cwd=self.root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            buffer = b""
+            while True:
+                chunk = proc.stdout.read1(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                *records, buffer = buffer.split(b"\0")
+                for record in records:
+                    parts = record.decode("utf-8", "replace").strip("\n").split("\n", 4)
+                    if len(parts) >= 4:
+                        yield {
+                            "hash": parts[0],
+                            "parent": parts[1],
+                            "tree": parts[2],
+                            "timestamp": parts[3],
+                            "body": parts[4] if len(parts) > 4 else "",
+                        }
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
     def push_quipu_refs(self, remote: str, user_id: str, force: bool = False):
         """
         将本地 Quipu heads 推送到远程用户专属的命名空间。
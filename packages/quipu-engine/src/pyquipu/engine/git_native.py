@@ -0,0 +1,512 @@
+import heapq
+import logging
+import mmap
+import os
+import struct
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Pack 文件中的对象类型编号
+_OBJ_COMMIT = 1
+_OBJ_TREE = 2
+_OBJ_BLOB = 3
+_OBJ_TAG = 4
+_OBJ_OFS_DELTA = 6
+_OBJ_REF_DELTA = 7
+
+_TYPE_NAMES = {_OBJ_COMMIT: "commit", _OBJ_TREE: "tree", _OBJ_BLOB: "blob", _OBJ_TAG: "tag"}
+
+
+class NativeStoreUnsupported(Exception):
+    """仓库使用了原生读取器不支持的特性 (如 reftable、SHA-256)，调用方应回退到 git 命令行。"""
+
+    pass
+
+
+def _apply_delta(base: bytes, delta: bytes) -> bytes:
+    """将 Git 的 delta 指令流应用到 base 对象上。"""
+
+    def read_varint(pos: int) -> Tuple[int, int]:
+        value = shift = 0
+        while True:
+            byte = delta[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value, pos
+
+    src_size, pos = read_varint(0)
+    dst_size, pos = read_varint(pos)
+    if src_size != len(base):
+        raise ValueError("delta base size mismatch")
+
+    out = bytearray()
+    delta_len = len(delta)
+    while pos < delta_len:
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            # Copy 指令: 从 base 中复制一段数据
+            offset = size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (1 << (4 + i)):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            if size == 0:
+                size = 0x10000
+            out += base[offset : offset + size]
+        elif op:
+            # Insert 指令: 插入随后的 op 个字节
+            out += delta[pos : pos + op]
+            pos += op
+        else:
+            raise ValueError("invalid delta opcode 0")
+
+    if len(out) != dst_size:
+        raise ValueError("delta result size mismatch")
+    return bytes(out)
+
+
+class _PackFile:
+    """一个通过 mmap 访问的 `.idx` (v2) + `.pack` 文件对。"""
+
+    def __init__(self, idx_path: Path):
+        self.idx_path = idx_path
+        self.pack_path = idx_path.with_suffix(".pack")
+        self._idx_file = open(idx_path, "rb")
+        self._pack_file = open(self.pack_path, "rb")
+        self.idx = mmap.mmap(self._idx_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.pack = mmap.mmap(self._pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.idx[:4] != b"\377tOc" or struct.unpack(">I", self.idx[4:8])[0] != 2:
+            self.close()
+            raise NativeStoreUnsupported(f"unsupported pack index version: {idx_path.name}")
+        if self.pack[:4] != b"PACK":
+            self.close()
+            raise NativeStoreUnsupported(f"invalid pack file: {self.pack_path.name}")
+
+        self.fanout = struct.unpack(">256I", self.idx[8 : 8 + 1024])
+        self.count = self.fanout[255]
+        self._sha_start = 8 + 1024
+        self._crc_start = self._sha_start + 20 * self.count
+        self._off_start = self._crc_start + 4 * self.count
+        self._large_off_start = self._off_start + 4 * self.count
+
+    def close(self):
+        for handle in (getattr(self, "idx", None), getattr(self, "pack", None)):
+            if handle is not None:
+                handle.close()
+        self._idx_file.close()
+        self._pack_file.close()
+
+    def find_offset(self, sha: bytes) -> Optional[int]:
+        """通过 fanout 表 + 二分查找定位对象在 pack 中的偏移量。"""
+        first = sha[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        idx = self.idx
+        base = self._sha_start
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = base + 20 * mid
+            candidate = idx[pos : pos + 20]
+            if candidate < sha:
+                lo = mid + 1
+            elif candidate > sha:
+                hi = mid
+            else:
+                return self._offset_at(mid)
+        return None
+
+    def _offset_at(self, n: int) -> int:
+        pos = self._off_start + 4 * n
+        offset = struct.unpack(">I", self.idx[pos : pos + 4])[0]
+        if offset & 0x80000000:
+            large_pos = self._large_off_start + 8 * (offset & 0x7FFFFFFF)
+            offset = struct.unpack(">Q", self.idx[large_pos : large_pos + 8])[0]
+        return offset
+
+    def read_entry_header(self, offset: int) -> Tuple[int, int, int]:
+        """解析对象头，返回 (type, size, data_offset)。"""
+        pack = self.pack
+        byte = pack[offset]
+        offset += 1
+        obj_type = (byte >> 4) & 0x07
+        size = byte & 0x0F
+        shift = 4
+        while byte & 0x80:
+            byte = pack[offset]
+            offset += 1
+            size |= (byte & 0x7F) << shift
+            shift += 7
+        return obj_type, size, offset
+
+    def inflate(self, offset: int, size: int) -> bytes:
+        """从指定偏移量解压一个 zlib 流，直到得到 size 字节。"""
+        decompressor = zlib.decompressobj()
+        chunk = max(size + 64, 4096)
+        out = bytearray()
+        pack_len = len(self.pack)
+        while not decompressor.eof and offset < pack_len:
+            out += decompressor.decompress(self.pack[offset : offset + chunk])
+            offset += chunk
+        return bytes(out)
+
+
+class NativeObjectStore:
+    """
+    一个纯 Python 的 Git 对象库读取器。
+
+    直接解析 `.git/objects` 下的松散对象 (zlib) 以及 pack `.idx`/`.pack` 文件 (mmap)，
+    包括 OFS_DELTA / REF_DELTA 的解析，从而在读取历史时完全避免 fork/exec。
+    遇到不支持的仓库特性时抛出 NativeStoreUnsupported。
+    """
+
+    # 已解析对象的 LRU 缓存大小，主要用于加速 delta 链上 base 对象的复用
+    CACHE_SIZE = 256
+
+    def __init__(self, git_dir: Path):
+        self.git_dir = git_dir
+        self.objects_dir = git_dir / "objects"
+        self._check_supported()
+
+        self._packs: List[_PackFile] = []
+        self._packs_signature: Optional[Tuple] = None
+        self._cache: "OrderedDict[Tuple[int, int], Tuple[int, bytes]]" = OrderedDict()
+        self._refresh_packs()
+
+    def _check_supported(self):
+        if (self.git_dir / "reftable").exists():
+            raise NativeStoreUnsupported("reftable ref storage is not supported")
+        config_path = self.git_dir / "config"
+        if config_path.exists():
+            config_text = config_path.read_text(encoding="utf-8", errors="ignore").lower()
+            if "objectformat = sha256" in config_text.replace("\t", " "):
+                raise NativeStoreUnsupported("SHA-256 repositories are not supported")
+
+    def close(self):
+        for pack in self._packs:
+            pack.close()
+        self._packs = []
+        self._packs_signature = None
+        self._cache.clear()
+
+    # --- Pack 管理 ---
+
+    def _pack_dir_signature(self) -> Tuple:
+        pack_dir = self.objects_dir / "pack"
+        try:
+            return tuple(sorted(p.name for p in pack_dir.glob("*.idx")))
+        except OSError:
+            return ()
+
+    def _refresh_packs(self) -> bool:
+        """当 pack 目录内容发生变化时 (如 gc、fetch 之后) 重新加载 pack 列表。返回是否发生了变化。"""
+        signature = self._pack_dir_signature()
+        if signature == self._packs_signature:
+            return False
+
+        for pack in self._packs:
+            pack.close()
+        self._packs = []
+        self._cache.clear()
+        pack_dir = self.objects_dir / "pack"
+        for name in signature:
+            idx_path = pack_dir / name
+            if not idx_path.with_suffix(".pack").exists():
+                continue
+            self._packs.append(_PackFile(idx_path))
+        self._packs_signature = signature
+        return True
+
+    # --- 对象读取 ---
+
+    def _read_loose(self, hex_sha: str) -> Optional[Tuple[str, bytes]]:
+        path = self.objects_dir / hex_sha[:2] / hex_sha[2:]
+        try:
+            raw = zlib.decompress(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        header_end = raw.index(b"\0")
+        obj_type, _ = raw[:header_end].split(b" ", 1)
+        return obj_type.decode("ascii"), raw[header_end + 1 :]
+
+    def _read_packed(self, sha: bytes) -> Optional[Tuple[str, bytes]]:
+        for pack_no, pack in enumerate(self._packs):
+            offset = pack.find_offset(sha)
+            if offset is not None:
+                obj_type, data = self._resolve_at(pack_no, offset)
+                return _TYPE_NAMES[obj_type], data
+        return None
+
+    def _resolve_at(self, pack_no: int, offset: int) -> Tuple[int, bytes]:
+        """读取 pack 中指定偏移量的对象，递归解析 delta 链。"""
+        key = (pack_no, offset)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        pack = self._packs[pack_no]
+        obj_type, size, data_offset = pack.read_entry_header(offset)
+
+        if obj_type == _OBJ_OFS_DELTA:
+            # 负偏移量编码: 每字节 7 位，后续字节需要先 +1
+            byte = pack.pack[data_offset]
+            data_offset += 1
+            rel = byte & 0x7F
+            while byte & 0x80:
+                byte = pack.pack[data_offset]
+                data_offset += 1
+                rel = ((rel + 1) << 7) | (byte & 0x7F)
+            base_type, base_data = self._resolve_at(pack_no, offset - rel)
+            result = (base_type, _apply_delta(base_data, pack.inflate(data_offset, size)))
+        elif obj_type == _OBJ_REF_DELTA:
+            base_sha = pack.pack[data_offset : data_offset + 20]
+            base = self._read_object(base_sha.hex())
+            if base is None:
+                raise KeyError(f"delta base {base_sha.hex()} not found")
+            base_type_name, base_data = base
+            base_type = next(k for k, v in _TYPE_NAMES.items() if v == base_type_name)
+            result = (base_type, _apply_delta(base_data, pack.inflate(data_offset + 20, size)))
+        elif obj_type in _TYPE_NAMES:
+            result = (obj_type, pack.inflate(data_offset, size))
+        else:
+            raise ValueError(f"unknown pack object type {obj_type}")
+
+        self._cache[key] = result
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+    def _read_object(self, hex_sha: str) -> Optional[Tuple[str, bytes]]:
+        if len(hex_sha) != 40:
+            return None
+        try:
+            sha = bytes.fromhex(hex_sha)
+        except ValueError:
+            return None
+
+        obj = self._read_packed(sha)
+        if obj is None:
+            obj = self._read_loose(hex_sha)
+        if obj is None and self._refresh_packs():
+            obj = self._read_packed(sha)
+        return obj
+
+    def read_object(self, hex_sha: str) -> Optional[Tuple[str, bytes]]:
+        """读取单个对象，返回 (type, content)；对象不存在时返回 None。"""
+        return self._read_object(hex_sha.strip().lower())
+
+    def read_objects(self, hex_shas: List[str]) -> Dict[str, Tuple[str, bytes]]:
+        """批量读取对象。不存在的对象不会出现在返回字典中。"""
+        results = {}
+        for hex_sha in dict.fromkeys(hex_shas):
+            obj = self.read_object(hex_sha)
+            if obj is not None:
+                results[hex_sha] = obj
+        return results
+
+    # --- 引用读取 ---
+
+    def _read_packed_refs(self) -> Dict[str, str]:
+        refs: Dict[str, str] = {}
+        packed_refs = self.git_dir / "packed-refs"
+        if not packed_refs.exists():
+            return refs
+        for line in packed_refs.read_text(encoding="utf-8").splitlines():
+            if not line or line.startswith("#") or line.startswith("^"):
+                continue
+            parts = line.split(" ", 1)
+            if len(parts) == 2:
+                refs[parts[1]] = parts[0]
+        return refs
+
+    def _read_loose_ref(self, ref_name: str, depth: int = 0) -> Optional[str]:
+        path = self.git_dir / ref_name
+        try:
+            value = path.read_text(encoding="utf-8").strip()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+        if value.startswith("ref: "):
+            if depth > 5:
+                return None
+            return self.resolve_ref(value[5:], depth + 1)
+        return value
+
+    def resolve_ref(self, ref_name: str, depth: int = 0) -> Optional[str]:
+        """将引用名 (如 HEAD、refs/heads/main) 解析为对象哈希。"""
+        value = self._read_loose_ref(ref_name, depth)
+        if value is not None:
+            return value
+        return self._read_packed_refs().get(ref_name)
+
+    def list_refs(self, prefix: str) -> List[Tuple[str, str]]:
+        """
+        列出指定前缀下的所有引用，返回按引用名排序的 (commit_hash, ref_name) 列表，
+        语义与 `git for-each-ref <prefix>` 一致。松散引用优先于 packed-refs 中的同名引用。
+        """
+        if any(c in prefix for c in "*?["):
+            raise NativeStoreUnsupported("glob ref patterns are not supported")
+
+        # 与 for-each-ref 一致: 完全匹配，或者匹配到某个 '/' 为止的前缀
+        base = prefix.rstrip("/")
+
+        def matches(name: str) -> bool:
+            return name == base or name.startswith(base + "/")
+
+        refs = {name: sha for name, sha in self._read_packed_refs().items() if matches(name)}
+
+        search_root = self.git_dir / base
+        if search_root.is_dir():
+            for dirpath, _, filenames in os.walk(search_root):
+                for filename in filenames:
+                    ref_name = (Path(dirpath) / filename).relative_to(self.git_dir).as_posix()
+                    if filename.endswith(".lock") or not matches(ref_name):
+                        continue
+                    sha = self._read_loose_ref(ref_name)
+                    if sha:
+                        refs[ref_name] = sha
+        elif search_root.is_file():
+            sha = self._read_loose_ref(base)
+            if sha:
+                refs[base] = sha
+
+        return [(sha, name) for name, sha in sorted(refs.items())]
+
+    # --- 提交遍历 ---
+
+    @staticmethod
+    def parse_commit(data: bytes) -> Dict[str, Union[str, List[str]]]:
+        """解析 commit 对象的头部字段与提交信息。"""
+        header_bytes, _, message = data.partition(b"\n\n")
+        tree = ""
+        parents: List[str] = []
+        committer_ts = "0"
+        for line in header_bytes.split(b"\n"):
+            if line.startswith(b" "):
+                continue  # 多行头部 (如 gpgsig) 的续行
+            key, _, value = line.partition(b" ")
+            if key == b"tree":
+                tree = value.decode("ascii")
+            elif key == b"parent":
+                parents.append(value.decode("ascii"))
+            elif key == b"committer":
+                # 格式: Name <email> <timestamp> <tz>
+                committer_ts = value.rsplit(b" ", 2)[-2].decode("ascii")
+        return {
+            "tree": tree,
+            "parents": parents,
+            "timestamp": committer_ts,
+            "message": message.decode("utf-8", errors="replace"),
+        }
+
+    def walk_commits(self, starts: List[str], exclude: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """
+        从给定的起点遍历提交历史，按提交时间倒序返回，
+        输出格式与 `GitDB.log_ref` 一致。等价于 `git log <starts> --not <exclude>`。
+
+        与 git 的 revision walk 相同，排除端的提交与起点一同按时间入堆并向上传播
+        "不感兴趣" 标记，一旦堆中只剩被排除的提交便停止，而不会遍历排除端的全部祖先。
+        由于提交时间可能相同或倒错，标记可能晚于提交出堆，因此结果在遍历结束后统一过滤。
+        """
+        commits: Dict[str, Dict] = {}
+        uninteresting = set()
+        pending = set()  # 仍在堆中的提交
+        heap: List[Tuple[int, int, str]] = []
+        candidates: List[str] = []
+        counter = 0
+        interesting_pending = 0
+
+        def mark_uninteresting(sha: str):
+            nonlocal interesting_pending
+            stack = [sha]
+            while stack:
+                sha = stack.pop()
+                if sha in uninteresting:
+                    continue
+                uninteresting.add(sha)
+                if sha in pending:
+                    interesting_pending -= 1
+                elif sha in commits:
+                    # 已经出堆的提交: 标记需继续传播给其祖先
+                    stack.extend(commits[sha]["parents"])
+
+        def push(sha: str, hidden: bool):
+            nonlocal counter, interesting_pending
+            if hidden:
+                mark_uninteresting(sha)
+            if sha in commits:
+                return
+            obj = self.read_object(sha)
+            if obj is not None and obj[0] == "tag":
+                # 附注标签: 剥离到其指向的对象
+                push(obj[1].split(b"\n", 1)[0].partition(b" ")[2].decode("ascii"), hidden)
+                return
+            if obj is None:
+                # 本地对象库中缺失 (例如位于 alternates 中)，交由调用方回退
+                raise KeyError(f"commit {sha} not found")
+            if obj[0] != "commit":
+                return
+            commits[sha] = self.parse_commit(obj[1])
+            pending.add(sha)
+            if sha not in uninteresting:
+                interesting_pending += 1
+            # 与 git 一致: 按提交时间倒序，时间相同则按入队顺序
+            heapq.heappush(heap, (-int(commits[sha]["timestamp"]), counter, sha))
+            counter += 1
+
+        for name in exclude or []:
+            sha = self._resolve_start(name)
+            if not sha:
+                # 静默忽略排除端会放大结果集，交由调用方回退到 git CLI
+                raise KeyError(f"cannot resolve {name}")
+            push(sha, True)
+        for start in starts:
+            sha = self._resolve_start(start)
+            if sha:
+                push(sha, False)
+
+        # 堆中只剩被排除的提交后，仍需处理那些不早于最老候选的提交，它们仍可能到达候选
+        oldest_candidate: Optional[int] = None
+        while heap and (interesting_pending > 0 or (oldest_candidate is not None and -heap[0][0] >= oldest_candidate)):
+            neg_ts, _, sha = heapq.heappop(heap)
+            pending.discard(sha)
+            hidden = sha in uninteresting
+            if not hidden:
+                interesting_pending -= 1
+                candidates.append(sha)
+                oldest_candidate = -neg_ts if oldest_candidate is None else min(oldest_candidate, -neg_ts)
+            for parent in commits[sha]["parents"]:
+                push(parent, hidden)
+
+        entries = []
+        for sha in candidates:
+            if sha in uninteresting:
+                continue
+            commit = commits[sha]
+            entries.append(
+                {
+                    "hash": sha,
+                    "parent": " ".join(commit["parents"]),
+                    "tree": commit["tree"],
+                    "timestamp": commit["timestamp"],
+                    "body": commit["message"].rstrip(),
+                }
+            )
+        return entries
+
+    def _resolve_start(self, name: str) -> Optional[str]:
+        name = name.strip()
+        if len(name) == 40 and all(c in "0123456789abcdef" for c in name):
+            return name
+        return self.resolve_ref(name)
@@ -5,9 +5,10 @@ import os
 import platform
 import re
 import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 from pyquipu.engine.git_db import GitDB
 from pyquipu.interfaces.models import QuipuNode
@@ -16,6 +17,11 @@ from pyquipu.interfaces.storage import HistoryReader, HistoryWriter
 logger = logging.getLogger(__name__)
 
 
+def local_head_ref(commit_hash: str) -> str:
+    """写入器为每个新节点创建的本地 head 引用名。"""
+    return f"refs/quipu/local/heads/{commit_hash}"
+
+
 class GitObjectHistoryReader(HistoryReader):
     """
     一个从 Git 底层对象读取历史的实现。
@@ -66,26 +72,11 @@ class GitObjectHistoryReader(HistoryReader):
             idx = hash_start + 20
         return entries
 
-    def load_all_nodes(self) -> List[QuipuNode]:
+    def _build_nodes(self, log_entries: List[Dict[str, str]]) -> Tuple[Dict[str, QuipuNode], Dict[str, str]]:
         """
-        加载所有节点。
-        优化策略: Batch cat-file
-        1. 获取所有 commits
-        2. 批量读取所有 Trees
-        3. 解析 Trees 找到 metadata.json Blob Hashes
-        4. 批量读取所有 Metadata Blobs
-        5. 组装 Nodes
+        将一批日志条目组装为 (尚未链接的) 节点。
+        返回 ({commit_hash: node}, {commit_hash: parent_commit_hash})，节点的 input_tree 留空。
         """
-        # Step 1: Get Commits
-        ref_tuples = self.git_db.get_all_ref_heads("refs/quipu/")
-        if not ref_tuples:
-            return []
-
-        all_heads = list(set(t[0] for t in ref_tuples))
-        log_entries = self.git_db.log_ref(all_heads)
-        if not log_entries:
-            return []
-
         # Step 2: Batch fetch Trees
         tree_hashes = [entry["tree"] for entry in log_entries]
         trees_content = self.git_db.batch_cat_file(tree_hashes)
@@ -166,6 +157,31 @@ class GitObjectHistoryReader(HistoryReader):
             except Exception as e:
                 logger.error(f"Failed to load history node from commit {commit_hash[:7]}: {e}")
 
+        return temp_nodes, parent_map
+
+    def load_all_nodes(self) -> List[QuipuNode]:
+        """
+        加载所有节点。
+        优化策略: Batch cat-file
+        1. 获取所有 commits
+        2. 批量读取所有 Trees
+        3. 解析 Trees 找到 metadata.json Blob Hashes
+        4. 批量读取所有 Metadata Blobs
+        5. 组装 Nodes
+        """
+        # Step 1: Get Commits
+        ref_tuples = self.git_db.get_all_ref_heads("refs/quipu/")
+        if not ref_tuples:
+            return []
+
+        all_heads = list(set(t[0] for t in ref_tuples))
+        log_entries = self.git_db.log_ref(all_heads)
+        if not log_entries:
+            return []
+
+        # Step 2-5: 批量读取 Trees 与 Metadata，组装节点
+        temp_nodes, parent_map = self._build_nodes(log_entries)
+
         # Phase 2: Link nodes (Same as before)
         for commit_hash, node in temp_nodes.items():
             parent_commit_hash = parent_map.get(commit_hash)
@@ -183,16 +199,87 @@ class GitObjectHistoryReader(HistoryReader):
 
         return list(temp_nodes.values())
 
+    # 流式读取时每批处理的提交数
+    STREAM_BATCH_SIZE = 64
+
+    def iter_nodes(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        node_type: Optional[str] = None,
+        owner_id: Optional[str] = None,
+    ) -> Iterator[QuipuNode]:
+        """
+        Git后端: 流式读取 `git log --date-order`，分批组装节点。
+
+        只有 since 被下推为 `git log --since`: 提交时间不早于节点的开始时间，因此结果是安全的超集，
+        其余条件在批内过滤。顺序以提交时间为准，与节点时间戳 (执行开始时间) 可能存在细微差异。
+        Git 对象中不记录所有者，提供 owner_id 时不会产出任何节点。
+        """
+        if owner_id is not None:
+            return
+        ref_tuples = self.git_db.get_all_ref_heads("refs/quipu/")
+        if not ref_tuples:
+            return
+
+        heads = list(set(t[0] for t in ref_tuples))
+        entries = self.git_db.iter_log(heads, since=since.timestamp() if since is not None else None)
+        output_trees: Dict[str, str] = {}
+        batch: List[Dict[str, str]] = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= self.STREAM_BATCH_SIZE:
+                yield from self._emit_batch(batch, output_trees, since, until, node_type)
+                batch = []
+        if batch:
+            yield from self._emit_batch(batch, output_trees, since, until, node_type)
+
+    def _emit_batch(
+        self,
+        batch: List[Dict[str, str]],
+        output_trees: Dict[str, str],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        node_type: Optional[str],
+    ) -> Iterator[QuipuNode]:
+        for entry in batch:
+            output_tree = self._parse_output_tree_from_body(entry["body"])
+            if output_tree:
+                output_trees[entry["hash"]] = output_tree
+
+        genesis_hash = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        nodes, parent_map = self._build_nodes(batch)
+
+        # 父提交通常排在子提交之后，尚未读到时直接读取其提交信息中的 output_tree
+        missing = list({p for p in parent_map.values() if p not in output_trees})
+        for parent_hash, content in self.git_db.batch_cat_file(missing).items():
+            output_tree = self._parse_output_tree_from_body(content.decode("utf-8", "ignore"))
+            if output_tree:
+                output_trees[parent_hash] = output_tree
+
+        for commit_hash, node in nodes.items():
+            parent_hash = parent_map.get(commit_hash)
+            node.input_tree = output_trees.get(parent_hash, genesis_hash) if parent_hash else genesis_hash
+            if since is not None and node.timestamp < since:
+                continue
+            if until is not None and node.timestamp > until:
+                continue
+            if node_type is not None and node.node_type != node_type:
+                continue
+            yield node
+
+    def has_nodes(self) -> bool:
+        """Git后端: 存在任何 Quipu 引用即存在历史，无需加载节点"""
+        return bool(self.git_db.get_all_ref_heads("refs/quipu/"))
+
     def get_node_count(self) -> int:
         """Git后端: 低效实现，加载所有节点后计数"""
         return len(self.load_all_nodes())
 
     def get_node_position(self, output_tree_hash: str) -> int:
         """Git后端: 低效实现，加载所有节点后查找索引"""
-        all_nodes = self.load_all_nodes()
-        # load_all_nodes 内部已经按时间倒序排序了
-        # 但为了保险，还是在这里再次确认排序逻辑
-        all_nodes.sort(key=lambda n: n.timestamp, reverse=True)
+        # 与游标分页使用相同的排序键 (timestamp, commit_hash)，保证页码计算一致
+        all_nodes = self._sorted_for_paging()
 
         for i, node in enumerate(all_nodes):
             if node.output_tree == output_tree_hash:
@@ -201,30 +288,39 @@ class GitObjectHistoryReader(HistoryReader):
 
     def load_nodes_paginated(self, limit: int, offset: int) -> List[QuipuNode]:
         """Git后端: 低效实现，加载所有节点后切片"""
-        all_nodes = self.load_all_nodes()
-        # load_all_nodes 通常按时间倒序返回
-        return all_nodes[offset : offset + limit]
+        return self._sorted_for_paging()[offset : offset + limit]
+
+    @staticmethod
+    def _collect_output_trees(start: QuipuNode, ancestors: bool, descendants: bool) -> Set[str]:
+        """从起点出发沿 parent / children 引用遍历，收集 output_tree。"""
+        result: Set[str] = set()
+        if ancestors:
+            # 每个节点至多一个父节点，祖先就是一条链
+            parent = start.parent
+            while parent is not None and parent.output_tree not in result:
+                result.add(parent.output_tree)
+                parent = parent.parent
+        if descendants:
+            seen = set()
+            queue = deque(start.children)
+            while queue:
+                child = queue.popleft()
+                if child.commit_hash in seen:
+                    continue
+                seen.add(child.commit_hash)
+                result.add(child.output_tree)
+                queue.extend(child.children)
+        return result
+
+    def _find_by_output_tree(self, output_tree_hash: str) -> Optional[QuipuNode]:
+        # 与旧实现保持一致: output_tree 重复时取最后加载的节点
+        node_map = {n.output_tree: n for n in self.load_all_nodes()}
+        return node_map.get(output_tree_hash)
 
     def get_ancestor_output_trees(self, start_output_tree_hash: str) -> Set[str]:
         """Git后端: 在内存中遍历图谱"""
-        all_nodes = self.load_all_nodes()
-        node_map = {n.output_tree: n for n in all_nodes}
-
-        ancestors = set()
-        queue = []
-
-        if start_output_tree_hash in node_map:
-            queue.append(node_map[start_output_tree_hash])
-
-        while queue:
-            current_node = queue.pop(0)
-            if current_node.parent:
-                p_hash = current_node.parent.output_tree
-                if p_hash not in ancestors:
-                    ancestors.add(p_hash)
-                    queue.append(current_node.parent)
-
-        return ancestors
+        start = self._find_by_output_tree(start_output_tree_hash)
+        return self._collect_output_trees(start, True, False) if start else set()
 
     def get_private_data(self, node_commit_hash: str) -> Optional[str]:
         """Git后端: 不支持私有数据"""
@@ -232,53 +328,58 @@ class GitObjectHistoryReader(HistoryReader):
 
     def get_descendant_output_trees(self, start_output_tree_hash: str) -> Set[str]:
         """Git后端: 在内存中遍历图谱以查找后代"""
-        all_nodes = self.load_all_nodes()
-        node_map = {n.output_tree: n for n in all_nodes}
-
-        descendants = set()
-        queue = []
-
-        if start_output_tree_hash in node_map:
-            queue.append(node_map[start_output_tree_hash])
+        start = self._find_by_output_tree(start_output_tree_hash)
+        return self._collect_output_trees(start, False, True) if start else set()
 
-        while queue:
-            current_node = queue.pop(0)
-            for child in current_node.children:
-                c_hash = child.output_tree
-                if c_hash not in descendants:
-                    descendants.add(c_hash)
-                    queue.append(child)
-
-        return descendants
+    def get_reachable_output_trees(self, start_output_tree_hash: str) -> Set[str]:
+        """Git后端: 只加载一次图谱，同时收集祖先与后代"""
+        start = self._find_by_output_tree(start_output_tree_hash)
+        reachable = self._collect_output_trees(start, True, True) if start else set()
+        reachable.add(start_output_tree_hash)
+        return reachable
 
     def get_node_blobs(self, commit_hash: str) -> Dict[str, bytes]:
         """从 Git 对象中读取节点的所有文件内容。"""
-        try:
-            # 1. Get Tree Hash from Commit
-            commit_content = self.git_db.cat_file(commit_hash, "commit").decode("utf-8", "ignore")
-            tree_line = commit_content.split("\n", 1)[0]
-            if not tree_line.startswith("tree "):
-                raise ValueError("Invalid commit object format")
-            tree_hash = tree_line.split()[1]
+        return self.get_nodes_blobs([commit_hash]).get(commit_hash, {})
 
-            # 2. 解析 Tree 并批量获取所有 blobs
-            # We need to map blob hashes back to filenames.
-            tree_content_bytes = self.git_db.cat_file(tree_hash, "tree")
-            entries = self._parse_tree_binary(tree_content_bytes)
-
-            blob_hashes = list(entries.values())
-            blob_contents = self.git_db.batch_cat_file(blob_hashes)
-
-            # Reconstruct the {filename: content} map
-            result = {}
-            for filename, blob_hash in entries.items():
-                if blob_hash in blob_contents:
-                    result[filename] = blob_contents[blob_hash]
+    def get_nodes_blobs(self, commit_hashes: List[str]) -> Dict[str, Dict[str, bytes]]:
+        """
+        批量读取多个节点的所有文件内容。
+        无论节点数量多少都只需三次批量读取 (commits -> trees -> blobs)，全部经由同一个 cat-file 流。
+        无法读取的节点映射为空字典。
+        """
+        result: Dict[str, Dict[str, bytes]] = {commit_hash: {} for commit_hash in commit_hashes}
+        try:
+            # 1. Get Tree Hashes from Commits
+            commit_to_tree: Dict[str, str] = {}
+            for commit_hash, commit_bytes in self.git_db.batch_cat_file(commit_hashes).items():
+                tree_line = commit_bytes.split(b"\n", 1)[0]
+                if tree_line.startswith(b"tree "):
+                    commit_to_tree[commit_hash] = tree_line[5:].decode("ascii")
+                else:
+                    logger.error(f"Failed to load blobs for commit {commit_hash[:7]}: Invalid commit object format")
+
+            # 2. 解析所有 Trees，记录文件名到 blob 的映射
+            tree_entries: Dict[str, Dict[str, str]] = {}
+            for tree_hash, tree_bytes in self.git_db.batch_cat_file(list(set(commit_to_tree.values()))).items():
+                tree_entries[tree_hash] = self._parse_tree_binary(tree_bytes)
+
+            # 3. 一次性读取所有 blobs (不同节点间相同的文件内容只读取一次)
+            blob_hashes = {blob for entries in tree_entries.values() for blob in entries.values()}
+            blob_contents = self.git_db.batch_cat_file(list(blob_hashes))
+        except Exception as e:
+            logger.error(f"Failed to batch load blobs for {len(commit_hashes)} commits: {e}")
             return result
 
-        except Exception as e:
-            logger.error(f"Failed to load blobs for commit {commit_hash[:7]}: {e}")
-            return {}
+        # Reconstruct the {filename: content} maps
+        for commit_hash, tree_hash in commit_to_tree.items():
+            entries = tree_entries.get(tree_hash, {})
+            result[commit_hash] = {
+                filename: blob_contents[blob_hash]
+                for filename, blob_hash in entries.items()
+                if blob_hash in blob_contents
+            }
+        return result
 
     def get_node_content(self, node: QuipuNode) -> str:
         """
@@ -299,13 +400,8 @@ class GitObjectHistoryReader(HistoryReader):
                 raise ValueError("Invalid commit object format")
             tree_hash = tree_line.split()[1]
 
-            # 2. Get content.md Blob Hash from Tree
-            # Use batch_cat_file to get RAW binary tree content, compatible with _parse_tree_binary
-            tree_content_map = self.git_db.batch_cat_file([tree_hash])
-            if tree_hash not in tree_content_map:
-                return ""
-
-            tree_content = tree_content_map[tree_hash]
+            # 2. Get content.md Blob Hash from Tree (RAW binary, compatible with _parse_tree_binary)
+            tree_content = self.git_db.cat_file(tree_hash, "tree")
             entries = self._parse_tree_binary(tree_content)
 
             blob_hash = entries.get("content.md")
@@ -325,15 +421,59 @@ class GitObjectHistoryReader(HistoryReader):
             logger.error(f"Failed to lazy load content for node {node.short_hash}: {e}")
             return ""
 
+    def read_contents(self, commit_hashes: List[str]) -> Dict[str, str]:
+        """
+        批量读取一组提交的 content.md，返回 {commit_hash: content}。
+        无论节点数量多少都只需三次批量读取 (commit -> tree -> content.md)，全部经由同一个 cat-file 流。
+        没有 content.md 的节点映射为空字符串；无法读取的提交不出现在结果中。
+        """
+        commits = self.git_db.batch_cat_file(commit_hashes)
+        commit_to_tree: Dict[str, str] = {}
+        for commit_hash, commit_bytes in commits.items():
+            first_line = commit_bytes.split(b"\n", 1)[0]
+            if first_line.startswith(b"tree "):
+                commit_to_tree[commit_hash] = first_line[5:].decode("ascii")
+
+        trees = self.git_db.batch_cat_file(list(set(commit_to_tree.values())))
+        tree_to_blob: Dict[str, Optional[str]] = {
+            tree_hash: self._parse_tree_binary(tree_bytes).get("content.md") for tree_hash, tree_bytes in trees.items()
+        }
+        blobs = self.git_db.batch_cat_file([b for b in tree_to_blob.values() if b])
+
+        contents: Dict[str, str] = {}
+        for commit_hash, tree_hash in commit_to_tree.items():
+            if tree_hash not in tree_to_blob:
+                continue
+            blob_hash = tree_to_blob[tree_hash]
+            if blob_hash is None:
+                contents[commit_hash] = ""
+            elif blob_hash in blobs:
+                contents[commit_hash] = blobs[blob_hash].decode("utf-8", errors="ignore")
+        return contents
+
+    def get_node_contents(self, nodes: List[QuipuNode]) -> Dict[str, str]:
+        """Git后端: 批量读取尚未加载内容的节点"""
+        result = {node.commit_hash: node.content for node in nodes if node.content}
+        missing = [node.commit_hash for node in nodes if not node.content]
+        if missing:
+            loaded = self.read_contents(missing)
+            result.update({commit_hash: loaded.get(commit_hash, "") for commit_hash in missing})
+        return result
+
+    # 全文检索时每批读取内容的节点数，限制同时驻留内存的内容量
+    CONTENT_BATCH_SIZE = 256
+
     def find_nodes(
         self,
         summary_regex: Optional[str] = None,
         node_type: Optional[str] = None,
         limit: int = 10,
+        text: Optional[str] = None,
     ) -> List[QuipuNode]:
         """
         GitObject 后端的查找实现。
         由于没有索引，此实现加载所有节点并在内存中进行过滤。
+        全文检索分批读取节点内容 (每批三次批量读取)，结果按命中次数排序。
         """
         # 这是一个高成本操作，因为它需要加载整个图
         candidates = self.load_all_nodes()
@@ -352,6 +492,22 @@ class GitObjectHistoryReader(HistoryReader):
         # 按时间戳降序排序
         candidates.sort(key=lambda n: n.timestamp, reverse=True)
 
+        if text:
+            terms = [t.casefold() for t in text.split()]
+            scored = []
+            for i in range(0, len(candidates), self.CONTENT_BATCH_SIZE):
+                batch = candidates[i : i + self.CONTENT_BATCH_SIZE]
+                contents = self.get_node_contents(batch)
+                for node in batch:
+                    haystack = f"{node.summary}\n{contents.get(node.commit_hash, '')}".casefold()
+                    if all(t in haystack for t in terms):
+                        # 摘要命中的权重高于正文 (与 SQLite 后端的 bm25 权重取向一致)
+                        score = sum(haystack.count(t) + 4 * node.summary.casefold().count(t) for t in terms)
+                        scored.append((score, node))
+            # sort 是稳定的: 得分相同的节点保持时间倒序
+            scored.sort(key=lambda item: item[0], reverse=True)
+            candidates = [node for _, node in scored]
+
         return candidates[:limit]
 
 
@@ -487,7 +643,7 @@ class GitObjectHistoryWriter(HistoryWriter):
         # 3. 引用管理 (QDPS v1.1 - Local Heads Namespace)
         # 在本地工作区命名空间中为新的 commit 创建一个持久化的 head 引用。
         # 这是 push 操作的唯一来源，并且支持多分支图谱，因此不再删除父节点的 head。
-        self.git_db.update_ref(f"refs/quipu/local/heads/{new_commit_hash}", new_commit_hash)
+        self.git_db.update_ref(local_head_ref(new_commit_hash), new_commit_hash)
 
         logger.info(f"✅ History node created as commit {new_commit_hash[:7]}")
 
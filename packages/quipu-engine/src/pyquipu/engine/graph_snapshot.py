@@ -0,0 +1,332 @@
+"""
+历史图谱的二进制快照，用于冷启动时直接内存映射 (mmap) 完整图谱。
+
+文件布局 (数据段使用本机字节序并记录在头部，各数据段按 8 字节对齐):
+
+    MAGIC (8 字节) | 版本号 u32 | 头部长度 u32 | JSON 头部 | 数据段 ...
+
+JSON 头部记录快照对应的引用状态 (key)、节点数、各数据段的偏移与长度，以及节点类型、
+所有者这类小表。数据段是 CompactHistoryGraph 所需的全部列:
+
+- commits / trees: 每个节点 20 字节的原始哈希 (仅支持 SHA-1 仓库)
+- timestamps (f64)、parents / type_ids / owner_ids (i32 / u16 / u32)
+- commit_order / tree_order: 按 commit_hash / output_tree 排序的行号，用于二分查找
+- child_offsets / child_targets: CSR 形式的子节点邻接表
+- summary_offsets (u32) + summary_blob: 摘要字符串池 (UTF-8)
+
+加载时不解析任何数据段，列直接以 memoryview 的形式映射到文件上。
+
+create_node 追加节点时不重写快照，而是向旁路日志 (journal) 追加一条记录；
+加载时在快照之上重放日志。日志过长时删除快照，由下一次完整加载重新生成。
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pyquipu.interfaces.models import QuipuNode
+
+from .history_graph import CompactHistoryGraph
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"QUIPUGS\x00"
+FORMAT_VERSION = 1
+SNAPSHOT_FILE = "graph.snapshot"
+JOURNAL_FILE = "graph.snapshot.journal"
+# 日志条目超过该数量时放弃快照，下次对齐时整体重建
+MAX_JOURNAL_ENTRIES = 256
+# 哈希列按 SHA-1 的 20 字节定长存储，SHA-256 仓库不写快照
+HASH_BYTES = 20
+
+_PREAMBLE = struct.Struct("<8sII")
+_SECTIONS = (
+    ("commits", "B"),
+    ("trees", "B"),
+    ("timestamps", "d"),
+    ("parents", "i"),
+    ("type_ids", "H"),
+    ("owner_ids", "I"),
+    ("commit_order", "i"),
+    ("tree_order", "i"),
+    ("child_offsets", "i"),
+    ("child_targets", "i"),
+    ("summary_offsets", "I"),
+    ("summary_blob", "B"),
+)
+
+
+def ref_state_key(ref_heads: Iterable[Tuple[str, str]], salt: str = "") -> str:
+    """根据 (commit_hash, ref_name) 列表计算引用状态的摘要，作为快照的键。"""
+    digest = hashlib.sha1(salt.encode("utf-8"))
+    for commit_hash, ref_name in sorted(ref_heads, key=lambda item: item[1]):
+        digest.update(f"{ref_name} {commit_hash}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class _HexColumn(Sequence):
+    """以 20 字节原始哈希存储、按需转换为十六进制字符串的只读列。"""
+
+    def __init__(self, buffer: memoryview):
+        self._buffer = buffer
+
+    def __len__(self) -> int:
+        return len(self._buffer) // HASH_BYTES
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start = index * HASH_BYTES
+        return self._buffer[start : start + HASH_BYTES].hex()
+
+
+class _StringColumn(Sequence):
+    """由偏移数组与 UTF-8 字符串池组成的只读列。"""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self._blob[self._offsets[index] : self._offsets[index + 1]], "utf-8")
+
+
+class GraphSnapshotStore:
+    """
+    管理 .quipu 目录下的图谱快照文件及其追加日志。
+    """
+
+    def __init__(self, quipu_dir: Path):
+        self.path = quipu_dir / SNAPSHOT_FILE
+        self.journal_path = quipu_dir / JOURNAL_FILE
+
+    # --- 写入 ---
+
+    def write(self, graph: CompactHistoryGraph, key: str):
+        """将一个刚从存储加载的 (没有附加节点的) 紧凑图谱写为快照，并清空日志。"""
+        count = len(graph._commits)
+        alive = [row for row in range(count) if graph._alive(row)]
+        if len(alive) != count or graph._extra:
+            # 含有增删的图谱需要重新编号，直接放弃写入
+            logger.debug("图谱包含未持久化的修改，跳过快照写入。")
+            return
+
+        hex_len = HASH_BYTES * 2
+        if any(len(h) != hex_len for h in graph._commits) or any(len(h) != hex_len for h in graph._output_trees):
+            # SHA-256 仓库的哈希无法放入定长列
+            logger.debug("仓库使用的不是 SHA-1 哈希，跳过快照写入。")
+            return
+
+        graph._ensure_sorted()
+        if graph._child_offsets is None:
+            graph._build_children()
+
+        summaries = [s.encode("utf-8") for s in graph._summaries]
+        summary_offsets = array("I", [0])
+        for encoded in summaries:
+            summary_offsets.append(summary_offsets[-1] + len(encoded))
+
+        sections: Dict[str, bytes] = {
+            "commits": b"".join(bytes.fromhex(c) for c in graph._commits),
+            "trees": b"".join(bytes.fromhex(t) for t in graph._output_trees),
+            "timestamps": array("d", graph._timestamps).tobytes(),
+            "parents": array("i", graph._parents).tobytes(),
+            "type_ids": array("H", graph._type_ids).tobytes(),
+            "owner_ids": array("I", graph._owner_ids).tobytes(),
+            "commit_order": array("i", graph._commit_order).tobytes(),
+            "tree_order": array("i", graph._tree_order).tobytes(),
+            "child_offsets": array("i", graph._child_offsets).tobytes(),
+            "child_targets": array("i", graph._child_targets).tobytes(),
+            "summary_offsets": summary_offsets.tobytes(),
+            "summary_blob": b"".join(summaries),
+        }
+
+        layout: Dict[str, List[int]] = {}
+        offset = 0
+        for name, _ in _SECTIONS:
+            layout[name] = [offset, len(sections[name])]
+            offset += (len(sections[name]) + 7) & ~7
+        header = json.dumps(
+            {
+                "key": key,
+                "count": count,
+                "byteorder": sys.byteorder,
+                "types": graph._types,
+                "owners": graph._owners,
+                "sections": layout,
+            }
+        ).encode("utf-8")
+        header += b" " * (-(len(header) + _PREAMBLE.size) % 8)
+
+        tmp_path = self.path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+                f.write(header)
+                for name, _ in _SECTIONS:
+                    data = sections[name]
+                    f.write(data)
+                    f.write(b"\0" * (-len(data) % 8))
+            os.replace(tmp_path, self.path)
+            self.journal_path.unlink(missing_ok=True)
+            logger.debug(f"🗺️  图谱快照已写入 ({count} 个节点)。")
+        except OSError as e:
+            logger.warning(f"无法写入图谱快照: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def append(self, node: QuipuNode, prev_key: str, new_key: str, owner_id: Optional[str] = None):
+        """
+        将 create_node 新建的节点追加到日志中。
+        只有当快照 (含日志) 恰好对应创建前的引用状态时才追加，否则使快照失效。
+        """
+        if not self.path.exists():
+            return
+        entries = self._read_journal()
+        current = entries[-1]["key"] if entries else self._read_key()
+        if current != prev_key or len(entries) >= MAX_JOURNAL_ENTRIES:
+            self.invalidate()
+            return
+        record = {
+            "key": new_key,
+            "commit_hash": node.commit_hash,
+            "output_tree": node.output_tree,
+            "input_tree": node.input_tree,
+            "timestamp": node.timestamp.timestamp(),
+            "node_type": node.node_type,
+            "summary": node.summary,
+            "owner_id": node.owner_id or owner_id,
+            "parent": node.parent.commit_hash if node.parent is not None else None,
+        }
+        try:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.warning(f"无法追加图谱快照日志: {e}")
+            self.invalidate()
+
+    def invalidate(self):
+        """删除快照与日志。"""
+        for path in (self.path, self.journal_path):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.debug(f"无法删除 {path}: {e}")
+
+    # --- 读取 ---
+
+    def _read_preamble(self, f) -> Optional[Dict[str, Any]]:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) != _PREAMBLE.size:
+            return None
+        magic, version, header_len = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            return None
+        header = json.loads(f.read(header_len))
+        header["data_offset"] = _PREAMBLE.size + header_len
+        return header
+
+    def _read_key(self) -> Optional[str]:
+        try:
+            with open(self.path, "rb") as f:
+                header = self._read_preamble(f)
+        except (OSError, ValueError):
+            return None
+        return header["key"] if header else None
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        if not self.journal_path.exists():
+            return []
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            logger.debug(f"无法读取图谱快照日志: {e}")
+            return []
+
+    def load(self, key: str) -> Optional[CompactHistoryGraph]:
+        """
+        加载与给定引用状态匹配的快照，返回映射到文件上的 CompactHistoryGraph。
+        快照不存在、格式不兼容或已过期时返回 None。
+        """
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                header = self._read_preamble(f)
+                if header is None or header.get("byteorder") != sys.byteorder:
+                    return None
+                entries = self._read_journal()
+                current = entries[-1]["key"] if entries else header["key"]
+                if current != key:
+                    return None
+                if header["count"] == 0:
+                    graph = CompactHistoryGraph()
+                else:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    graph = self._map_graph(header, memoryview(mapped))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"图谱快照已损坏，将重新生成: {e}")
+            self.invalidate()
+            return None
+
+        for entry in entries:
+            graph[entry["commit_hash"]] = self._entry_to_node(graph, entry)
+        logger.debug(f"🗺️  已从快照映射 {len(graph)} 个节点。")
+        return graph
+
+    def _map_graph(self, header: Dict[str, Any], buffer: memoryview) -> CompactHistoryGraph:
+        base = header["data_offset"]
+        views = {}
+        for name, fmt in _SECTIONS:
+            offset, length = header["sections"][name]
+            view = buffer[base + offset : base + offset + length]
+            views[name] = view.cast(fmt) if fmt != "B" else view
+
+        graph = CompactHistoryGraph()
+        graph._rows = None
+        graph._commits = _HexColumn(views["commits"])
+        graph._output_trees = _HexColumn(views["trees"])
+        graph._timestamps = views["timestamps"]
+        graph._parents = views["parents"]
+        graph._type_ids = views["type_ids"]
+        graph._owner_ids = views["owner_ids"]
+        graph._commit_order = views["commit_order"]
+        graph._tree_order = views["tree_order"]
+        graph._child_offsets = views["child_offsets"]
+        graph._child_targets = views["child_targets"]
+        graph._summaries = _StringColumn(views["summary_offsets"], views["summary_blob"])
+        graph._types = header["types"]
+        graph._owners = header["owners"]
+        return graph
+
+    @staticmethod
+    def _entry_to_node(graph: CompactHistoryGraph, entry: Dict[str, Any]) -> QuipuNode:
+        commit_hash = entry["commit_hash"]
+        node = QuipuNode(
+            commit_hash=commit_hash,
+            input_tree=entry["input_tree"],
+            output_tree=entry["output_tree"],
+            timestamp=datetime.fromtimestamp(entry["timestamp"]),
+            filename=Path(f".quipu/git_objects/{commit_hash}"),
+            node_type=entry["node_type"],
+            summary=entry["summary"],
+            owner_id=entry["owner_id"],
+        )
+        parent_hash = entry.get("parent")
+        if parent_hash and parent_hash in graph:
+            # 父节点的 children 由图谱在插入时维护
+            node.parent = graph[parent_hash]
+        return node
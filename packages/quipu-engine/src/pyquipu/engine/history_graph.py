@@ -0,0 +1,561 @@
+import bisect
+from array import array
+from collections.abc import MutableMapping, Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from pyquipu.interfaces.models import QuipuNode
+
+
+class HistoryGraph(Dict[str, QuipuNode]):
+    """
+    以 commit_hash 为键的历史图谱字典，附带自动维护的二级索引。
+
+    它与普通字典完全兼容，但在每次写入/删除时同步更新:
+    - output_tree -> 节点列表 (按插入顺序，与遍历 values() 的先后一致)
+    - commit_hash / output_tree 的有序列表，用于 O(log n) 的前缀查找
+    有序列表在批量构建后惰性生成，之后的单点插入通过 bisect 维护。
+    """
+
+    def __init__(self, nodes: Optional[Dict[str, QuipuNode]] = None):
+        super().__init__()
+        self._by_output_tree: Dict[str, List[str]] = {}
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        self._sorted_commits: Optional[List[str]] = None
+        self._sorted_trees: Optional[List[str]] = None
+        self._latest: Optional[QuipuNode] = None
+        self._latest_valid = True
+        if nodes:
+            self.update(nodes)
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[QuipuNode]) -> "HistoryGraph":
+        graph = cls()
+        for node in nodes:
+            graph[node.commit_hash] = node
+        return graph
+
+    # --- 字典写入接口 ---
+
+    def __setitem__(self, commit_hash: str, node: QuipuNode):
+        old = self.get(commit_hash)
+        if old is not None:
+            self._unindex(commit_hash, old)
+        else:
+            self._order[commit_hash] = self._next_order
+            self._next_order += 1
+            if self._sorted_commits is not None:
+                bisect.insort(self._sorted_commits, commit_hash)
+        super().__setitem__(commit_hash, node)
+        self._index(commit_hash, node)
+
+    def __delitem__(self, commit_hash: str):
+        node = self[commit_hash]
+        super().__delitem__(commit_hash)
+        self._unindex(commit_hash, node)
+        self._order.pop(commit_hash, None)
+        if self._sorted_commits is not None:
+            pos = bisect.bisect_left(self._sorted_commits, commit_hash)
+            del self._sorted_commits[pos]
+
+    def update(self, *args, **kwargs):
+        for commit_hash, node in dict(*args, **kwargs).items():
+            self[commit_hash] = node
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, commit_hash: str, default: Optional[QuipuNode] = None):
+        if commit_hash not in self:
+            self[commit_hash] = default
+        return self[commit_hash]
+
+    _MISSING = object()
+
+    def pop(self, commit_hash: str, default=_MISSING):
+        if commit_hash in self:
+            node = self[commit_hash]
+            del self[commit_hash]
+            return node
+        if default is self._MISSING:
+            raise KeyError(commit_hash)
+        return default
+
+    def popitem(self) -> Tuple[str, QuipuNode]:
+        commit_hash = next(reversed(self))
+        return commit_hash, self.pop(commit_hash)
+
+    def clear(self):
+        super().clear()
+        self._by_output_tree.clear()
+        self._order.clear()
+        self._sorted_commits = None
+        self._sorted_trees = None
+        self._latest = None
+        self._latest_valid = True
+
+    # --- 索引维护 ---
+
+    def _index(self, commit_hash: str, node: QuipuNode):
+        bucket = self._by_output_tree.get(node.output_tree)
+        if bucket is None:
+            self._by_output_tree[node.output_tree] = [commit_hash]
+            if self._sorted_trees is not None:
+                bisect.insort(self._sorted_trees, node.output_tree)
+        else:
+            # 按插入顺序保持有序 (替换已有键时保留其原始位置)
+            order = self._order
+            keys = [order[c] for c in bucket]
+            bucket.insert(bisect.bisect(keys, order[commit_hash]), commit_hash)
+
+        if self._latest_valid and (self._latest is None or node.timestamp > self._latest.timestamp):
+            self._latest = node
+
+    def _unindex(self, commit_hash: str, node: QuipuNode):
+        bucket = self._by_output_tree.get(node.output_tree)
+        if bucket is not None:
+            bucket.remove(commit_hash)
+            if not bucket:
+                del self._by_output_tree[node.output_tree]
+                if self._sorted_trees is not None:
+                    pos = bisect.bisect_left(self._sorted_trees, node.output_tree)
+                    del self._sorted_trees[pos]
+        if self._latest is node:
+            self._latest = None
+            self._latest_valid = False
+
+    def _ensure_sorted(self):
+        if self._sorted_commits is None:
+            self._sorted_commits = sorted(self.keys())
+        if self._sorted_trees is None:
+            self._sorted_trees = sorted(self._by_output_tree.keys())
+
+    @staticmethod
+    def _prefix_range(sorted_keys: List[str], prefix: str) -> List[str]:
+        start = bisect.bisect_left(sorted_keys, prefix)
+        result = []
+        for key in sorted_keys[start:]:
+            if not key.startswith(prefix):
+                break
+            result.append(key)
+        return result
+
+    # --- 查询接口 ---
+
+    def find_by_output_tree(self, output_tree: str) -> Optional[QuipuNode]:
+        """返回第一个 (最早插入的) output_tree 匹配的节点。"""
+        bucket = self._by_output_tree.get(output_tree)
+        return self[bucket[0]] if bucket else None
+
+    def nodes_by_output_tree(self, output_tree: str) -> List[QuipuNode]:
+        return [self[c] for c in self._by_output_tree.get(output_tree, [])]
+
+    def find_by_commit_prefix(self, prefix: str) -> List[QuipuNode]:
+        """返回 commit_hash 以 prefix 开头的所有节点。"""
+        self._ensure_sorted()
+        return [self[c] for c in self._prefix_range(self._sorted_commits, prefix)]
+
+    def find_by_output_tree_prefix(self, prefix: str) -> List[QuipuNode]:
+        """返回 output_tree 以 prefix 开头的所有节点，按插入顺序排列。"""
+        self._ensure_sorted()
+        commits = [c for tree in self._prefix_range(self._sorted_trees, prefix) for c in self._by_output_tree[tree]]
+        commits.sort(key=self._order.__getitem__)
+        return [self[c] for c in commits]
+
+    def find_by_prefix(self, prefix: str) -> List[QuipuNode]:
+        """返回 commit_hash 或 output_tree 以 prefix 开头的所有节点，按插入顺序排列且不重复。"""
+        self._ensure_sorted()
+        commits = set(self._prefix_range(self._sorted_commits, prefix))
+        for tree in self._prefix_range(self._sorted_trees, prefix):
+            commits.update(self._by_output_tree[tree])
+        return [self[c] for c in sorted(commits, key=self._order.__getitem__)]
+
+    def latest_node(self) -> Optional[QuipuNode]:
+        """返回时间戳最新的节点 (时间相同则取最先插入的)。"""
+        if not self._latest_valid:
+            self._latest = max(self.values(), key=lambda node: node.timestamp) if self else None
+            self._latest_valid = True
+        return self._latest
+
+
+_GENESIS_HASH = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+_UNSET = object()
+
+
+class CompactNodeView(QuipuNode):
+    """
+    CompactHistoryGraph 中某一行的 QuipuNode 视图。
+
+    标量字段在创建视图时填充；parent / children 在首次访问时才从紧凑图谱中物化，
+    因此访问单个节点不会连带创建整条祖先链或整棵子树。
+    """
+
+    def __init__(self, graph: "CompactHistoryGraph", index: int):
+        # 不调用 dataclass 生成的 __init__，以免立即物化 parent / children
+        self._graph = graph
+        self._row = index
+        self._parent = _UNSET
+        self._children: Optional[List[QuipuNode]] = None
+        parent_row = graph._parents[index]
+        self.commit_hash = graph._commits[index]
+        self.output_tree = graph._output_trees[index]
+        self.input_tree = graph._output_trees[parent_row] if parent_row >= 0 else _GENESIS_HASH
+        self.timestamp = datetime.fromtimestamp(graph._timestamps[index])
+        self.filename = Path(f".quipu/git_objects/{self.commit_hash}")
+        self.node_type = graph._types[graph._type_ids[index]]
+        self.parent_hint = None
+        self.content = ""
+        self.summary = graph._summaries[index]
+        self.owner_id = graph._owners[graph._owner_ids[index]]
+
+    @property
+    def parent(self) -> Optional[QuipuNode]:
+        if self._parent is _UNSET:
+            self._parent = self._graph._view_of(self._graph._parents[self._row])
+        return self._parent
+
+    @parent.setter
+    def parent(self, value: Optional[QuipuNode]):
+        self._parent = value
+
+    @property
+    def children(self) -> List[QuipuNode]:
+        if self._children is None:
+            graph = self._graph
+            keys = graph._child_keys(self._row)
+            self._children = [graph._view_of(k) if isinstance(k, int) else graph._extra[k] for k in keys]
+        return self._children
+
+    @children.setter
+    def children(self, value: List[QuipuNode]):
+        self._children = value
+
+
+class CompactHistoryGraph(MutableMapping):
+    """
+    以列式数组存储的只读为主的历史图谱，提供与 HistoryGraph 相同的查询接口。
+
+    每个节点对应一个整数行号，各字段保存在平行数组中:
+    - commit_hash / output_tree / summary 为字符串列表 (output_tree 经过 intern 去重)
+    - 时间戳、父节点行号为 array，节点类型与所有者为小表索引
+    - 子节点关系以 CSR 形式 (偏移数组 + 目标数组) 在首次访问时构建
+    QuipuNode 视图只在通过映射接口访问时才按需创建并缓存，保证同一节点的视图唯一。
+
+    构建完成后追加或替换的节点 (例如新创建的 Plan 节点) 以普通 QuipuNode 保存在一个
+    附加的 HistoryGraph 中。
+    """
+
+    def __init__(self):
+        # 列可以是 list / array，也可以是映射到快照文件上的只读序列 (见 graph_snapshot)
+        self._commits: Sequence[str] = []
+        # commit_hash -> 行号；为 None 时通过 _commit_order 二分查找
+        self._rows: Optional[Dict[str, int]] = {}
+        self._output_trees: Sequence[str] = []
+        self._timestamps: Sequence[float] = array("d")
+        self._summaries: Sequence[str] = []
+        self._types: List[str] = []
+        self._type_ids: Sequence[int] = array("H")
+        self._owners: List[Optional[str]] = []
+        self._owner_ids: Sequence[int] = array("I")
+        self._parents: Sequence[int] = array("i")
+        self._deleted: Set[int] = set()
+        self._views: Dict[int, CompactNodeView] = {}
+        self._extra = HistoryGraph()
+        self._extra_children: Dict[str, List[str]] = {}
+        # 惰性构建的索引
+        self._child_offsets: Optional[Sequence[int]] = None
+        self._child_targets: Optional[Sequence[int]] = None
+        self._commit_order: Optional[Sequence[int]] = None
+        self._tree_order: Optional[Sequence[int]] = None
+        self._latest_row: Optional[int] = None
+        self._latest_valid = False
+
+    # --- 构建 ---
+
+    @classmethod
+    def from_columns(
+        cls,
+        rows: Iterable[Tuple[str, str, float, str, str, Optional[str]]],
+        edges: Iterable[Tuple[str, str]],
+    ) -> "CompactHistoryGraph":
+        """
+        从原始列数据构建图谱，全程不创建 QuipuNode。
+
+        Args:
+            rows: (commit_hash, output_tree, timestamp, node_type, summary, owner_id) 序列。
+            edges: (child_hash, parent_hash) 序列；一个节点存在多条边时只取第一条。
+        """
+        graph = cls()
+        types: Dict[str, int] = {}
+        owners: Dict[Optional[str], int] = {}
+        trees: Dict[str, str] = {}
+        for commit_hash, output_tree, timestamp, node_type, summary, owner_id in rows:
+            if commit_hash in graph._rows:
+                continue
+            graph._rows[commit_hash] = len(graph._commits)
+            graph._commits.append(commit_hash)
+            graph._output_trees.append(trees.setdefault(output_tree, output_tree))
+            graph._timestamps.append(timestamp)
+            graph._summaries.append(summary)
+            if node_type not in types:
+                types[node_type] = len(graph._types)
+                graph._types.append(node_type)
+            graph._type_ids.append(types[node_type])
+            if owner_id not in owners:
+                owners[owner_id] = len(graph._owners)
+                graph._owners.append(owner_id)
+            graph._owner_ids.append(owners[owner_id])
+
+        graph._parents = array("i", [-1]) * len(graph._commits)
+        rows_index = graph._rows
+        for child_hash, parent_hash in edges:
+            child_row = rows_index.get(child_hash)
+            parent_row = rows_index.get(parent_hash)
+            if child_row is None or parent_row is None or child_row == parent_row:
+                continue
+            if graph._parents[child_row] < 0:
+                graph._parents[child_row] = parent_row
+        return graph
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[QuipuNode]) -> "CompactHistoryGraph":
+        """从已构建的 QuipuNode 列表转换 (用于不提供列式加载的 reader)。"""
+        nodes = list(nodes)
+        rows = (
+            (n.commit_hash, n.output_tree, n.timestamp.timestamp(), n.node_type, n.summary, n.owner_id) for n in nodes
+        )
+        edges = [(n.commit_hash, n.parent.commit_hash) for n in nodes if n.parent is not None]
+        return cls.from_columns(rows, edges)
+
+    # --- 行与视图 ---
+
+    def _alive(self, row: int) -> bool:
+        return row not in self._deleted
+
+    def _row_of(self, commit_hash: str) -> Optional[int]:
+        """返回 commit_hash 对应的存活行号。"""
+        if self._rows is not None:
+            row = self._rows.get(commit_hash)
+        else:
+            self._ensure_sorted()
+            order = self._commit_order
+            pos = bisect.bisect_left(order, commit_hash, key=self._commits.__getitem__)
+            row = order[pos] if pos < len(order) and self._commits[order[pos]] == commit_hash else None
+        return row if row is not None and self._alive(row) else None
+
+    def _view_of(self, row: int) -> Optional[QuipuNode]:
+        if row < 0 or not self._alive(row):
+            return None
+        view = self._views.get(row)
+        if view is None:
+            view = self._views[row] = CompactNodeView(self, row)
+        return view
+
+    def _child_rows(self, row: int) -> List[int]:
+        if self._child_offsets is None:
+            self._build_children()
+        start, end = self._child_offsets[row], self._child_offsets[row + 1]
+        return [r for r in self._child_targets[start:end] if self._alive(r)]
+
+    def _build_children(self):
+        """构建 CSR 子节点邻接表，每个节点的子节点按时间戳排序。"""
+        count = len(self._commits)
+        offsets = array("i", [0]) * (count + 1)
+        for parent_row in self._parents:
+            if parent_row >= 0:
+                offsets[parent_row + 1] += 1
+        for i in range(count):
+            offsets[i + 1] += offsets[i]
+        targets = array("i", [0]) * offsets[count]
+        cursor = array("i", offsets[:count])
+        timestamps = self._timestamps
+        for row in sorted(range(count), key=timestamps.__getitem__):
+            parent_row = self._parents[row]
+            if parent_row >= 0:
+                targets[cursor[parent_row]] = row
+                cursor[parent_row] += 1
+        self._child_offsets, self._child_targets = offsets, targets
+
+    # --- 映射接口 ---
+
+    def __getitem__(self, commit_hash: str) -> QuipuNode:
+        if commit_hash in self._extra:
+            return self._extra[commit_hash]
+        row = self._row_of(commit_hash)
+        if row is None:
+            raise KeyError(commit_hash)
+        return self._view_of(row)
+
+    def __setitem__(self, commit_hash: str, node: QuipuNode):
+        row = self._row_of(commit_hash)
+        if row is not None:
+            self._delete_row(row)
+        self._extra[commit_hash] = node
+        # 记录附加节点与其父节点的关系，使父节点视图的 children 与可达性遍历能看到它
+        if node.parent is not None:
+            parent_hash = node.parent.commit_hash
+            siblings = self._extra_children.setdefault(parent_hash, [])
+            if commit_hash not in siblings:
+                siblings.append(commit_hash)
+            parent_row = self._row_of(parent_hash)
+            if parent_row is not None and parent_row in self._views:
+                self._views[parent_row]._children = None
+
+    def __delitem__(self, commit_hash: str):
+        if commit_hash in self._extra:
+            del self._extra[commit_hash]
+            return
+        row = self._row_of(commit_hash)
+        if row is None:
+            raise KeyError(commit_hash)
+        self._delete_row(row)
+
+    def _delete_row(self, row: int):
+        self._deleted.add(row)
+        self._views.pop(row, None)
+        if self._latest_row == row:
+            self._latest_valid = False
+
+    def __contains__(self, commit_hash: object) -> bool:
+        if commit_hash in self._extra:
+            return True
+        return isinstance(commit_hash, str) and self._row_of(commit_hash) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for row, commit_hash in enumerate(self._commits):
+            if self._alive(row):
+                yield commit_hash
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return len(self._commits) - len(self._deleted) + len(self._extra)
+
+    def clear(self):
+        self.__init__()
+
+    # --- 查询接口 (与 HistoryGraph 一致) ---
+
+    def _ensure_sorted(self):
+        if self._commit_order is None:
+            self._commit_order = sorted(range(len(self._commits)), key=self._commits.__getitem__)
+        if self._tree_order is None:
+            trees = self._output_trees
+            self._tree_order = sorted(range(len(trees)), key=lambda row: (trees[row], row))
+
+    def _tree_rows(self, output_tree: str) -> List[int]:
+        self._ensure_sorted()
+        trees = self._output_trees
+        order = self._tree_order
+        rows = []
+        for pos in range(bisect.bisect_left(order, output_tree, key=trees.__getitem__), len(order)):
+            row = order[pos]
+            if trees[row] != output_tree:
+                break
+            if self._alive(row):
+                rows.append(row)
+        return rows
+
+    def _prefix_rows(self, order: Sequence[int], column: Sequence[str], prefix: str) -> List[int]:
+        rows = []
+        for pos in range(bisect.bisect_left(order, prefix, key=column.__getitem__), len(order)):
+            row = order[pos]
+            if not column[row].startswith(prefix):
+                break
+            if self._alive(row):
+                rows.append(row)
+        return rows
+
+    def find_by_output_tree(self, output_tree: str) -> Optional[QuipuNode]:
+        """返回第一个 (最早插入的) output_tree 匹配的节点。"""
+        rows = self._tree_rows(output_tree)
+        return self._view_of(rows[0]) if rows else self._extra.find_by_output_tree(output_tree)
+
+    def nodes_by_output_tree(self, output_tree: str) -> List[QuipuNode]:
+        return [self._view_of(row) for row in self._tree_rows(output_tree)] + self._extra.nodes_by_output_tree(
+            output_tree
+        )
+
+    def find_by_commit_prefix(self, prefix: str) -> List[QuipuNode]:
+        """返回 commit_hash 以 prefix 开头的所有节点。"""
+        self._ensure_sorted()
+        rows = self._prefix_rows(self._commit_order, self._commits, prefix)
+        return [self._view_of(row) for row in rows] + self._extra.find_by_commit_prefix(prefix)
+
+    def find_by_output_tree_prefix(self, prefix: str) -> List[QuipuNode]:
+        """返回 output_tree 以 prefix 开头的所有节点，按插入顺序排列。"""
+        self._ensure_sorted()
+        rows = sorted(self._prefix_rows(self._tree_order, self._output_trees, prefix))
+        return [self._view_of(row) for row in rows] + self._extra.find_by_output_tree_prefix(prefix)
+
+    def find_by_prefix(self, prefix: str) -> List[QuipuNode]:
+        """返回 commit_hash 或 output_tree 以 prefix 开头的所有节点，按插入顺序排列且不重复。"""
+        self._ensure_sorted()
+        rows = set(self._prefix_rows(self._commit_order, self._commits, prefix))
+        rows.update(self._prefix_rows(self._tree_order, self._output_trees, prefix))
+        return [self._view_of(row) for row in sorted(rows)] + self._extra.find_by_prefix(prefix)
+
+    # 遍历时以行号 (int) 表示列式节点，以 commit_hash (str) 表示附加节点
+
+    def _key_of(self, commit_hash: str):
+        row = self._row_of(commit_hash)
+        if row is not None:
+            return row
+        return commit_hash if commit_hash in self._extra else None
+
+    def _tree_of(self, key) -> str:
+        return self._output_trees[key] if isinstance(key, int) else self._extra[key].output_tree
+
+    def _parent_key(self, key):
+        if isinstance(key, int):
+            row = self._parents[key]
+            return row if row >= 0 and self._alive(row) else None
+        parent = self._extra[key].parent
+        return self._key_of(parent.commit_hash) if parent is not None else None
+
+    def _child_keys(self, key) -> list:
+        commit_hash = self._commits[key] if isinstance(key, int) else key
+        keys = self._child_rows(key) if isinstance(key, int) else []
+        return keys + [c for c in self._extra_children.get(commit_hash, []) if c in self._extra]
+
+    def reachable_output_trees(self, output_tree: str) -> Set[str]:
+        """
+        返回与指定状态直接相关的 output_tree 集合 (祖先、后代以及它自身)。
+        直接在父节点数组与 CSR 邻接表上遍历，不物化任何 QuipuNode。
+        """
+        reachable = {output_tree}
+        rows = self._tree_rows(output_tree)
+        if rows:
+            start = rows[0]
+        else:
+            node = self._extra.find_by_output_tree(output_tree)
+            if node is None:
+                return reachable
+            start = node.commit_hash
+
+        key = self._parent_key(start)
+        while key is not None and self._tree_of(key) not in reachable:
+            reachable.add(self._tree_of(key))
+            key = self._parent_key(key)
+
+        stack = self._child_keys(start)
+        while stack:
+            key = stack.pop()
+            reachable.add(self._tree_of(key))
+            stack.extend(self._child_keys(key))
+        return reachable
+
+    def latest_node(self) -> Optional[QuipuNode]:
+        """返回时间戳最新的节点 (时间相同则取最先插入的)。"""
+        if not self._latest_valid:
+            timestamps = self._timestamps
+            alive = (row for row in range(len(self._commits)) if self._alive(row))
+            self._latest_row = max(alive, key=timestamps.__getitem__, default=None)
+            self._latest_valid = True
+        latest = self._view_of(self._latest_row) if self._latest_row is not None else None
+        extra = self._extra.latest_node()
+        if extra is not None and (latest is None or extra.timestamp > latest.timestamp):
+            return extra
+        return latest
@@ -1,7 +1,10 @@
 import json
 import logging
 import re
-from typing import Dict, List, Optional, Tuple
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
 from .git_db import GitDB
 from .git_object_storage import GitObjectHistoryReader  # Reuse parsing logic
@@ -30,13 +33,14 @@ class Hydrator:
             return local_user_id
         return None
 
-    def _get_commit_owners(self, local_user_id: str) -> Dict[str, str]:
+    def _get_commit_owners(
+        self, local_user_id: str, head_ref_tuples: List[Tuple[str, str]], log_map: Dict[str, Dict[str, str]]
+    ) -> Dict[str, str]:
         """
-        构建一个从 commit_hash 到 owner_id 的完整映射。
-        通过从每个分支末端向上遍历图来传播所有权。
+        构建一个从 commit_hash 到 owner_id 的映射。
+        通过从每个分支末端向上遍历图来传播所有权，遍历范围限定在 log_map 内。
         """
-        # 1. 获取所有分支末端 (heads) 及其直接所有者
-        head_ref_tuples = self.git_db.get_all_ref_heads("refs/quipu/")
+        # 1. 确定所有分支末端 (heads) 的直接所有者
         head_owners: Dict[str, str] = {}
         for commit_hash, ref_name in head_ref_tuples:
             # 优先级：远程所有者 > 本地所有者。避免本地 ref 覆盖正确的远程所有者。
@@ -50,13 +54,9 @@ class Hydrator:
         if not head_owners:
             return {}
 
-        # 2. 获取完整的历史图谱日志
-        all_git_logs = self.git_db.log_ref(list(head_owners.keys()))
-        log_map = {entry["hash"]: entry for entry in all_git_logs}
-
-        # 3. 从 Heads 开始，通过图遍历传播所有权
+        # 2. 从 Heads 开始，通过图遍历传播所有权
         final_commit_owners: Dict[str, str] = {}
-        queue = list(head_owners.keys())
+        queue = deque(head_owners.keys())
 
         # 将 head 节点预先填入，作为遍历的起点
         for commit_hash in queue:
@@ -65,7 +65,7 @@ class Hydrator:
         visited = set(head_owners.keys())
 
         while queue:
-            child_hash = queue.pop(0)
+            child_hash = queue.popleft()
             owner = final_commit_owners.get(child_hash)
             if not owner or child_hash not in log_map:
                 continue
@@ -82,29 +82,49 @@ class Hydrator:
     def sync(self, local_user_id: str):
         """
         执行增量补水操作。
-        此实现经过重构，以确保在从零重建时能够处理完整的历史图谱。
+
+        数据库中记录了上一次补水完成时的引用快照 (水位线)。引用未变化时直接返回；
+        否则只遍历发生变化的引用，并排除已知 heads 可达的历史 (`git log <new> --not <known>`)。
+        没有水位线时 (如首次补水或重建缓存后) 退化为完整遍历。
         """
         # --- 阶段 1: 发现 ---
-        all_ref_heads = [t[0] for t in self.git_db.get_all_ref_heads("refs/quipu/")]
-        if not all_ref_heads:
-            logger.debug("✅ Git 中未发现 Quipu 引用，无需补水。")
+        head_ref_tuples = self.git_db.get_all_ref_heads("refs/quipu/")
+        current_refs = {ref_name: commit_hash for commit_hash, ref_name in head_ref_tuples}
+        watermarks = self.db_manager.get_ref_watermarks()
+        if current_refs == watermarks:
+            logger.debug("✅ Quipu 引用自上次补水后未变化，无需补水。")
             return
 
-        all_git_logs = self.git_db.log_ref(all_ref_heads)
+        changed_heads = sorted({c for ref, c in current_refs.items() if watermarks.get(ref) != c})
+        if not changed_heads:
+            # 仅有引用被删除，已补水的节点保持不变
+            logger.debug("✅ Git 中未发现新的 Quipu 引用，无需补水。")
+            self.db_manager.save_ref_watermarks(current_refs)
+            return
+
+        # 已被回收的旧 head 不能作为排除端，否则 git log 会直接失败
+        known_heads = sorted(set(watermarks.values()))
+        if known_heads:
+            present = self.git_db.batch_check_objects(known_heads)
+            known_heads = [h for h in known_heads if present.get(h, ("",))[0] == "commit"]
+
+        all_git_logs = self.git_db.log_ref(changed_heads, exclude=known_heads)
         if not all_git_logs:
-            logger.debug("✅ Git 中未发现 Quipu 历史，无需补水。")
+            logger.debug("✅ Git 中未发现新的 Quipu 历史，无需补水。")
+            self.db_manager.save_ref_watermarks(current_refs)
             return
         log_map = {entry["hash"]: entry for entry in all_git_logs}
 
-        # 1.2 [FIXED] 构建一个覆盖所有历史节点的完整所有权地图
-        commit_owners = self._get_commit_owners(local_user_id)
+        # 1.2 构建一个覆盖本次遍历范围的所有权地图
+        commit_owners = self._get_commit_owners(local_user_id, head_ref_tuples, log_map)
 
-        # 1.3 计算需要插入的节点 (所有历史节点 - 已在数据库中的节点)
-        db_hashes = self.db_manager.get_all_node_hashes()
+        # 1.3 计算需要插入的节点 (本次遍历到的节点 - 已在数据库中的节点)
+        db_hashes = self.db_manager.get_existing_node_hashes(log_map.keys())
         missing_hashes = set(log_map.keys()) - db_hashes
 
         if not missing_hashes:
             logger.debug("✅ 数据库与 Git 历史一致，无需补水。")
+            self.db_manager.save_ref_watermarks(current_refs)
             return
 
         logger.info(f"发现 {len(missing_hashes)} 个需要补水的节点。")
@@ -162,15 +182,75 @@ class Hydrator:
                     )
                 )
                 for p_hash in log_entry["parent"].split():
-                    if p_hash in log_map:
-                        edges_to_insert.append((commit_hash, p_hash))
+                    edges_to_insert.append((commit_hash, p_hash))
             except (json.JSONDecodeError, KeyError) as e:
                 logger.error(f"解析 {commit_hash[:7]} 的元数据失败: {e}")
 
-        # --- 阶段 3: 批量写入数据库 ---
+        # 父节点可能在本次遍历范围之外 (已在之前补水)，只保留两端都会存在于数据库中的边
+        inserted = {row[0] for row in nodes_to_insert}
+        outside_parents = {p for _, p in edges_to_insert if p not in inserted}
+        known_parents = self.db_manager.get_existing_node_hashes(outside_parents)
+        edges_to_insert = [edge for edge in edges_to_insert if edge[1] in inserted or edge[1] in known_parents]
+
+        # --- 阶段 3: 批量写入数据库 (单个事务) ---
+        with self.db_manager.transaction():
+            if nodes_to_insert:
+                self.db_manager.batch_insert_nodes(nodes_to_insert)
+            if edges_to_insert:
+                self.db_manager.batch_insert_edges(edges_to_insert)
+            self.db_manager.label_nodes(inserted)
+            self.db_manager.save_ref_watermarks(current_refs)
         if nodes_to_insert:
-            self.db_manager.batch_insert_nodes(nodes_to_insert)
             logger.info(f"💧 {len(nodes_to_insert)} 个节点元数据已补水。")
         if edges_to_insert:
-            self.db_manager.batch_insert_edges(edges_to_insert)
             logger.info(f"💧 {len(edges_to_insert)} 条边关系已补水。")
+
+    def hydrate_content(self, batch_size: int = 1000) -> int:
+        """
+        批量回填所有节点的计划内容缓存 (plan_md_cache)。
+
+        与 SQLiteHistoryReader.get_node_content 逐个节点读取不同，这里每一批节点只需
+        三次批量读取 (commit -> tree -> content.md)，全部经由同一个 cat-file 流完成，
+        并在单个事务中写回。返回本次回填的节点数量。
+        """
+        conn = self.db_manager._get_conn()
+        cold = [row[0] for row in conn.execute("SELECT commit_hash FROM nodes WHERE plan_md_cache IS NULL;")]
+        if not cold:
+            logger.debug("✅ 所有节点的内容缓存均已就绪。")
+            return 0
+
+        filled = 0
+        with self.db_manager.transaction():
+            for i in range(0, len(cold), batch_size):
+                updates = self._read_contents(cold[i : i + batch_size])
+                conn.executemany("UPDATE nodes SET plan_md_cache = ? WHERE commit_hash = ?", updates)
+                filled += len(updates)
+        logger.info(f"📄 {filled} 个节点的内容缓存已回填。")
+        return filled
+
+    def _read_contents(self, commit_hashes: List[str]) -> List[Tuple[str, str]]:
+        """批量读取一组节点的 content.md，返回 (content, commit_hash) 列表。"""
+        return [(content, commit_hash) for commit_hash, content in self._parser.read_contents(commit_hashes).items()]
+
+
+def hydrate_content_in_background(root_dir: Path, profile: Optional[Dict[str, Any]] = None) -> threading.Thread:
+    """
+    在后台守护线程中回填内容缓存。
+    线程使用独立的 GitDB 与数据库连接，不与调用方共享任何非线程安全的资源；
+    进程提前退出时未提交的事务会被 SQLite 自动丢弃，下次再继续。
+    """
+
+    def worker():
+        git_db = GitDB(root_dir)
+        db_manager = DatabaseManager(root_dir, profile=profile)
+        try:
+            Hydrator(git_db, db_manager).hydrate_content()
+        except Exception as e:
+            logger.warning(f"后台内容回填失败: {e}")
+        finally:
+            db_manager.close()
+            git_db.close()
+
+    thread = threading.Thread(target=worker, name="quipu-content-hydration", daemon=True)
+    thread.start()
+    return thread
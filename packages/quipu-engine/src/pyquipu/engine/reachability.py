@@ -0,0 +1,217 @@
+"""
+历史图谱的区间标号 (Interval Labeling)，用于 O(1) 的祖先判断与按区间扫描的祖先/后代查询。
+
+Quipu 的历史是一片森林 (每个节点至多一个父节点)。每个节点被分配一个整数区间 [lo, hi]，
+子节点的区间严格嵌套在父节点的区间之内，兄弟节点的区间互不相交。于是:
+
+- a 是 b 的祖先  <=>  a.root == b.root 且 a.lo < b.lo <= a.hi
+- a 的后代       =   同一棵树中 lo 落在 (a.lo, a.hi] 内的节点
+- b 的祖先       =   同一棵树中 lo < b.lo 且 hi >= b.lo 的节点
+
+区间之间预留了空隙 (gap)，新节点总是作为叶子追加，因此可以在父节点的剩余空间中
+就地分配，而无需改动已有标号。
+
+把每个节点的 lo 与 hi 看作两个标记，一棵树的所有标记构成一个有序序列；追加子节点就是在
+父节点的 hi 之前插入两个相邻的标记 (next_free - 1 始终是 hi 的前一个标记)。父节点的
+剩余空间耗尽时，按顺序维护 (order maintenance) 的做法，只把插入点周围足够稀疏的一段
+对齐标号区间内的标记均匀重排，重排的代价按摊还计算与树的深度和规模无关。
+只有数据库升级等情况才会对整个森林按子树规模重新标号。
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 每棵树的标号空间 [0, LABEL_SPACE)，保证落在 SQLite 的 64 位整数范围内
+LABEL_BITS = 62
+LABEL_SPACE = 1 << LABEL_BITS
+
+# 局部重排的密度阈值：大小为 2^k 的区间最多容纳 2^k / DENSITY^k 个标记。
+# 区间越大允许的密度越低，重排后留下的空隙足以吸收与区间规模相称的后续插入
+DENSITY = 1.5
+
+# 重新标号时的空间预留 (以"单位"计)。叶子是链式增长最集中的位置，因此预留得更多。
+LEAF_UNITS = 16
+NODE_UNITS = 2
+
+# (root_hash, lo, hi, next_free)，next_free 是父节点剩余空间中下一个可分配的位置
+Label = Tuple[str, int, int, int]
+
+
+def root_label(commit_hash: str) -> Label:
+    """为一个新的根节点生成标号，占据整个标号空间。"""
+    return (commit_hash, 0, LABEL_SPACE - 1, 1)
+
+
+def allocate_child(parent: Label) -> Optional[Tuple[Label, Label]]:
+    """
+    在父节点的剩余空间中为一个新的子节点分配区间。
+
+    新子节点取走剩余空间的 15/16，其余留给之后的兄弟节点。
+    这样一条线性链每向下一层只消耗约 0.1 bit 的标号空间。
+
+    Returns:
+        (子节点标号, 更新后的父节点标号)；剩余空间不足时返回 None。
+    """
+    root, lo, hi, next_free = parent
+    # 子节点的两个标记都必须严格位于父节点的 hi 之前
+    free = hi - next_free
+    if free < 2:
+        return None
+    width = max(2, free - free // 16)
+    child = (root, next_free, next_free + width - 1, next_free + 1)
+    return child, (root, lo, hi, next_free + width)
+
+
+# (标号, 是否为 hi 标记, commit_hash)
+Token = Tuple[int, bool, str]
+
+
+def range_is_sparse(count: int, bits: int) -> bool:
+    """count 个标记放入大小为 2^bits 的区间后是否足够稀疏，可以在其中均匀重排。"""
+    size = 1 << bits
+    return count * DENSITY**bits <= size and size // (count + 1) >= 2
+
+
+def relabel_tokens(
+    tokens: List[Token], after: int, child: str, base: int, end: int
+) -> Tuple[List[Token], Dict[str, int]]:
+    """
+    在 [base, end) 内将 tokens (按标号排序) 连同新子节点的两个标记一起均匀重排。
+
+    Args:
+        tokens: 区间内已有的全部标记。
+        after: 新子节点的两个标记紧跟在标号为 after 的标记 (父节点 hi 的前一个标记) 之后。
+        child: 新子节点。
+
+    Returns:
+        (重排后的标记, {节点: 新的 next_free})。hi 标记的前一个标记也在区间内时，
+        该节点的 next_free 随之更新；区间之外紧随其后的 hi 标记由调用方处理。
+    """
+    ordered: List[Tuple[bool, str]] = []
+    inserted = False
+    for label, is_hi, commit_hash in tokens:
+        ordered.append((is_hi, commit_hash))
+        if label == after and not inserted:
+            ordered.extend(((False, child), (True, child)))
+            inserted = True
+    step = (end - base) // (len(ordered) + 1)
+    relabeled = [(base + (k + 1) * step, is_hi, commit_hash) for k, (is_hi, commit_hash) in enumerate(ordered)]
+    next_free = {cur[2]: prev[0] + 1 for prev, cur in zip(relabeled, relabeled[1:]) if cur[1]}
+    return relabeled, next_free
+
+
+def parent_first(nodes: Iterable[str], parent_of: Dict[str, Optional[str]]) -> List[str]:
+    """将一批节点排列为父节点先于子节点的顺序 (只考虑批次内部的父子关系)。"""
+    batch = list(dict.fromkeys(nodes))
+    batch_set = set(batch)
+    children: Dict[str, List[str]] = {}
+    starts: List[str] = []
+    for commit_hash in batch:
+        parent_hash = parent_of.get(commit_hash)
+        if parent_hash in batch_set and parent_hash != commit_hash:
+            children.setdefault(parent_hash, []).append(commit_hash)
+        else:
+            starts.append(commit_hash)
+
+    ordered: List[str] = []
+    stack = list(reversed(starts))
+    while stack:
+        commit_hash = stack.pop()
+        ordered.append(commit_hash)
+        stack.extend(reversed(children.get(commit_hash, [])))
+    return ordered
+
+
+def compute_labels(
+    parent_of: Dict[str, Optional[str]], order_key: Optional[Dict[str, float]] = None
+) -> Dict[str, Label]:
+    """
+    为整个森林重新计算标号。
+
+    Args:
+        parent_of: {commit_hash: parent_hash}，根节点的 parent_hash 为 None。
+                   父节点不在字典中的节点同样视为根节点。
+        order_key: 可选的兄弟节点排序键 (通常是时间戳)，使标号与插入顺序一致。
+
+    每个节点按其子树规模获得正比例的区间，并在子节点之后预留空隙供未来追加。
+    """
+    children: Dict[str, List[str]] = {}
+    roots: List[str] = []
+    for commit_hash, parent_hash in parent_of.items():
+        if parent_hash is None or parent_hash == commit_hash or parent_hash not in parent_of:
+            roots.append(commit_hash)
+        else:
+            children.setdefault(parent_hash, []).append(commit_hash)
+
+    if order_key:
+        for siblings in children.values():
+            siblings.sort(key=lambda h: (order_key.get(h, 0.0), h))
+
+    # 1. 后序遍历计算子树规模 (单位数)
+    units: Dict[str, int] = {}
+    for root in roots:
+        stack = [(root, False)]
+        while stack:
+            commit_hash, expanded = stack.pop()
+            kids = children.get(commit_hash, [])
+            if not expanded:
+                stack.append((commit_hash, True))
+                stack.extend((kid, False) for kid in kids)
+            else:
+                units[commit_hash] = NODE_UNITS + (sum(units[k] for k in kids) if kids else LEAF_UNITS)
+
+    # 2. 先序遍历分配区间
+    labels: Dict[str, Label] = {}
+    for root in roots:
+        unit = LABEL_SPACE // units[root]
+        stack = [(root, 0, LABEL_SPACE - 1)]
+        while stack:
+            commit_hash, lo, hi = stack.pop()
+            pos = lo + 1
+            placed = []
+            for kid in children.get(commit_hash, []):
+                width = units[kid] * unit
+                placed.append((kid, pos, pos + width - 1))
+                pos += width
+            labels[commit_hash] = (root, lo, hi, pos)
+            stack.extend(reversed(placed))
+    return labels
+
+
+def assign_labels(
+    new_nodes: Iterable[str],
+    parent_of: Dict[str, Optional[str]],
+    known: Dict[str, Label],
+) -> Optional[Tuple[Dict[str, Label], Dict[str, Label]]]:
+    """
+    为一批新追加的节点增量分配标号，父节点先于子节点处理。
+
+    Args:
+        new_nodes: 待标号的节点。
+        parent_of: 新节点到其父节点的映射 (无父节点时为 None 或缺省)。
+        known: 批次之外的父节点已有的标号。
+
+    Returns:
+        (新节点标号, 剩余空间发生变化的已有节点标号)；
+        当某个父节点缺少标号或剩余空间耗尽时返回 None，调用方应逐个插入并在需要时局部重排。
+    """
+    labels = dict(known)
+    assigned: Dict[str, Label] = {}
+    touched: Dict[str, Label] = {}
+    for commit_hash in parent_first(new_nodes, parent_of):
+        parent_hash = parent_of.get(commit_hash)
+        if parent_hash is None or parent_hash == commit_hash:
+            label = root_label(commit_hash)
+        else:
+            parent_label = labels.get(parent_hash)
+            if parent_label is None:
+                return None
+            allocated = allocate_child(parent_label)
+            if allocated is None:
+                return None
+            label, labels[parent_hash] = allocated
+            if parent_hash in assigned:
+                assigned[parent_hash] = labels[parent_hash]
+            else:
+                touched[parent_hash] = labels[parent_hash]
+        labels[commit_hash] = assigned[commit_hash] = label
+    return assigned, touched
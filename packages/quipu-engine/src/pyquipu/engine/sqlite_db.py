@@ -1,35 +1,141 @@
+import functools
 import logging
+import re
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Set, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .reachability import (
+    LABEL_BITS,
+    LABEL_SPACE,
+    Label,
+    Token,
+    allocate_child,
+    assign_labels,
+    compute_labels,
+    parent_first,
+    range_is_sparse,
+    relabel_tokens,
+    root_label,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# 连接调优参数的默认值，可通过 .quipu/config.yml 中的 storage.sqlite 逐项覆盖
+DEFAULT_PROFILE: Dict[str, Any] = {
+    # WAL 模式下读者不会被写者阻塞，TUI 可以在 `quipu run` 写入时继续读取
+    "journal_mode": "wal",
+    # WAL 下 NORMAL 仍能保证数据库一致性，仅在断电时可能丢失最近的提交 (可由补水恢复)
+    "synchronous": "normal",
+    "cache_size": -16000,  # 负值单位为 KiB
+    "mmap_size": 268435456,
+    "temp_store": "memory",
+    "busy_timeout": 5000,  # 毫秒，等待其他进程释放写锁
+    "statement_cache_size": 128,  # 预编译语句缓存
+}
+
+# 全文索引覆盖的 nodes 列
+FTS_COLUMNS = ("summary", "plan_md_cache", "meta_json")
+
+# 直接作为 PRAGMA 设置的参数 (其余参数在连接时使用)
+_PRAGMA_KEYS = ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store")
+_PRAGMA_VALUE_RE = re.compile(r"^-?[A-Za-z0-9_]+$")
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_regex(pattern: str) -> "re.Pattern[str]":
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _regexp(pattern: str, value: Optional[str]) -> bool:
+    """SQL 函数 REGEXP 的实现 (`value REGEXP pattern`)，不区分大小写。"""
+    return value is not None and _compile_regex(pattern).search(value) is not None
+
+
 class DatabaseManager:
     """
     管理 SQLite 数据库连接和 Schema。
     """
 
-    def __init__(self, work_dir: Path):
+    def __init__(self, work_dir: Path, profile: Optional[Dict[str, Any]] = None):
         self.db_path = work_dir / ".quipu" / "history.sqlite"
         self.db_path.parent.mkdir(exist_ok=True)
+        self.profile: Dict[str, Any] = {**DEFAULT_PROFILE, **(profile or {})}
         self._conn: Optional[sqlite3.Connection] = None
+        self._tx_depth = 0
+        self._fts_tokenizer: Optional[str] = None
+        self._fts_checked = False
 
     def _get_conn(self) -> sqlite3.Connection:
         """获取数据库连接，如果不存在则创建。"""
         if self._conn is None:
             try:
-                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._conn = sqlite3.connect(
+                    self.db_path,
+                    check_same_thread=False,
+                    timeout=int(self.profile["busy_timeout"]) / 1000,
+                    cached_statements=int(self.profile["statement_cache_size"]),
+                    # 自动提交模式: 事务边界由 transaction() 显式管理
+                    isolation_level=None,
+                )
                 self._conn.row_factory = sqlite3.Row
                 # 开启外键约束
                 self._conn.execute("PRAGMA foreign_keys = ON;")
+                # 标准 SQLite 不提供 REGEXP 的实现，由 Python 注册
+                self._conn.create_function("REGEXP", 2, _regexp, deterministic=True)
+                self._apply_profile(self._conn)
                 logger.debug(f"🗃️  成功连接到数据库: {self.db_path}")
             except sqlite3.Error as e:
                 logger.error(f"❌ 数据库连接失败: {e}")
                 raise
         return self._conn
 
+    def _apply_profile(self, conn: sqlite3.Connection):
+        """将调优参数应用到连接上。单项失败不影响连接可用性。"""
+        for key in _PRAGMA_KEYS:
+            value = self.profile.get(key)
+            if value is None:
+                continue
+            if not _PRAGMA_VALUE_RE.match(str(value)):
+                logger.warning(f"⚠️  忽略无效的 SQLite 参数: {key} = {value!r}")
+                continue
+            try:
+                conn.execute(f"PRAGMA {key} = {value};")
+            except sqlite3.Error as e:
+                # 例如文件系统不支持 WAL 所需的共享内存
+                logger.debug(f"设置 PRAGMA {key} = {value} 失败: {e}")
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        在单个写事务中执行一组写操作，退出时统一提交，异常时回滚。
+        可以嵌套使用，只有最外层负责提交。
+        """
+        conn = self._get_conn()
+        if self._tx_depth:
+            self._tx_depth += 1
+            try:
+                yield conn
+            finally:
+                self._tx_depth -= 1
+            return
+
+        # IMMEDIATE: 事务开始即获取写锁，避免读锁升级时因其他写者而失败
+        conn.execute("BEGIN IMMEDIATE;")
+        self._tx_depth = 1
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+            raise
+        else:
+            conn.execute("COMMIT;")
+        finally:
+            self._tx_depth = 0
+
     def close(self):
         """关闭数据库连接。"""
         if self._conn:
@@ -46,9 +152,8 @@ class DatabaseManager:
         初始化数据库 Schema，如果表不存在则创建。
         符合 QLDS v1.0 规范。
         """
-        conn = self._get_conn()
         try:
-            with conn:
+            with self.transaction() as conn:
                 # nodes 表
                 conn.execute(
                     """
@@ -68,6 +173,8 @@ class DatabaseManager:
                 # 索引
                 conn.execute("CREATE INDEX IF NOT EXISTS IDX_nodes_timestamp ON nodes(timestamp);")
                 conn.execute("CREATE INDEX IF NOT EXISTS IDX_nodes_output_tree ON nodes(output_tree);")
+                # 游标分页的排序键 (timestamp, commit_hash)，同时作为定位页边界的覆盖索引
+                conn.execute("CREATE INDEX IF NOT EXISTS IDX_nodes_timestamp_commit ON nodes(timestamp, commit_hash);")
 
                 # edges 表
                 conn.execute(
@@ -95,16 +202,98 @@ class DatabaseManager:
                     );
                     """
                 )
+                # ref_watermarks 表: 上一次补水完成时的 Quipu 引用快照 (ref -> commit)
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS ref_watermarks (
+                        ref_name TEXT PRIMARY KEY,
+                        commit_hash TEXT(40) NOT NULL
+                    );
+                    """
+                )
+                self._init_fts(conn)
+                self._init_intervals(conn)
             logger.debug("✅ 数据库 Schema 已初始化/验证。")
         except sqlite3.Error as e:
             logger.error(f"❌ 初始化 Schema 失败: {e}")
             raise
 
+    def _init_fts(self, conn: sqlite3.Connection):
+        """
+        创建 nodes 的 FTS5 外部内容索引及同步触发器。
+        所有对 nodes 的写入 (Writer 的双写、Hydrator 的补水、内容缓存回填) 都由触发器同步到索引。
+        优先使用 trigram 分词器以支持子串与中文检索；SQLite 未编译 FTS5 时静默降级为 LIKE 检索。
+        """
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'nodes_fts'").fetchone() is not None
+        if not exists:
+            columns = ", ".join(FTS_COLUMNS)
+            for tokenizer in ("trigram", "unicode61"):
+                try:
+                    conn.execute(
+                        f"CREATE VIRTUAL TABLE nodes_fts USING fts5({columns}, "
+                        f"content='nodes', content_rowid='rowid', tokenize='{tokenizer}');"
+                    )
+                    break
+                except sqlite3.OperationalError as e:
+                    logger.debug(f"无法使用 {tokenizer} 分词器创建全文索引: {e}")
+            else:
+                self._fts_tokenizer, self._fts_checked = None, True
+                return
+
+        new_values = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+        old_values = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+        columns = ", ".join(FTS_COLUMNS)
+        delete_old = f"INSERT INTO nodes_fts(nodes_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});"
+        insert_new = f"INSERT INTO nodes_fts(rowid, {columns}) VALUES (new.rowid, {new_values});"
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS nodes_fts_ai AFTER INSERT ON nodes BEGIN {insert_new} END;")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS nodes_fts_ad AFTER DELETE ON nodes BEGIN {delete_old} END;")
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS nodes_fts_au AFTER UPDATE OF {columns} ON nodes "
+            f"BEGIN {delete_old} {insert_new} END;"
+        )
+        if not exists:
+            # 为已有数据建立索引 (从旧版本升级的数据库)
+            conn.execute("INSERT INTO nodes_fts(nodes_fts) VALUES ('rebuild');")
+        self._fts_checked = False
+
+    def _init_intervals(self, conn: sqlite3.Connection):
+        """
+        创建 node_intervals 表，保存每个节点的可达性区间标号 (见 reachability 模块)。
+        标号由 Writer 与 Hydrator 在写入节点的同一事务中增量维护。
+        """
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'node_intervals'").fetchone() is not None
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS node_intervals (
+                commit_hash TEXT(40) PRIMARY KEY,
+                root_hash TEXT(40) NOT NULL,
+                lo INTEGER NOT NULL,
+                hi INTEGER NOT NULL,
+                next_free INTEGER NOT NULL,
+                FOREIGN KEY (commit_hash) REFERENCES nodes(commit_hash) ON DELETE CASCADE
+            );
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS IDX_node_intervals_root_lo ON node_intervals(root_hash, lo);")
+        conn.execute("CREATE INDEX IF NOT EXISTS IDX_node_intervals_root_hi ON node_intervals(root_hash, hi);")
+        if not exists:
+            # 为已有数据建立标号 (从旧版本升级的数据库)
+            self.rebuild_intervals()
+
+    @property
+    def fts_tokenizer(self) -> Optional[str]:
+        """全文索引使用的分词器 ('trigram' 或 'unicode61')；全文索引不可用时为 None。"""
+        if not self._fts_checked:
+            row = self._get_conn().execute("SELECT sql FROM sqlite_master WHERE name = 'nodes_fts'").fetchone()
+            match = re.search(r"tokenize\s*=\s*'(\w+)", row[0]) if row else None
+            self._fts_tokenizer = match.group(1) if match else None
+            self._fts_checked = True
+        return self._fts_tokenizer
+
     def execute_write(self, sql: str, params: tuple = ()):
         """执行写操作的通用方法。"""
-        conn = self._get_conn()
         try:
-            with conn:
+            with self.transaction() as conn:
                 conn.execute(sql, params)
         except sqlite3.Error as e:
             logger.error(f"❌ 数据库写入失败: {e} | SQL: {sql}")
@@ -120,16 +309,51 @@ class DatabaseManager:
             logger.error(f"❌ 查询节点哈希失败: {e}")
             return set()
 
+    def get_existing_node_hashes(self, commit_hashes: Iterable[str]) -> Set[str]:
+        """返回给定 commit_hash 中已存在于数据库的那一部分。"""
+        conn = self._get_conn()
+        hashes = list(commit_hashes)
+        found: Set[str] = set()
+        try:
+            # 分批查询，避免超出 SQLite 的参数数量上限
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = conn.execute(f"SELECT commit_hash FROM nodes WHERE commit_hash IN ({placeholders});", chunk)
+                found.update(row[0] for row in cursor.fetchall())
+        except sqlite3.Error as e:
+            logger.error(f"❌ 查询节点哈希失败: {e}")
+        return found
+
+    def get_ref_watermarks(self) -> Dict[str, str]:
+        """获取上一次补水完成时记录的引用快照 {ref_name: commit_hash}。"""
+        conn = self._get_conn()
+        try:
+            cursor = conn.execute("SELECT ref_name, commit_hash FROM ref_watermarks;")
+            return {row[0]: row[1] for row in cursor.fetchall()}
+        except sqlite3.Error as e:
+            logger.error(f"❌ 查询引用水位线失败: {e}")
+            return {}
+
+    def save_ref_watermarks(self, refs: Dict[str, str]):
+        """用给定的引用快照整体替换已记录的水位线。"""
+        try:
+            with self.transaction() as conn:
+                conn.execute("DELETE FROM ref_watermarks;")
+                conn.executemany("INSERT INTO ref_watermarks (ref_name, commit_hash) VALUES (?, ?)", refs.items())
+        except sqlite3.Error as e:
+            logger.error(f"❌ 保存引用水位线失败: {e}")
+            raise
+
     def batch_insert_nodes(self, nodes: List[Tuple]):
         """批量插入节点。"""
-        conn = self._get_conn()
         sql = """
             INSERT OR IGNORE INTO nodes 
             (commit_hash, owner_id, output_tree, node_type, timestamp, summary, generator_id, meta_json, plan_md_cache)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         try:
-            with conn:
+            with self.transaction() as conn:
                 conn.executemany(sql, nodes)
         except sqlite3.Error as e:
             logger.error(f"❌ 批量插入节点失败: {e}")
@@ -137,11 +361,203 @@ class DatabaseManager:
 
     def batch_insert_edges(self, edges: List[Tuple]):
         """批量插入边。"""
-        conn = self._get_conn()
         sql = "INSERT OR IGNORE INTO edges (child_hash, parent_hash) VALUES (?, ?)"
         try:
-            with conn:
+            with self.transaction() as conn:
                 conn.executemany(sql, edges)
         except sqlite3.Error as e:
             logger.error(f"❌ 批量插入边失败: {e}")
             raise
+
+    def get_interval(self, commit_hash: str) -> Optional[Tuple[str, int, int]]:
+        """获取节点的区间标号 (root_hash, lo, hi)；节点未标号时返回 None。"""
+        conn = self._get_conn()
+        row = conn.execute(
+            "SELECT root_hash, lo, hi FROM node_intervals WHERE commit_hash = ?;", (commit_hash,)
+        ).fetchone()
+        return (row[0], row[1], row[2]) if row else None
+
+    def rebuild_intervals(self):
+        """按子树规模为所有节点重新计算区间标号。"""
+        try:
+            with self.transaction() as conn:
+                order_key = {row[0]: row[1] for row in conn.execute("SELECT commit_hash, timestamp FROM nodes;")}
+                parent_of: Dict[str, Optional[str]] = dict.fromkeys(order_key)
+                # 与 load_all_nodes 一致: 存在多个父节点时取最先写入的、指向已有节点的那条边
+                cursor = conn.execute("SELECT child_hash, parent_hash FROM edges ORDER BY rowid;")
+                for child_hash, parent_hash in cursor:
+                    if (
+                        child_hash in parent_of
+                        and parent_of[child_hash] is None
+                        and parent_hash in parent_of
+                        and parent_hash != child_hash
+                    ):
+                        parent_of[child_hash] = parent_hash
+                labels = compute_labels(parent_of, order_key)
+                conn.execute("DELETE FROM node_intervals;")
+                conn.executemany(
+                    "INSERT INTO node_intervals (commit_hash, root_hash, lo, hi, next_free) VALUES (?, ?, ?, ?, ?)",
+                    ((h, *label) for h, label in labels.items()),
+                )
+            logger.debug(f"🔢 已为 {len(labels)} 个节点重建可达性标号。")
+        except sqlite3.Error as e:
+            logger.error(f"❌ 重建可达性标号失败: {e}")
+            raise
+
+    def label_nodes(self, commit_hashes: Iterable[str]):
+        """
+        为新写入的节点增量分配区间标号，应在写入节点与边的同一事务中调用。
+        已有标号的节点会被跳过；父节点空间耗尽时只重排插入点附近的一段标号。
+        """
+        hashes = list(commit_hashes)
+        if not hashes:
+            return
+        try:
+            with self.transaction() as conn:
+                parent_of: Dict[str, Optional[str]] = {}
+                labeled: Set[str] = set()
+                for i in range(0, len(hashes), 500):
+                    chunk = hashes[i : i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    # 与 load_all_nodes 一致: 取最先写入的、指向已有节点的那条边
+                    cursor = conn.execute(
+                        f"SELECT e.child_hash, e.parent_hash FROM edges e "
+                        f"JOIN nodes p ON p.commit_hash = e.parent_hash "
+                        f"WHERE e.child_hash IN ({placeholders}) AND e.child_hash != e.parent_hash "
+                        f"ORDER BY e.rowid;",
+                        chunk,
+                    )
+                    for child_hash, parent_hash in cursor:
+                        parent_of.setdefault(child_hash, parent_hash)
+                    cursor = conn.execute(
+                        f"SELECT commit_hash FROM node_intervals WHERE commit_hash IN ({placeholders});", chunk
+                    )
+                    labeled.update(row[0] for row in cursor)
+
+                pending = [h for h in hashes if h not in labeled]
+                if not pending:
+                    return
+                pending_set = set(pending)
+                outside = list({p for h, p in parent_of.items() if h in pending_set and p not in pending_set})
+                known = {}
+                for i in range(0, len(outside), 500):
+                    chunk = outside[i : i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor = conn.execute(
+                        f"SELECT commit_hash, root_hash, lo, hi, next_free FROM node_intervals "
+                        f"WHERE commit_hash IN ({placeholders});",
+                        chunk,
+                    )
+                    known.update((row[0], tuple(row[1:])) for row in cursor)
+
+                result = assign_labels(pending, parent_of, known)
+                if result is None:
+                    # 有父节点的空间已耗尽: 逐个插入，必要时局部重排
+                    for commit_hash in parent_first(pending, parent_of):
+                        if not self._insert_label(conn, commit_hash, parent_of.get(commit_hash)):
+                            self.rebuild_intervals()
+                            return
+                    return
+                assigned, touched = result
+                conn.executemany(
+                    "INSERT INTO node_intervals (commit_hash, root_hash, lo, hi, next_free) VALUES (?, ?, ?, ?, ?)",
+                    ((h, *label) for h, label in assigned.items()),
+                )
+                conn.executemany(
+                    "UPDATE node_intervals SET next_free = ? WHERE commit_hash = ?",
+                    ((label[3], h) for h, label in touched.items()),
+                )
+        except sqlite3.Error as e:
+            logger.error(f"❌ 分配可达性标号失败: {e}")
+            raise
+
+    def _insert_label(self, conn: sqlite3.Connection, commit_hash: str, parent_hash: Optional[str]) -> bool:
+        """为单个节点分配标号。父节点没有标号时返回 False。"""
+        if parent_hash is None:
+            label = root_label(commit_hash)
+        else:
+            row = conn.execute(
+                "SELECT root_hash, lo, hi, next_free FROM node_intervals WHERE commit_hash = ?;", (parent_hash,)
+            ).fetchone()
+            if row is None:
+                return False
+            parent_label: Label = tuple(row)
+            allocated = allocate_child(parent_label)
+            if allocated is None:
+                self._relabel_range(conn, commit_hash, parent_label)
+                return True
+            label, parent_label = allocated
+            conn.execute(
+                "UPDATE node_intervals SET next_free = ? WHERE commit_hash = ?", (parent_label[3], parent_hash)
+            )
+        conn.execute(
+            "INSERT INTO node_intervals (commit_hash, root_hash, lo, hi, next_free) VALUES (?, ?, ?, ?, ?)",
+            (commit_hash, *label),
+        )
+        return True
+
+    def _relabel_range(self, conn: sqlite3.Connection, commit_hash: str, parent_label: Label):
+        """
+        父节点空间耗尽时插入子节点: 找到包含插入点的最小的足够稀疏的对齐区间，
+        将其中的标记连同新节点的两个标记均匀重排。区间之外的标号保持不变。
+        """
+        root_hash, _, _, next_free = parent_label
+        after = next_free - 1
+        base, end = 0, LABEL_SPACE
+        for bits in range(1, LABEL_BITS + 1):
+            lo, hi = (after >> bits) << bits, ((after >> bits) + 1) << bits
+            (count,) = conn.execute(
+                "SELECT (SELECT COUNT(*) FROM node_intervals WHERE root_hash = ? AND lo >= ? AND lo < ?)"
+                " + (SELECT COUNT(*) FROM node_intervals WHERE root_hash = ? AND hi >= ? AND hi < ?);",
+                (root_hash, lo, hi, root_hash, lo, hi),
+            ).fetchone()
+            if range_is_sparse(count + 2, bits):
+                base, end = lo, hi
+                break
+
+        tokens: List[Token] = [
+            (row[0], False, row[1])
+            for row in conn.execute(
+                "SELECT lo, commit_hash FROM node_intervals WHERE root_hash = ? AND lo >= ? AND lo < ?;",
+                (root_hash, base, end),
+            )
+        ]
+        tokens.extend(
+            (row[0], True, row[1])
+            for row in conn.execute(
+                "SELECT hi, commit_hash FROM node_intervals WHERE root_hash = ? AND hi >= ? AND hi < ?;",
+                (root_hash, base, end),
+            )
+        )
+        tokens.sort()
+        relabeled, next_free_updates = relabel_tokens(tokens, after, commit_hash, base, end)
+
+        # 紧随区间之后的若是某个节点的 hi 标记，它的前一个标记已被重排
+        following = conn.execute(
+            "SELECT commit_hash, hi FROM node_intervals WHERE root_hash = ? AND hi >= ? ORDER BY hi LIMIT 1;",
+            (root_hash, end),
+        ).fetchone()
+        (next_lo,) = conn.execute(
+            "SELECT MIN(lo) FROM node_intervals WHERE root_hash = ? AND lo >= ?;", (root_hash, end)
+        ).fetchone()
+        if following is not None and (next_lo is None or following[1] < next_lo):
+            next_free_updates[following[0]] = relabeled[-1][0] + 1
+
+        child_lo, child_hi = [label for label, _, h in relabeled if h == commit_hash]
+        conn.execute(
+            "INSERT INTO node_intervals (commit_hash, root_hash, lo, hi, next_free) VALUES (?, ?, ?, ?, ?)",
+            (commit_hash, root_hash, child_lo, child_hi, child_lo + 1),
+        )
+        conn.executemany(
+            "UPDATE node_intervals SET hi = ? WHERE commit_hash = ?",
+            ((label, h) for label, is_hi, h in relabeled if is_hi and h != commit_hash),
+        )
+        conn.executemany(
+            "UPDATE node_intervals SET lo = ? WHERE commit_hash = ?",
+            ((label, h) for label, is_hi, h in relabeled if not is_hi and h != commit_hash),
+        )
+        conn.executemany(
+            "UPDATE node_intervals SET next_free = ? WHERE commit_hash = ?",
+            ((label, h) for h, label in next_free_updates.items()),
+        )
+        logger.debug(f"🔢 局部重排了 {len(relabeled)} 个可达性标记。")
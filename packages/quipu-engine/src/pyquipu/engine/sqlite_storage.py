@@ -1,15 +1,17 @@
 import json
 import logging
+import re
 import sqlite3
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, Iterator, List, Optional, Set
 
 from pyquipu.engine.git_object_storage import GitObjectHistoryReader, GitObjectHistoryWriter
 from pyquipu.interfaces.models import QuipuNode
 from pyquipu.interfaces.storage import HistoryReader, HistoryWriter
 
 from .git_db import GitDB
+from .history_graph import CompactHistoryGraph
 from .sqlite_db import DatabaseManager
 
 logger = logging.getLogger(__name__)
@@ -54,7 +56,8 @@ class SQLiteHistoryReader(HistoryReader):
             temp_nodes[commit_hash] = node
 
         # 2. 一次性获取所有边关系
-        edges_cursor = conn.execute("SELECT child_hash, parent_hash FROM edges;")
+        # 存在多个父节点时保留最先写入的、指向已有节点的那条边 (与区间标号的规则一致)
+        edges_cursor = conn.execute("SELECT child_hash, parent_hash FROM edges ORDER BY rowid;")
         edges_data = edges_cursor.fetchall()
 
         # 3. 在内存中构建图
@@ -90,6 +93,109 @@ class SQLiteHistoryReader(HistoryReader):
 
         return list(temp_nodes.values())
 
+    def load_compact_graph(self) -> CompactHistoryGraph:
+        """
+        以列式方式加载完整图谱，不为每个节点创建 QuipuNode。
+        节点内容不随图谱加载，由 get_node_content 按需从缓存读取。
+        """
+        conn = self.db_manager._get_conn()
+        rows = conn.execute("SELECT commit_hash, output_tree, timestamp, node_type, summary, owner_id FROM nodes;")
+        edges = conn.execute("SELECT child_hash, parent_hash FROM edges ORDER BY rowid;").fetchall()
+        return CompactHistoryGraph.from_columns(rows, edges)
+
+    # --- 点查询 ---
+
+    supports_point_queries = True
+
+    def _row_to_node(self, row: sqlite3.Row) -> QuipuNode:
+        """将 nodes 表中的一行映射为 QuipuNode (不含父子关系)。"""
+        commit_hash = row["commit_hash"]
+        return QuipuNode(
+            commit_hash=commit_hash,
+            input_tree="",
+            output_tree=row["output_tree"],
+            timestamp=datetime.fromtimestamp(row["timestamp"]),
+            filename=Path(f".quipu/git_objects/{commit_hash}"),
+            node_type=row["node_type"],
+            summary=row["summary"],
+            content=row["plan_md_cache"] if row["plan_md_cache"] is not None else "",
+            owner_id=row["owner_id"],
+        )
+
+    def _query_nodes(self, where: str, params: tuple, order_limit: str = "") -> List[QuipuNode]:
+        """
+        按条件查询节点，并通过 edges 表一次性补全 input_tree (父节点的 output_tree)。
+        返回的节点不包含 parent/children 对象引用。
+        """
+        conn = self.db_manager._get_conn()
+        sql = f"""
+            SELECT n.*, p.output_tree AS parent_output_tree
+            FROM nodes n
+            LEFT JOIN edges e ON e.child_hash = n.commit_hash
+            LEFT JOIN nodes p ON p.commit_hash = e.parent_hash
+            WHERE {where}
+            GROUP BY n.commit_hash
+            {order_limit}
+        """
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to query nodes: {e}")
+            return []
+
+        genesis_hash = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        results = []
+        for row in rows:
+            node = self._row_to_node(row)
+            node.input_tree = row["parent_output_tree"] or genesis_hash
+            results.append(node)
+        return results
+
+    def has_nodes(self) -> bool:
+        conn = self.db_manager._get_conn()
+        try:
+            return conn.execute("SELECT 1 FROM nodes LIMIT 1").fetchone() is not None
+        except sqlite3.Error as e:
+            logger.error(f"Failed to check for nodes: {e}")
+            return False
+
+    def find_node_by_output_tree(self, output_tree_hash: str) -> Optional[QuipuNode]:
+        nodes = self._query_nodes("n.output_tree = ?", (output_tree_hash,), "ORDER BY n.timestamp DESC LIMIT 1")
+        return nodes[0] if nodes else None
+
+    def find_nodes_by_output_tree_prefix(self, prefix: str) -> List[QuipuNode]:
+        # 使用范围查询以命中 output_tree 索引 (LIKE 'abc%' 在默认大小写规则下无法使用索引)
+        return self._query_nodes(
+            "n.output_tree >= ? AND n.output_tree < ?",
+            (prefix, prefix + "\uffff"),
+            "ORDER BY n.timestamp DESC",
+        )
+
+    def get_node_by_commit(self, commit_hash: str) -> Optional[QuipuNode]:
+        nodes = self._query_nodes("n.commit_hash = ?", (commit_hash,))
+        return nodes[0] if nodes else None
+
+    def get_parent(self, commit_hash: str) -> Optional[QuipuNode]:
+        nodes = self._query_nodes(
+            "n.commit_hash = (SELECT e.parent_hash FROM edges e JOIN nodes p ON p.commit_hash = e.parent_hash "
+            "WHERE e.child_hash = ? AND e.parent_hash != e.child_hash ORDER BY e.rowid LIMIT 1)",
+            (commit_hash,),
+        )
+        return nodes[0] if nodes else None
+
+    def get_children(self, commit_hash: str) -> List[QuipuNode]:
+        return self._query_nodes(
+            "n.commit_hash IN (SELECT child_hash FROM edges WHERE parent_hash = ?)",
+            (commit_hash,),
+            "ORDER BY n.timestamp ASC",
+        )
+
+    def get_latest_node(self) -> Optional[QuipuNode]:
+        # 先通过时间戳索引定位最新节点，再补全其 input_tree
+        conn = self.db_manager._get_conn()
+        row = conn.execute("SELECT commit_hash FROM nodes ORDER BY timestamp DESC LIMIT 1").fetchone()
+        return self.get_node_by_commit(row[0]) if row else None
+
     def get_node_count(self) -> int:
         """
         获取历史节点总数。
@@ -105,21 +211,24 @@ class SQLiteHistoryReader(HistoryReader):
 
     def get_node_position(self, output_tree_hash: str) -> int:
         """
-        计算节点在时间倒序列表中的位置 (Rank)。
+        计算节点在 (timestamp, commit_hash) 倒序列表中的位置 (Rank)。
         """
         conn = self.db_manager._get_conn()
         try:
-            # 1. 获取目标节点的时间戳
-            cursor = conn.execute("SELECT timestamp FROM nodes WHERE output_tree = ?", (output_tree_hash,))
+            # 1. 获取目标节点的排序键
+            cursor = conn.execute(
+                "SELECT timestamp, commit_hash FROM nodes WHERE output_tree = ? ORDER BY timestamp DESC LIMIT 1",
+                (output_tree_hash,),
+            )
             row = cursor.fetchone()
             if not row:
                 return -1
-            target_ts = row[0]
 
-            # 2. 计算有多少个节点比它新（时间戳更大）
-            cursor = conn.execute("SELECT COUNT(*) FROM nodes WHERE timestamp > ?", (target_ts,))
-            count = cursor.fetchone()[0]
-            return count
+            # 2. 计算有多少个节点排在它前面
+            cursor = conn.execute(
+                "SELECT COUNT(*) FROM nodes WHERE (timestamp, commit_hash) > (?, ?)", (row[0], row[1])
+            )
+            return cursor.fetchone()[0]
         except sqlite3.Error as e:
             logger.error(f"Failed to get node position: {e}")
             return -1
@@ -130,117 +239,244 @@ class SQLiteHistoryReader(HistoryReader):
         """
         conn = self.db_manager._get_conn()
         try:
-            # 1. Fetch nodes
-            cursor = conn.execute("SELECT * FROM nodes ORDER BY timestamp DESC LIMIT ? OFFSET ?", (limit, offset))
-            rows = cursor.fetchall()
-
-            if not rows:
-                return []
+            cursor = conn.execute(
+                "SELECT * FROM nodes ORDER BY timestamp DESC, commit_hash DESC LIMIT ? OFFSET ?", (limit, offset)
+            )
+            return self._build_page(conn, cursor.fetchall())
+        except sqlite3.Error as e:
+            logger.error(f"Failed to load paginated nodes: {e}")
+            return []
 
-            nodes_map = {}
-            node_hashes = []
-
-            for row in rows:
-                commit_hash = row["commit_hash"]
-                node_hashes.append(commit_hash)
-                nodes_map[commit_hash] = QuipuNode(
-                    commit_hash=commit_hash,
-                    input_tree="",  # Placeholder
-                    output_tree=row["output_tree"],
-                    timestamp=datetime.fromtimestamp(row["timestamp"]),
-                    filename=Path(f".quipu/git_objects/{commit_hash}"),
-                    node_type=row["node_type"],
-                    summary=row["summary"],
-                    content=row["plan_md_cache"] if row["plan_md_cache"] is not None else "",
-                    owner_id=row["owner_id"],
+    def load_nodes_page(self, limit: int, before: Optional[str] = None, after: Optional[str] = None) -> List[QuipuNode]:
+        """
+        基于游标加载一页节点。通过 (timestamp, commit_hash) 索引直接定位到游标处，
+        代价与页码深度无关。
+        """
+        conn = self.db_manager._get_conn()
+        boundary = "(SELECT timestamp, commit_hash FROM nodes WHERE commit_hash = ?)"
+        try:
+            if before is not None:
+                cursor = conn.execute(
+                    f"""
+                    SELECT * FROM nodes WHERE (timestamp, commit_hash) < {boundary}
+                    ORDER BY timestamp DESC, commit_hash DESC LIMIT ?
+                    """,
+                    (before, limit),
+                )
+                rows = cursor.fetchall()
+            elif after is not None:
+                cursor = conn.execute(
+                    f"""
+                    SELECT * FROM nodes WHERE (timestamp, commit_hash) > {boundary}
+                    ORDER BY timestamp ASC, commit_hash ASC LIMIT ?
+                    """,
+                    (after, limit),
                 )
+                rows = cursor.fetchall()[::-1]
+            else:
+                cursor = conn.execute("SELECT * FROM nodes ORDER BY timestamp DESC, commit_hash DESC LIMIT ?", (limit,))
+                rows = cursor.fetchall()
+            return self._build_page(conn, rows)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to load node page: {e}")
+            return []
 
-            # 2. Fetch edges to identify parents
-            placeholders = ",".join("?" * len(node_hashes))
-            edges_cursor = conn.execute(
-                f"SELECT child_hash, parent_hash FROM edges WHERE child_hash IN ({placeholders})", tuple(node_hashes)
+    def get_commit_at_offset(self, commit_hash: Optional[str], offset: int) -> Optional[str]:
+        """
+        从出发节点的 (timestamp, commit_hash) 处沿索引移动 offset 步。
+        只扫描覆盖索引而不读取节点行，代价与 |offset| 成正比，与出发节点的深度无关；
+        调用方应从离目标最近的已知节点出发。
+        """
+        conn = self.db_manager._get_conn()
+        if commit_hash is None:
+            if offset >= 0:
+                order, skip = "DESC", offset
+            else:
+                order, skip = "ASC", -offset - 1
+            sql = f"SELECT commit_hash FROM nodes ORDER BY timestamp {order}, commit_hash {order} LIMIT 1 OFFSET ?"
+            params: tuple = (skip,)
+        elif offset == 0:
+            sql, params = "SELECT commit_hash FROM nodes WHERE commit_hash = ?", (commit_hash,)
+        else:
+            boundary = "(SELECT timestamp, commit_hash FROM nodes WHERE commit_hash = ?)"
+            if offset > 0:
+                op, order, skip = "<", "DESC", offset - 1
+            else:
+                op, order, skip = ">", "ASC", -offset - 1
+            sql = (
+                f"SELECT commit_hash FROM nodes WHERE (timestamp, commit_hash) {op} {boundary} "
+                f"ORDER BY timestamp {order}, commit_hash {order} LIMIT 1 OFFSET ?"
             )
-            edges = edges_cursor.fetchall()
-
-            child_to_parent = {row["child_hash"]: row["parent_hash"] for row in edges}
-            parent_hashes = [row["parent_hash"] for row in edges]
-
-            # 3. Fetch parent output_tree for input_tree linking
-            parent_info = {}
-            if parent_hashes:
-                p_placeholders = ",".join("?" * len(parent_hashes))
-                p_cursor = conn.execute(
-                    f"SELECT commit_hash, output_tree FROM nodes WHERE commit_hash IN ({p_placeholders})",
-                    tuple(parent_hashes),
-                )
-                parent_info = {row["commit_hash"]: row["output_tree"] for row in p_cursor.fetchall()}
+            params = (commit_hash, skip)
+        try:
+            row = conn.execute(sql, params).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Failed to seek {offset} nodes from {commit_hash}: {e}")
+            return None
+
+    def iter_nodes(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        node_type: Optional[str] = None,
+        owner_id: Optional[str] = None,
+    ) -> Iterator[QuipuNode]:
+        """
+        沿 (timestamp, commit_hash) 索引倒序流式读取节点，过滤条件全部下推到 SQL。
+        input_tree 通过相关子查询逐行补全 (而非 GROUP BY)，因此游标无需物化整个结果集。
+        """
+        # datetime 只有微秒精度，边界放宽半微秒，使结果与按 datetime 比较一致
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("n.timestamp >= ?")
+            params.append(since.timestamp() - 5e-7)
+        if until is not None:
+            conditions.append("n.timestamp <= ?")
+            params.append(until.timestamp() + 5e-7)
+        if node_type is not None:
+            conditions.append("n.node_type = ?")
+            params.append(node_type)
+        if owner_id is not None:
+            conditions.append("n.owner_id = ?")
+            params.append(owner_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"""
+            SELECT n.*, (
+                SELECT p.output_tree FROM edges e JOIN nodes p ON p.commit_hash = e.parent_hash
+                WHERE e.child_hash = n.commit_hash AND e.parent_hash != e.child_hash ORDER BY e.rowid LIMIT 1
+            ) AS parent_output_tree
+            FROM nodes n
+            {where}
+            ORDER BY n.timestamp DESC, n.commit_hash DESC
+        """
 
-            genesis_hash = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        genesis_hash = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        try:
+            cursor = self.db_manager._get_conn().execute(sql, tuple(params))
+            while True:
+                rows = cursor.fetchmany(64)
+                if not rows:
+                    break
+                for row in rows:
+                    node = self._row_to_node(row)
+                    node.input_tree = row["parent_output_tree"] or genesis_hash
+                    yield node
+        except sqlite3.Error as e:
+            logger.error(f"Failed to stream nodes: {e}")
 
-            results = []
-            for commit_hash in node_hashes:
-                node = nodes_map[commit_hash]
-                parent_hash = child_to_parent.get(commit_hash)
+    def _build_page(self, conn: sqlite3.Connection, rows: List[sqlite3.Row]) -> List[QuipuNode]:
+        """将一页节点行转换为 QuipuNode，补全 input_tree 并链接页内的父子关系。"""
+        if not rows:
+            return []
 
-                if parent_hash:
-                    # Set input_tree from parent's output_tree
-                    node.input_tree = parent_info.get(parent_hash, genesis_hash)
+        nodes_map = {}
+        node_hashes = []
 
-                    # Link objects if parent is in the same page
-                    if parent_hash in nodes_map:
-                        parent_node = nodes_map[parent_hash]
-                        node.parent = parent_node
-                        parent_node.children.append(node)
-                else:
-                    node.input_tree = genesis_hash
+        for row in rows:
+            node = self._row_to_node(row)
+            node_hashes.append(node.commit_hash)
+            nodes_map[node.commit_hash] = node
+
+        # 1. Fetch edges to identify parents
+        placeholders = ",".join("?" * len(node_hashes))
+        edges_cursor = conn.execute(
+            f"SELECT child_hash, parent_hash FROM edges WHERE child_hash IN ({placeholders}) ORDER BY rowid",
+            tuple(node_hashes),
+        )
+        edges = edges_cursor.fetchall()
+
+        child_to_parent: Dict[str, str] = {}
+        for row in edges:
+            if row["child_hash"] != row["parent_hash"]:
+                child_to_parent.setdefault(row["child_hash"], row["parent_hash"])
+        parent_hashes = list(set(child_to_parent.values()))
+
+        # 2. Fetch parent output_tree for input_tree linking
+        parent_info = {}
+        if parent_hashes:
+            p_placeholders = ",".join("?" * len(parent_hashes))
+            p_cursor = conn.execute(
+                f"SELECT commit_hash, output_tree FROM nodes WHERE commit_hash IN ({p_placeholders})",
+                tuple(parent_hashes),
+            )
+            parent_info = {row["commit_hash"]: row["output_tree"] for row in p_cursor.fetchall()}
 
-                results.append(node)
+        genesis_hash = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
 
-            # Sort children for consistency (though partial)
-            for node in results:
-                node.children.sort(key=lambda n: n.timestamp)
+        results = []
+        for commit_hash in node_hashes:
+            node = nodes_map[commit_hash]
+            parent_hash = child_to_parent.get(commit_hash)
+
+            if parent_hash:
+                # Set input_tree from parent's output_tree
+                node.input_tree = parent_info.get(parent_hash, genesis_hash)
+
+                # Link objects if parent is in the same page
+                if parent_hash in nodes_map:
+                    parent_node = nodes_map[parent_hash]
+                    node.parent = parent_node
+                    parent_node.children.append(node)
+            else:
+                node.input_tree = genesis_hash
 
-            return results
+            results.append(node)
 
-        except sqlite3.Error as e:
-            logger.error(f"Failed to load paginated nodes: {e}")
-            return []
+        # Sort children for consistency (though partial)
+        for node in results:
+            node.children.sort(key=lambda n: n.timestamp)
+
+        return results
+
+    # --- 可达性查询 ---
+    # 基于 node_intervals 中维护的区间标号 (见 reachability 模块):
+    # 祖先判断为 O(1)，后代查询是 (root_hash, lo) 索引上的一次范围扫描。
+    # 节点尚未标号时 (例如写入标号失败)，退化为沿 edges 表的递归 CTE。
+
+    def _find_labeled_start(self, conn: sqlite3.Connection, output_tree_hash: str) -> Optional[sqlite3.Row]:
+        return conn.execute(
+            """
+            SELECT n.commit_hash, i.root_hash, i.lo, i.hi
+            FROM nodes n LEFT JOIN node_intervals i ON i.commit_hash = n.commit_hash
+            WHERE n.output_tree = ? LIMIT 1
+            """,
+            (output_tree_hash,),
+        ).fetchone()
+
+    def _walk_output_trees(self, conn: sqlite3.Connection, start_commit_hash: str, ancestors: bool) -> Set[str]:
+        """沿 edges 表递归遍历祖先或后代，返回其 output_tree 集合。"""
+        src, dst = ("child_hash", "parent_hash") if ancestors else ("parent_hash", "child_hash")
+        sql = f"""
+        WITH RECURSIVE walk(h) AS (
+            SELECT {dst} FROM edges WHERE {src} = ?
+            UNION
+            SELECT e.{dst} FROM edges e, walk w WHERE e.{src} = w.h
+        )
+        SELECT n.output_tree FROM nodes n WHERE n.commit_hash IN (SELECT h FROM walk);
+        """
+        return {row[0] for row in conn.execute(sql, (start_commit_hash,))}
 
     def get_descendant_output_trees(self, start_output_tree_hash: str) -> Set[str]:
         """
         获取指定状态节点的所有后代节点的 output_tree 哈希集合。
-        与 get_ancestors 逻辑相反。
+        后代即同一棵树中区间起点落在 (lo, hi] 内的节点。
         """
         conn = self.db_manager._get_conn()
         try:
-            # 1. 查找起点的 commit_hash
-            cursor = conn.execute("SELECT commit_hash FROM nodes WHERE output_tree = ?", (start_output_tree_hash,))
-            row = cursor.fetchone()
-            if not row:
+            start = self._find_labeled_start(conn, start_output_tree_hash)
+            if not start:
                 return set()
-            start_commit_hash = row[0]
-
-            # 2. 使用递归 CTE 查找所有后代 commit_hash
-            sql = """
-            WITH RECURSIVE descendants(h) AS (
-                SELECT child_hash FROM edges WHERE parent_hash = ?
-                UNION ALL
-                SELECT e.child_hash FROM edges e, descendants d WHERE e.parent_hash = d.h AND e.child_hash IS NOT NULL
+            if start["root_hash"] is None:
+                return self._walk_output_trees(conn, start["commit_hash"], ancestors=False)
+            cursor = conn.execute(
+                """
+                SELECT n.output_tree FROM node_intervals i JOIN nodes n ON n.commit_hash = i.commit_hash
+                WHERE i.root_hash = ? AND i.lo > ? AND i.lo <= ?
+                """,
+                (start["root_hash"], start["lo"], start["hi"]),
             )
-            SELECT h FROM descendants WHERE h IS NOT NULL;
-            """
-            cursor = conn.execute(sql, (start_commit_hash,))
-            descendant_commit_hashes = {row[0] for row in cursor.fetchall()}
-
-            if not descendant_commit_hashes:
-                return set()
-
-            # 3. 将 commit_hash 集合转换为 output_tree 集合
-            placeholders = ",".join("?" * len(descendant_commit_hashes))
-            sql_out = f"SELECT output_tree FROM nodes WHERE commit_hash IN ({placeholders})"
-            cursor = conn.execute(sql_out, tuple(descendant_commit_hashes))
-            return {row[0] for row in cursor.fetchall()}
-
+            return {row[0] for row in cursor}
         except sqlite3.Error as e:
             logger.error(f"Failed to get descendants for {start_output_tree_hash[:7]}: {e}")
             return set()
@@ -248,45 +484,41 @@ class SQLiteHistoryReader(HistoryReader):
     def get_ancestor_output_trees(self, start_output_tree_hash: str) -> Set[str]:
         """
         获取指定状态节点的所有祖先节点的 output_tree 哈希集合 (用于可达性分析)。
-        使用三步策略：
-        1. 将 output_tree 哈希翻译为 commit_hash。
-        2. 使用递归 CTE 查找所有祖先的 commit_hash。
-        3. 将祖先 commit_hash 集合翻译回 output_tree 哈希集合。
+        祖先即同一棵树中区间包含起点 lo 的节点。扫描范围是先序排在起点之前的节点，
+        对深的线性链而言恰好就是祖先本身。
         """
         conn = self.db_manager._get_conn()
         try:
-            # 1. 查找起点的 commit_hash
-            cursor = conn.execute("SELECT commit_hash FROM nodes WHERE output_tree = ?", (start_output_tree_hash,))
-            row = cursor.fetchone()
-            if not row:
+            start = self._find_labeled_start(conn, start_output_tree_hash)
+            if not start:
                 return set()
-            start_commit_hash = row[0]
-
-            # 2. 使用递归 CTE 查找所有祖先 commit_hash
-            sql = """
-            WITH RECURSIVE ancestors(h) AS (
-                SELECT parent_hash FROM edges WHERE child_hash = ?
-                UNION ALL
-                SELECT e.parent_hash FROM edges e, ancestors a WHERE e.child_hash = a.h AND e.parent_hash IS NOT NULL
+            if start["root_hash"] is None:
+                return self._walk_output_trees(conn, start["commit_hash"], ancestors=True)
+            cursor = conn.execute(
+                """
+                SELECT n.output_tree FROM node_intervals i JOIN nodes n ON n.commit_hash = i.commit_hash
+                WHERE i.root_hash = ? AND i.lo < ? AND i.hi >= ?
+                """,
+                (start["root_hash"], start["lo"], start["lo"]),
             )
-            SELECT h FROM ancestors WHERE h IS NOT NULL;
-            """
-            cursor = conn.execute(sql, (start_commit_hash,))
-            ancestor_commit_hashes = {row[0] for row in cursor.fetchall()}
-
-            if not ancestor_commit_hashes:
-                return set()
-
-            # 3. 将 commit_hash 集合转换为 output_tree 集合
-            placeholders = ",".join("?" * len(ancestor_commit_hashes))
-            sql_out = f"SELECT output_tree FROM nodes WHERE commit_hash IN ({placeholders})"
-            cursor = conn.execute(sql_out, tuple(ancestor_commit_hashes))
-            return {row[0] for row in cursor.fetchall()}
-
+            return {row[0] for row in cursor}
         except sqlite3.Error as e:
             logger.error(f"Failed to get ancestors for {start_output_tree_hash[:7]}: {e}")
             return set()
 
+    def is_ancestor(self, ancestor_commit: str, descendant_commit: str) -> bool:
+        """O(1) 判断: 祖先的区间严格包含后代的区间起点。"""
+        a = self.db_manager.get_interval(ancestor_commit)
+        b = self.db_manager.get_interval(descendant_commit)
+        if a is None or b is None:
+            parent = self.get_parent(descendant_commit)
+            while parent is not None:
+                if parent.commit_hash == ancestor_commit:
+                    return True
+                parent = self.get_parent(parent.commit_hash)
+            return False
+        return a[0] == b[0] and a[1] < b[1] <= a[2]
+
     def get_private_data(self, node_commit_hash: str) -> Optional[str]:
         """
         获取指定节点的私有数据 (如 intent.md)。
@@ -300,6 +532,22 @@ class SQLiteHistoryReader(HistoryReader):
             logger.error(f"Failed to get private data for {node_commit_hash[:7]}: {e}")
             return None
 
+    def get_private_data_many(self, commit_hashes: List[str]) -> Dict[str, str]:
+        """分块批量查询私有数据。"""
+        conn = self.db_manager._get_conn()
+        result: Dict[str, str] = {}
+        try:
+            for i in range(0, len(commit_hashes), 500):
+                chunk = commit_hashes[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT node_hash, intent_md FROM private_data WHERE node_hash IN ({placeholders})", tuple(chunk)
+                )
+                result.update({row[0]: row[1] for row in rows if row[1]})
+        except sqlite3.Error as e:
+            logger.error(f"Failed to batch load private data: {e}")
+        return result
+
     def get_node_blobs(self, commit_hash: str) -> Dict[str, bytes]:
         """
         从 Git 回源获取节点的所有文件内容。
@@ -307,6 +555,10 @@ class SQLiteHistoryReader(HistoryReader):
         """
         return self._git_reader.get_node_blobs(commit_hash)
 
+    def get_nodes_blobs(self, commit_hashes: List[str]) -> Dict[str, Dict[str, bytes]]:
+        """批量版本，同样委托给底层的 git_reader。"""
+        return self._git_reader.get_nodes_blobs(commit_hashes)
+
     def get_node_content(self, node: QuipuNode) -> str:
         """
         实现通读缓存策略来获取节点内容。
@@ -316,6 +568,15 @@ class SQLiteHistoryReader(HistoryReader):
 
         commit_hash = node.commit_hash
 
+        # 节点可能来自不携带内容的加载路径 (如紧凑图谱)，先查询缓存
+        row = (
+            self.db_manager._get_conn()
+            .execute("SELECT plan_md_cache FROM nodes WHERE commit_hash = ?", (commit_hash,))
+            .fetchone()
+        )
+        if row and row[0]:
+            return row[0]
+
         # 尝试从 Git 加载内容
         content = self._git_reader.get_node_content(node)
 
@@ -331,57 +592,112 @@ class SQLiteHistoryReader(HistoryReader):
 
         return content
 
+    def get_node_contents(self, nodes: List[QuipuNode]) -> Dict[str, str]:
+        """
+        批量版本的通读缓存: 先分块查询 plan_md_cache，未命中的节点经由同一个 cat-file 流
+        批量从 Git 读取，并在单个事务中回填缓存。
+        """
+        result = {node.commit_hash: node.content for node in nodes if node.content}
+        pending = [node.commit_hash for node in nodes if not node.content]
+        conn = self.db_manager._get_conn()
+        try:
+            for i in range(0, len(pending), 500):
+                chunk = pending[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT commit_hash, plan_md_cache FROM nodes "
+                    f"WHERE commit_hash IN ({placeholders}) AND plan_md_cache IS NOT NULL",
+                    tuple(chunk),
+                )
+                result.update({row[0]: row[1] for row in rows})
+        except sqlite3.Error as e:
+            logger.error(f"Failed to batch load content cache: {e}")
+
+        missing = [commit_hash for commit_hash in pending if commit_hash not in result]
+        if missing:
+            loaded = self._git_reader.read_contents(missing)
+            try:
+                with self.db_manager.transaction():
+                    conn.executemany(
+                        "UPDATE nodes SET plan_md_cache = ? WHERE commit_hash = ?",
+                        [(content, commit_hash) for commit_hash, content in loaded.items()],
+                    )
+                logger.debug(f"缓存已批量回填: {len(loaded)} 个节点")
+            except Exception as e:
+                logger.warning(f"批量回填缓存失败: {e}")
+            result.update({commit_hash: loaded.get(commit_hash, "") for commit_hash in missing})
+        return result
+
     def find_nodes(
         self,
         summary_regex: Optional[str] = None,
         node_type: Optional[str] = None,
         limit: int = 10,
+        text: Optional[str] = None,
     ) -> List[QuipuNode]:
         """
         直接在 SQLite 数据库中执行高效的节点查找。
+
+        - summary_regex 通过注册的 REGEXP 函数进行真正的正则匹配 (不区分大小写)。
+        - text 使用 FTS5 全文索引检索 summary、计划内容与元数据，结果按相关度 (bm25) 排序；
+          过短而无法走索引的词，或全文索引不可用时，退化为 LIKE 匹配。
         """
-        query = "SELECT * FROM nodes"
+        if summary_regex:
+            try:
+                re.compile(summary_regex)
+            except re.error as e:
+                logger.error(f"无效的正则表达式: {summary_regex} ({e})")
+                return []
+
+        source = "nodes n"
         conditions = []
-        params = []
+        params: List[Any] = []
+        order = "n.timestamp DESC"
+
+        if text:
+            tokenizer = self.db_manager.fts_tokenizer
+            # trigram 分词器无法匹配少于 3 个字符的词
+            min_len = 3 if tokenizer == "trigram" else 1
+            indexed_terms = [t for t in text.split() if tokenizer and len(t) >= min_len]
+            for term in text.split():
+                if term in indexed_terms:
+                    continue
+                pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                conditions.append(
+                    "(n.summary LIKE ? ESCAPE '\\' OR n.plan_md_cache LIKE ? ESCAPE '\\' "
+                    "OR n.meta_json LIKE ? ESCAPE '\\')"
+                )
+                params.extend([pattern] * 3)
+            if indexed_terms:
+                source = "nodes_fts f JOIN nodes n ON n.rowid = f.rowid"
+                conditions.insert(0, "nodes_fts MATCH ?")
+                params.insert(0, " AND ".join('"' + t.replace('"', '""') + '"' for t in indexed_terms))
+                # 摘要命中的权重最高，其次是计划内容，元数据最低
+                order = "bm25(nodes_fts, 10.0, 2.0, 0.5), n.timestamp DESC"
 
         if node_type:
-            conditions.append("node_type = ?")
+            conditions.append("n.node_type = ?")
             params.append(node_type)
 
-        # 注意: 标准 SQLite 不支持 REGEXP。
-        # 此处使用 LIKE 实现简单的子字符串匹配作为替代。
-        # 完整的正则支持需要加载扩展或在 Python 端进行二次过滤。
         if summary_regex:
-            conditions.append("summary LIKE ?")
-            params.append(f"%{summary_regex}%")
+            conditions.append("n.summary REGEXP ?")
+            params.append(summary_regex)
 
+        query = f"SELECT n.* FROM {source}"
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
-
-        query += " ORDER BY timestamp DESC LIMIT ?"
+        query += f" ORDER BY {order} LIMIT ?"
         params.append(limit)
 
         conn = self.db_manager._get_conn()
-        cursor = conn.execute(query, tuple(params))
-        rows = cursor.fetchall()
-
-        # 将查询结果行映射回 QuipuNode 对象 (不含父子关系)
-        results = []
-        for row in rows:
-            node = QuipuNode(
-                commit_hash=row["commit_hash"],
-                input_tree="",  # 查找结果是扁平列表，不包含父子关系
-                output_tree=row["output_tree"],
-                timestamp=datetime.fromtimestamp(row["timestamp"]),
-                filename=Path(f".quipu/git_objects/{row['commit_hash']}"),
-                node_type=row["node_type"],
-                summary=row["summary"],
-                content=row["plan_md_cache"] if row["plan_md_cache"] is not None else "",
-                owner_id=row["owner_id"],
-            )
-            results.append(node)
+        try:
+            rows = conn.execute(query, tuple(params)).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to find nodes: {e}")
+            return []
 
-        return results
+        # 查找结果是扁平列表，不包含父子关系
+        return [self._row_to_node(row) for row in rows]
 
 
 class SQLiteHistoryWriter(HistoryWriter):
@@ -424,38 +740,48 @@ class SQLiteHistoryWriter(HistoryWriter):
             }
             meta_json_str = json.dumps(metadata)
 
-            # 2.2 写入 'nodes' 表
-            owner_id = kwargs.get("owner_id", "unknown-local-user")
-            self.db_manager.execute_write(
-                """
-                INSERT OR REPLACE INTO nodes
-                (commit_hash, owner_id, output_tree, node_type, timestamp, summary,
-                 generator_id, meta_json, plan_md_cache)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    commit_hash,
-                    owner_id,
-                    output_tree,
-                    node_type,
-                    start_time,
-                    summary,
-                    metadata["generator"]["id"],
-                    meta_json_str,
-                    content,  # 热缓存: 新创建的节点内容直接写入缓存
-                ),
-            )
-
-            # 2.3 写入 'edges' 表
-            # 关键修改：直接使用 GitWriter 传递回来的确切父节点信息，不再进行 Tree 反查
-            if git_node.parent:
-                parent_commit_hash = git_node.parent.commit_hash
+            # 2.2 / 2.3 在同一个事务中写入 'nodes' 与 'edges' 表
+            with self.db_manager.transaction():
+                # 2.2 写入 'nodes' 表
+                owner_id = kwargs.get("owner_id", "unknown-local-user")
                 self.db_manager.execute_write(
-                    "INSERT OR IGNORE INTO edges (child_hash, parent_hash) VALUES (?, ?)",
-                    (commit_hash, parent_commit_hash),
+                    """
+                    INSERT INTO nodes
+                    (commit_hash, owner_id, output_tree, node_type, timestamp, summary,
+                     generator_id, meta_json, plan_md_cache)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(commit_hash) DO UPDATE SET
+                        owner_id = excluded.owner_id, output_tree = excluded.output_tree,
+                        node_type = excluded.node_type, timestamp = excluded.timestamp,
+                        summary = excluded.summary, generator_id = excluded.generator_id,
+                        meta_json = excluded.meta_json, plan_md_cache = excluded.plan_md_cache
+                    """,
+                    (
+                        commit_hash,
+                        owner_id,
+                        output_tree,
+                        node_type,
+                        start_time,
+                        summary,
+                        metadata["generator"]["id"],
+                        meta_json_str,
+                        content,  # 热缓存: 新创建的节点内容直接写入缓存
+                    ),
                 )
 
-            # 2.4 (未来) 写入 'private_data' 表
+                # 2.3 写入 'edges' 表
+                # 关键修改：直接使用 GitWriter 传递回来的确切父节点信息，不再进行 Tree 反查
+                if git_node.parent:
+                    parent_commit_hash = git_node.parent.commit_hash
+                    self.db_manager.execute_write(
+                        "INSERT OR IGNORE INTO edges (child_hash, parent_hash) VALUES (?, ?)",
+                        (commit_hash, parent_commit_hash),
+                    )
+
+                # 2.4 为新节点追加可达性区间标号
+                self.db_manager.label_nodes([commit_hash])
+
+            # 2.5 (未来) 写入 'private_data' 表
             # intent = kwargs.get("intent_md")
             # if intent: ...
 
@@ -1,8 +1,9 @@
 import logging
 import re
 import subprocess
+import threading
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from pyquipu.common.identity import get_user_id_from_email
 from pyquipu.interfaces.models import QuipuNode
@@ -10,7 +11,10 @@ from pyquipu.interfaces.storage import HistoryReader, HistoryWriter
 
 from .config import ConfigManager
 from .git_db import GitDB
-from .hydrator import Hydrator
+from .git_object_storage import local_head_ref
+from .graph_snapshot import GraphSnapshotStore, ref_state_key
+from .history_graph import CompactHistoryGraph, HistoryGraph
+from .hydrator import Hydrator, hydrate_content_in_background
 
 # 导入类型以进行类型提示
 try:
@@ -69,6 +73,8 @@ class Engine:
         reader: HistoryReader,
         writer: HistoryWriter,
         db_manager: Optional[Any] = None,
+        compact_graph: bool = False,
+        graph_snapshot: bool = False,
     ):
         self.root_dir = root_dir.resolve()
         self.quipu_dir = self.root_dir / ".quipu"
@@ -90,16 +96,74 @@ class Engine:
         self.reader = reader
         self.writer = writer
         self.db_manager = db_manager  # 持有数据库管理器引用
-        self.history_graph: Dict[str, QuipuNode] = {}
+        self._history_graph = HistoryGraph()
+        # 为 True 时，完整图谱以列式的 CompactHistoryGraph 加载，QuipuNode 仅在访问时物化
+        self.compact_graph = compact_graph
+        # 启用时，完整图谱优先从 .quipu 中的二进制快照映射，并在创建节点时增量追加
+        self.graph_snapshot: Optional[GraphSnapshotStore] = (
+            GraphSnapshotStore(self.quipu_dir) if graph_snapshot else None
+        )
+        # 为 False 时，history_graph 只包含按需物化的部分节点 (惰性对齐模式)
+        self.graph_complete = False
         self.current_node: Optional[QuipuNode] = None
+        self._content_hydration: Optional[threading.Thread] = None
 
         if isinstance(db, GitDB):
             self._sync_persistent_ignores()
 
+    @property
+    def history_graph(self) -> Union[HistoryGraph, CompactHistoryGraph]:
+        """以 commit_hash 为键的历史图谱，附带 output_tree 与哈希前缀索引。"""
+        return self._history_graph
+
+    @history_graph.setter
+    def history_graph(self, graph: Dict[str, QuipuNode]):
+        if not isinstance(graph, (HistoryGraph, CompactHistoryGraph)):
+            graph = HistoryGraph(graph)
+        self._history_graph = graph
+        self.graph_complete = True
+
+    def _remember(self, node: Optional[QuipuNode]) -> Optional[QuipuNode]:
+        """将从 reader 点查询得到的节点物化到 history_graph 中 (已存在则复用)。"""
+        if node is None:
+            return None
+        existing = self._history_graph.get(node.commit_hash)
+        if existing is not None:
+            return existing
+        self._history_graph[node.commit_hash] = node
+        return node
+
+    def find_node_by_output_tree(self, output_tree_hash: str) -> Optional[QuipuNode]:
+        """查找 output_tree 匹配的节点。图谱不完整时回退到 reader 的点查询。"""
+        node = self._history_graph.find_by_output_tree(output_tree_hash)
+        if node is not None or self.graph_complete:
+            return node
+        return self._remember(self.reader.find_node_by_output_tree(output_tree_hash))
+
+    def find_nodes_by_output_tree_prefix(self, prefix: str) -> List[QuipuNode]:
+        """查找 output_tree 以 prefix 开头的所有节点。"""
+        if self.graph_complete:
+            return self._history_graph.find_by_output_tree_prefix(prefix)
+        return [self._remember(node) for node in self.reader.find_nodes_by_output_tree_prefix(prefix)]
+
+    def get_latest_node(self) -> Optional[QuipuNode]:
+        """获取时间戳最新的节点。"""
+        if self.graph_complete:
+            return self._history_graph.latest_node()
+        return self._remember(self.reader.get_latest_node())
+
+    def has_history(self) -> bool:
+        """判断是否存在任何历史节点。"""
+        if self._history_graph:
+            return True
+        return not self.graph_complete and self.reader.has_nodes()
+
     def close(self):
-        """关闭引擎持有的所有资源，如数据库连接。"""
+        """关闭引擎持有的所有资源，如数据库连接和长驻的 git 协进程。"""
         if self.db_manager:
             self.db_manager.close()
+        if isinstance(self.git_db, GitDB):
+            self.git_db.close()
 
     def _get_current_user_id(self) -> str:
         """
@@ -137,6 +201,17 @@ class Engine:
         logger.debug("未找到 user_id，将使用默认回退值 'unknown-local-user'。")
         return "unknown-local-user"
 
+    def _hydrate_content(self, hydrator: Hydrator):
+        """按 storage.hydrate_content 配置回填计划内容缓存。"""
+        mode = ConfigManager(self.root_dir).get("storage.hydrate_content", "off")
+        if mode == "sync":
+            hydrator.hydrate_content()
+        elif mode == "background":
+            if self._content_hydration is None or not self._content_hydration.is_alive():
+                self._content_hydration = hydrate_content_in_background(self.root_dir, self.db_manager.profile)
+        elif mode != "off":
+            logger.warning(f"未知的 storage.hydrate_content 配置: {mode}")
+
     def _read_head(self) -> Optional[str]:
         if self.head_file.exists():
             return self.head_file.read_text(encoding="utf-8").strip()
@@ -225,34 +300,92 @@ class Engine:
             return target_hash
         return None
 
-    def align(self) -> str:
-        # 如果使用 SQLite，先进行数据补水
-        if self.db_manager:
-            try:
-                user_id = self._get_current_user_id()
-                hydrator = Hydrator(self.git_db, self.db_manager)
-                hydrator.sync(local_user_id=user_id)
-            except Exception as e:
-                logger.error(f"❌ 自动数据补水失败: {e}", exc_info=True)
+    def _ref_state_key(self, ref_heads: Optional[List[Tuple[str, str]]] = None) -> str:
+        """Quipu 引用状态 (默认为当前状态) 的摘要，用作图谱快照的键。"""
+        if ref_heads is None:
+            ref_heads = self.git_db.get_all_ref_heads("refs/quipu/")
+        return ref_state_key(ref_heads, salt=type(self.reader).__name__)
 
-        all_nodes = self.reader.load_all_nodes()
-        self.history_graph = {node.commit_hash: node for node in all_nodes}
-        if all_nodes:
-            logger.info(f"从存储中加载了 {len(all_nodes)} 个历史事件，形成 {len(self.history_graph)} 个唯一状态节点。")
+    def _load_compact_graph(self) -> CompactHistoryGraph:
+        """
+        加载紧凑图谱: 快照与当前引用状态匹配时直接映射快照；
+        否则优先使用 reader 的列式加载，不支持时由完整节点列表转换，并刷新快照。
+        """
+        key = None
+        if self.graph_snapshot is not None:
+            key = self._ref_state_key()
+            graph = self.graph_snapshot.load(key)
+            if graph is not None:
+                return graph
+
+        loader = getattr(self.reader, "load_compact_graph", None)
+        if loader is not None:
+            graph = loader()
+        else:
+            graph = CompactHistoryGraph.from_nodes(self.reader.load_all_nodes())
+        if self.graph_snapshot is not None:
+            self.graph_snapshot.write(graph, key)
+        return graph
+
+    def _write_node(self, **kwargs: Any) -> QuipuNode:
+        """通过 writer 创建节点，并将其追加到图谱快照的日志中。"""
+        if self.graph_snapshot is None:
+            return self.writer.create_node(**kwargs)
+        ref_heads = self.git_db.get_all_ref_heads("refs/quipu/")
+        node = self.writer.create_node(**kwargs)
+        # 写入器只新建了该节点自己的 head 引用，据此推导新的引用状态，无需再次列出引用
+        new_ref = local_head_ref(node.commit_hash)
+        new_heads = [item for item in ref_heads if item[1] != new_ref] + [(node.commit_hash, new_ref)]
+        self.graph_snapshot.append(
+            node, self._ref_state_key(ref_heads), self._ref_state_key(new_heads), owner_id=kwargs.get("owner_id")
+        )
+        return node
+
+    def hydrate(self):
+        """使用 SQLite 时，将 Git 中尚未索引的历史同步到数据库 (数据补水)。其他后端无需任何操作。"""
+        if not self.db_manager:
+            return
+        try:
+            user_id = self._get_current_user_id()
+            hydrator = Hydrator(self.git_db, self.db_manager)
+            hydrator.sync(local_user_id=user_id)
+            self._hydrate_content(hydrator)
+        except Exception as e:
+            logger.error(f"❌ 自动数据补水失败: {e}", exc_info=True)
+
+    def align(self, lazy: bool = False) -> str:
+        """
+        将工作区状态与历史图谱对齐。
+
+        Args:
+            lazy: 为 True 且 reader 支持点查询时，不加载完整图谱，
+                  只通过 output_tree 点查询定位当前节点 (适用于 run/save/checkout 等命令)。
+        """
+        self.hydrate()
+
+        if lazy and self.reader.supports_point_queries:
+            self._history_graph = HistoryGraph()
+            self.graph_complete = False
+        elif self.compact_graph or self.graph_snapshot is not None:
+            self.history_graph = self._load_compact_graph()
+            if self.history_graph:
+                logger.info(f"从存储中加载了 {len(self.history_graph)} 个历史事件 (紧凑图谱)。")
+        else:
+            all_nodes = self.reader.load_all_nodes()
+            self.history_graph = HistoryGraph.from_nodes(all_nodes)
+            if all_nodes:
+                logger.info(
+                    f"从存储中加载了 {len(all_nodes)} 个历史事件，形成 {len(self.history_graph)} 个唯一状态节点。"
+                )
 
         current_hash = self.git_db.get_tree_hash()
         EMPTY_TREE_HASH = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
-        if current_hash == EMPTY_TREE_HASH and not self.history_graph:
+        if current_hash == EMPTY_TREE_HASH and not self.has_history():
             logger.info("✅ 状态对齐：检测到创世状态 (空仓库)。")
             self.current_node = None
             return "CLEAN"
 
-        # Find node by iterating since keys are now commit hashes
-        found_node = None
-        for node in self.history_graph.values():
-            if node.output_tree == current_hash:
-                found_node = node
-                break
+        found_node = self.find_node_by_output_tree(current_hash)
 
         if found_node:
             self.current_node = found_node
@@ -261,7 +394,7 @@ class Engine:
             return "CLEAN"
 
         logger.warning(f"⚠️  状态漂移：当前 Tree Hash {current_hash[:7]} 未在历史中找到。")
-        if not self.history_graph:
+        if not self.has_history():
             return "ORPHAN"
         return "DIRTY"
 
@@ -270,6 +403,7 @@ class Engine:
         summary_regex: Optional[str] = None,
         node_type: Optional[str] = None,
         limit: int = 10,
+        text: Optional[str] = None,
     ) -> List[QuipuNode]:
         """
         在历史图谱中查找符合条件的节点。
@@ -279,6 +413,7 @@ class Engine:
             summary_regex=summary_regex,
             node_type=node_type,
             limit=limit,
+            text=text,
         )
 
     def capture_drift(self, current_hash: str, message: Optional[str] = None) -> QuipuNode:
@@ -291,17 +426,15 @@ class Engine:
         parent_node = None
 
         if head_tree_hash:
-            # 正确的逻辑：遍历节点，用 output_tree 匹配 head 的 tree hash
-            parent_node = next(
-                (node for node in self.history_graph.values() if node.output_tree == head_tree_hash), None
-            )
+            # 用 output_tree 匹配 head 的 tree hash
+            parent_node = self.find_node_by_output_tree(head_tree_hash)
 
         if parent_node:
             input_hash = parent_node.output_tree
-        elif self.history_graph:
+        elif self.has_history():
             # 只有当 HEAD 指针无效或丢失时，才执行回退逻辑
-            last_node = max(self.history_graph.values(), key=lambda node: node.timestamp)
-            input_hash = last_node.output_tree
+            parent_node = self.get_latest_node()
+            input_hash = parent_node.output_tree
             logger.warning(
                 f"⚠️  HEAD 指针 '{head_tree_hash[:7] if head_tree_hash else 'N/A'}' 无效或丢失，"
                 f"自动回退到最新历史节点: {input_hash[:7]}"
@@ -318,13 +451,14 @@ class Engine:
 
         user_id = self._get_current_user_id()
 
-        new_node = self.writer.create_node(
+        new_node = self._write_node(
             node_type="capture",
             input_tree=input_hash,
             output_tree=current_hash,
             content=body,
             message=message,
             owner_id=user_id,
+            parent_commit_hash=parent_node.commit_hash if parent_node else None,
         )
 
         self.history_graph[new_node.commit_hash] = new_node
@@ -345,13 +479,19 @@ class Engine:
 
         user_id = self._get_current_user_id()
 
-        new_node = self.writer.create_node(
+        if self.current_node is not None and self.current_node.output_tree == input_tree:
+            parent_node = self.current_node
+        else:
+            parent_node = self.find_node_by_output_tree(input_tree)
+
+        new_node = self._write_node(
             node_type="plan",
             input_tree=input_tree,
             output_tree=output_tree,
             content=plan_content,
             summary_override=summary_override,
             owner_id=user_id,
+            parent_commit_hash=parent_node.commit_hash if parent_node else None,
         )
 
         self.history_graph[new_node.commit_hash] = new_node
@@ -370,9 +510,5 @@ class Engine:
         self.git_db.checkout_tree(new_tree_hash=target_hash, old_tree_hash=current_head_hash)
 
         self._write_head(target_hash)
-        self.current_node = None
-        for node in self.history_graph.values():
-            if node.output_tree == target_hash:
-                self.current_node = node
-                break
+        self.current_node = self.find_node_by_output_tree(target_hash)
         logger.info(f"🔄 状态已切换至: {target_hash[:7]}")
@@ -0,0 +1,390 @@
+import ctypes
+import ctypes.util
+import errno
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- inotify 常量 (见 <sys/inotify.h>) ---
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+    | IN_EXCL_UNLINK
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+# 不需要监控的顶层目录
+_SKIP_DIRS = {".git", ".quipu"}
+
+
+class WatcherUnavailable(Exception):
+    """当前平台或环境无法启动文件监控 (非 Linux、inotify 配额耗尽等)。"""
+
+    pass
+
+
+def is_supported() -> bool:
+    """inotify 监控仅在 Linux 上可用。"""
+    return sys.platform.startswith("linux")
+
+
+class WatchJournal:
+    """
+    监控进程与 GitDB 之间共享的、基于文件的变更日志协议。
+
+    所有文件位于 `.quipu/watch/` 下:
+    - `state.json`: 当前监控会话 {session, pid}，监控进程退出时删除。
+    - `journal-<session>`: 只追加的日志，每行一条记录:
+        "P <path>"   相对于仓库根目录的变更路径
+        "C <cookie>" 同步屏障 (cookie 文件已被监控进程观察到)
+        "O"          事件队列溢出，此后的日志不再可信
+    - `cookies/`: 读取方创建 cookie 文件，以确认之前的所有事件都已写入日志。
+    - `baseline.json`: 最近一次已知的干净状态 {session, offset, tree, index, rules}。
+    """
+
+    def __init__(self, quipu_dir: Path):
+        self.watch_dir = quipu_dir / "watch"
+        self.state_path = self.watch_dir / "state.json"
+        self.cookie_dir = self.watch_dir / "cookies"
+        self.baseline_path = self.watch_dir / "baseline.json"
+
+    def journal_path(self, session: str) -> Path:
+        return self.watch_dir / f"journal-{session}"
+
+    # --- 监控进程侧 ---
+
+    def begin_session(self) -> str:
+        """开始一个新的监控会话，清理旧会话留下的日志。"""
+        self.watch_dir.mkdir(parents=True, exist_ok=True)
+        self.cookie_dir.mkdir(exist_ok=True)
+        for old in self.watch_dir.glob("journal-*"):
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+        session = uuid.uuid4().hex
+        self.journal_path(session).touch()
+        self._write_json(self.state_path, {"session": session, "pid": os.getpid()})
+        return session
+
+    def end_session(self, session: str):
+        try:
+            if self._read_json(self.state_path).get("session") == session:
+                self.state_path.unlink()
+            self.journal_path(session).unlink()
+        except OSError:
+            pass
+
+    def append(self, session: str, records: List[str]):
+        """原子地追加一批记录 (单次 write 调用)。"""
+        if not records:
+            return
+        data = ("\n".join(records) + "\n").encode("utf-8", "surrogateescape")
+        fd = os.open(self.journal_path(session), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    # --- 读取方侧 ---
+
+    def active_session(self) -> Optional[str]:
+        """返回当前存活的监控会话 ID；没有监控进程在运行时返回 None。"""
+        state = self._read_json(self.state_path)
+        session, pid = state.get("session"), state.get("pid")
+        if not session or not isinstance(pid, int):
+            return None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return session
+
+    def sync(self, session: str, start: int = 0, timeout: float = 0.5) -> Optional[int]:
+        """
+        同步屏障：创建一个 cookie 文件并等待监控进程将其写入日志。
+        由于 inotify 事件按顺序投递，cookie 之前发生的所有变更都已在日志中。
+
+        Args:
+            start: 从该偏移量开始搜索 cookie 记录。
+
+        Returns:
+            cookie 记录之后的日志偏移量；超时或会话失效时返回 None。
+        """
+        cookie = uuid.uuid4().hex
+        cookie_path = self.cookie_dir / cookie
+        marker = f"C {cookie}\n".encode("ascii")
+        try:
+            cookie_path.touch()
+        except OSError:
+            return None
+
+        try:
+            with open(self.journal_path(session), "rb") as f:
+                f.seek(start)
+                data = b""
+                deadline = time.monotonic() + timeout
+                while time.monotonic() < deadline:
+                    data += f.read()
+                    pos = data.find(marker)
+                    if pos != -1:
+                        return start + pos + len(marker)
+                    time.sleep(0.002)
+            return None
+        except OSError:
+            return None
+        finally:
+            try:
+                cookie_path.unlink()
+            except OSError:
+                pass
+
+    def read_changes(self, session: str, start: int, end: int) -> Tuple[Set[str], bool]:
+        """读取 [start, end) 区间内的变更路径。返回 (paths, overflowed)。"""
+        with open(self.journal_path(session), "rb") as f:
+            f.seek(start)
+            data = f.read(max(0, end - start))
+
+        paths: Set[str] = set()
+        for line in data.decode("utf-8", "surrogateescape").splitlines():
+            if line == "O":
+                return paths, True
+            if line.startswith("P "):
+                paths.add(line[2:])
+        return paths, False
+
+    def load_baseline(self) -> Dict:
+        return self._read_json(self.baseline_path)
+
+    def save_baseline(self, baseline: Dict):
+        try:
+            self._write_json(self.baseline_path, baseline)
+        except OSError as e:
+            logger.debug(f"Failed to save watch baseline: {e}")
+
+    # --- 工具 ---
+
+    @staticmethod
+    def _read_json(path: Path) -> Dict:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_json(path: Path, data: Dict):
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+class InotifyWatcher:
+    """
+    基于 inotify 的工作区监控器 (通过 ctypes 调用 libc，无额外依赖)。
+
+    递归监控仓库中除 .git/ 与 .quipu/ 之外的所有目录，将变更路径写入 WatchJournal。
+    可以在前台运行 (`quipu watch`)，也可以通过 start() 在后台线程中运行。
+    """
+
+    def __init__(self, root: Path, journal: Optional[WatchJournal] = None):
+        if not is_supported():
+            raise WatcherUnavailable("inotify is only available on Linux")
+        self.root = root.resolve()
+        self.journal = journal or WatchJournal(self.root / ".quipu")
+        self.session: Optional[str] = None
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = -1
+        self._wd_to_path: Dict[int, str] = {}
+        self._cookie_wd = -1
+        self._overflowed = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- inotify 封装 ---
+
+    def _add_watch(self, abs_path: Path, rel_path: str) -> bool:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(abs_path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise WatcherUnavailable("inotify watch limit reached (fs.inotify.max_user_watches)")
+            # 目录可能在我们添加监控前已被删除
+            return False
+        self._wd_to_path[wd] = rel_path
+        return True
+
+    def _watch_tree(self, abs_dir: Path, rel_dir: str) -> List[str]:
+        """递归地为目录添加监控，返回新发现的文件 (用于补记监控建立前就已存在的变更)。"""
+        found: List[str] = []
+        if not self._add_watch(abs_dir, rel_dir):
+            return found
+        for dirpath, dirnames, filenames in os.walk(abs_dir):
+            rel_base = Path(dirpath).relative_to(self.root).as_posix()
+            if rel_base == ".":
+                dirnames[:] = [d for d in dirnames if d not in _SKIP_DIRS]
+            for dirname in dirnames:
+                rel = f"{rel_base}/{dirname}" if rel_base != "." else dirname
+                self._add_watch(Path(dirpath) / dirname, rel)
+            for filename in filenames:
+                found.append(f"{rel_base}/{filename}" if rel_base != "." else filename)
+        return found
+
+    def _open(self):
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self._fd < 0:
+            raise WatcherUnavailable(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self.session = self.journal.begin_session()
+        self._watch_tree(self.root, ".")
+        self._cookie_wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(self.journal.cookie_dir), IN_CREATE | IN_ONLYDIR
+        )
+        logger.debug(f"Watching {len(self._wd_to_path)} directories under {self.root} (session={self.session})")
+
+    def _close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._wd_to_path.clear()
+        if self.session:
+            self.journal.end_session(self.session)
+
+    # --- 事件处理 ---
+
+    def _handle_events(self, buf: bytes) -> List[str]:
+        records: List[str] = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = buf[offset : offset + name_len].rstrip(b"\0")
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                self._overflowed = True
+                records.append("O")
+                continue
+
+            if wd == self._cookie_wd:
+                if mask & IN_CREATE and name:
+                    records.append(f"C {os.fsdecode(name)}")
+                continue
+
+            if mask & IN_IGNORED:
+                self._wd_to_path.pop(wd, None)
+                continue
+
+            base = self._wd_to_path.get(wd)
+            if base is None:
+                continue
+            if not name:
+                # 被监控目录自身被删除或移动
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and base != ".":
+                    records.append(f"P {base}")
+                continue
+
+            decoded = os.fsdecode(name)
+            if "\n" in decoded:
+                # 日志按行分隔，无法表示包含换行的文件名：放弃本次会话的增量信息
+                self._overflowed = True
+                records.append("O")
+                continue
+
+            rel_path = f"{base}/{decoded}" if base != "." else decoded
+            if base == "." and decoded in _SKIP_DIRS:
+                continue
+            records.append(f"P {rel_path}")
+
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # 新目录: 建立监控，并补记其中已存在的文件
+                for found in self._watch_tree(self.root / rel_path, rel_path):
+                    records.append(f"P {found}")
+        return records
+
+    def _loop(self):
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        while not self._stop.is_set():
+            if not poller.poll(200):
+                continue
+            try:
+                buf = os.read(self._fd, 256 * 1024)
+            except BlockingIOError:
+                continue
+            records = self._handle_events(buf)
+            self.journal.append(self.session, records)
+            if self._overflowed:
+                logger.warning("inotify event queue overflowed; incremental tracking disabled for this session.")
+                break
+
+    # --- 生命周期 ---
+
+    def run_forever(self):
+        """在当前线程中运行监控，直到 stop() 被调用或队列溢出。"""
+        try:
+            self._open()
+            self._loop()
+        finally:
+            self._close()
+
+    def start(self):
+        """在后台线程中运行监控。返回时监控已经建立。"""
+        try:
+            self._open()
+        except Exception:
+            self._close()
+            raise
+
+        def target():
+            try:
+                self._loop()
+            finally:
+                self._close()
+
+        self._thread = threading.Thread(target=target, name="quipu-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
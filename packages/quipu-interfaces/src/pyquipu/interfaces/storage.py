@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, Set
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
 
 from .models import QuipuNode
 
@@ -37,9 +38,17 @@ class HistoryReader(ABC):
         summary_regex: Optional[str] = None,
         node_type: Optional[str] = None,
         limit: int = 10,
+        text: Optional[str] = None,
     ) -> List[QuipuNode]:
         """
         根据条件查找历史节点。
+
+        Args:
+            summary_regex: 匹配节点摘要的正则表达式 (不区分大小写)。
+            node_type: 节点类型。
+            limit: 返回的最大结果数量。
+            text: 全文检索词 (空白分隔，需全部命中)，在摘要、计划内容与元数据中检索。
+                  提供时结果按相关度排序，否则按时间倒序。
         """
         pass
 
@@ -87,6 +96,164 @@ class HistoryReader(ABC):
         """
         pass
 
+    # --- 点查询 (Point Queries) ---
+    # 以下方法提供了基于 load_all_nodes 的默认实现，以保持对现有实现的兼容。
+    # 具备索引能力的后端 (如 SQLite) 应覆盖它们，并将 supports_point_queries 设为 True，
+    # 这样 Engine 就可以在不加载完整图谱的情况下完成状态对齐。
+
+    supports_point_queries: bool = False
+
+    def has_nodes(self) -> bool:
+        """判断存储中是否存在任何历史节点。"""
+        return self.get_node_count() > 0
+
+    def find_node_by_output_tree(self, output_tree_hash: str) -> Optional[QuipuNode]:
+        """查找 output_tree 匹配的节点 (存在多个时返回最新的一个)。"""
+        matches = [node for node in self.load_all_nodes() if node.output_tree == output_tree_hash]
+        return max(matches, key=lambda node: node.timestamp) if matches else None
+
+    def find_nodes_by_output_tree_prefix(self, prefix: str) -> List[QuipuNode]:
+        """查找 output_tree 以 prefix 开头的所有节点，按时间倒序排列。"""
+        matches = [node for node in self.load_all_nodes() if node.output_tree.startswith(prefix)]
+        return sorted(matches, key=lambda node: node.timestamp, reverse=True)
+
+    def get_node_by_commit(self, commit_hash: str) -> Optional[QuipuNode]:
+        """根据 commit_hash 获取单个节点。"""
+        return next((node for node in self.load_all_nodes() if node.commit_hash == commit_hash), None)
+
+    def get_parent(self, commit_hash: str) -> Optional[QuipuNode]:
+        """获取指定节点的父节点。"""
+        node = self.get_node_by_commit(commit_hash)
+        return node.parent if node else None
+
+    def get_children(self, commit_hash: str) -> List[QuipuNode]:
+        """获取指定节点的所有子节点，按时间正序排列。"""
+        node = self.get_node_by_commit(commit_hash)
+        return list(node.children) if node else []
+
+    def get_latest_node(self) -> Optional[QuipuNode]:
+        """获取时间戳最新的节点。"""
+        nodes = self.load_all_nodes()
+        return max(nodes, key=lambda node: node.timestamp) if nodes else None
+
+    # --- 可达性 (Reachability) ---
+
+    def is_ancestor(self, ancestor_commit: str, descendant_commit: str) -> bool:
+        """判断 ancestor_commit 是否为 descendant_commit 的严格祖先。"""
+        node = self.get_node_by_commit(descendant_commit)
+        parent = node.parent if node else None
+        while parent is not None:
+            if parent.commit_hash == ancestor_commit:
+                return True
+            parent = parent.parent
+        return False
+
+    def get_reachable_output_trees(self, start_output_tree_hash: str) -> Set[str]:
+        """获取与指定状态直接相关的 output_tree 集合: 祖先、后代以及它自身。"""
+        reachable = self.get_ancestor_output_trees(start_output_tree_hash)
+        reachable |= self.get_descendant_output_trees(start_output_tree_hash)
+        reachable.add(start_output_tree_hash)
+        return reachable
+
+    # --- 批量读取 (Batch Reads) ---
+
+    def get_node_contents(self, nodes: List[QuipuNode]) -> Dict[str, str]:
+        """批量获取一组节点的完整内容，返回 {commit_hash: content}。后端可覆盖以合并读取。"""
+        return {node.commit_hash: self.get_node_content(node) for node in nodes}
+
+    def get_nodes_blobs(self, commit_hashes: List[str]) -> Dict[str, Dict[str, bytes]]:
+        """批量获取多个节点内所有文件的原始内容，返回 {commit_hash: {filename: content_bytes}}。"""
+        return {commit_hash: self.get_node_blobs(commit_hash) for commit_hash in commit_hashes}
+
+    def get_private_data_many(self, commit_hashes: List[str]) -> Dict[str, str]:
+        """批量获取一组节点的私有数据，只返回存在私有数据的节点 {commit_hash: data}。"""
+        result = {}
+        for commit_hash in commit_hashes:
+            data = self.get_private_data(commit_hash)
+            if data:
+                result[commit_hash] = data
+        return result
+
+    # --- 流式遍历 (Streaming) ---
+
+    def iter_nodes(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        node_type: Optional[str] = None,
+        owner_id: Optional[str] = None,
+    ) -> Iterator[QuipuNode]:
+        """
+        按时间倒序逐个产出满足条件的节点。
+
+        调用方可以随时停止迭代；能够流式读取的后端应覆盖此方法，将过滤条件下推到存储层，
+        使只取前 N 个节点的代价与历史规模无关。
+
+        Args:
+            since: 只产出时间戳不早于该时刻的节点。
+            until: 只产出时间戳不晚于该时刻的节点。
+            node_type: 节点类型。
+            owner_id: 节点所有者 (仅对记录所有者的后端有效)。
+        """
+        for node in self._sorted_for_paging():
+            if since is not None and node.timestamp < since:
+                break
+            if until is not None and node.timestamp > until:
+                continue
+            if node_type is not None and node.node_type != node_type:
+                continue
+            if owner_id is not None and node.owner_id != owner_id:
+                continue
+            yield node
+
+    # --- 游标分页 (Keyset Pagination) ---
+    # 节点按 (timestamp, commit_hash) 倒序排列，游标即页边界节点的 commit_hash。
+    # 与 OFFSET 分页不同，基于游标的定位代价与页码深度无关。
+
+    def _sorted_for_paging(self) -> List[QuipuNode]:
+        return sorted(self.load_all_nodes(), key=lambda node: (node.timestamp, node.commit_hash), reverse=True)
+
+    def load_nodes_page(self, limit: int, before: Optional[str] = None, after: Optional[str] = None) -> List[QuipuNode]:
+        """
+        基于游标加载一页节点，按 (timestamp, commit_hash) 倒序返回。
+
+        Args:
+            limit: 本页最多返回的节点数。
+            before: 只返回排在该节点之后 (更旧) 的节点，用于向后翻页。
+            after: 只返回排在该节点之前 (更新) 的、与其最接近的节点，用于向前翻页。
+            两者都未提供时返回最新的一页。游标节点不存在时返回空列表。
+        """
+        nodes = self._sorted_for_paging()
+        cursor = before if before is not None else after
+        if cursor is None:
+            return nodes[:limit]
+        index = next((i for i, node in enumerate(nodes) if node.commit_hash == cursor), None)
+        if index is None:
+            return []
+        if before is not None:
+            return nodes[index + 1 : index + 1 + limit]
+        return nodes[max(0, index - limit) : index]
+
+    def get_commit_at_offset(self, commit_hash: Optional[str], offset: int) -> Optional[str]:
+        """
+        从已知节点出发，在倒序排列中移动 offset 步，返回到达节点的 commit_hash，用于跳转到任意页。
+
+        Args:
+            commit_hash: 出发节点。为 None 时从列表两端出发: offset >= 0 表示从最新的节点数起
+                         (0 即最新节点)，offset < 0 表示从最旧的节点倒数 (-1 即最旧节点)。
+            offset: 正数向更旧的方向移动，负数向更新的方向移动。
+            目标越界或出发节点不存在时返回 None。
+        """
+        nodes = self._sorted_for_paging()
+        if commit_hash is None:
+            index = offset if offset >= 0 else len(nodes) + offset
+        else:
+            start = next((i for i, node in enumerate(nodes) if node.commit_hash == commit_hash), None)
+            if start is None:
+                return None
+            index = start + offset
+        return nodes[index].commit_hash if 0 <= index < len(nodes) else None
+
 
 class HistoryWriter(ABC):
     """
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Callable, List, TypedDict
+from typing import Callable, List, Optional, TypedDict
 
 from .exceptions import ExecutionError
 
@@ -32,6 +32,34 @@ class ActContext:
         """生成 diff 并请求用户确认"""
         return self._executor.request_confirmation(file_path, old_content, new_content)
 
+    # --- 文件操作 ---
+    # 经由执行器当前的文件系统完成。执行期间修改暂存在覆盖层中 (读取会看到暂存的内容)，
+    # 在计划执行完毕后一次性落盘。
+
+    def exists(self, path: Path) -> bool:
+        return self._executor.fs.exists(path)
+
+    def is_dir(self, path: Path) -> bool:
+        return self._executor.fs.is_dir(path)
+
+    def read_text(self, path: Path) -> str:
+        return self._executor.fs.read_text(path)
+
+    def write_text(self, path: Path, content: str):
+        """写入文件，必要时创建父目录"""
+        self._executor.fs.write_text(path, content)
+
+    def append_text(self, path: Path, content: str):
+        self._executor.fs.append_text(path, content)
+
+    def delete(self, path: Path):
+        """删除文件或 (递归地) 删除目录"""
+        self._executor.fs.delete(path)
+
+    def move(self, src: Path, dest: Path):
+        """移动文件或目录，必要时创建目标的父目录"""
+        self._executor.fs.move(src, dest)
+
     def fail(self, message: str):
         """
         向执行器报告一个可恢复的错误并终止当前 act。
@@ -49,6 +77,11 @@ ActFunction = Callable[[ActContext, List[str]], None]
 # 用于根据指令参数生成单行摘要
 Summarizer = Callable[[List[str], List[str]], str]
 
+# Touches 函数签名定义: (args) -> paths
+# 根据传给 act 的最终参数，声明其将读写的工作区相对路径。
+# 返回 None 表示无法确定，该 act 将与其他所有 act 串行执行。
+Touches = Callable[[List[str]], Optional[List[str]]]
+
 
 class Statement(TypedDict):
     """表示解析后的单个操作语句"""
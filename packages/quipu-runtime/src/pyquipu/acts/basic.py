@@ -1,5 +1,5 @@
 import logging
-from typing import List
+from typing import List, Optional
 
 from pyquipu.common.messaging import bus
 from pyquipu.interfaces.types import ActContext, Executor
@@ -9,10 +9,14 @@ logger = logging.getLogger(__name__)
 
 def register(executor: Executor):
     """注册基础文件系统操作"""
-    executor.register("write_file", _write_file, arg_mode="hybrid", summarizer=_summarize_write)
-    executor.register("patch_file", _patch_file, arg_mode="hybrid", summarizer=_summarize_patch_file)
-    executor.register("append_file", _append_file, arg_mode="hybrid", summarizer=_summarize_append)
-    executor.register("end", _end, arg_mode="hybrid")
+    executor.register("write_file", _write_file, arg_mode="hybrid", summarizer=_summarize_write, touches=_touches_path)
+    executor.register(
+        "patch_file", _patch_file, arg_mode="hybrid", summarizer=_summarize_patch_file, touches=_touches_path
+    )
+    executor.register(
+        "append_file", _append_file, arg_mode="hybrid", summarizer=_summarize_append, touches=_touches_path
+    )
+    executor.register("end", _end, arg_mode="hybrid", touches=_touches_nothing)
     executor.register("echo", _echo, arg_mode="hybrid")
 
 
@@ -31,6 +35,14 @@ def _summarize_append(args: List[str], contexts: List[str]) -> str:
     return f"Append to: {path}"
 
 
+def _touches_path(args: List[str]) -> Optional[List[str]]:
+    return args[:1] or None
+
+
+def _touches_nothing(args: List[str]) -> List[str]:
+    return []
+
+
 def _end(ctx: ActContext, args: List[str]):
     """
     Act: end
@@ -67,17 +79,16 @@ def _write_file(ctx: ActContext, args: List[str]):
     target_path = ctx.resolve_path(raw_path)
 
     old_content = ""
-    if target_path.exists():
+    if ctx.exists(target_path):
         try:
-            old_content = target_path.read_text(encoding="utf-8")
+            old_content = ctx.read_text(target_path)
         except Exception:
             old_content = "[Binary or Unreadable]"
 
     ctx.request_confirmation(target_path, old_content, content)
 
     try:
-        target_path.parent.mkdir(parents=True, exist_ok=True)
-        target_path.write_text(content, encoding="utf-8")
+        ctx.write_text(target_path, content)
     except PermissionError:
         ctx.fail(bus.get("acts.basic.error.writePermission", path=raw_path))
     except Exception as e:
@@ -101,11 +112,11 @@ def _patch_file(ctx: ActContext, args: List[str]):
     raw_path, old_str, new_str = args[0], args[1], args[2]
     target_path = ctx.resolve_path(raw_path)
 
-    if not target_path.exists():
+    if not ctx.exists(target_path):
         ctx.fail(bus.get("acts.basic.error.fileNotFound", path=raw_path))
 
     try:
-        content = target_path.read_text(encoding="utf-8")
+        content = ctx.read_text(target_path)
     except Exception as e:
         ctx.fail(bus.get("acts.basic.error.readFailed", path=raw_path, error=e))
 
@@ -117,7 +128,7 @@ def _patch_file(ctx: ActContext, args: List[str]):
     ctx.request_confirmation(target_path, content, new_content)
 
     try:
-        target_path.write_text(new_content, encoding="utf-8")
+        ctx.write_text(target_path, new_content)
     except PermissionError:
         ctx.fail(bus.get("acts.basic.error.patchPermission", path=raw_path))
     except Exception as e:
@@ -137,12 +148,12 @@ def _append_file(ctx: ActContext, args: List[str]):
     raw_path, content_to_append = args[0], args[1]
     target_path = ctx.resolve_path(raw_path)
 
-    if not target_path.exists():
+    if not ctx.exists(target_path):
         ctx.fail(bus.get("acts.basic.error.fileNotFound", path=raw_path))
 
     old_content = ""
     try:
-        old_content = target_path.read_text(encoding="utf-8")
+        old_content = ctx.read_text(target_path)
     except Exception:
         old_content = "[Binary or Unreadable]"
 
@@ -151,8 +162,7 @@ def _append_file(ctx: ActContext, args: List[str]):
     ctx.request_confirmation(target_path, old_content, new_content)
 
     try:
-        with open(target_path, "a", encoding="utf-8") as f:
-            f.write(content_to_append)
+        ctx.append_text(target_path, content_to_append)
     except PermissionError:
         ctx.fail(bus.get("acts.basic.error.appendPermission", path=raw_path))
     except Exception as e:
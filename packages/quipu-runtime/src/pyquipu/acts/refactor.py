@@ -1,6 +1,5 @@
 import logging
-import shutil
-from typing import List
+from typing import List, Optional
 
 from pyquipu.common.messaging import bus
 from pyquipu.interfaces.types import ActContext, Executor
@@ -10,8 +9,16 @@ logger = logging.getLogger(__name__)
 
 def register(executor: Executor):
     """注册重构类操作"""
-    executor.register("move_file", _move_file, arg_mode="hybrid")
-    executor.register("delete_file", _delete_file, arg_mode="exclusive")
+    executor.register("move_file", _move_file, arg_mode="hybrid", touches=_touches_move)
+    executor.register("delete_file", _delete_file, arg_mode="exclusive", touches=_touches_delete)
+
+
+def _touches_move(args: List[str]) -> Optional[List[str]]:
+    return args[:2] if len(args) >= 2 else None
+
+
+def _touches_delete(args: List[str]) -> Optional[List[str]]:
+    return args[:1] or None
 
 
 def _move_file(ctx: ActContext, args: List[str]):
@@ -26,15 +33,14 @@ def _move_file(ctx: ActContext, args: List[str]):
     src_path = ctx.resolve_path(src_raw)
     dest_path = ctx.resolve_path(dest_raw)
 
-    if not src_path.exists():
+    if not ctx.exists(src_path):
         ctx.fail(bus.get("acts.refactor.error.srcNotFound", path=src_raw))
 
     msg = f"Move: {src_raw} -> {dest_raw}"
     ctx.request_confirmation(src_path, "Source Exists", msg)
 
     try:
-        dest_path.parent.mkdir(parents=True, exist_ok=True)
-        shutil.move(str(src_path), str(dest_path))
+        ctx.move(src_path, dest_path)
     except PermissionError:
         ctx.fail(bus.get("acts.refactor.error.movePermission", src=src_raw, dest=dest_raw))
     except Exception as e:
@@ -53,20 +59,17 @@ def _delete_file(ctx: ActContext, args: List[str]):
     raw_path = args[0]
     target_path = ctx.resolve_path(raw_path)
 
-    if not target_path.exists():
+    if not ctx.exists(target_path):
         bus.warning("acts.refactor.warning.deleteSkipped", path=raw_path)
         return
 
-    file_type = "目录 (递归删除!)" if target_path.is_dir() else "文件"
+    file_type = "目录 (递归删除!)" if ctx.is_dir(target_path) else "文件"
     warning = f"🚨 正在删除{file_type}: {target_path}"
 
     ctx.request_confirmation(target_path, "EXISTING CONTENT", warning)
 
     try:
-        if target_path.is_dir():
-            shutil.rmtree(target_path)
-        else:
-            target_path.unlink()
+        ctx.delete(target_path)
     except PermissionError:
         ctx.fail(bus.get("acts.refactor.error.deletePermission", path=raw_path))
     except Exception as e:
@@ -1,13 +1,20 @@
+import contextvars
 import difflib
 import logging
+import os
 import shlex
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
 
 from pyquipu.common.messaging import bus
 from pyquipu.interfaces.exceptions import ExecutionError, OperationCancelledError
 from pyquipu.interfaces.types import ActContext, ActFunction, Statement
 
+from .overlay import DiskFileSystem, FileOverlay
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,6 +22,52 @@ logger = logging.getLogger(__name__)
 ConfirmationHandler = Callable[[List[str], str], bool]
 
 
+@dataclass
+class _Job:
+    """一条解析完毕、等待执行的语句。"""
+
+    index: int
+    act_name: str
+    func: ActFunction
+    arg_mode: str
+    args: List[str]
+    # act 声明会读写的绝对路径；None 表示未知，需要与其他所有 act 串行
+    paths: Optional[List[Path]]
+
+
+class _WaveGate:
+    """
+    同一批次内并行执行的 act 的副作用顺序控制。
+    确认提示等有副作用的步骤按语句顺序放行：只有序号更小的 act 全部成功结束后才能进行；
+    其中任何一个失败时，序号更大的 act 不再继续。
+    """
+
+    def __init__(self, indices: Iterable[int]):
+        self._pending = set(indices)
+        self._failed: Optional[int] = None
+        self._cond = threading.Condition()
+
+    def _failed_before(self, index: int) -> bool:
+        return self._failed is not None and self._failed < index
+
+    def superseded(self, index: int) -> bool:
+        with self._cond:
+            return self._failed_before(index)
+
+    def finish(self, index: int, ok: bool):
+        with self._cond:
+            self._pending.discard(index)
+            if not ok and not self._failed_before(index):
+                self._failed = index
+            self._cond.notify_all()
+
+    def wait_turn(self, index: int):
+        with self._cond:
+            self._cond.wait_for(lambda: self._failed_before(index) or all(i >= index for i in self._pending))
+            if self._failed_before(index):
+                raise OperationCancelledError("An earlier act in the plan failed.")
+
+
 class Executor:
     """
     执行器：负责管理可用的 Act 并执行解析后的语句。
@@ -26,12 +79,31 @@ class Executor:
         root_dir: Path,
         yolo: bool = False,
         confirmation_handler: Optional[ConfirmationHandler] = None,
+        max_workers: Optional[int] = None,
+        transactional: bool = False,
     ):
         self.root_dir = root_dir.resolve()
         self.yolo = yolo
         self.confirmation_handler = confirmation_handler
+        # 文件写入总是先暂存在覆盖层中，执行结束时一次性原地写回。
+        # 事务模式下删除与移动也被暂存，只有整个计划成功才原子地落盘，失败则工作区保持不变；
+        # 否则失败前的修改照常落盘
+        self.transactional = transactional
+        # act 通过 ActContext 进行文件操作时使用的文件系统
+        self._disk = DiskFileSystem()
+        self.fs: Any = self._disk
+        # 上一次 execute 可能修改过的绝对路径。执行过未声明路径的 act 时无法确定，为 None
+        self.changed_paths: Optional[Set[Path]] = set()
+        # 并行执行互不相关的 act 时使用的线程数；1 表示始终串行
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) + 4)
         # Map: name -> (func, arg_mode, summarizer)
         self._acts: Dict[str, tuple[ActFunction, str, Any]] = {}
+        # Map: name -> touches，只包含声明了读写路径的 act
+        self._touches: Dict[str, Any] = {}
+        # 并行执行时，确认提示必须一个接一个地出现
+        self._confirmation_lock = threading.Lock()
+        # 工作线程当前执行的 (批次控制, 语句序号)；串行执行时为空
+        self._local = threading.local()
 
         if not self.root_dir.exists():
             try:
@@ -39,7 +111,9 @@ class Executor:
             except Exception as e:
                 bus.warning("runtime.executor.warning.createRootDirFailed", path=self.root_dir, error=e)
 
-    def register(self, name: str, func: ActFunction, arg_mode: str = "hybrid", summarizer: Any = None):
+    def register(
+        self, name: str, func: ActFunction, arg_mode: str = "hybrid", summarizer: Any = None, touches: Any = None
+    ):
         """
         注册一个新的操作
         :param arg_mode: 参数解析模式
@@ -47,12 +121,20 @@ class Executor:
                          - "exclusive": 互斥模式。优先使用行内参数；若无行内参数，则使用块内容。绝不混合。
                          - "block_only": 仅使用块内容，强制忽略行内参数。
         :param summarizer: 可选的 Summarizer 函数 (args, context_blocks) -> str
+        :param touches: 可选的 Touches 函数 (args) -> paths，声明 act 读写的路径。
+                        声明了路径的 act 在与前序 act 没有路径冲突时可以并行执行。
+                        这类 act 必须通过 ActContext 的文件方法 (read_text/write_text 等) 访问文件，
+                        以便在事务模式下读写覆盖层；未声明路径的 act 执行前，已暂存的修改会先落盘。
         """
         valid_modes = {"hybrid", "exclusive", "block_only"}
         if arg_mode not in valid_modes:
             raise ValueError(f"Invalid arg_mode: {arg_mode}. Must be one of {valid_modes}")
 
         self._acts[name] = (func, arg_mode, summarizer)
+        if touches is not None:
+            self._touches[name] = touches
+        else:
+            self._touches.pop(name, None)
         logger.debug(f"注册 Act: {name} (Mode: {arg_mode})")
 
     def get_registered_acts(self) -> Dict[str, str]:
@@ -132,76 +214,279 @@ class Executor:
             raise OperationCancelledError("No confirmation handler is configured.")
 
         prompt = f"❓ 是否对 {file_path.name} 执行上述修改?"
+        # 并行执行时按语句顺序提示；前序 act 失败或被取消后不再提示
+        self._wait_turn()
         # 此调用现在要么成功返回，要么抛出 OperationCancelledError
-        self.confirmation_handler(diff, prompt)
+        with self._confirmation_lock:
+            self.confirmation_handler(diff, prompt)
 
     def execute(self, statements: List[Statement]):
-        """执行一系列语句"""
+        """
+        执行一系列语句。
+
+        所有 act 都声明了读写路径时，按路径冲突关系将语句分为若干批次：
+        同一批次内的 act 互不冲突，在线程池中并行执行；批次之间严格按顺序执行。
+        未声明路径的 act 独占一个批次，因此只含此类 act 的计划与逐条串行执行完全一致。
+
+        act 经由 ActContext 进行的文件读写都通过本次执行的 FileOverlay 完成，
+        每个被修改的文件只在结束时 (或在未声明路径的 act 之前) 落盘一次。
+        事务模式下任一语句失败时丢弃暂存的修改，工作区保持不变；
+        非事务模式下只有失败语句之前的修改会落盘：同一批次中序号更大的 act
+        即使已经执行，其暂存的修改也会被撤销，确认提示同样按语句顺序出现。
+        """
         bus.info("runtime.executor.info.starting", count=len(statements))
 
+        jobs: List[_Job] = []
+        # 无法解析的语句之前的语句仍然照常执行，之后再报告错误 (事务模式下这些修改会被丢弃)
+        parse_error: Optional[ExecutionError] = None
+        for i, stmt in enumerate(statements):
+            try:
+                job = self._prepare_job(i, stmt, len(statements))
+            except ExecutionError as e:
+                parse_error = e
+                break
+            if job:
+                jobs.append(job)
+        waves = self._schedule(jobs) if self.max_workers > 1 else [[job] for job in jobs]
+        self._run_waves(waves, len(statements), parse_error)
+
+    def execute_stream(self, statements: Iterable[Statement]):
+        """
+        边接收边执行语句，例如 parser.iter_parse 从管道输入中逐条解析出的语句。
+
+        语句总数事先未知，因此不做跨语句的并行调度：每条语句到达后立即执行。
+        覆盖层暂存、落盘时机与失败处理均与 execute 相同；
+        无法解析的语句与执行失败一样，会中止后续语句的读取。
+        """
+        bus.info("runtime.executor.info.streaming")
+
+        def waves() -> Iterator[List[_Job]]:
+            for i, stmt in enumerate(statements):
+                job = self._prepare_job(i, stmt, "?")
+                if job:
+                    yield [job]
+
+        self._run_waves(waves(), "?", None)
+
+    def _run_waves(self, waves: Iterable[List[_Job]], total: int | str, parse_error: Optional[ExecutionError]):
+        """按顺序执行各批次，并负责覆盖层的创建、落盘与失败时的处理。"""
         # 创建一个可重用的上下文对象
         ctx = ActContext(self)
+        # 只有事务模式以换入方式原子提交；否则原地写回，保留文件的 inode、属主与硬链接
+        overlay = FileOverlay(self.root_dir, atomic=self.transactional, before_direct=self._wait_turn)
+        self.fs = overlay
+        self.changed_paths = set()
+        pool: Optional[ThreadPoolExecutor] = None
+        try:
+            for wave in waves:
+                if len(wave) == 1:
+                    if wave[0].paths is None:
+                        # 该 act 可能直接读写磁盘 (例如 shell 命令)，需要先看到此前的修改
+                        self._commit_overlay(overlay)
+                    self._record_changes(wave[0].paths)
+                    self._run_job(ctx, wave[0], total)
+                    continue
+                if pool is None:
+                    pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="quipu-act")
+                logger.debug(f"并行执行 {len(wave)} 个互不冲突的 act")
+                gate = _WaveGate(job.index for job in wave)
+                snapshots = []
+                for job in wave:
+                    self._record_changes(job.paths)
+                    snapshots.append(overlay.snapshot(job.paths))
+                # 工作线程在调用方上下文的副本中运行，使上下文变量 (如守护进程按请求捕获输出) 得以延续
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._run_wave_job, ctx, job, total, gate)
+                    for job in wave
+                ]
+                # 等待整个批次结束后，按语句顺序抛出第一个错误
+                errors = [f.exception() for f in futures]
+                failed = next((i for i, error in enumerate(errors) if error is not None), None)
+                if failed is not None:
+                    # 失败语句之后的 act 不应生效，撤销它们已暂存的修改
+                    for snapshot in snapshots[failed + 1 :]:
+                        overlay.restore(snapshot)
+                    raise errors[failed]
+
+            if parse_error is not None:
+                raise parse_error
+            self._commit_overlay(overlay)
+        except BaseException:
+            if not overlay.dirty:
+                raise
+            if self.transactional:
+                logger.info("计划执行失败，已丢弃所有暂存的文件修改。")
+                overlay.discard()
+            else:
+                try:
+                    self._commit_overlay(overlay)
+                except ExecutionError:
+                    pass
+            raise
+        finally:
+            self.fs = self._disk
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+    def _record_changes(self, paths: Optional[List[Path]]):
+        # 声明的路径也计入变更集，以覆盖绕过覆盖层直接写盘的插件 act
+        if paths is None:
+            self.changed_paths = None
+        elif self.changed_paths is not None:
+            self.changed_paths.update(paths)
+
+    def _commit_overlay(self, overlay: FileOverlay):
+        try:
+            changed = overlay.commit()
+        except OSError as e:
+            # 原子模式下 commit 已回滚磁盘上的修改；暂存内容都不再重试
+            overlay.discard()
+            logger.error(f"Failed to apply staged changes: {e}")
+            if overlay.atomic:
+                raise ExecutionError(f"Failed to apply staged changes, workspace rolled back: {e}") from e
+            raise ExecutionError(f"Failed to write staged changes: {e}") from e
+        if self.changed_paths is not None:
+            self.changed_paths.update(changed)
+
+    def _prepare_job(self, i: int, stmt: Statement, total: int | str) -> Optional[_Job]:
+        """解析语句的指令行并确定最终参数。无法执行的语句返回 None。"""
+        raw_act_line = stmt["act"]
+        block_contexts = stmt["contexts"]
 
-        for i, stmt in enumerate(statements):
-            raw_act_line = stmt["act"]
-            block_contexts = stmt["contexts"]
-
-            try:
-                tokens = shlex.split(raw_act_line)
-            except ValueError as e:
-                raise ExecutionError(f"Error parsing Act command line: {raw_act_line} ({e})")
+        try:
+            tokens = shlex.split(raw_act_line)
+        except ValueError as e:
+            raise ExecutionError(f"Error parsing Act command line: {raw_act_line} ({e})")
 
-            if not tokens:
-                bus.warning("runtime.executor.warning.skipEmpty", current=i + 1, total=len(statements))
-                continue
+        if not tokens:
+            bus.warning("runtime.executor.warning.skipEmpty", current=i + 1, total=total)
+            return None
 
-            act_name = tokens[0]
-            inline_args = tokens[1:]
+        act_name = tokens[0]
+        inline_args = tokens[1:]
 
-            if act_name not in self._acts:
-                bus.warning(
-                    "runtime.executor.warning.skipUnknown",
-                    current=i + 1,
-                    total=len(statements),
-                    act_name=act_name,
-                )
-                continue
+        if act_name not in self._acts:
+            bus.warning(
+                "runtime.executor.warning.skipUnknown",
+                current=i + 1,
+                total=total,
+                act_name=act_name,
+            )
+            return None
 
-            func, arg_mode, _ = self._acts[act_name]
-
-            final_args = []
-            if arg_mode == "hybrid":
-                final_args = inline_args + block_contexts
-            elif arg_mode == "exclusive":
-                if inline_args:
-                    final_args = inline_args
-                    if block_contexts:
-                        logger.debug(
-                            f"ℹ️  [{act_name} - Exclusive] Inline args detected,"
-                            f" ignoring {len(block_contexts)} subsequent Block(s)."
-                        )
-                else:
-                    final_args = block_contexts
-            elif arg_mode == "block_only":
-                if inline_args:
-                    bus.warning("runtime.executor.warning.ignoreInlineArgs", act_name=act_name, args=inline_args)
+        func, arg_mode, _ = self._acts[act_name]
+
+        final_args = []
+        if arg_mode == "hybrid":
+            final_args = inline_args + block_contexts
+        elif arg_mode == "exclusive":
+            if inline_args:
+                final_args = inline_args
+                if block_contexts:
+                    logger.debug(
+                        f"ℹ️  [{act_name} - Exclusive] Inline args detected,"
+                        f" ignoring {len(block_contexts)} subsequent Block(s)."
+                    )
+            else:
                 final_args = block_contexts
+        elif arg_mode == "block_only":
+            if inline_args:
+                bus.warning("runtime.executor.warning.ignoreInlineArgs", act_name=act_name, args=inline_args)
+            final_args = block_contexts
 
-            try:
-                bus.info(
-                    "runtime.executor.info.executing",
-                    current=i + 1,
-                    total=len(statements),
-                    act_name=act_name,
-                    mode=arg_mode,
-                    arg_count=len(final_args),
-                )
-                # 传递上下文对象，而不是 executor 实例
-                func(ctx, final_args)
-            except OperationCancelledError:
-                # 显式地重新抛出，以确保它能被上层捕获
-                raise
-            except Exception as e:
-                # 记录详细日志供调试，同时抛出标准错误供上层展示
-                logger.error(f"Execution failed for '{act_name}': {e}")
-                raise ExecutionError(f"An error occurred while executing '{act_name}': {e}") from e
+        return _Job(i, act_name, func, arg_mode, final_args, self._declared_paths(act_name, final_args))
+
+    def _declared_paths(self, act_name: str, args: List[str]) -> Optional[List[Path]]:
+        touches = self._touches.get(act_name)
+        if touches is None:
+            return None
+        try:
+            rel_paths = touches(args)
+            if rel_paths is None:
+                return None
+            return [self.resolve_path(p) for p in rel_paths]
+        except Exception as e:
+            # 参数不完整或路径越界等错误留给 act 自己报告，这里只需放弃并行
+            logger.debug(f"Touches for '{act_name}' failed, running it serially: {e}")
+            return None
+
+    @staticmethod
+    def _schedule(jobs: List[_Job]) -> List[List[_Job]]:
+        """
+        将任务分为按顺序执行的批次。一个任务的批次号大于所有与之冲突的前序任务的批次号，
+        且不小于前一个任务的批次号：批次随语句顺序单调递增，因此某条语句失败时，
+        之后的语句要么在同一批次中被撤销，要么根本不会执行。
+        两个任务读写同一路径，或一个路径是另一个的祖先目录时视为冲突。
+        """
+        waves: List[List[_Job]] = []
+        # 路径 -> 最后一个恰好读写该路径的任务所在批次
+        exact: Dict[Path, int] = {}
+        # 路径 -> 读写该路径或其子路径的任务所在的最大批次
+        subtree: Dict[Path, int] = {}
+        # 后续任务的最小批次: 前一个任务所在批次 (未声明路径的任务之后为其下一批次)
+        floor = 0
+
+        for job in jobs:
+            if job.paths is None:
+                level = len(waves)
+                waves.append([job])
+                floor = level + 1
+                continue
+
+            level = floor
+            for path in job.paths:
+                level = max(level, subtree.get(path, -1) + 1)
+                for parent in path.parents:
+                    level = max(level, exact.get(parent, -1) + 1)
+            if level == len(waves):
+                waves.append([])
+            waves[level].append(job)
+            floor = level
+
+            for path in job.paths:
+                exact[path] = max(exact.get(path, -1), level)
+                for ancestor in (path, *path.parents):
+                    subtree[ancestor] = max(subtree.get(ancestor, -1), level)
+
+        return waves
+
+    def _run_wave_job(self, ctx: ActContext, job: _Job, total: int | str, gate: _WaveGate):
+        ok = False
+        self._local.turn = (gate, job.index)
+        try:
+            if gate.superseded(job.index):
+                # 前序 act 已失败，不再执行
+                ok = True
+                return
+            self._run_job(ctx, job, total)
+            ok = True
+        finally:
+            self._local.turn = None
+            gate.finish(job.index, ok)
+
+    def _wait_turn(self):
+        """并行批次中的 act 在产生副作用前调用，等待序号更小的 act 全部完成。"""
+        turn = getattr(self._local, "turn", None)
+        if turn is not None:
+            gate, index = turn
+            gate.wait_turn(index)
+
+    def _run_job(self, ctx: ActContext, job: _Job, total: int | str):
+        try:
+            bus.info(
+                "runtime.executor.info.executing",
+                current=job.index + 1,
+                total=total,
+                act_name=job.act_name,
+                mode=job.arg_mode,
+                arg_count=len(job.args),
+            )
+            # 传递上下文对象，而不是 executor 实例
+            job.func(ctx, job.args)
+        except OperationCancelledError:
+            # 显式地重新抛出，以确保它能被上层捕获
+            raise
+        except Exception as e:
+            # 记录详细日志供调试，同时抛出标准错误供上层展示
+            logger.error(f"Execution failed for '{job.act_name}': {e}")
+            raise ExecutionError(f"An error occurred while executing '{job.act_name}': {e}") from e
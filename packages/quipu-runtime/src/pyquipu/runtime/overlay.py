@@ -0,0 +1,479 @@
+"""
+文件系统覆盖层 (Overlay)：在内存中暂存 act 对工作区的修改，最后一次性落盘。
+
+暂存期间，读取会优先看到已暂存的内容，因此同一计划中的后续 act 能观察到前序 act 的修改，
+而真实的工作区保持不变。从磁盘读取过的文件内容也会被缓存，对同一文件的连续修改
+(例如数十次 patch_file) 只需读一次磁盘、写一次磁盘。写入在暂存时即检查权限，
+与直接写盘一样以 PermissionError 报告给 act。
+
+默认 (atomic=False) 时 commit() 按暂存顺序原地写回各文件，文件的 inode、权限、属主与硬链接
+均保持不变；删除与移动不暂存，直接作用于磁盘。
+原子模式 (atomic=True，用于事务执行) 下删除与移动也被暂存，commit() 以一个批次应用全部修改:
+
+1. 将所有新内容写入 .quipu 下事务目录中的临时文件，并统一 fsync；
+2. 把将被覆盖或删除的原有文件/目录改名移入事务目录作为备份；
+3. 用 os.replace 将临时文件换到目标位置，最后对涉及的目录各做一次 fsync。
+
+任一步骤失败时按相反顺序恢复备份，工作区回到 commit 之前的状态。
+由于新内容是换入而非写入，被覆盖文件的硬链接关系与属主不会保留。
+"""
+
+import errno
+import io
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DiskFileSystem:
+    """直接作用于磁盘的文件操作，接口与 FileOverlay 一致。"""
+
+    def exists(self, path: Path) -> bool:
+        return path.exists()
+
+    def is_dir(self, path: Path) -> bool:
+        return path.is_dir()
+
+    def read_bytes(self, path: Path) -> bytes:
+        return path.read_bytes()
+
+    def read_text(self, path: Path, encoding: str = "utf-8") -> str:
+        return path.read_text(encoding=encoding)
+
+    def write_bytes(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    def write_text(self, path: Path, content: str, encoding: str = "utf-8"):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding=encoding)
+
+    def append_text(self, path: Path, content: str, encoding: str = "utf-8"):
+        with open(path, "a", encoding=encoding) as f:
+            f.write(content)
+
+    def delete(self, path: Path):
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+    def move(self, src: Path, dest: Path):
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(src), str(dest))
+
+
+class FileOverlay:
+    """
+    暂存文件写入、删除与移动的覆盖层。所有路径均为工作区内的绝对路径。
+    方法是线程安全的，可供并行执行的 act 共享。
+    """
+
+    def __init__(self, root_dir: Path, atomic: bool = True, before_direct: Optional[Callable[[], None]] = None):
+        self.root_dir = root_dir
+        self.atomic = atomic
+        # 非原子模式下，直接作用于磁盘的删除与移动执行前的回调 (执行器借此保证副作用按语句顺序发生)
+        self._before_direct = before_direct
+        # 非原子模式下已直接应用到磁盘的路径
+        self._applied: Set[Path] = set()
+        # 暂存的文件内容
+        self._files: Dict[Path, bytes] = {}
+        # 需要创建的目录 (例如移动空目录)
+        self._dirs: Set[Path] = set()
+        # commit 时需要从磁盘上移除的路径 (文件或目录)
+        self._removed: Set[Path] = set()
+        # 未修改文件的磁盘内容缓存。只在没有其他写入者时有效，commit/discard 时清空
+        self._cache: Dict[Path, bytes] = {}
+        self._lock = threading.RLock()
+
+    # --- 查询 ---
+
+    @property
+    def dirty(self) -> bool:
+        with self._lock:
+            return bool(self._files or self._dirs or self._removed)
+
+    def _is_removed(self, path: Path) -> bool:
+        return any(p in self._removed for p in (path, *path.parents))
+
+    def _has_staged_under(self, path: Path) -> bool:
+        return any(path in p.parents for p in self._files) or any(p == path or path in p.parents for p in self._dirs)
+
+    def _disk_visible(self, path: Path) -> bool:
+        return not self._is_removed(path) and (path.exists() or path.is_symlink())
+
+    def exists(self, path: Path) -> bool:
+        with self._lock:
+            if path in self._files or self._has_staged_under(path):
+                return True
+            return self._disk_visible(path)
+
+    def is_dir(self, path: Path) -> bool:
+        with self._lock:
+            if path in self._files:
+                return False
+            if self._has_staged_under(path):
+                return True
+            return not self._is_removed(path) and path.is_dir()
+
+    def read_bytes(self, path: Path) -> bytes:
+        with self._lock:
+            if path in self._files:
+                return self._files[path]
+            if self._is_removed(path):
+                raise FileNotFoundError(str(path))
+            if path in self._cache:
+                return self._cache[path]
+        data = path.read_bytes()
+        with self._lock:
+            self._cache[path] = data
+        return data
+
+    def read_text(self, path: Path, encoding: str = "utf-8") -> str:
+        # 与 Path.read_text 一样以文本模式解码 (通用换行: \r\n 与 \r 均读作 \n)
+        with io.TextIOWrapper(io.BytesIO(self.read_bytes(path)), encoding=encoding, newline=None) as f:
+            return f.read()
+
+    # --- 修改 ---
+
+    def _check_writable(self, path: Path):
+        """按直接写盘时的权限检查 path 能否被写入或创建。"""
+        if path in self._files:
+            return
+        if self._disk_visible(path):
+            if path.is_dir():
+                return
+            if not os.access(path, os.W_OK):
+                raise PermissionError(errno.EACCES, os.strerror(errno.EACCES), str(path))
+            return
+        for parent in path.parents:
+            if self._disk_visible(parent):
+                if not os.access(parent, os.W_OK | os.X_OK):
+                    raise PermissionError(errno.EACCES, os.strerror(errno.EACCES), str(path))
+                return
+            if self._has_staged_under(parent):
+                # 该目录将由本覆盖层创建
+                return
+
+    def write_bytes(self, path: Path, data: bytes):
+        with self._lock:
+            if self.is_dir(path):
+                raise IsADirectoryError(str(path))
+            self._check_writable(path)
+            self._files[path] = data
+
+    def write_text(self, path: Path, content: str, encoding: str = "utf-8"):
+        self.write_bytes(path, content.encode(encoding))
+
+    def append_text(self, path: Path, content: str, encoding: str = "utf-8"):
+        with self._lock:
+            self.write_bytes(path, self.read_bytes(path) + content.encode(encoding))
+
+    def delete(self, path: Path):
+        """删除文件或 (递归地) 删除目录。"""
+        if not self.atomic:
+            self._delete_direct(path)
+            return
+        with self._lock:
+            if not self.exists(path):
+                raise FileNotFoundError(str(path))
+            if self._disk_visible(path):
+                self._check_writable(path.parent)
+            for staged in [p for p in self._files if p == path or path in p.parents]:
+                del self._files[staged]
+            self._dirs = {p for p in self._dirs if not (p == path or path in p.parents)}
+            if self._disk_visible(path):
+                self._removed = {p for p in self._removed if path not in p.parents}
+                self._removed.add(path)
+
+    def move(self, src: Path, dest: Path):
+        """移动文件或目录。原子模式下目录会被展开为其中的文件与子目录。"""
+        if not self.atomic:
+            self._move_direct(src, dest)
+            return
+        with self._lock:
+            if not self.exists(src):
+                raise FileNotFoundError(str(src))
+            if self._disk_visible(src):
+                self._check_writable(src.parent)
+            self._check_writable(dest)
+            if self.is_dir(src):
+                files, dirs = self._list_tree(src)
+                for d in dirs:
+                    self._dirs.add(dest / d.relative_to(src))
+                self._dirs.add(dest)
+                contents = {dest / f.relative_to(src): self.read_bytes(f) for f in files}
+                self.delete(src)
+                self._files.update(contents)
+            else:
+                data = self.read_bytes(src)
+                self.delete(src)
+                self.write_bytes(dest, data)
+
+    def _delete_direct(self, path: Path):
+        if self._before_direct is not None:
+            self._before_direct()
+        with self._lock:
+            if not self.exists(path):
+                raise FileNotFoundError(str(path))
+            staged = [p for p in self._files if _is_under(p, [path])]
+            on_disk = self._disk_visible(path)
+            if on_disk:
+                DiskFileSystem().delete(path)
+                self._applied.add(path)
+            for p in staged:
+                del self._files[p]
+            self._forget_cached(path)
+
+    def _move_direct(self, src: Path, dest: Path):
+        if self._before_direct is not None:
+            self._before_direct()
+        with self._lock:
+            if not self.exists(src):
+                raise FileNotFoundError(str(src))
+            # 先写回两处已暂存的内容，再在磁盘上移动
+            self._flush_files([p for p in self._files if _is_under(p, [src, dest])])
+            DiskFileSystem().move(src, dest)
+            self._applied.update((src, dest))
+            self._forget_cached(src)
+            self._forget_cached(dest)
+
+    def _forget_cached(self, root: Path):
+        for p in [p for p in self._cache if _is_under(p, [root])]:
+            del self._cache[p]
+
+    def _flush_files(self, paths: List[Path]):
+        """按暂存顺序原地写回文件。写入成功的文件会移出暂存区。"""
+        for path in paths:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(self._files[path])
+            del self._files[path]
+            self._applied.add(path)
+
+    def _list_tree(self, root: Path) -> Tuple[List[Path], List[Path]]:
+        files: Set[Path] = {p for p in self._files if root in p.parents}
+        dirs: Set[Path] = {p for p in self._dirs if root in p.parents}
+        if not self._is_removed(root) and root.is_dir():
+            for dirpath, dirnames, filenames in os.walk(root):
+                base = Path(dirpath)
+                for name in dirnames:
+                    if not self._is_removed(base / name):
+                        dirs.add(base / name)
+                for name in filenames:
+                    if not self._is_removed(base / name):
+                        files.add(base / name)
+        return sorted(files), sorted(dirs)
+
+    def snapshot(self, paths: List[Path]) -> "_Snapshot":
+        """记录 paths 及其子路径当前的暂存状态，供 restore 撤销此后对它们的修改。"""
+        with self._lock:
+            return _Snapshot(
+                list(paths),
+                {p: d for p, d in self._files.items() if _is_under(p, paths)},
+                {p for p in self._dirs if _is_under(p, paths)},
+                {p for p in self._removed if _is_under(p, paths)},
+            )
+
+    def restore(self, snapshot: "_Snapshot"):
+        """将 snapshot 覆盖的路径恢复到记录时的暂存状态，其他路径不受影响。"""
+        paths = snapshot.paths
+        with self._lock:
+            for p in [p for p in self._files if _is_under(p, paths)]:
+                del self._files[p]
+            self._files.update(snapshot.files)
+            self._dirs = {p for p in self._dirs if not _is_under(p, paths)} | snapshot.dirs
+            self._removed = {p for p in self._removed if not _is_under(p, paths)} | snapshot.removed
+
+    def discard(self):
+        """丢弃所有暂存的修改与读缓存。"""
+        with self._lock:
+            self._files.clear()
+            self._dirs.clear()
+            self._removed.clear()
+            self._cache.clear()
+            self._applied.clear()
+
+    # --- 提交 ---
+
+    def changed_paths(self) -> Tuple[Set[Path], Set[Path]]:
+        """返回 (写入的文件, 移除的路径)。"""
+        with self._lock:
+            return set(self._files), set(self._removed)
+
+    def commit(self) -> Set[Path]:
+        """
+        将所有暂存的修改应用到磁盘，返回被写入、移除或移动的路径。
+        原子模式下失败时回滚并重新抛出异常；否则失败前已写回的文件保留。
+        """
+        with self._lock:
+            changed = set(self._files) | self._dirs | self._removed | self._applied
+            if not self.dirty:
+                self.discard()
+                return changed
+            if not self.atomic:
+                # 原地写回：失败时已写入的文件保留，与逐个 act 直接写盘的结果一致
+                self._flush_files(list(self._files))
+                self.discard()
+                return changed
+            txn = _Transaction(self.root_dir)
+            try:
+                txn.apply(self._files, self._dirs, self._removed)
+            except BaseException:
+                txn.rollback()
+                raise
+            finally:
+                txn.cleanup()
+            self.discard()
+            return changed
+
+
+@dataclass
+class _Snapshot:
+    paths: List[Path]
+    files: Dict[Path, bytes]
+    dirs: Set[Path]
+    removed: Set[Path]
+
+
+def _is_under(path: Path, roots: List[Path]) -> bool:
+    return any(path == root or root in path.parents for root in roots)
+
+
+class _Transaction:
+    """一次 commit 的执行与回滚记录。临时文件与备份都放在 .quipu 下的事务目录中。"""
+
+    def __init__(self, root_dir: Path):
+        self.root_dir = root_dir
+        self._txn_dir: Optional[Path] = None
+        self._created_quipu_dir = False
+        self._temp_files: List[Path] = []
+        # (备份位置, 原位置)
+        self._backups: List[Tuple[Path, Path]] = []
+        self._unrestored: List[Path] = []
+        # 已被放置到位的新文件
+        self._placed: List[Path] = []
+        self._created_dirs: List[Path] = []
+        self._touched_dirs: Set[Path] = set()
+
+    def _scratch(self, name: str) -> Path:
+        if self._txn_dir is None:
+            quipu_dir = self.root_dir / ".quipu"
+            if not quipu_dir.exists():
+                quipu_dir.mkdir()
+                self._created_quipu_dir = True
+            self._txn_dir = Path(tempfile.mkdtemp(prefix="txn-", dir=quipu_dir))
+        return self._txn_dir / name
+
+    def _mkdirs(self, path: Path):
+        missing = []
+        for p in (path, *path.parents):
+            if p.exists() or p == self.root_dir:
+                break
+            missing.append(p)
+        for p in reversed(missing):
+            p.mkdir()
+            self._created_dirs.append(p)
+            self._touched_dirs.add(p.parent)
+
+    def _backup(self, path: Path):
+        backup = self._scratch(f"backup-{len(self._backups)}")
+        os.rename(path, backup)
+        self._backups.append((backup, path))
+        self._touched_dirs.add(path.parent)
+
+    def apply(self, files: Dict[Path, bytes], dirs: Set[Path], removed: Set[Path]):
+        # 阶段 1: 写入临时文件，全部写完后再统一 fsync
+        staged: List[Tuple[Path, Path]] = []
+        fds = []
+        try:
+            for i, (target, data) in enumerate(sorted(files.items())):
+                tmp = self._scratch(f"new-{i}")
+                # 以 0o666 创建以遵循 umask；覆盖已有文件时沿用其权限
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+                self._temp_files.append(tmp)
+                fds.append(fd)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view) :]
+                if target.is_file() and not target.is_symlink():
+                    os.chmod(tmp, stat.S_IMODE(target.stat().st_mode))
+                staged.append((tmp, target))
+            for fd in fds:
+                os.fsync(fd)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+        # 阶段 2: 移走将被删除或覆盖的原有路径
+        for path in sorted(removed):
+            if path.exists() or path.is_symlink():
+                self._backup(path)
+        for _, target in staged:
+            if target.exists() or target.is_symlink():
+                self._backup(target)
+
+        # 阶段 3: 放置新内容，并对涉及的目录各 fsync 一次
+        for d in sorted(dirs):
+            self._mkdirs(d)
+        for tmp, target in staged:
+            self._mkdirs(target.parent)
+            os.replace(tmp, target)
+            self._temp_files.remove(tmp)
+            self._placed.append(target)
+            self._touched_dirs.add(target.parent)
+
+        for d in self._touched_dirs:
+            _fsync_dir(d)
+
+    def rollback(self):
+        for target in reversed(self._placed):
+            try:
+                target.unlink()
+            except OSError as e:
+                logger.error(f"回滚失败，无法移除 {target}: {e}")
+        # 先移除新建的目录，被删除的同名文件或目录才能恢复原位
+        for d in reversed(self._created_dirs):
+            try:
+                d.rmdir()
+            except OSError:
+                pass
+        for backup, original in reversed(self._backups):
+            try:
+                os.rename(backup, original)
+            except OSError as e:
+                logger.error(f"回滚失败，无法恢复 {original} (备份位于 {backup}): {e}")
+                self._unrestored.append(backup)
+
+    def cleanup(self):
+        for tmp in self._temp_files:
+            tmp.unlink(missing_ok=True)
+        # 回滚未能恢复的备份需要保留，供人工恢复
+        if self._txn_dir is not None and not self._unrestored:
+            shutil.rmtree(self._txn_dir, ignore_errors=True)
+            if self._created_quipu_dir:
+                try:
+                    self._txn_dir.parent.rmdir()
+                except OSError:
+                    pass
+
+
+def _fsync_dir(path: Path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
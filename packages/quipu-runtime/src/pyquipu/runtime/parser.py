@@ -1,6 +1,8 @@
+import functools
+import itertools
 import re
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterable, Iterator, List, Tuple
 
 from pyquipu.interfaces.types import Statement
 
@@ -16,6 +18,19 @@ class BaseParser(ABC):
         """
         pass
 
+    def iter_parse(self, lines: Iterable[str]) -> Iterator[Statement]:
+        """
+        逐行读取输入 (每行保留换行符)，逐条产出语句。
+        默认实现读完全部输入后再调用 parse，子类可以提供真正的流式实现。
+        """
+        yield from self.parse("".join(lines))
+
+
+@functools.lru_cache(maxsize=64)
+def _end_fence_pattern(fence: str) -> "re.Pattern[str]":
+    """结束 fence 的正则。同一份计划中的 fence 通常只有寥寥几种，按 fence 字符串缓存。"""
+    return re.compile(rf"^{re.escape(fence)}\s*$", re.MULTILINE)
+
 
 class RegexBlockParser(BaseParser):
     """
@@ -55,7 +70,7 @@ class RegexBlockParser(BaseParser):
             # 2. 寻找匹配的结束 fence
             # 结束 fence 必须位于行首，且与开始 fence 完全一致，且该行除空白外无其他内容
             # re.escape(fence) 确保如 `+++` 这样的特殊字符也被正确处理
-            end_pattern = re.compile(rf"^{re.escape(fence)}\s*$", re.MULTILINE)
+            end_pattern = _end_fence_pattern(fence)
 
             end_match = end_pattern.search(text, content_start)
 
@@ -99,6 +114,53 @@ class RegexBlockParser(BaseParser):
 
         return statements
 
+    def iter_parse(self, lines: Iterable[str]) -> Iterator[Statement]:
+        """
+        parse 的逐行版本，结果与 parse("".join(lines)) 完全一致。
+
+        只缓冲当前代码块的内容。由于 act 之后的块都是它的上下文，
+        一条语句在下一个 act 块闭合 (或输入结束) 时产出，此时即可交给执行器。
+        """
+        current_statement: Statement | None = None
+        for lang, content in self._iter_blocks(iter(lines)):
+            if lang == "act":
+                if current_statement is not None:
+                    yield current_statement
+                current_statement = {"act": content.strip(), "contexts": []}
+            elif current_statement is not None:
+                current_statement["contexts"].append(content)
+        if current_statement is not None:
+            yield current_statement
+
+    def _iter_blocks(self, lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+        """逐行扫描代码块，产出 (语言标记, 内容)。"""
+        for line in lines:
+            match = self.start_pattern.match(line)
+            if not match:
+                continue
+
+            lang = match.group(2).strip().lower()
+            end_pattern = _end_fence_pattern(match.group(1))
+            body: List[str] = []
+            closed = False
+            for inner in lines:
+                if end_pattern.match(inner):
+                    closed = True
+                    break
+                body.append(inner)
+
+            if not closed:
+                # 与 parse 一致：跳过未闭合的块头，从其后的行继续寻找
+                yield from self._iter_blocks(iter(body))
+                return
+
+            # 与 parse 一致：块头之后的空白行不计入内容
+            start = next((i for i, inner in enumerate(body) if inner.strip()), len(body))
+            raw_content = "".join(body[start:])
+            if raw_content.endswith("\n"):
+                raw_content = raw_content[:-1]
+            yield lang, raw_content
+
 
 class BacktickParser(RegexBlockParser):
     """标准 Markdown 解析器 (```) - 相当于 '绿幕'"""
@@ -134,24 +196,46 @@ def list_parsers() -> List[str]:
     return list(_PARSERS.keys())
 
 
+# 匹配行首的 fence，后跟 act (忽略大小写)
+# group(1) 是 fence 字符
+_ACT_FENCE_PATTERN = re.compile(r"^([`~]{3,})act\s*$", re.IGNORECASE | re.MULTILINE)
+
+
+def _parser_for_act_fence(fence_str: str) -> str:
+    # 检查 fence 由什么字符组成
+    if fence_str.startswith("~"):
+        return "tilde"
+    # 默认为 backtick
+    return "backtick"
+
+
 def detect_best_parser(text: str) -> str:
     """
     扫描文本，根据第一个出现的 act 块特征自动决定使用哪种解析器。
     策略：搜索第一个 ` ```act ` 或 ` ~~~act `，返回对应的解析器名称。
     支持变长围栏检测 (如 ` ````act `)。
     """
-    # 匹配行首的 fence，后跟 act (忽略大小写)
-    # group(1) 是 fence 字符
-    pattern = re.compile(r"^([`~]{3,})act\s*$", re.IGNORECASE | re.MULTILINE)
-    match = pattern.search(text)
+    match = _ACT_FENCE_PATTERN.search(text)
 
     if match:
-        fence_str = match.group(1)
-        # 检查 fence 由什么字符组成
-        if fence_str.startswith("~"):
-            return "tilde"
-        # 默认为 backtick
-        return "backtick"
+        return _parser_for_act_fence(match.group(1))
 
     # 如果没找到明确的 act 块，默认返回 backtick
     return "backtick"
+
+
+def detect_best_parser_from_lines(lines: Iterable[str]) -> Tuple[str, Iterator[str]]:
+    """
+    detect_best_parser 的逐行版本：读取输入直到第一个 act 块头。
+    返回解析器名称，以及一个从头重放全部输入的迭代器 (已读取的行 + 其余的行)。
+    """
+    lines = iter(lines)
+    consumed: List[str] = []
+    name = "backtick"
+    for line in lines:
+        consumed.append(line)
+        match = _ACT_FENCE_PATTERN.match(line)
+        if match:
+            name = _parser_for_act_fence(match.group(1))
+            break
+    return name, itertools.chain(consumed, lines)
@@ -59,6 +59,21 @@ def test_cache_sync(runner, quipu_workspace, monkeypatch):
     mock_bus.success.assert_called_once_with("cache.sync.success")
 
 
+def test_cache_sync_with_content(runner, quipu_workspace, monkeypatch):
+    work_dir, _, engine = quipu_workspace
+    mock_bus = MagicMock()
+    monkeypatch.setattr("pyquipu.cli.commands.cache.bus", mock_bus)
+
+    (work_dir / "a.txt").touch()
+    engine.create_plan_node("4b825dc642cb6eb9a060e54bf8d69288fbee4904", engine.git_db.get_tree_hash(), "Plan body")
+
+    result = runner.invoke(app, ["cache", "sync", "--with-content", "-w", str(work_dir)])
+
+    assert result.exit_code == 0
+    mock_bus.info.assert_any_call("cache.sync.info.contentHydrated", count=1)
+    mock_bus.success.assert_called_once_with("cache.sync.success")
+
+
 def test_cache_rebuild_no_db(runner, quipu_workspace, monkeypatch):
     work_dir, _, _ = quipu_workspace
     mock_bus = MagicMock()
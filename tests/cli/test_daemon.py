@@ -0,0 +1,145 @@
+import socket
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from pyquipu.cli.daemon import (
+    DaemonClient,
+    DaemonError,
+    DaemonServer,
+    DaemonUnavailable,
+    QuipuDaemon,
+    is_supported,
+)
+from pyquipu.cli.main import app
+from pyquipu.common.messaging import bus
+
+pytestmark = pytest.mark.skipif(not is_supported(), reason="需要 Unix Socket")
+
+PLAN = "```act\nwrite_file {name}\n```\n```content\n{text}\n```"
+
+
+@pytest.fixture
+def daemon_server(tmp_path, monkeypatch):
+    daemon = QuipuDaemon(max_workspaces=2)
+    monkeypatch.setattr(bus, "_renderer", daemon._renderer)
+    server = DaemonServer(tmp_path / "d.sock", daemon)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    daemon.close()
+    thread.join(timeout=5)
+
+
+def test_run_reuses_warm_engine(daemon_server, quipu_workspace):
+    work_dir, _, _ = quipu_workspace
+    client = DaemonClient(daemon_server.socket_path)
+
+    payload = client.call("run", content=PLAN.format(name="a.txt", text="A"), work_dir=str(work_dir))
+    assert payload["result"]["success"] is True
+    engine = daemon_server.daemon._workspaces[work_dir.resolve()].engine
+
+    # 守护进程之外的修改也会在下一次请求前被重新对齐
+    (work_dir / "outside.txt").write_text("x")
+    result = client.run(content=PLAN.format(name="b.txt", text="B"), work_dir=work_dir)
+    assert result.success and result.message == "run.success"
+    assert daemon_server.daemon._workspaces[work_dir.resolve()].engine is engine
+    assert (work_dir / "a.txt").read_text().strip() == "A"
+    assert (work_dir / "b.txt").read_text().strip() == "B"
+    assert client.call("ping")["workspaces"] == [str(work_dir.resolve())]
+
+
+def test_parallel_act_output_is_captured(daemon_server, quipu_workspace, monkeypatch):
+    """测试：执行器工作线程中并行 act 的输出同样随响应返回，而不是落到守护进程自身的终端"""
+    work_dir, _, _ = quipu_workspace
+    fallback = MagicMock()
+    monkeypatch.setattr(daemon_server.daemon._renderer, "_fallback", fallback)
+    # 第一批次并行写入 a.txt 与 b.txt，第二批次修改 a.txt
+    plan = "\n".join(
+        [
+            PLAN.format(name="a.txt", text="A"),
+            PLAN.format(name="b.txt", text="B"),
+            "```act\npatch_file a.txt\n```\n```old\nA\n```\n```new\nAA\n```",
+        ]
+    )
+
+    payload = DaemonClient(daemon_server.socket_path).call("run", content=plan, work_dir=str(work_dir))
+
+    assert payload["result"]["success"] is True
+    assert (work_dir / "a.txt").read_text().strip() == "AA"
+    texts = [text for _, text in payload["messages"]]
+    assert sum("a.txt" in text for text in texts) == 2
+    assert sum("b.txt" in text for text in texts) == 1
+    assert fallback.method_calls == []
+
+
+def test_workspaces_are_evicted_lru(daemon_server, tmp_path):
+    daemon = daemon_server.daemon
+    for name in ("w1", "w2", "w3"):
+        (tmp_path / name).mkdir()
+        daemon._workspace(tmp_path / name)
+    assert [p.name for p in daemon._workspaces] == ["w2", "w3"]
+
+
+def test_unknown_method_and_shutdown(daemon_server):
+    client = DaemonClient(daemon_server.socket_path)
+    with pytest.raises(DaemonError):
+        client.call("nope")
+    assert client.call("shutdown") == {"ok": True}
+
+
+def test_missing_daemon_is_unavailable(tmp_path):
+    with pytest.raises(DaemonUnavailable):
+        DaemonClient(tmp_path / "missing.sock").call("ping")
+
+
+def test_run_command_falls_back_without_daemon(runner, quipu_workspace, tmp_path, monkeypatch):
+    work_dir, _, _ = quipu_workspace
+    monkeypatch.setattr("pyquipu.cli.commands.run.DAEMON_SOCKET", tmp_path / "missing.sock")
+    monkeypatch.setattr("pyquipu.cli.commands.run.bus", MagicMock())
+    plan = tmp_path / "plan.md"
+    plan.write_text(PLAN.format(name="c.txt", text="C"))
+
+    result = runner.invoke(app, ["run", str(plan), "-w", str(work_dir), "--yolo"])
+    assert result.exit_code == 0
+    assert (work_dir / "c.txt").read_text().strip() == "C"
+
+
+@pytest.fixture
+def broken_daemon(tmp_path):
+    """接收请求后只返回半行响应的守护进程。"""
+    path = tmp_path / "broken.sock"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen(1)
+    requests = []
+
+    def serve():
+        conn, _ = server.accept()
+        with conn, conn.makefile("rb") as f:
+            requests.append(f.readline())
+            conn.sendall(b'{"jsonrpc": "2.0", "res')
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield path, requests
+    thread.join(timeout=5)
+    server.close()
+
+
+def test_failure_after_request_is_not_retried_locally(broken_daemon, runner, quipu_workspace, tmp_path, monkeypatch):
+    socket_path, requests = broken_daemon
+    work_dir, _, _ = quipu_workspace
+    monkeypatch.setattr("pyquipu.cli.commands.run.DAEMON_SOCKET", socket_path)
+    local_runs = []
+    monkeypatch.setattr("pyquipu.cli.commands.run.run_quipu", lambda **kwargs: local_runs.append(kwargs))
+    plan = tmp_path / "plan.md"
+    plan.write_text(PLAN.format(name="d.txt", text="D"))
+
+    result = runner.invoke(app, ["run", str(plan), "-w", str(work_dir), "--yolo"])
+
+    assert result.exit_code == 1
+    assert len(requests) == 1 and local_runs == []
+    assert "守护进程执行失败" in result.stderr
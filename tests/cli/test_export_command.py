@@ -253,3 +253,49 @@ def test_export_reachable_only(runner, populated_history, monkeypatch):
     filenames = {f.name for f in files}
     assert not any("Branch_B_change" in name for name in filenames)
     assert any("Branch_A_change" in name for name in filenames)
+
+
+def test_export_incremental(runner, populated_history, monkeypatch):
+    """增量导出只重写新增或发生变化的节点，并维护清单。"""
+    engine = populated_history
+    output_dir = engine.root_dir / ".quipu" / "test_export_incremental"
+    mock_bus = MagicMock()
+    monkeypatch.setattr("pyquipu.cli.commands.export.bus", mock_bus)
+    args = ["export", "-w", str(engine.root_dir), "-o", str(output_dir), "--incremental"]
+
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    assert len(list(output_dir.glob("*.md"))) == 6
+    assert (output_dir / ".quipu-export.json").exists()
+
+    mock_bus.reset_mock()
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    mock_bus.info.assert_any_call("export.info.incremental", changed=0, skipped=6, removed=0)
+
+    # 新节点本身与其父节点 (导航栏新增子节点链接) 需要重写
+    branch_b = next(n for n in engine.history_graph.values() if n.summary == "Branch B change")
+    (engine.root_dir / "branch_b2.txt").touch()
+    engine.create_plan_node(branch_b.output_tree, engine.git_db.get_tree_hash(), "plan 5", summary_override="Follow Up")
+    mock_bus.reset_mock()
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    mock_bus.info.assert_any_call("export.info.incremental", changed=2, skipped=5, removed=0)
+    assert len(list(output_dir.glob("*.md"))) == 7
+
+    mock_bus.reset_mock()
+    # 导出范围缩小: 范围外的文件被删除，保留节点的导航栏随之变化
+    result = runner.invoke(app, args + ["-n", "3"])
+    assert result.exit_code == 0
+    mock_bus.info.assert_any_call("export.info.incremental", changed=3, skipped=0, removed=4)
+    assert len(list(output_dir.glob("*.md"))) == 3
+
+
+def test_export_incremental_rejects_zip(runner, populated_history, monkeypatch):
+    engine = populated_history
+    mock_bus = MagicMock()
+    monkeypatch.setattr("pyquipu.cli.commands.export.bus", mock_bus)
+
+    result = runner.invoke(app, ["export", "-w", str(engine.root_dir), "--incremental", "--zip"])
+    assert result.exit_code == 1
+    mock_bus.error.assert_called_once_with("export.error.incrementalZip")
@@ -2,6 +2,7 @@ import json
 from unittest.mock import MagicMock
 
 from pyquipu.cli.main import app
+from pyquipu.engine.git_object_storage import GitObjectHistoryReader
 
 
 def test_log_empty(runner, quipu_workspace, monkeypatch):
@@ -32,6 +33,28 @@ def test_log_output(runner, quipu_workspace, monkeypatch):
     assert "Node 1" in mock_bus.data.call_args_list[1].args[0]
 
 
+def test_log_limit_does_not_load_full_graph(runner, quipu_workspace, monkeypatch):
+    work_dir, _, engine = quipu_workspace
+    mock_bus = MagicMock()
+    monkeypatch.setattr("pyquipu.cli.commands.query.bus", mock_bus)
+    (work_dir / ".quipu").mkdir(exist_ok=True)
+    (work_dir / ".quipu" / "config.yml").write_text("storage:\n  type: git_object\n")
+
+    (work_dir / "f1").touch()
+    engine.capture_drift(engine.git_db.get_tree_hash(), message="Node 1")
+    (work_dir / "f2").touch()
+    engine.capture_drift(engine.git_db.get_tree_hash(), message="Node 2")
+
+    def fail(self):
+        raise AssertionError("log -n loaded the full graph")
+
+    monkeypatch.setattr(GitObjectHistoryReader, "load_all_nodes", fail)
+    result = runner.invoke(app, ["log", "-n", "1", "-w", str(work_dir)])
+    assert result.exit_code == 0, result.output
+    mock_bus.data.assert_called_once()
+    assert "Node 2" in mock_bus.data.call_args.args[0]
+
+
 def test_find_command(runner, quipu_workspace, monkeypatch):
     work_dir, _, engine = quipu_workspace
     mock_bus = MagicMock()
@@ -53,6 +76,23 @@ def test_find_command(runner, quipu_workspace, monkeypatch):
     assert "Fix bug" in mock_bus.data.call_args.args[0]
 
 
+def test_find_text_command(runner, quipu_workspace, monkeypatch):
+    work_dir, _, engine = quipu_workspace
+    mock_bus = MagicMock()
+    monkeypatch.setattr("pyquipu.cli.commands.query.bus", mock_bus)
+
+    (work_dir / "f1").touch()
+    hash_v1 = engine.git_db.get_tree_hash()
+    engine.capture_drift(hash_v1, message="Refactor auth middleware")
+    (work_dir / "f2").touch()
+    engine.capture_drift(engine.git_db.get_tree_hash(), message="Update docs")
+
+    result = runner.invoke(app, ["find", "--text", "auth", "-w", str(work_dir)])
+    assert result.exit_code == 0
+    mock_bus.data.assert_called_once()
+    assert "Refactor auth middleware" in mock_bus.data.call_args.args[0]
+
+
 def test_log_json_output(runner, quipu_workspace, monkeypatch):
     work_dir, _, engine = quipu_workspace
     mock_bus = MagicMock()
@@ -131,6 +171,33 @@ def test_log_filtering(runner, quipu_workspace, monkeypatch):
     mock_bus.info.assert_called_with("query.info.noResults")
 
 
+def test_log_json_lines_and_type_filter(runner, quipu_workspace, monkeypatch):
+    work_dir, _, engine = quipu_workspace
+    mock_bus = MagicMock()
+    monkeypatch.setattr("pyquipu.cli.commands.query.bus", mock_bus)
+
+    (work_dir / "f1").touch()
+    hash_v1 = engine.git_db.get_tree_hash()
+    engine.capture_drift(hash_v1, message="Capture 1")
+    (work_dir / "f2").touch()
+    engine.create_plan_node(
+        input_tree=hash_v1, output_tree=engine.git_db.get_tree_hash(), plan_content="content", summary_override="Plan 2"
+    )
+
+    result = runner.invoke(app, ["log", "--json-lines", "-w", str(work_dir)])
+    assert result.exit_code == 0
+    lines = [json.loads(call.args[0]) for call in mock_bus.data.call_args_list]
+    assert [line["node_type"] for line in lines] == ["plan", "capture"]
+    assert lines[0]["summary"] == "Plan 2"
+    mock_bus.info.assert_not_called()
+
+    mock_bus.reset_mock()
+    result = runner.invoke(app, ["log", "--type", "capture", "-w", str(work_dir)])
+    assert result.exit_code == 0
+    mock_bus.data.assert_called_once()
+    assert "Capture 1" in mock_bus.data.call_args.args[0]
+
+
 def test_log_reachable_only(runner, quipu_workspace, monkeypatch):
     """Test --reachable-only filtering for the log command."""
     work_dir, _, engine = quipu_workspace
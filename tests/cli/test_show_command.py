@@ -0,0 +1,46 @@
+import json
+from unittest.mock import MagicMock
+
+from pyquipu.cli.main import app
+
+
+def _make_chain(work_dir, engine, count: int):
+    nodes = []
+    for i in range(count):
+        (work_dir / f"f{i}").touch()
+        nodes.append(engine.capture_drift(engine.git_db.get_tree_hash(), message=f"Node {i}"))
+    return nodes
+
+
+def test_show_multiple_hashes_json(runner, quipu_workspace, monkeypatch):
+    work_dir, _, engine = quipu_workspace
+    mock_bus = MagicMock()
+    monkeypatch.setattr("pyquipu.cli.commands.show.bus", mock_bus)
+    nodes = _make_chain(work_dir, engine, 3)
+
+    args = ["show", nodes[0].commit_hash[:10], nodes[2].commit_hash[:10], "--json", "-w", str(work_dir)]
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    data = json.loads(mock_bus.data.call_args.args[0])
+    assert list(data) == [nodes[0].commit_hash, nodes[2].commit_hash]
+    assert "metadata.json" in data[nodes[2].commit_hash]
+
+
+def test_show_range(runner, quipu_workspace, monkeypatch):
+    work_dir, _, engine = quipu_workspace
+    mock_bus = MagicMock()
+    monkeypatch.setattr("pyquipu.cli.commands.show.bus", mock_bus)
+    nodes = _make_chain(work_dir, engine, 4)
+
+    spec = f"{nodes[0].commit_hash[:10]}..{nodes[3].commit_hash[:10]}"
+    result = runner.invoke(app, ["show", spec, "--json", "-e", "metadata.json", "-w", str(work_dir)])
+    assert result.exit_code == 0
+    data = json.loads(mock_bus.data.call_args.args[0])
+    # 范围不含起点，按时间正序排列
+    assert list(data) == [n.commit_hash for n in nodes[1:]]
+
+    mock_bus.reset_mock()
+    reversed_spec = f"{nodes[3].commit_hash[:10]}..{nodes[0].commit_hash[:10]}"
+    result = runner.invoke(app, ["show", reversed_spec, "-w", str(work_dir)])
+    assert result.exit_code == 1
+    assert mock_bus.error.call_args.args[0] == "show.error.notAncestor"
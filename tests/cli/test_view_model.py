@@ -120,6 +120,38 @@ class TestGraphViewModel:
         page4 = vm.load_page(4)
         assert len(page4) == 0
 
+    def test_pagination_uses_cursors(self, sample_nodes, monkeypatch):
+        """测试翻页与跳页都通过游标完成，不依赖 OFFSET。"""
+        reader = MockHistoryReader(sample_nodes)
+        monkeypatch.setattr(reader, "load_nodes_paginated", lambda limit, offset: pytest.fail("offset paging used"))
+        vm = GraphViewModel(reader, current_output_tree_hash=None, page_size=4)
+        vm.initialize()
+
+        # 直接跳转到最后一页，再向前翻页
+        assert [n.output_tree for n in vm.load_page(3)] == ["h1", "h0"]
+        assert [n.output_tree for n in vm.previous_page()] == ["h5", "h4", "h3", "h2"]
+        assert [n.output_tree for n in vm.previous_page()] == ["h9", "h8", "h7", "h6"]
+        assert [n.output_tree for n in vm.next_page()] == ["h5", "h4", "h3", "h2"]
+        assert vm.current_page == 2
+
+    def test_head_page_seeks_from_head(self, sample_nodes, monkeypatch):
+        """测试跳转到 HEAD 所在页时，从 HEAD 出发定位而不是从列表开头数起。"""
+        reader = MockHistoryReader(sample_nodes)
+        seeks = []
+        original = reader.get_commit_at_offset
+        monkeypatch.setattr(
+            reader,
+            "get_commit_at_offset",
+            lambda commit, offset: seeks.append((commit, offset)) or original(commit, offset),
+        )
+        vm = GraphViewModel(reader, current_output_tree_hash="h2", page_size=3)
+        vm.initialize()
+
+        page = vm.calculate_initial_page()
+        assert page == 3
+        assert [n.output_tree for n in vm.load_page(page)] == ["h3", "h2", "h1"]
+        assert seeks == [("c2", -2)]
+
     def test_is_reachable(self, sample_nodes):
         """测试可达性检查逻辑。"""
         ancestors = {"h8"}
@@ -0,0 +1,173 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from pyquipu.engine.sqlite_db import DatabaseManager
+
+NODE_ROW = ("c" * 40, "user", "t" * 40, "plan", 1.0, "summary", None, "{}", None)
+
+
+@pytest.fixture
+def db_manager(tmp_path: Path):
+    manager = DatabaseManager(tmp_path)
+    manager.init_schema()
+    yield manager
+    manager.close()
+
+
+class TestConnectionProfile:
+    def test_default_profile_enables_wal(self, db_manager):
+        conn = db_manager._get_conn()
+        assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+        # NORMAL = 1
+        assert conn.execute("PRAGMA synchronous;").fetchone()[0] == 1
+        # MEMORY = 2
+        assert conn.execute("PRAGMA temp_store;").fetchone()[0] == 2
+        assert conn.execute("PRAGMA foreign_keys;").fetchone()[0] == 1
+
+    def test_profile_overrides(self, tmp_path):
+        manager = DatabaseManager(tmp_path, profile={"journal_mode": "delete", "cache_size": -2048})
+        conn = manager._get_conn()
+        assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == "delete"
+        assert conn.execute("PRAGMA cache_size;").fetchone()[0] == -2048
+        # 未覆盖的参数保留默认值
+        assert conn.execute("PRAGMA synchronous;").fetchone()[0] == 1
+        manager.close()
+
+    def test_invalid_value_is_ignored(self, tmp_path):
+        manager = DatabaseManager(tmp_path, profile={"synchronous": "off; DROP TABLE nodes"})
+        manager.init_schema()
+        conn = manager._get_conn()
+        assert conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0] == 0
+        manager.close()
+
+
+class TestTransaction:
+    def test_writes_commit_together(self, db_manager):
+        with db_manager.transaction():
+            db_manager.batch_insert_nodes([NODE_ROW])
+            db_manager.save_ref_watermarks({"refs/quipu/local/heads/x": NODE_ROW[0]})
+            # 嵌套的写入不会提前提交
+            assert db_manager._get_conn().in_transaction
+
+        assert not db_manager._get_conn().in_transaction
+        assert db_manager.get_all_node_hashes() == {NODE_ROW[0]}
+        assert db_manager.get_ref_watermarks() == {"refs/quipu/local/heads/x": NODE_ROW[0]}
+
+    def test_rollback_on_error(self, db_manager):
+        with pytest.raises(RuntimeError):
+            with db_manager.transaction():
+                db_manager.batch_insert_nodes([NODE_ROW])
+                raise RuntimeError("boom")
+
+        assert db_manager.get_all_node_hashes() == set()
+
+    def test_reader_not_blocked_by_open_write(self, tmp_path, db_manager):
+        db_manager.batch_insert_nodes([NODE_ROW])
+        reader = DatabaseManager(tmp_path, profile={"busy_timeout": 0})
+
+        with db_manager.transaction():
+            db_manager.execute_write("UPDATE nodes SET summary = ?", ("pending",))
+            # WAL 模式下，另一个连接在写事务进行中仍可读取已提交的数据
+            row = reader._get_conn().execute("SELECT summary FROM nodes").fetchone()
+            assert row[0] == "summary"
+
+        assert reader._get_conn().execute("SELECT summary FROM nodes").fetchone()[0] == "pending"
+        reader.close()
+
+    def test_second_writer_waits_for_lock(self, tmp_path, db_manager):
+        other = DatabaseManager(tmp_path, profile={"busy_timeout": 0})
+        with db_manager.transaction():
+            with pytest.raises(sqlite3.OperationalError):
+                other.execute_write("DELETE FROM nodes")
+        other.close()
+
+
+def _node_row(commit_hash: str, timestamp: float = 1.0) -> tuple:
+    return (commit_hash, "user", commit_hash[::-1], "plan", timestamp, "summary", None, "{}", None)
+
+
+def _append(manager: DatabaseManager, commit_hash: str, parent_hash=None, timestamp: float = 1.0):
+    with manager.transaction():
+        manager.batch_insert_nodes([_node_row(commit_hash, timestamp)])
+        if parent_hash:
+            manager.batch_insert_edges([(commit_hash, parent_hash)])
+        manager.label_nodes([commit_hash])
+
+
+def _contains(outer, inner) -> bool:
+    return outer[0] == inner[0] and outer[1] < inner[1] <= outer[2]
+
+
+class TestIntervalLabels:
+    def test_incremental_labels_are_nested(self, db_manager):
+        # r -> a -> b, r -> c
+        r, a, b, c = (ch * 40 for ch in "0abc")
+        _append(db_manager, r)
+        _append(db_manager, a, r)
+        _append(db_manager, b, a)
+        _append(db_manager, c, r)
+
+        labels = {h: db_manager.get_interval(h) for h in (r, a, b, c)}
+        assert _contains(labels[r], labels[a])
+        assert _contains(labels[a], labels[b])
+        assert _contains(labels[r], labels[c])
+        assert not _contains(labels[a], labels[c])
+        assert not _contains(labels[c], labels[b])
+
+    def test_batch_labels_with_parent_after_child(self, db_manager):
+        r, a, b = (ch * 40 for ch in "0ab")
+        with db_manager.transaction():
+            db_manager.batch_insert_nodes([_node_row(h) for h in (b, a, r)])
+            db_manager.batch_insert_edges([(b, a), (a, r)])
+            db_manager.label_nodes([b, a, r])
+
+        assert _contains(db_manager.get_interval(r), db_manager.get_interval(b))
+        assert _contains(db_manager.get_interval(a), db_manager.get_interval(b))
+
+    def test_exhausted_gap_relabels_locally(self, db_manager, monkeypatch):
+        calls = []
+        monkeypatch.setattr(db_manager, "rebuild_intervals", lambda: calls.append(1))
+
+        # 足够深的线性链与大量兄弟节点都会耗尽就地分配的空隙
+        chain = [f"{i:040x}" for i in range(3000)]
+        _append(db_manager, chain[0])
+        for parent, child in zip(chain, chain[1:]):
+            _append(db_manager, child, parent)
+        siblings = [f"s{i:039x}" for i in range(300)]
+        for sibling in siblings:
+            _append(db_manager, sibling, chain[1000])
+
+        assert not calls
+        labels = [db_manager.get_interval(h) for h in chain]
+        assert all(_contains(p, c) for p, c in zip(labels, labels[1:]))
+        assert _contains(labels[0], labels[-1])
+        sibling_labels = [db_manager.get_interval(h) for h in siblings]
+        assert all(_contains(labels[1000], s) and not _contains(labels[1001], s) for s in sibling_labels)
+        assert not _contains(sibling_labels[0], sibling_labels[1])
+        assert not _contains(sibling_labels[-1], labels[-1])
+
+    def test_merge_node_uses_first_edge(self, db_manager):
+        a, b, m = (ch * 40 for ch in "abm")
+        _append(db_manager, a)
+        _append(db_manager, b)
+        with db_manager.transaction():
+            db_manager.batch_insert_nodes([_node_row(m)])
+            db_manager.batch_insert_edges([(m, b), (m, a)])
+            db_manager.label_nodes([m])
+
+        assert _contains(db_manager.get_interval(b), db_manager.get_interval(m))
+        db_manager.rebuild_intervals()
+        assert _contains(db_manager.get_interval(b), db_manager.get_interval(m))
+
+    def test_labels_rebuilt_for_existing_database(self, tmp_path, db_manager):
+        r, a = (ch * 40 for ch in "0a")
+        _append(db_manager, r)
+        _append(db_manager, a, r)
+        db_manager.execute_write("DROP TABLE node_intervals")
+        db_manager.close()
+
+        manager = DatabaseManager(tmp_path)
+        manager.init_schema()
+        assert _contains(manager.get_interval(r), manager.get_interval(a))
+        manager.close()
@@ -4,7 +4,7 @@ from pathlib import Path
 import pytest
 from pyquipu.engine.git_db import GitDB
 from pyquipu.engine.git_object_storage import GitObjectHistoryWriter
-from pyquipu.engine.hydrator import Hydrator
+from pyquipu.engine.hydrator import Hydrator, hydrate_content_in_background
 from pyquipu.engine.sqlite_db import DatabaseManager
 
 
@@ -102,3 +102,85 @@ class TestHydration:
         hydrator.sync("test-user")
 
         assert len(db_manager.get_all_node_hashes()) == 1
+
+    def test_unchanged_refs_skip_log_walk(self, hydrator_setup, monkeypatch):
+        """测试引用未变化时，补水不再遍历 Git 历史。"""
+        hydrator, writer, git_db, db_manager, repo = hydrator_setup
+
+        (repo / "a.txt").touch()
+        writer.create_node("plan", "genesis", git_db.get_tree_hash(), "Node A")
+        hydrator.sync("test-user")
+        assert db_manager.get_ref_watermarks()
+
+        def fail(*args, **kwargs):
+            raise AssertionError("log_ref should not run when refs are unchanged")
+
+        monkeypatch.setattr(git_db, "log_ref", fail)
+        hydrator.sync("test-user")
+        assert len(db_manager.get_all_node_hashes()) == 1
+
+    def test_incremental_walk_excludes_known_heads(self, hydrator_setup, monkeypatch):
+        """测试增量补水只遍历新引用相对于已知 heads 的增量，并正确连接父边。"""
+        hydrator, writer, git_db, db_manager, repo = hydrator_setup
+
+        (repo / "a.txt").touch()
+        hash_a = git_db.get_tree_hash()
+        writer.create_node("plan", "genesis", hash_a, "Node A")
+        hydrator.sync("test-user")
+
+        (repo / "b.txt").touch()
+        writer.create_node("plan", hash_a, git_db.get_tree_hash(), "Node B")
+
+        walked = []
+        original_log_ref = git_db.log_ref
+
+        def spy(ref_names, exclude=None):
+            result = original_log_ref(ref_names, exclude=exclude)
+            walked.extend(entry["hash"] for entry in result)
+            return result
+
+        monkeypatch.setattr(git_db, "log_ref", spy)
+        hydrator.sync("test-user")
+
+        conn = db_manager._get_conn()
+        node_a = conn.execute("SELECT commit_hash FROM nodes WHERE summary = ?", ("Node A",)).fetchone()[0]
+        node_b = conn.execute("SELECT commit_hash FROM nodes WHERE summary = ?", ("Node B",)).fetchone()[0]
+        assert walked == [node_b]
+        edge = conn.execute("SELECT parent_hash FROM edges WHERE child_hash = ?", (node_b,)).fetchone()
+        assert edge[0] == node_a
+        assert node_b in db_manager.get_ref_watermarks().values()
+
+    def test_bulk_content_hydration(self, hydrator_setup, monkeypatch):
+        """测试批量回填内容缓存只使用批量读取，并在之后不再重复处理。"""
+        hydrator, writer, git_db, db_manager, repo = hydrator_setup
+
+        (repo / "a.txt").touch()
+        hash_a = git_db.get_tree_hash()
+        writer.create_node("plan", "genesis", hash_a, "Content A")
+        (repo / "b.txt").touch()
+        writer.create_node("plan", hash_a, git_db.get_tree_hash(), "Content B")
+        hydrator.sync("test-user")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("content hydration must not read objects one at a time")
+
+        monkeypatch.setattr(git_db, "cat_file", fail)
+        assert hydrator.hydrate_content(batch_size=1) == 2
+
+        conn = db_manager._get_conn()
+        rows = conn.execute("SELECT summary, plan_md_cache FROM nodes ORDER BY timestamp").fetchall()
+        assert [row["plan_md_cache"] for row in rows] == ["Content A", "Content B"]
+        assert hydrator.hydrate_content() == 0
+
+    def test_background_content_hydration(self, hydrator_setup):
+        """测试后台线程使用独立连接完成内容回填。"""
+        hydrator, writer, git_db, db_manager, repo = hydrator_setup
+
+        (repo / "a.txt").touch()
+        writer.create_node("plan", "genesis", git_db.get_tree_hash(), "Content A")
+        hydrator.sync("test-user")
+
+        hydrate_content_in_background(repo, db_manager.profile).join(timeout=30)
+
+        row = db_manager._get_conn().execute("SELECT plan_md_cache FROM nodes").fetchone()
+        assert row[0] == "Content A"
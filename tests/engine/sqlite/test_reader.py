@@ -1,3 +1,4 @@
+import itertools
 import subprocess
 import time
 from pathlib import Path
@@ -5,9 +6,11 @@ from pathlib import Path
 import pytest
 from pyquipu.engine.git_db import GitDB
 from pyquipu.engine.git_object_storage import GitObjectHistoryWriter
+from pyquipu.engine.history_graph import CompactHistoryGraph
 from pyquipu.engine.hydrator import Hydrator
 from pyquipu.engine.sqlite_db import DatabaseManager
-from pyquipu.engine.sqlite_storage import SQLiteHistoryReader
+from pyquipu.engine.sqlite_storage import SQLiteHistoryReader, SQLiteHistoryWriter
+from pyquipu.engine.state_machine import Engine
 
 
 @pytest.fixture
@@ -105,6 +108,29 @@ class TestSQLiteHistoryReader:
         row_after = cursor_after.fetchone()
         assert row_after["plan_md_cache"] == "Cache Test Content", "Cache was not written back to DB."
 
+    def test_batch_read_through_cache(self, sqlite_reader_setup):
+        """批量读取内容与私有数据: 未命中的节点一次性从 Git 读取并回填缓存。"""
+        reader, git_writer, hydrator, db_manager, repo, git_db = sqlite_reader_setup
+        parent = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        commits = []
+        for i in range(3):
+            (repo / f"f{i}.txt").write_text(str(i))
+            output = git_db.get_tree_hash()
+            commits.append(git_writer.create_node("plan", parent, output, f"Content {i}").commit_hash)
+            parent = output
+        hydrator.sync("test-user")
+        db_manager.execute_write("UPDATE nodes SET plan_md_cache = 'cached' WHERE commit_hash = ?", (commits[0],))
+        db_manager.execute_write("INSERT INTO private_data (node_hash, intent_md) VALUES (?, ?)", (commits[1], "why"))
+
+        nodes = [reader.get_node_by_commit(h) for h in commits]
+        for node in nodes:
+            node.content = ""
+        contents = reader.get_node_contents(nodes)
+        assert contents == {commits[0]: "cached", commits[1]: "Content 1", commits[2]: "Content 2"}
+        conn = db_manager._get_conn()
+        assert conn.execute("SELECT COUNT(*) FROM nodes WHERE plan_md_cache IS NULL").fetchone()[0] == 0
+        assert reader.get_private_data_many(commits) == {commits[1]: "why"}
+
 
 @pytest.fixture(scope="class")
 def populated_db(tmp_path_factory):
@@ -186,6 +212,67 @@ class TestSQLiteReaderPaginated:
         nodes = reader.load_nodes_paginated(limit=5, offset=20)
         assert len(nodes) == 0
 
+    def test_keyset_pages_match_offset_pages(self, populated_db):
+        reader, _, commit_hashes, _ = populated_db
+        page1 = reader.load_nodes_page(5)
+        page2 = reader.load_nodes_page(5, before=page1[-1].commit_hash)
+        page3 = reader.load_nodes_page(5, before=page2[-1].commit_hash)
+
+        for i, page in enumerate([page1, page2, page3]):
+            expected = reader.load_nodes_paginated(limit=5, offset=i * 5)
+            assert [n.commit_hash for n in page] == [n.commit_hash for n in expected]
+        assert reader.load_nodes_page(5, before=page3[-1].commit_hash) == []
+        # 页内节点补全了 input_tree 与父子链接
+        assert page2[0].parent is page2[1]
+
+    def test_keyset_page_backwards(self, populated_db):
+        reader, _, _, _ = populated_db
+        page3 = reader.load_nodes_paginated(limit=5, offset=10)
+        page2 = reader.load_nodes_page(5, after=page3[0].commit_hash)
+        assert [n.summary for n in page2] == [f"Node {i}" for i in range(9, 4, -1)]
+        # 返回紧邻游标的更新节点，仍按倒序排列
+        newer = reader.load_nodes_page(5, after=page2[2].commit_hash)
+        assert [n.summary for n in newer] == [f"Node {i}" for i in range(12, 7, -1)]
+        newest = reader.load_nodes_page(5, after=newer[0].commit_hash)
+        assert [n.summary for n in newest] == ["Node 14", "Node 13"]
+
+    def test_commit_at_offset(self, populated_db):
+        reader, _, commit_hashes, output_tree_hashes = populated_db
+        assert reader.get_commit_at_offset(None, 0) == commit_hashes[14]
+        assert reader.get_commit_at_offset(None, -1) == commit_hashes[0]
+        assert reader.get_commit_at_offset(None, 15) is None
+        # 从已知节点出发双向移动
+        assert reader.get_commit_at_offset(commit_hashes[7], 0) == commit_hashes[7]
+        assert reader.get_commit_at_offset(commit_hashes[7], 3) == commit_hashes[4]
+        assert reader.get_commit_at_offset(commit_hashes[7], -3) == commit_hashes[10]
+        assert reader.get_commit_at_offset(commit_hashes[7], -8) is None
+        assert reader.get_commit_at_offset("0" * 40, 1) is None
+        assert reader.get_node_position(output_tree_hashes[9]) == 5
+        assert reader.load_nodes_page(5, before="0" * 40) == []
+
+    def test_iter_nodes_streams_with_filters(self, populated_db):
+        reader, _, commit_hashes, output_tree_hashes = populated_db
+        stream = reader.iter_nodes()
+        first = next(stream)
+        assert first.commit_hash == commit_hashes[14]
+        assert first.input_tree == output_tree_hashes[13]
+        stream.close()
+
+        nodes = reader.load_nodes_paginated(limit=15, offset=0)
+        since, until = nodes[10].timestamp, nodes[4].timestamp
+        window = list(reader.iter_nodes(since=since, until=until))
+        assert [n.summary for n in window] == [f"Node {i}" for i in range(10, 3, -1)]
+        assert list(reader.iter_nodes(node_type="capture")) == []
+        assert len(list(reader.iter_nodes(owner_id="test-user"))) == 15
+        assert list(reader.iter_nodes(owner_id="someone-else")) == []
+
+    def test_git_reader_iter_nodes(self, populated_db):
+        reader, _, _, output_tree_hashes = populated_db
+        git_nodes = list(itertools.islice(reader._git_reader.iter_nodes(), 3))
+        assert [n.summary for n in git_nodes] == ["Node 14", "Node 13", "Node 12"]
+        assert [n.input_tree for n in git_nodes] == output_tree_hashes[13:10:-1]
+        assert len(list(reader._git_reader.iter_nodes(node_type="plan"))) == 15
+
     def test_get_private_data_found(self, populated_db):
         reader, _, commit_hashes, _ = populated_db
         private_data = reader.get_private_data(commit_hashes[3])
@@ -207,3 +294,163 @@ class TestSQLiteReaderPaginated:
         assert output_tree_hashes[0] in ancestor_output_trees
         assert output_tree_hashes[13] in ancestor_output_trees
         assert output_tree_hashes[14] not in ancestor_output_trees  # Should not contain itself
+
+    def test_descendants_and_ancestry(self, populated_db):
+        reader, _, commit_hashes, output_tree_hashes = populated_db
+        descendants = reader.get_descendant_output_trees(output_tree_hashes[10])
+        assert descendants == set(output_tree_hashes[11:])
+
+        assert reader.is_ancestor(commit_hashes[0], commit_hashes[14])
+        assert reader.is_ancestor(commit_hashes[9], commit_hashes[10])
+        assert not reader.is_ancestor(commit_hashes[10], commit_hashes[9])
+        assert not reader.is_ancestor(commit_hashes[5], commit_hashes[5])
+        assert reader.get_reachable_output_trees(output_tree_hashes[7]) == set(output_tree_hashes)
+
+    def test_reachability_without_labels_falls_back_to_edges(self, populated_db):
+        reader, db_manager, commit_hashes, output_tree_hashes = populated_db
+        db_manager.execute_write("DELETE FROM node_intervals WHERE commit_hash = ?", (commit_hashes[12],))
+        try:
+            assert reader.get_ancestor_output_trees(output_tree_hashes[12]) == set(output_tree_hashes[:12])
+            assert reader.get_descendant_output_trees(output_tree_hashes[12]) == set(output_tree_hashes[13:])
+            assert reader.is_ancestor(commit_hashes[11], commit_hashes[12])
+        finally:
+            db_manager.rebuild_intervals()
+
+
+class TestSQLiteReaderPointQueries:
+    def test_point_queries(self, sqlite_reader_setup):
+        """测试点查询在不加载完整图谱的情况下返回正确的节点与关系。"""
+        reader, git_writer, hydrator, _, repo, git_db = sqlite_reader_setup
+        genesis = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+        assert not reader.has_nodes()
+        assert reader.get_latest_node() is None
+
+        (repo / "a.txt").touch()
+        hash_a = git_db.get_tree_hash()
+        node_a = git_writer.create_node("plan", genesis, hash_a, "Content A")
+        time.sleep(0.01)
+        (repo / "b.txt").touch()
+        hash_b = git_db.get_tree_hash()
+        node_b = git_writer.create_node("plan", hash_a, hash_b, "Content B")
+        hydrator.sync("test-user")
+
+        assert reader.supports_point_queries
+        assert reader.has_nodes()
+
+        found = reader.find_node_by_output_tree(hash_b)
+        assert found.commit_hash == node_b.commit_hash
+        assert found.input_tree == hash_a
+        assert reader.find_node_by_output_tree("f" * 40) is None
+
+        assert reader.get_node_by_commit(node_a.commit_hash).input_tree == genesis
+        assert reader.get_parent(node_b.commit_hash).commit_hash == node_a.commit_hash
+        assert reader.get_parent(node_a.commit_hash) is None
+        assert [n.commit_hash for n in reader.get_children(node_a.commit_hash)] == [node_b.commit_hash]
+        assert reader.get_latest_node().commit_hash == node_b.commit_hash
+
+        prefix_matches = reader.find_nodes_by_output_tree_prefix(hash_a[:5])
+        assert [n.output_tree for n in prefix_matches] == [hash_a]
+
+
+def test_engine_lazy_align_uses_point_queries(sqlite_reader_setup, monkeypatch):
+    """惰性对齐不加载完整图谱，但状态判定与父节点链接保持正确。"""
+    reader, git_writer, _, db_manager, repo, git_db = sqlite_reader_setup
+    engine = Engine(repo, db=git_db, reader=reader, writer=SQLiteHistoryWriter(git_writer, db_manager))
+
+    (repo / "main.py").write_text("version = 1", "utf-8")
+    first_hash = git_db.get_tree_hash()
+    engine.capture_drift(first_hash)
+
+    def fail():
+        raise AssertionError("lazy align must not load the full graph")
+
+    monkeypatch.setattr(reader, "load_all_nodes", fail)
+
+    assert engine.align(lazy=True) == "CLEAN"
+    assert engine.current_node.output_tree == first_hash
+    assert not engine.graph_complete
+    assert list(engine.history_graph) == [engine.current_node.commit_hash]
+
+    (repo / "main.py").write_text("version = 2", "utf-8")
+    assert engine.align(lazy=True) == "DIRTY"
+    new_node = engine.capture_drift(git_db.get_tree_hash())
+    assert new_node.input_tree == first_hash
+    assert reader.get_parent(new_node.commit_hash).output_tree == first_hash
+
+
+def test_engine_compact_graph_align(sqlite_reader_setup, monkeypatch):
+    """紧凑图谱模式下，对齐与图遍历不经过 load_all_nodes，内容按需从缓存读取。"""
+    reader, git_writer, _, db_manager, repo, git_db = sqlite_reader_setup
+    writer = SQLiteHistoryWriter(git_writer, db_manager)
+    engine = Engine(repo, db=git_db, reader=reader, writer=writer, compact_graph=True)
+
+    (repo / "main.py").write_text("version = 1", "utf-8")
+    first = engine.capture_drift(git_db.get_tree_hash())
+    (repo / "main.py").write_text("version = 2", "utf-8")
+    second = engine.capture_drift(git_db.get_tree_hash())
+
+    monkeypatch.setattr(reader, "load_all_nodes", lambda: pytest.fail("compact align must not build QuipuNodes"))
+    assert engine.align() == "CLEAN"
+    assert isinstance(engine.history_graph, CompactHistoryGraph)
+    assert engine.current_node.commit_hash == second.commit_hash
+    assert engine.current_node.parent.commit_hash == first.commit_hash
+    assert engine.history_graph.latest_node() is engine.current_node
+    assert "Snapshot Capture" in reader.get_node_content(engine.current_node)
+
+
+class TestSQLiteReaderSearch:
+    @pytest.fixture
+    def search_db(self, sqlite_reader_setup):
+        reader, git_writer, hydrator, db_manager, repo, git_db = sqlite_reader_setup
+        writer = SQLiteHistoryWriter(git_writer, db_manager)
+        parent = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        specs = [
+            ("plan", "Add login form", "Touches the auth module and session cookies (Zq)."),
+            ("plan", "Refactor auth service", "Split auth into token and password flows."),
+            ("capture", "重构用户认证模块", ""),
+            ("plan", "Update README", "Documentation only."),
+        ]
+        nodes = []
+        for i, (node_type, summary, content) in enumerate(specs):
+            (repo / f"f{i}.txt").write_text(str(i))
+            time.sleep(0.01)
+            output = git_db.get_tree_hash()
+            nodes.append(
+                writer.create_node(node_type, parent, output, content, summary_override=summary, message=summary)
+            )
+            parent = output
+        return reader, db_manager, nodes
+
+    def test_text_search_ranks_summary_hits_first(self, search_db):
+        reader, db_manager, nodes = search_db
+        assert db_manager.fts_tokenizer is not None
+
+        results = reader.find_nodes(text="auth")
+        # 摘要命中的节点排在仅正文命中的节点之前
+        assert [n.summary for n in results] == ["Refactor auth service", "Add login form"]
+        assert [n.summary for n in reader.find_nodes(text="认证模块")] == ["重构用户认证模块"]
+        assert reader.find_nodes(text="auth cookies")[0].summary == "Add login form"
+        assert reader.find_nodes(text="nonexistent") == []
+
+    def test_text_search_with_filters(self, search_db):
+        reader, _, _ = search_db
+        assert [n.summary for n in reader.find_nodes(text="auth", summary_regex="^add")] == ["Add login form"]
+        assert reader.find_nodes(text="auth", node_type="capture") == []
+        # 过短的词退化为 LIKE 匹配
+        assert [n.summary for n in reader.find_nodes(text="zQ")] == ["Add login form"]
+
+    def test_summary_regex_is_a_real_regex(self, search_db):
+        reader, _, _ = search_db
+        assert [n.summary for n in reader.find_nodes(summary_regex=r"^(add|update)\b")] == [
+            "Update README",
+            "Add login form",
+        ]
+        assert reader.find_nodes(summary_regex="(unclosed") == []
+
+    def test_index_follows_cache_backfill(self, search_db):
+        reader, db_manager, nodes = search_db
+        db_manager.execute_write(
+            "UPDATE nodes SET plan_md_cache = ? WHERE commit_hash = ?", ("mentions kubernetes", nodes[3].commit_hash)
+        )
+        assert [n.summary for n in reader.find_nodes(text="kubernetes")] == ["Update README"]
@@ -0,0 +1,100 @@
+import asyncio
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from pyquipu.engine.async_engine import AsyncEngine, run_blocking
+from pyquipu.engine.git_db import GitDB
+from pyquipu.engine.git_object_storage import GitObjectHistoryReader, GitObjectHistoryWriter
+from pyquipu.engine.state_machine import Engine
+
+
+def make_engine(root: Path) -> Engine:
+    git_db = GitDB(root)
+    return Engine(root, db=git_db, reader=GitObjectHistoryReader(git_db), writer=GitObjectHistoryWriter(git_db))
+
+
+def init_repo(path: Path) -> Path:
+    path.mkdir()
+    subprocess.run(["git", "init"], cwd=path, check=True, capture_output=True)
+    subprocess.run(["git", "config", "user.email", "test@quipu.dev"], cwd=path, check=True)
+    subprocess.run(["git", "config", "user.name", "Quipu Test"], cwd=path, check=True)
+    return path
+
+
+def test_drives_many_workspaces_concurrently(tmp_path):
+    roots = [init_repo(tmp_path / f"ws{i}") for i in range(4)]
+
+    async def drive(root: Path):
+        async with await AsyncEngine.create(make_engine, root) as engine:
+            (root / "a.txt").write_text(root.name)
+            node = await engine.capture_drift(message=f"capture {root.name}")
+            assert await engine.align() == "CLEAN"
+            assert await engine.has_history()
+            return node
+
+    async def main():
+        return await asyncio.gather(*(drive(root) for root in roots))
+
+    nodes = asyncio.run(main())
+    assert all(n.summary.startswith(f"capture {root.name}") for n, root in zip(nodes, roots))
+    assert len({n.output_tree for n in nodes}) == 4
+
+
+def test_same_workspace_calls_are_serialized(tmp_path):
+    root = tmp_path / "ws"
+    root.mkdir()
+    active = []
+    overlaps = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            active.append(1)
+            if len(active) > 1:
+                overlaps.append(1)
+        time.sleep(0.02)
+        with lock:
+            active.pop()
+
+    async def main():
+        await asyncio.gather(*(run_blocking(root, work) for _ in range(5)))
+
+    asyncio.run(main())
+    assert overlaps == []
+
+
+def test_native_async_git(git_workspace):
+    async def main():
+        engine = AsyncEngine(make_engine(git_workspace))
+        top = await engine.git("rev-parse", "--show-toplevel")
+        blob = await engine.git("hash-object", "--stdin", input_data=b"hello")
+        with pytest.raises(RuntimeError):
+            await engine.git("cat-file", "-p", "0" * 40)
+        await engine.close()
+        return top, blob
+
+    top, blob = asyncio.run(main())
+    assert Path(top.decode().strip()).resolve() == git_workspace.resolve()
+    assert blob.decode().strip() == "b6fc4c620b67d95f953a5c1c1230aaab5db5a1b0"
+
+
+def test_cancelled_call_keeps_workspace_locked(tmp_path):
+    spans = []
+
+    def work(duration: float):
+        start = time.monotonic()
+        time.sleep(duration)
+        spans.append((start, time.monotonic()))
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(run_blocking(tmp_path, work, 0.3), timeout=0.05)
+        # 第二个调用必须等到被取消的调用在线程中真正结束
+        await run_blocking(tmp_path, work, 0)
+
+    asyncio.run(main())
+    (first_start, first_end), (second_start, _) = spans
+    assert second_start >= first_end
@@ -294,3 +294,171 @@ class TestGitDBPlumbing:
         assert results[h1] == b"obj1"
         assert results[h2] == b"obj2"
         assert h3_missing not in results
+
+    def test_object_stream_is_persistent(self, db):
+        """测试所有对象读取都复用同一个长驻的 cat-file 进程"""
+        h1 = db.hash_object(b"first")
+        h2 = db.hash_object(b"second")
+
+        assert db.cat_file(h1, "blob") == b"first"
+        pid = db._object_stream._proc.pid
+
+        assert db.batch_cat_file([h2]) == {h2: b"second"}
+        assert db.cat_file(h2, "blob") == b"second"
+        assert db._object_stream._proc.pid == pid
+
+    def test_object_stream_sees_new_objects(self, db):
+        """测试长驻进程启动后写入的对象依然可读"""
+        h1 = db.hash_object(b"before")
+        assert db.cat_file(h1, "blob") == b"before"
+
+        h2 = db.hash_object(b"after")
+        assert db.cat_file(h2, "blob") == b"after"
+
+    def test_cat_file_missing_object_raises(self, db):
+        """测试读取不存在的对象时抛出 RuntimeError"""
+        with pytest.raises(RuntimeError):
+            db.cat_file("b" * 40, "blob")
+
+    def test_cat_file_dereferences_commit_to_tree(self, git_repo, db):
+        """测试请求类型与对象类型不一致时，保留 git cat-file 的解引用语义"""
+        (git_repo / "a.txt").write_text("a", encoding="utf-8")
+        subprocess.run(["git", "add", "."], cwd=git_repo, check=True)
+        subprocess.run(["git", "commit", "-m", "c"], cwd=git_repo, check=True)
+        head_hash = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=git_repo).decode().strip()
+        tree_hash = subprocess.check_output(["git", "rev-parse", "HEAD^{tree}"], cwd=git_repo).decode().strip()
+
+        assert db.cat_file(head_hash, "tree") == db.cat_file(tree_hash, "tree")
+
+    def test_batch_check_objects(self, db):
+        """测试 batch_check_objects 只返回类型和大小"""
+        h1 = db.hash_object(b"12345")
+        results = db.batch_check_objects([h1, "c" * 40])
+        assert results == {h1: ("blob", 5)}
+
+    def test_close_stops_object_streams(self, db):
+        """测试 close 会关闭协进程，且之后的请求可以重新启动它"""
+        h1 = db.hash_object(b"data")
+        db.batch_cat_file([h1])
+        db.batch_check_objects([h1])
+        assert db._object_stream.is_running
+        assert db._check_stream.is_running
+
+        db.close()
+        assert not db._object_stream.is_running
+        assert not db._check_stream.is_running
+
+        assert db.cat_file(h1, "blob") == b"data"
+        db.close()
+
+
+class TestPersistentShadowIndex:
+    def test_index_is_reused_across_instances(self, git_repo, db):
+        """测试：持久化索引会保留在 .quipu/ 中，并且结果与临时索引一致"""
+        (git_repo / "a.txt").write_text("a", encoding="utf-8")
+        hash1 = db.get_tree_hash()
+
+        index_path = git_repo / ".quipu" / "shadow_index"
+        assert index_path.exists()
+        assert hash1 == db._tree_hash_with_temporary_index()
+
+        hash2 = GitDB(git_repo).get_tree_hash()
+        assert hash2 == hash1
+
+    def test_nested_gitignore_change_drops_entries(self, git_repo, db):
+        """测试：文件被新的嵌套 .gitignore 规则忽略后，不再出现在 Tree 中"""
+        sub = git_repo / "sub"
+        sub.mkdir()
+        (sub / "keep.txt").write_text("keep", encoding="utf-8")
+        (sub / "build.log").write_text("log", encoding="utf-8")
+        with_log = db.get_tree_hash()
+
+        (sub / ".gitignore").write_text("*.log\n", encoding="utf-8")
+        without_log = db.get_tree_hash()
+
+        assert without_log != with_log
+        assert without_log == db._tree_hash_with_temporary_index()
+        listing = subprocess.check_output(["git", "ls-tree", "-r", "--name-only", without_log], cwd=git_repo)
+        assert b"sub/build.log" not in listing
+
+    def test_exclude_file_change_reseeds(self, git_repo, db):
+        """测试：.git/info/exclude 变化时重新播种索引"""
+        (git_repo / "a.txt").write_text("a", encoding="utf-8")
+        (git_repo / "secret.env").write_text("x", encoding="utf-8")
+        db.get_tree_hash()
+
+        exclude = git_repo / ".git" / "info" / "exclude"
+        exclude.parent.mkdir(exist_ok=True)
+        exclude.write_text("secret.env\n", encoding="utf-8")
+
+        tree_hash = db.get_tree_hash()
+        listing = subprocess.check_output(["git", "ls-tree", "--name-only", tree_hash], cwd=git_repo)
+        assert listing.decode().split() == ["a.txt"]
+
+    def test_force_added_ignored_file_reseeds(self, git_repo, db):
+        """测试：用户 `git add -f` 强制跟踪被忽略的文件后，该文件出现在 Tree 中"""
+        (git_repo / ".gitignore").write_text("*.log\n", encoding="utf-8")
+        (git_repo / "f.log").write_text("log", encoding="utf-8")
+        tree_hash = db.get_tree_hash()
+        listing = subprocess.check_output(["git", "ls-tree", "--name-only", tree_hash], cwd=git_repo)
+        assert b"f.log" not in listing
+
+        subprocess.run(["git", "add", "-f", "f.log"], cwd=git_repo, check=True, capture_output=True)
+
+        tree_hash = db.get_tree_hash()
+        assert tree_hash == db._tree_hash_with_temporary_index()
+        listing = subprocess.check_output(["git", "ls-tree", "--name-only", tree_hash], cwd=git_repo)
+        assert b"f.log" in listing.split()
+
+    def test_corrupt_index_falls_back(self, git_repo, db):
+        """测试：持久化索引损坏时回退到临时索引，并在下次调用时恢复"""
+        (git_repo / "a.txt").write_text("a", encoding="utf-8")
+        expected = db.get_tree_hash()
+
+        (git_repo / ".quipu" / "shadow_index").write_bytes(b"garbage")
+        assert db.get_tree_hash() == expected
+        assert db.get_tree_hash() == expected
+        assert (git_repo / ".quipu" / "shadow_index").exists()
+
+    def test_memo_requires_invalidation(self, git_repo):
+        """测试：进程内缓存只在显式失效 (或检出) 后重新计算"""
+        db = GitDB(git_repo, memoize_tree_hash=True)
+        f = git_repo / "a.txt"
+        f.write_text("v1", encoding="utf-8")
+        hash_v1 = db.get_tree_hash()
+
+        f.write_text("v2", encoding="utf-8")
+        assert db.get_tree_hash() == hash_v1
+
+        db.invalidate_tree_hash()
+        hash_v2 = db.get_tree_hash()
+        assert hash_v2 != hash_v1
+
+        db.checkout_tree(hash_v1)
+        assert db.get_tree_hash() == hash_v1
+
+    def test_update_tree_only_touches_changed_paths(self, git_repo, db, monkeypatch):
+        """测试：在基准树之上只更新变更路径，结果与完整计算一致"""
+        (git_repo / "a.txt").write_text("a", encoding="utf-8")
+        (git_repo / "d").mkdir()
+        (git_repo / "d" / "x.txt").write_text("x", encoding="utf-8")
+        base = db.get_tree_hash()
+
+        (git_repo / "a.txt").write_text("a2", encoding="utf-8")
+        (git_repo / "d" / "x.txt").unlink()
+        (git_repo / "d").rmdir()
+        (git_repo / "new").mkdir()
+        (git_repo / "new" / "n.txt").write_text("n", encoding="utf-8")
+        monkeypatch.setattr(db, "_compute_tree_hash", lambda: pytest.fail("should not rescan the workspace"))
+
+        updated = db.update_tree(base, ["a.txt", "d", "new/n.txt"])
+        assert updated == db._tree_hash_with_temporary_index()
+        assert db.update_tree(updated, []) == updated
+
+    def test_update_tree_falls_back_on_mismatched_base(self, git_repo, db):
+        (git_repo / "a.txt").write_text("a", encoding="utf-8")
+        db.get_tree_hash()
+        (git_repo / "b.txt").write_text("b", encoding="utf-8")
+        # 未报告 b.txt 的变化，且基准树与索引不符时，结果仍应是完整扫描的结果
+        genesis = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        assert db.update_tree(genesis, ["a.txt"]) == db._tree_hash_with_temporary_index()
@@ -0,0 +1,154 @@
+import subprocess
+
+import pytest
+from pyquipu.engine.git_db import GitDB
+from pyquipu.engine.git_native import NativeObjectStore
+
+
+def _git(root, *args) -> str:
+    return subprocess.run(["git", *args], cwd=root, check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def repo_with_history(tmp_path):
+    """创建一个包含多次提交与多个引用的仓库，文件内容逐步演化以便 gc 后产生 delta 对象。"""
+    root = tmp_path / "repo"
+    root.mkdir()
+    _git(root, "init")
+    _git(root, "config", "user.email", "test@quipu.dev")
+    _git(root, "config", "user.name", "Quipu Test")
+
+    lines = [f"line {i}: some reasonably long content to make deltas worthwhile\n" for i in range(200)]
+    for i in range(12):
+        lines[i * 7] = f"changed in revision {i}\n"
+        (root / "big.txt").write_text("".join(lines), encoding="utf-8")
+        (root / "sub").mkdir(exist_ok=True)
+        (root / "sub" / f"f{i}.txt").write_text(f"file {i}", encoding="utf-8")
+        _git(root, "add", "-A")
+        _git(root, "commit", "-m", f"Commit {i}\n\nBody of commit {i}\nX-Quipu-Output-Tree: {i}")
+        if i == 5:
+            _git(root, "update-ref", "refs/quipu/local/heads/early", "HEAD")
+    _git(root, "update-ref", "refs/quipu/local/heads/late", "HEAD")
+    return root
+
+
+def _all_objects(root):
+    out = _git(root, "cat-file", "--batch-all-objects", "--batch-check=%(objectname) %(objecttype)")
+    return [line.split() for line in out.strip().splitlines()]
+
+
+def _assert_objects_match(root):
+    store = NativeObjectStore(root / ".git")
+    try:
+        objects = _all_objects(root)
+        assert objects
+        for sha, obj_type in objects:
+            native = store.read_object(sha)
+            assert native is not None, sha
+            expected = subprocess.run(["git", "cat-file", obj_type, sha], cwd=root, check=True, capture_output=True)
+            assert native == (obj_type, expected.stdout)
+    finally:
+        store.close()
+
+
+class TestNativeObjectStore:
+    def test_reads_loose_objects(self, repo_with_history):
+        _assert_objects_match(repo_with_history)
+
+    def test_reads_packed_objects_with_deltas(self, repo_with_history):
+        _git(repo_with_history, "gc", "--aggressive", "--prune=now", "--quiet")
+        assert not list((repo_with_history / ".git" / "objects").glob("[0-9a-f][0-9a-f]/*"))
+        assert list((repo_with_history / ".git" / "objects" / "pack").glob("*.pack"))
+        _assert_objects_match(repo_with_history)
+
+    def test_missing_object_returns_none(self, repo_with_history):
+        store = NativeObjectStore(repo_with_history / ".git")
+        assert store.read_object("0" * 40) is None
+        assert store.read_objects(["0" * 40]) == {}
+        store.close()
+
+    def test_picks_up_new_packs(self, repo_with_history):
+        store = NativeObjectStore(repo_with_history / ".git")
+        head = _git(repo_with_history, "rev-parse", "HEAD").strip()
+        assert store.read_object(head)[0] == "commit"
+
+        _git(repo_with_history, "gc", "--prune=now", "--quiet")
+        assert store.read_object(head)[0] == "commit"
+        store.close()
+
+
+class TestNativeReadBackend:
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_refs_match_cli(self, repo_with_history, packed):
+        if packed:
+            _git(repo_with_history, "gc", "--prune=now", "--quiet")
+            _git(repo_with_history, "pack-refs", "--all")
+
+        cli_db = GitDB(repo_with_history)
+        native_db = GitDB(repo_with_history, read_backend="native")
+        assert native_db.read_backend == "native"
+
+        for prefix in ["refs/quipu/local/heads/", "refs/quipu/", "refs/heads/", "refs/quipu/missing/"]:
+            assert native_db.get_all_ref_heads(prefix) == cli_db.get_all_ref_heads(prefix)
+
+    def test_loose_ref_overrides_packed_ref(self, repo_with_history):
+        _git(repo_with_history, "pack-refs", "--all")
+        first = _git(repo_with_history, "rev-list", "--max-parents=0", "HEAD").strip()
+        _git(repo_with_history, "update-ref", "refs/quipu/local/heads/late", first)
+
+        native_db = GitDB(repo_with_history, read_backend="native")
+        heads = dict((ref, sha) for sha, ref in native_db.get_all_ref_heads("refs/quipu/local/heads/"))
+        assert heads["refs/quipu/local/heads/late"] == first
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_log_ref_matches_cli(self, repo_with_history, packed):
+        if packed:
+            _git(repo_with_history, "gc", "--aggressive", "--prune=now", "--quiet")
+
+        cli_db = GitDB(repo_with_history)
+        native_db = GitDB(repo_with_history, read_backend="native")
+
+        for refs in (["HEAD"], ["refs/quipu/local/heads/early"], ["refs/quipu/local/heads/early", "HEAD"]):
+            assert native_db.log_ref(refs) == cli_db.log_ref(refs)
+
+        assert native_db.log_ref("refs/quipu/local/heads/missing") == []
+
+    def test_log_ref_exclude_matches_cli(self, repo_with_history):
+        cli_db = GitDB(repo_with_history)
+        native_db = GitDB(repo_with_history, read_backend="native")
+        early = _git(repo_with_history, "rev-parse", "refs/quipu/local/heads/early").strip()
+        later = _git(repo_with_history, "rev-parse", "HEAD~2").strip()
+
+        cases = [
+            (["refs/quipu/local/heads/late"], [early]),
+            (["refs/quipu/local/heads/late"], ["refs/quipu/local/heads/late"]),
+            (["refs/quipu/local/heads/early"], [later]),
+            (["refs/quipu/local/heads/early"], ["HEAD~2"]),
+        ]
+        for starts, exclude in cases:
+            assert native_db.log_ref(starts, exclude=exclude) == cli_db.log_ref(starts, exclude=exclude)
+        assert len(native_db.log_ref(["HEAD"], exclude=[early])) == 6
+
+    def test_cat_file_and_batch_match_cli(self, repo_with_history):
+        _git(repo_with_history, "gc", "--prune=now", "--quiet")
+        cli_db = GitDB(repo_with_history)
+        native_db = GitDB(repo_with_history, read_backend="native")
+
+        head = _git(repo_with_history, "rev-parse", "HEAD").strip()
+        tree = _git(repo_with_history, "rev-parse", "HEAD^{tree}").strip()
+        assert native_db.cat_file(head, "commit") == cli_db.cat_file(head, "commit")
+        # 对 commit 请求 tree 时保留 git 的解引用语义
+        assert native_db.cat_file(head, "tree") == cli_db.cat_file(tree, "tree")
+
+        hashes = [head, tree, "0" * 40]
+        assert native_db.batch_cat_file(hashes) == cli_db.batch_cat_file(hashes)
+
+    def test_sees_objects_written_after_init(self, repo_with_history):
+        native_db = GitDB(repo_with_history, read_backend="native")
+        blob = native_db.hash_object(b"fresh content")
+        assert native_db.batch_cat_file([blob]) == {blob: b"fresh content"}
+
+    def test_unsupported_repo_falls_back_to_cli(self, repo_with_history):
+        (repo_with_history / ".git" / "reftable").mkdir()
+        db = GitDB(repo_with_history, read_backend="native")
+        assert db.read_backend == "cli"
@@ -188,3 +188,46 @@ class TestGitObjectHistoryReader:
         # C should be correctly parented to A, effectively ignoring the bad commit.
         assert found_node_c.parent == found_node_a
         assert found_node_a.children == [found_node_c]
+
+    def test_get_nodes_blobs_batch(self, reader_setup, monkeypatch):
+        """测试：批量读取多个节点的文件，整个批次只需三次批量读取"""
+        reader, writer, git_db, repo = reader_setup
+        h0 = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        (repo / "a").touch()
+        h1 = git_db.get_tree_hash()
+        node_a = writer.create_node("plan", h0, h1, "Plan A", start_time=1000)
+        (repo / "b").touch()
+        h2 = git_db.get_tree_hash()
+        node_b = writer.create_node("plan", h1, h2, "Plan B", start_time=2000)
+
+        calls = []
+        original = git_db.batch_cat_file
+        monkeypatch.setattr(git_db, "batch_cat_file", lambda hashes: calls.append(len(hashes)) or original(hashes))
+
+        blobs = reader.get_nodes_blobs([node_a.commit_hash, node_b.commit_hash, "0" * 40])
+        assert len(calls) == 3
+        assert blobs[node_a.commit_hash]["content.md"] == b"Plan A"
+        assert blobs[node_b.commit_hash]["content.md"] == b"Plan B"
+        assert "metadata.json" in blobs[node_b.commit_hash]
+        assert blobs["0" * 40] == {}
+        assert reader.get_node_blobs(node_a.commit_hash) == blobs[node_a.commit_hash]
+
+    def test_find_text_reads_contents_in_batches(self, reader_setup, monkeypatch):
+        """测试：全文检索分批读取内容，而不是逐个节点读取"""
+        reader, writer, git_db, repo = reader_setup
+        parent = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        for i, body in enumerate(["alpha beta", "beta", "gamma"]):
+            (repo / f"f{i}").touch()
+            tree = git_db.get_tree_hash()
+            writer.create_node("plan", parent, tree, f"# Plan {i}\n{body}", start_time=1000 + i)
+            parent = tree
+
+        batches = []
+        original = reader.read_contents
+        monkeypatch.setattr(reader, "CONTENT_BATCH_SIZE", 2)
+        monkeypatch.setattr(reader, "read_contents", lambda hashes: batches.append(len(hashes)) or original(hashes))
+        monkeypatch.setattr(reader, "get_node_content", lambda node: pytest.fail("per-node content read"))
+
+        results = reader.find_nodes(text="beta", limit=10)
+        assert batches == [2, 1]
+        assert [n.summary for n in results] == ["Plan 1", "Plan 0"]
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from pyquipu.engine.git_db import GitDB
+from pyquipu.engine.git_object_storage import GitObjectHistoryReader, GitObjectHistoryWriter
+from pyquipu.engine.graph_snapshot import GraphSnapshotStore
+from pyquipu.engine.history_graph import CompactHistoryGraph
+from pyquipu.engine.state_machine import Engine
+from pyquipu.interfaces.models import QuipuNode
+
+BASE_TIME = datetime(2024, 1, 1)
+
+
+def build_graph() -> CompactHistoryGraph:
+    # r -> a -> b, r -> c
+    specs = [
+        ("a0" * 20, "f0" * 20, 0, None, "根节点"),
+        ("a1" * 20, "f1" * 20, 1, "a0" * 20, "修改 a"),
+        ("a2" * 20, "f2" * 20, 2, "a1" * 20, "修改 b"),
+        ("b3" * 20, "f3" * 20, 3, "a0" * 20, "分支 c"),
+    ]
+    rows = [(c, t, (BASE_TIME + timedelta(minutes=m)).timestamp(), "plan", s, "alice") for c, t, m, _, s in specs]
+    edges = [(c, p) for c, _, _, p, _ in specs if p]
+    return CompactHistoryGraph.from_columns(rows, edges)
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> GraphSnapshotStore:
+    return GraphSnapshotStore(tmp_path)
+
+
+class TestGraphSnapshotStore:
+    def test_round_trip(self, store):
+        store.write(build_graph(), "k1")
+        graph = store.load("k1")
+
+        assert graph is not None
+        assert graph._rows is None  # 列直接映射到文件上
+        assert list(graph) == ["a0" * 20, "a1" * 20, "a2" * 20, "b3" * 20]
+        node = graph["a2" * 20]
+        assert node.summary == "修改 b"
+        assert node.owner_id == "alice"
+        assert node.timestamp == BASE_TIME + timedelta(minutes=2)
+        assert node.parent.parent is graph["a0" * 20]
+        assert [n.commit_hash for n in graph["a0" * 20].children] == ["a1" * 20, "b3" * 20]
+        assert graph.find_by_output_tree("f3" * 20) is graph["b3" * 20]
+        assert [n.commit_hash for n in graph.find_by_prefix("a")] == ["a0" * 20, "a1" * 20, "a2" * 20]
+        assert graph.latest_node() is graph["b3" * 20]
+        assert graph.reachable_output_trees("f1" * 20) == {"f0" * 20, "f1" * 20, "f2" * 20}
+        assert "ff" * 20 not in graph
+
+    def test_stale_key_misses(self, store):
+        store.write(build_graph(), "k1")
+        assert store.load("k2") is None
+
+    def test_append_replays_journal(self, store):
+        store.write(build_graph(), "k1")
+        parent = store.load("k1")["a2" * 20]
+        node = QuipuNode(
+            commit_hash="c4" * 20,
+            input_tree="f2" * 20,
+            output_tree="f4" * 20,
+            timestamp=BASE_TIME + timedelta(minutes=4),
+            filename=Path("c4"),
+            node_type="capture",
+            summary="新节点",
+            parent=parent,
+        )
+        store.append(node, prev_key="k1", new_key="k2", owner_id="bob")
+
+        assert store.load("k1") is None
+        graph = store.load("k2")
+        new = graph["c4" * 20]
+        assert new.owner_id == "bob"
+        assert new.parent is graph["a2" * 20]
+        assert graph["a2" * 20].children == [new]
+        assert graph.latest_node() is new
+        assert "f4" * 20 in graph.reachable_output_trees("f0" * 20)
+
+    def test_append_from_unknown_state_invalidates(self, store):
+        store.write(build_graph(), "k1")
+        node = QuipuNode("c4" * 20, "f4" * 20, "f2" * 20, BASE_TIME, Path("c4"), "plan")
+        store.append(node, prev_key="other", new_key="k2")
+        assert not store.path.exists()
+        assert store.load("k1") is None
+
+    def test_sha256_graph_is_not_written(self, store):
+        rows = [("a0" * 32, "f0" * 32, BASE_TIME.timestamp(), "plan", "根节点", "alice")]
+        store.write(CompactHistoryGraph.from_columns(rows, []), "k1")
+        assert not store.path.exists()
+
+    def test_corrupt_snapshot_is_discarded(self, store):
+        store.path.write_bytes(b"garbage")
+        assert store.load("k1") is None
+
+
+def test_engine_uses_snapshot(git_workspace, monkeypatch):
+    def make_engine():
+        git_db = GitDB(git_workspace)
+        reader = GitObjectHistoryReader(git_db)
+        return Engine(
+            git_workspace, db=git_db, reader=reader, writer=GitObjectHistoryWriter(git_db), graph_snapshot=True
+        )
+
+    engine = make_engine()
+    (git_workspace / "a.txt").write_text("1", "utf-8")
+    first = engine.capture_drift(engine.git_db.get_tree_hash())
+    assert engine.align() == "CLEAN"
+    assert engine.graph_snapshot.path.exists()
+
+    # 创建节点只追加日志，快照保持有效
+    (git_workspace / "a.txt").write_text("2", "utf-8")
+    second = engine.capture_drift(engine.git_db.get_tree_hash())
+    assert engine.graph_snapshot.journal_path.exists()
+
+    engine = make_engine()
+    monkeypatch.setattr(engine.reader, "load_all_nodes", lambda: pytest.fail("snapshot should be used"))
+    assert engine.align() == "CLEAN"
+    assert isinstance(engine.history_graph, CompactHistoryGraph)
+    assert engine.current_node.commit_hash == second.commit_hash
+    assert engine.current_node.parent.commit_hash == first.commit_hash
+
+
+def test_node_write_lists_refs_once(git_workspace, monkeypatch):
+    git_db = GitDB(git_workspace)
+    reader = GitObjectHistoryReader(git_db)
+    engine = Engine(git_workspace, db=git_db, reader=reader, writer=GitObjectHistoryWriter(git_db), graph_snapshot=True)
+    (git_workspace / "a.txt").write_text("1", "utf-8")
+    engine.capture_drift(engine.git_db.get_tree_hash())
+    assert engine.align() == "CLEAN"
+
+    calls = []
+    original = git_db.get_all_ref_heads
+    monkeypatch.setattr(git_db, "get_all_ref_heads", lambda prefix: calls.append(prefix) or original(prefix))
+    (git_workspace / "a.txt").write_text("2", "utf-8")
+    engine.capture_drift(engine.git_db.get_tree_hash())
+
+    assert calls == ["refs/quipu/"]
+    # 推导出的引用状态与实际状态一致，快照在新的状态下仍然命中
+    assert engine.graph_snapshot.load(engine._ref_state_key()) is not None
@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from pyquipu.engine.history_graph import CompactHistoryGraph, HistoryGraph
+from pyquipu.interfaces.models import QuipuNode
+
+BASE_TIME = datetime(2024, 1, 1)
+
+
+def make_node(commit: str, tree: str, minutes: int = 0) -> QuipuNode:
+    return QuipuNode(
+        commit_hash=commit,
+        output_tree=tree,
+        input_tree="0" * 40,
+        timestamp=BASE_TIME + timedelta(minutes=minutes),
+        filename=Path(f"{commit}.md"),
+        node_type="plan",
+    )
+
+
+class TestHistoryGraph:
+    def test_behaves_like_dict(self):
+        n1 = make_node("c1" * 20, "t1" * 20)
+        graph = HistoryGraph({n1.commit_hash: n1})
+        assert graph[n1.commit_hash] is n1
+        assert list(graph.values()) == [n1]
+        assert isinstance(graph, dict)
+
+    def test_output_tree_lookup_prefers_first_inserted(self):
+        n1 = make_node("aa" * 20, "tt" * 20, minutes=1)
+        n2 = make_node("bb" * 20, "tt" * 20, minutes=2)
+        graph = HistoryGraph.from_nodes([n1, n2])
+
+        assert graph.find_by_output_tree("tt" * 20) is n1
+        assert graph.nodes_by_output_tree("tt" * 20) == [n1, n2]
+        assert graph.find_by_output_tree("ff" * 20) is None
+
+        del graph[n1.commit_hash]
+        assert graph.find_by_output_tree("tt" * 20) is n2
+
+    def test_replacing_node_reindexes(self):
+        old = make_node("aa" * 20, "t1" * 20)
+        graph = HistoryGraph.from_nodes([old])
+        new = make_node("aa" * 20, "t2" * 20)
+        graph[new.commit_hash] = new
+
+        assert graph.find_by_output_tree("t1" * 20) is None
+        assert graph.find_by_output_tree("t2" * 20) is new
+
+    def test_prefix_lookups(self):
+        n1 = make_node("abc1" + "0" * 36, "def1" + "0" * 36)
+        n2 = make_node("abc2" + "0" * 36, "abc9" + "0" * 36)
+        n3 = make_node("fff0" + "0" * 36, "def2" + "0" * 36)
+        graph = HistoryGraph.from_nodes([n1, n2, n3])
+
+        assert graph.find_by_commit_prefix("abc") == [n1, n2]
+        assert graph.find_by_output_tree_prefix("def") == [n1, n3]
+        # commit 与 output_tree 同时匹配时不重复
+        assert graph.find_by_prefix("abc") == [n1, n2]
+        assert graph.find_by_prefix("abc2") == [n2]
+        assert graph.find_by_prefix("zzz") == []
+
+        # 有序索引建立之后的插入与删除
+        n4 = make_node("abc3" + "0" * 36, "def3" + "0" * 36)
+        graph[n4.commit_hash] = n4
+        assert graph.find_by_commit_prefix("abc") == [n1, n2, n4]
+        graph.pop(n1.commit_hash)
+        assert graph.find_by_output_tree_prefix("def") == [n3, n4]
+
+    def test_latest_node(self):
+        n1 = make_node("aa" * 20, "t1" * 20, minutes=5)
+        n2 = make_node("bb" * 20, "t2" * 20, minutes=1)
+        graph = HistoryGraph.from_nodes([n1, n2])
+        assert graph.latest_node() is n1
+
+        n3 = make_node("cc" * 20, "t3" * 20, minutes=9)
+        graph[n3.commit_hash] = n3
+        assert graph.latest_node() is n3
+
+        del graph[n3.commit_hash]
+        assert graph.latest_node() is n1
+
+        graph.clear()
+        assert graph.latest_node() is None
+        assert graph.find_by_prefix("aa") == []
+
+
+def make_rows(specs):
+    """specs: [(commit, tree, minutes, parent_commit)] -> (rows, edges)"""
+    rows = [
+        (c, t, (BASE_TIME + timedelta(minutes=m)).timestamp(), "plan", f"summary {c[:2]}", "alice")
+        for c, t, m, _ in specs
+    ]
+    edges = [(c, p) for c, _, _, p in specs if p]
+    return rows, edges
+
+
+class TestCompactHistoryGraph:
+    def test_views_are_lazy_and_linked(self):
+        root, a, b = "aa" * 20, "bb" * 20, "cc" * 20
+        rows, edges = make_rows([(root, "t0" * 20, 0, None), (b, "t2" * 20, 2, root), (a, "t1" * 20, 1, root)])
+        graph = CompactHistoryGraph.from_columns(rows, edges)
+        assert len(graph) == 3
+        assert list(graph) == [root, b, a]
+
+        node_b = graph[b]
+        assert isinstance(node_b, QuipuNode)
+        assert not graph._views.keys() - {1}
+
+        assert node_b.parent is graph[root]
+        assert node_b.input_tree == "t0" * 20
+        assert graph[root].input_tree == "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        # 子节点按时间戳排序
+        assert [n.commit_hash for n in graph[root].children] == [a, b]
+        assert node_b.siblings == graph[root].children
+        assert node_b.summary == "summary cc"
+        assert node_b.owner_id == "alice"
+        assert node_b.timestamp == BASE_TIME + timedelta(minutes=2)
+
+    def test_queries_match_history_graph(self):
+        specs = [
+            ("abc1" + "0" * 36, "def1" + "0" * 36, 5, None),
+            ("abc2" + "0" * 36, "abc9" + "0" * 36, 9, "abc1" + "0" * 36),
+            ("fff0" + "0" * 36, "def1" + "0" * 36, 1, "abc2" + "0" * 36),
+        ]
+        rows, edges = make_rows(specs)
+        compact = CompactHistoryGraph.from_columns(rows, edges)
+        reference = HistoryGraph.from_nodes(compact[c] for c, _, _, _ in specs)
+
+        def hashes(nodes):
+            return [n.commit_hash for n in nodes]
+
+        for prefix in ("abc", "abc2", "def", "f", "zzz"):
+            assert hashes(compact.find_by_prefix(prefix)) == hashes(reference.find_by_prefix(prefix))
+            assert hashes(compact.find_by_commit_prefix(prefix)) == hashes(reference.find_by_commit_prefix(prefix))
+            assert hashes(compact.find_by_output_tree_prefix(prefix)) == hashes(
+                reference.find_by_output_tree_prefix(prefix)
+            )
+        assert compact.find_by_output_tree("def1" + "0" * 36) is compact["abc1" + "0" * 36]
+        assert hashes(compact.nodes_by_output_tree("def1" + "0" * 36)) == hashes(
+            reference.nodes_by_output_tree("def1" + "0" * 36)
+        )
+        assert compact.latest_node() is compact["abc2" + "0" * 36]
+
+    def test_mutations(self):
+        rows, edges = make_rows([("aa" * 20, "t1" * 20, 1, None), ("bb" * 20, "t2" * 20, 2, "aa" * 20)])
+        graph = CompactHistoryGraph.from_columns(rows, edges)
+
+        new = make_node("cc" * 20, "t3" * 20, minutes=9)
+        graph[new.commit_hash] = new
+        assert graph[new.commit_hash] is new
+        assert graph.find_by_output_tree("t3" * 20) is new
+        assert graph.latest_node() is new
+        assert len(graph) == 3
+
+        del graph["bb" * 20]
+        assert "bb" * 20 not in graph
+        assert graph["aa" * 20].children == []
+        assert graph.find_by_output_tree("t2" * 20) is None
+
+        replacement = make_node("aa" * 20, "t9" * 20)
+        graph["aa" * 20] = replacement
+        assert graph["aa" * 20] is replacement
+        assert graph.find_by_output_tree("t1" * 20) is None
+        assert list(graph) == ["cc" * 20, "aa" * 20]
+
+    def test_from_nodes_round_trip(self):
+        parent = make_node("aa" * 20, "t1" * 20, minutes=1)
+        child = make_node("bb" * 20, "t2" * 20, minutes=2)
+        child.parent = parent
+        parent.children.append(child)
+        graph = CompactHistoryGraph.from_nodes([parent, child])
+        assert graph["bb" * 20].parent is graph["aa" * 20]
+        assert graph["bb" * 20].timestamp == child.timestamp
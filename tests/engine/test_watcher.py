@@ -0,0 +1,124 @@
+import subprocess
+
+import pytest
+from pyquipu.engine.git_db import GitDB
+from pyquipu.engine.watcher import InotifyWatcher, WatchJournal, is_supported
+
+pytestmark = pytest.mark.skipif(not is_supported(), reason="inotify 仅在 Linux 上可用")
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    subprocess.run(["git", "init"], cwd=root, check=True, capture_output=True)
+    (root / "a.txt").write_text("a", encoding="utf-8")
+    (root / "src").mkdir()
+    (root / "src" / "main.py").write_text("print('hi')", encoding="utf-8")
+    (root / ".gitignore").write_text("*.log\n", encoding="utf-8")
+    return root
+
+
+@pytest.fixture
+def watched(repo):
+    db = GitDB(repo)
+    watcher = InotifyWatcher(repo)
+    watcher.start()
+    yield repo, db
+    watcher.stop()
+    db.close()
+
+
+def _reference_hash(db: GitDB) -> str:
+    return db._tree_hash_with_temporary_index()
+
+
+class TestWatchJournal:
+    def test_no_session_without_watcher(self, repo):
+        journal = WatchJournal(repo / ".quipu")
+        assert journal.active_session() is None
+
+    def test_session_lifecycle(self, repo):
+        watcher = InotifyWatcher(repo)
+        watcher.start()
+        journal = WatchJournal(repo / ".quipu")
+        session = journal.active_session()
+        assert session == watcher.session
+
+        offset = journal.sync(session)
+        assert offset is not None
+
+        (repo / "a.txt").write_text("changed", encoding="utf-8")
+        new_offset = journal.sync(session, start=offset)
+        paths, overflowed = journal.read_changes(session, offset, new_offset)
+        assert "a.txt" in paths
+        assert not overflowed
+
+        watcher.stop()
+        assert journal.active_session() is None
+
+
+class TestWatcherDrivenTreeHash:
+    def test_unchanged_workspace_skips_git(self, watched, monkeypatch):
+        repo, db = watched
+        baseline = db.get_tree_hash()
+
+        def fail(*args, **kwargs):
+            raise AssertionError("git should not be invoked for an unchanged workspace")
+
+        monkeypatch.setattr(db, "_run", fail)
+        assert db.get_tree_hash() == baseline
+
+    def test_incremental_changes_match_full_hash(self, watched, monkeypatch):
+        repo, db = watched
+        db.get_tree_hash()
+
+        def fail():
+            raise AssertionError("expected an incremental update, not a full re-hash")
+
+        monkeypatch.setattr(db, "_compute_tree_hash", fail)
+
+        (repo / "a.txt").write_text("modified", encoding="utf-8")
+        assert db.get_tree_hash() == _reference_hash(db)
+
+        (repo / "src" / "main.py").unlink()
+        (repo / "new.txt").write_text("new", encoding="utf-8")
+        (repo / "debug.log").write_text("ignored", encoding="utf-8")
+        tree_hash = db.get_tree_hash()
+        assert tree_hash == _reference_hash(db)
+        listing = subprocess.check_output(["git", "ls-tree", "-r", "--name-only", tree_hash], cwd=repo).decode()
+        assert "debug.log" not in listing
+        assert "src/main.py" not in listing
+
+        nested = repo / "pkg" / "sub"
+        nested.mkdir(parents=True)
+        (nested / "mod.py").write_text("x = 1", encoding="utf-8")
+        assert db.get_tree_hash() == _reference_hash(db)
+
+    def test_deleted_directory(self, watched, monkeypatch):
+        repo, db = watched
+        db.get_tree_hash()
+        monkeypatch.setattr(db, "_compute_tree_hash", lambda: pytest.fail("expected an incremental update"))
+
+        (repo / "src" / "main.py").unlink()
+        (repo / "src").rmdir()
+        assert db.get_tree_hash() == _reference_hash(db)
+
+    def test_gitignore_change_falls_back_to_full_hash(self, watched):
+        repo, db = watched
+        (repo / "build.tmp").write_text("tmp", encoding="utf-8")
+        with_tmp = db.get_tree_hash()
+
+        (repo / ".gitignore").write_text("*.log\n*.tmp\n", encoding="utf-8")
+        without_tmp = db.get_tree_hash()
+        assert without_tmp != with_tmp
+        assert without_tmp == _reference_hash(db)
+
+    def test_baseline_invalidated_when_index_replaced(self, watched):
+        repo, db = watched
+        db.get_tree_hash()
+
+        # 持久化索引被删除 (例如因损坏被丢弃)，不能再基于它做增量更新
+        (repo / ".quipu" / "shadow_index").unlink()
+        (repo / "a.txt").write_text("after reset", encoding="utf-8")
+        assert db.get_tree_hash() == _reference_hash(db)
@@ -176,9 +176,16 @@ class InMemoryHistoryManager(HistoryReader, HistoryWriter):
         summary_regex: Optional[str] = None,
         node_type: Optional[str] = None,
         limit: int = 10,
+        text: Optional[str] = None,
     ) -> List[QuipuNode]:
         candidates = list(self.db.nodes.values())
 
+        if text:
+            terms = [t.casefold() for t in text.split()]
+            candidates = [
+                node for node in candidates if all(t in f"{node.summary}\n{node.content}".casefold() for t in terms)
+            ]
+
         if summary_regex:
             try:
                 pattern = re.compile(summary_regex, re.IGNORECASE)
@@ -1,7 +1,8 @@
+import asyncio
 import logging
 
 import pytest
-from pyquipu.cli.controller import run_quipu
+from pyquipu.cli.controller import run_quipu, run_quipu_async, run_quipu_batch
 from pyquipu.cli.main import app
 from pyquipu.interfaces.exceptions import ExecutionError
 from typer.testing import CliRunner
@@ -103,6 +104,85 @@ boo
         assert result.exit_code == 0
         assert result.message == "axon.warning.noStatements"
 
+    def test_run_quipu_async_serializes_same_workspace(self, workspace):
+        """测试异步入口: 同一工作区上的并发计划按顺序执行，均生成节点"""
+        plans = [
+            f"""
+```act
+write_file
+```
+```path
+f{i}.txt
+```
+```content
+{i}
+```
+"""
+            for i in range(3)
+        ]
+
+        async def main():
+            return await asyncio.gather(*(run_quipu_async(plan, workspace, yolo=True) for plan in plans))
+
+        results = asyncio.run(main())
+
+        assert all(r.success for r in results)
+        assert all((workspace / f"f{i}.txt").exists() for i in range(3))
+        from pyquipu.cli.factory import create_engine
+
+        engine = create_engine(workspace)
+        assert len([n for n in engine.reader.load_all_nodes() if n.node_type == "plan"]) == 3
+        engine.close()
+
+    def test_run_quipu_batch_chains_plans(self, workspace, monkeypatch):
+        """测试批量执行: 单个会话、每个 Plan 一个节点，且中途不重新计算 Tree Hash"""
+        from pyquipu.cli.factory import create_engine
+        from pyquipu.engine.git_db import GitDB
+
+        plans = [f"```act\nwrite_file f{i}.txt\n```\n```content\n{i}\n```" for i in range(3)]
+        computed = []
+        original = GitDB._compute_tree_hash
+        monkeypatch.setattr(GitDB, "_compute_tree_hash", lambda self: computed.append(1) or original(self))
+
+        results = run_quipu_batch(plans, work_dir=workspace, yolo=True)
+
+        assert [r.success for r in results] == [True, True, True]
+        # 只在执行前完整扫描一次，之后的输出树都由执行器报告的变更集增量得到
+        assert len(computed) == 1
+        engine = create_engine(workspace)
+        nodes = sorted((n for n in engine.reader.load_all_nodes() if n.node_type == "plan"), key=lambda n: n.timestamp)
+        assert len(nodes) == 3
+        assert [n.input_tree for n in nodes[1:]] == [n.output_tree for n in nodes[:-1]]
+        engine.close()
+
+    def test_run_quipu_output_tree_matches_full_scan(self, workspace):
+        """测试：增量计算的输出树与完整扫描一致；含 shell act 时退回完整扫描"""
+        from pyquipu.cli.factory import create_engine
+
+        (workspace / "old.txt").write_text("old")
+        plans = [
+            "```act\nwrite_file src/a.txt\n```\n```content\nA\n```\n```act\ndelete_file old.txt\n```",
+            "```act\nrun_command\n```\n```bash\necho hi > shell.txt\n```",
+        ]
+        for plan in plans:
+            assert run_quipu(content=plan, work_dir=workspace, yolo=True).success
+            engine = create_engine(workspace)
+            latest = max(engine.reader.load_all_nodes(), key=lambda n: n.timestamp)
+            assert latest.output_tree == engine.git_db._tree_hash_with_temporary_index()
+            engine.close()
+
+    def test_run_quipu_batch_stops_on_failure(self, workspace):
+        plans = [
+            "```act\nwrite_file a.txt\n```\n```content\nA\n```",
+            "```act\nappend_file ghost.txt\n```\n```content\nboo\n```",
+            "```act\nwrite_file c.txt\n```\n```content\nC\n```",
+        ]
+        results = run_quipu_batch(plans, work_dir=workspace, yolo=True)
+
+        assert [r.success for r in results] == [True, False]
+        assert results[-1].message == "run.error.execution"
+        assert not (workspace / "c.txt").exists()
+
 
 # --- 2. CLI Layer Tests (The Shell) ---
 # 这些测试验证 main.py 是否正确解析参数并传递给 Controller
@@ -145,6 +225,39 @@ class TestCLIWrapper:
         assert result.exit_code == 0
         assert result.exception is None
 
+    def test_cli_batch_runs_files_in_order(self, workspace, tmp_path):
+        """测试 --batch: 按顺序执行多个文件，多个文件但未指定 --batch 时报错"""
+        files = []
+        for i in range(2):
+            plan_file = tmp_path / f"plan{i}.md"
+            plan_file.write_text(f"```act\nwrite_file out.txt\n```\n```content\n{i}\n```", encoding="utf-8")
+            files.append(str(plan_file))
+
+        result = runner.invoke(app, ["run", *files, "--work-dir", str(workspace), "--yolo"])
+        assert result.exit_code == 1
+        assert "--batch" in result.stderr
+
+        result = runner.invoke(app, ["run", *files, "--batch", "--work-dir", str(workspace), "--yolo"])
+        assert result.exit_code == 0
+        assert "共执行 2 个 Plan" in result.stderr
+        assert (workspace / "out.txt").read_text().strip() == "1"
+
+    def test_cli_stream_from_stdin(self, workspace):
+        """测试 --stream: 边读取管道输入边执行，并记录完整的 Plan 内容"""
+        from pyquipu.cli.factory import create_engine
+
+        plan = "# 流式\n~~~act\nwrite_file s.txt\n~~~\n~~~\nS\n~~~\n~~~act\nappend_file s.txt\n~~~\n~~~\n!\n~~~\n"
+        result = runner.invoke(app, ["run", "--stream", "--work-dir", str(workspace), "--yolo"], input=plan)
+
+        assert result.exit_code == 0
+        assert (workspace / "s.txt").read_text() == "S!"
+        engine = create_engine(workspace)
+        node = next(n for n in engine.reader.load_all_nodes() if n.node_type == "plan")
+        assert node.summary == "流式"
+        assert node.output_tree == engine.git_db._tree_hash_with_temporary_index()
+        assert engine.reader.get_node_content(node) == plan
+        engine.close()
+
     def test_cli_no_input_shows_usage(self, monkeypatch, tmp_path):
         """测试无输入时显示用法"""
         # 1. 临时修改 run 命令模块中的默认入口文件引用，防止读取当前目录下的 o.md
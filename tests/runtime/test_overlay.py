@@ -0,0 +1,173 @@
+import os
+from pathlib import Path
+
+import pytest
+from pyquipu.acts.refactor import register as register_refactor_acts
+from pyquipu.acts.shell import register as register_shell_acts
+from pyquipu.interfaces.exceptions import ExecutionError
+from pyquipu.runtime.executor import Executor
+from pyquipu.runtime.overlay import FileOverlay
+
+
+def _stmt(act: str, *contexts: str):
+    return {"act": act, "contexts": list(contexts)}
+
+
+@pytest.fixture
+def txn_executor(executor: Executor) -> Executor:
+    executor.transactional = True
+    register_refactor_acts(executor)
+    return executor
+
+
+class TestFileOverlay:
+    def test_reads_see_staged_changes_only(self, tmp_path: Path):
+        (tmp_path / "a.txt").write_text("disk")
+        (tmp_path / "d").mkdir()
+        (tmp_path / "d" / "x.txt").write_text("x")
+        overlay = FileOverlay(tmp_path)
+
+        overlay.write_text(tmp_path / "a.txt", "staged")
+        overlay.move(tmp_path / "d", tmp_path / "e")
+        overlay.write_text(tmp_path / "new" / "n.txt", "n")
+
+        assert overlay.read_text(tmp_path / "a.txt") == "staged"
+        assert not overlay.exists(tmp_path / "d" / "x.txt")
+        assert overlay.read_text(tmp_path / "e" / "x.txt") == "x"
+        assert overlay.is_dir(tmp_path / "new")
+        # 磁盘尚未改变
+        assert (tmp_path / "a.txt").read_text() == "disk"
+        assert (tmp_path / "d" / "x.txt").exists()
+
+        overlay.commit()
+        assert (tmp_path / "a.txt").read_text() == "staged"
+        assert not (tmp_path / "d").exists()
+        assert (tmp_path / "e" / "x.txt").read_text() == "x"
+        assert (tmp_path / "new" / "n.txt").read_text() == "n"
+        assert not overlay.dirty
+        assert not (tmp_path / ".quipu").exists()
+
+    def test_commit_keeps_file_mode(self, tmp_path: Path):
+        script = tmp_path / "run.sh"
+        script.write_text("old")
+        script.chmod(0o755)
+        overlay = FileOverlay(tmp_path)
+        overlay.write_text(script, "new")
+        overlay.commit()
+        assert script.stat().st_mode & 0o777 == 0o755
+
+    def test_failed_commit_rolls_back(self, tmp_path: Path, monkeypatch):
+        (tmp_path / "a.txt").write_text("A")
+        (tmp_path / "gone.txt").write_text("G")
+        overlay = FileOverlay(tmp_path)
+        overlay.write_text(tmp_path / "a.txt", "A2")
+        overlay.delete(tmp_path / "gone.txt")
+        overlay.write_text(tmp_path / "sub" / "b.txt", "B")
+
+        real_replace = os.replace
+        calls = []
+
+        def flaky_replace(src, dst):
+            calls.append(dst)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            real_replace(src, dst)
+
+        monkeypatch.setattr(os, "replace", flaky_replace)
+        with pytest.raises(OSError):
+            overlay.commit()
+
+        assert (tmp_path / "a.txt").read_text() == "A"
+        assert (tmp_path / "gone.txt").read_text() == "G"
+        assert not (tmp_path / "sub").exists()
+        assert not (tmp_path / ".quipu").exists()
+
+
+class TestTransactionalExecutor:
+    def test_failure_leaves_workspace_untouched(self, txn_executor: Executor, isolated_vault: Path):
+        (isolated_vault / "keep.txt").write_text("v1")
+        stmts = [
+            _stmt("write_file keep.txt", "v2"),
+            _stmt("write_file new.txt", "n"),
+            _stmt("patch_file missing.txt", "a", "b"),
+        ]
+        with pytest.raises(ExecutionError):
+            txn_executor.execute(stmts)
+
+        assert (isolated_vault / "keep.txt").read_text() == "v1"
+        assert not (isolated_vault / "new.txt").exists()
+
+    def test_consecutive_acts_see_staged_state(self, txn_executor: Executor, isolated_vault: Path):
+        stmts = [
+            _stmt("write_file a.txt", "hello"),
+            _stmt("patch_file a.txt", "hello", "hello world"),
+            _stmt("append_file a.txt", "!"),
+            _stmt("move_file a.txt b.txt"),
+            _stmt("delete_file b.txt"),
+            _stmt("write_file b.txt", "final"),
+        ]
+        txn_executor.execute(stmts)
+        assert not (isolated_vault / "a.txt").exists()
+        assert (isolated_vault / "b.txt").read_text() == "final"
+
+    def test_undeclared_act_sees_prior_writes(self, txn_executor: Executor, isolated_vault: Path):
+        register_shell_acts(txn_executor)
+        stmts = [_stmt("write_file a.txt", "A"), _stmt("run_command", "cp a.txt b.txt")]
+        txn_executor.execute(stmts)
+        assert (isolated_vault / "b.txt").read_text() == "A"
+
+
+class TestWriteBackCache:
+    def test_repeated_patches_read_and_write_once(self, executor: Executor, isolated_vault: Path, monkeypatch):
+        target = isolated_vault / "big.py"
+        target.write_text("".join(f"v{i} = {i}\n" for i in range(40)))
+        reads = []
+        real_read_bytes = Path.read_bytes
+        monkeypatch.setattr(Path, "read_bytes", lambda self: reads.append(self) or real_read_bytes(self))
+        mtime = target.stat().st_mtime_ns
+
+        executor.execute([_stmt("patch_file big.py", f"v{i} = {i}\n", f"v{i} = {i * 2}\n") for i in range(40)])
+
+        assert reads.count(target) == 1
+        assert target.read_text().splitlines()[39] == "v39 = 78"
+        assert target.stat().st_mtime_ns != mtime
+
+    def test_multiline_patch_on_crlf_file(self, executor: Executor, isolated_vault: Path):
+        target = isolated_vault / "win.txt"
+        target.write_bytes(b"a\r\nb\r\nc\r\n")
+
+        executor.execute([_stmt("patch_file win.txt", "a\nb\n", "x\ny\n")])
+        assert target.read_text() == "x\ny\nc\n"
+
+    def test_failure_still_flushes_prior_changes(self, executor: Executor, isolated_vault: Path):
+        stmts = [_stmt("write_file a.txt", "A"), _stmt("patch_file missing.txt", "a", "b")]
+        with pytest.raises(ExecutionError):
+            executor.execute(stmts)
+        assert (isolated_vault / "a.txt").read_text() == "A"
+
+    def test_read_only_file_reports_permission_error(self, executor: Executor, isolated_vault: Path, monkeypatch):
+        target = isolated_vault / "ro.txt"
+        target.write_text("old")
+        real_access = os.access
+        monkeypatch.setattr(os, "access", lambda p, mode: False if Path(p) == target else real_access(p, mode))
+
+        with pytest.raises(ExecutionError, match="acts.basic.error.writePermission"):
+            executor.execute([_stmt("write_file ro.txt", "NEW")])
+        assert target.read_text() == "old"
+
+    def test_writes_in_place_and_moves_on_disk(self, executor: Executor, isolated_vault: Path):
+        register_refactor_acts(executor)
+        target = isolated_vault / "a.txt"
+        target.write_text("A")
+        os.link(target, isolated_vault / "link.txt")
+        inode = target.stat().st_ino
+        script = isolated_vault / "run.sh"
+        script.write_text("echo")
+        script.chmod(0o755)
+
+        executor.execute([_stmt("append_file a.txt", "!"), _stmt("move_file run.sh bin/run.sh")])
+
+        assert target.stat().st_ino == inode
+        assert (isolated_vault / "link.txt").read_text() == "A!"
+        assert (isolated_vault / "bin" / "run.sh").stat().st_mode & 0o777 == 0o755
+        assert executor.changed_paths >= {target, script, isolated_vault / "bin" / "run.sh"}
@@ -0,0 +1,145 @@
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+from pyquipu.acts.basic import register as register_basic_acts
+from pyquipu.acts.refactor import register as register_refactor_acts
+from pyquipu.interfaces.exceptions import ExecutionError, OperationCancelledError
+from pyquipu.interfaces.types import ActContext
+from pyquipu.runtime.executor import Executor
+
+
+def _stmt(act: str, *contexts: str):
+    return {"act": act, "contexts": list(contexts)}
+
+
+class TestSchedule:
+    def test_disjoint_paths_share_a_wave(self, executor: Executor):
+        stmts = [_stmt(f"write_file f{i}.txt", str(i)) for i in range(4)]
+        jobs = [executor._prepare_job(i, s, len(stmts)) for i, s in enumerate(stmts)]
+        assert [[j.index for j in w] for w in executor._schedule(jobs)] == [[0, 1, 2, 3]]
+
+    def test_conflicts_and_barriers_keep_order(self, executor: Executor):
+        register_refactor_acts(executor)
+        stmts = [
+            _stmt("write_file a/x.txt", "1"),
+            _stmt("write_file b.txt", "2"),
+            _stmt("patch_file a/x.txt", "1", "2"),  # 与 0 冲突
+            _stmt("delete_file a"),  # 是 0/2 的祖先目录
+            _stmt("write_file c.txt", "3"),
+            _stmt("echo hi"),  # 未声明路径: 独占批次
+            _stmt("write_file d.txt", "4"),
+        ]
+        jobs = [executor._prepare_job(i, s, len(stmts)) for i, s in enumerate(stmts)]
+        waves = [[j.index for j in w] for w in executor._schedule(jobs)]
+        # 4 与前序任务都不冲突，但不能排到 3 之前的批次
+        assert waves == [[0, 1], [2], [3, 4], [5], [6]]
+
+
+def test_independent_acts_run_concurrently(executor: Executor, isolated_vault: Path):
+    active: List[int] = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow_touch(ctx: ActContext, args: List[str]):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        ctx.resolve_path(args[0]).write_text("ok")
+        with lock:
+            active.pop()
+
+    executor.register("slow_touch", slow_touch, touches=lambda args: args[:1])
+    executor.execute([_stmt(f"slow_touch f{i}.txt") for i in range(4)])
+
+    assert max(peak) > 1
+    assert all((isolated_vault / f"f{i}.txt").read_text() == "ok" for i in range(4))
+
+
+def test_same_path_applied_in_order(executor: Executor, isolated_vault: Path):
+    stmts = [_stmt("write_file a.txt", "1"), _stmt("write_file b.txt", "x"), _stmt("append_file a.txt", "2")]
+    executor.execute(stmts)
+    assert (isolated_vault / "a.txt").read_text() == "12"
+
+
+def test_first_error_in_statement_order(executor: Executor, isolated_vault: Path):
+    stmts = [
+        _stmt("write_file ok.txt", "1"),
+        _stmt("patch_file missing1.txt", "a", "b"),
+        _stmt("patch_file missing2.txt", "a", "b"),
+    ]
+    with pytest.raises(ExecutionError, match="patch_file"):
+        executor.execute(stmts)
+    assert (isolated_vault / "ok.txt").exists()
+
+
+def test_serial_when_single_worker(isolated_vault: Path):
+    executor = Executor(root_dir=isolated_vault, yolo=True, max_workers=1)
+    threads = set()
+    executor.register("where", lambda ctx, args: threads.add(threading.get_ident()), touches=lambda args: args)
+    executor.execute([_stmt(f"where p{i}") for i in range(3)])
+    assert threads == {threading.get_ident()}
+
+
+def test_acts_after_failure_in_wave_are_not_applied(executor: Executor, isolated_vault: Path):
+    (isolated_vault / "a.txt").write_text("A")
+    stmts = [
+        _stmt("write_file b.txt", "B"),
+        _stmt("patch_file a.txt", "missing", "x"),
+        _stmt("write_file c.txt", "C"),
+    ]
+    jobs = [executor._prepare_job(i, s, len(stmts)) for i, s in enumerate(stmts)]
+    assert [[j.index for j in w] for w in executor._schedule(jobs)] == [[0, 1, 2]]
+    with pytest.raises(ExecutionError, match="patch_file"):
+        executor.execute(stmts)
+    assert (isolated_vault / "b.txt").read_text() == "B"
+    assert not (isolated_vault / "c.txt").exists()
+
+
+def test_acts_after_failure_in_earlier_wave_are_not_applied(isolated_vault: Path):
+    prompts = []
+    executor = Executor(root_dir=isolated_vault, confirmation_handler=lambda diff, prompt: prompts.append(prompt))
+    register_basic_acts(executor)
+    register_refactor_acts(executor)
+    stmts = [
+        _stmt("write_file a.txt", "A"),
+        _stmt("patch_file a.txt", "missing", "x"),
+        _stmt("write_file c.txt", "C"),
+    ]
+    jobs = [executor._prepare_job(i, s, len(stmts)) for i, s in enumerate(stmts)]
+    assert [[j.index for j in w] for w in executor._schedule(jobs)] == [[0], [1, 2]]
+
+    with pytest.raises(ExecutionError, match="patch_file"):
+        executor.execute(stmts)
+    assert (isolated_vault / "a.txt").read_text() == "A"
+    assert not (isolated_vault / "c.txt").exists()
+    assert len(prompts) == 1 and "a.txt" in prompts[0]
+
+
+def test_rejected_confirmation_stops_later_acts_in_wave(isolated_vault: Path):
+    prompts = []
+
+    def reject_a(diff_lines, prompt):
+        prompts.append(prompt)
+        if "a.txt" in prompt:
+            raise OperationCancelledError("rejected")
+        return True
+
+    executor = Executor(root_dir=isolated_vault, confirmation_handler=reject_a)
+    executor.register("write_file", _write, touches=lambda args: args[:1])
+    with pytest.raises(OperationCancelledError):
+        executor.execute([_stmt("write_file a.txt", "A"), _stmt("write_file b.txt", "B")])
+    assert len(prompts) == 1 and "a.txt" in prompts[0]
+    assert not (isolated_vault / "b.txt").exists()
+
+
+def _write(ctx: ActContext, args: List[str]):
+    path = ctx.resolve_path(args[0])
+    if path.name == "a.txt":
+        # 让 b.txt 先到达确认步骤，它必须等待 a.txt 的确认结束
+        time.sleep(0.05)
+    ctx.request_confirmation(path, "", args[1])
+    ctx.write_text(path, args[1])
@@ -0,0 +1,79 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+from pyquipu.interfaces.exceptions import ExecutionError
+from pyquipu.runtime.executor import Executor
+from pyquipu.runtime.parser import (
+    BacktickParser,
+    TildeParser,
+    _end_fence_pattern,
+    detect_best_parser,
+    detect_best_parser_from_lines,
+)
+
+PLANS = [
+    "```act\nwrite_file a.txt\n```\n```python\nprint(1)\n```\n```act\nend\n```",
+    # 变长围栏、块头后的空白行、CRLF
+    "````act\r\nwrite_file a.md\r\n````\r\n````markdown\r\n\r\n```py\r\nx\r\n```\r\n````\r\n",
+    # 未闭合的块头会被跳过，其后的块照常解析
+    "````python\n```act\necho\n```\n```text\nhi\n```",
+    # act 之前的上下文块被忽略
+    "```text\norphan\n```\n```act\nend\n```\n\n```\n  \n```",
+    "~~~act\nwrite_file b.txt\n~~~\n~~~\n```\ninner\n```\n~~~",
+]
+
+
+@pytest.mark.parametrize("plan", PLANS)
+@pytest.mark.parametrize("parser_cls", [BacktickParser, TildeParser])
+def test_iter_parse_matches_parse(parser_cls, plan: str):
+    parser = parser_cls()
+    assert list(parser.iter_parse(plan.splitlines(keepends=True))) == parser.parse(plan)
+
+
+def test_iter_parse_yields_before_input_ends():
+    consumed: List[str] = []
+
+    def lines():
+        for line in PLANS[0].splitlines(keepends=True) + ["```act\n", "unfinished\n"]:
+            consumed.append(line)
+            yield line
+
+    statements = BacktickParser().iter_parse(lines())
+    assert next(statements) == {"act": "write_file a.txt", "contexts": ["print(1)"]}
+    # 第一条语句在第二个 act 块闭合时即产出，此时尚未读到后续输入
+    assert consumed == PLANS[0].splitlines(keepends=True)
+
+
+def test_end_fence_pattern_is_cached():
+    assert _end_fence_pattern("````") is _end_fence_pattern("````")
+
+
+def test_detect_from_lines_replays_input():
+    plan = "# title\n~~~~act\nend\n~~~~\n"
+    name, lines = detect_best_parser_from_lines(iter(plan.splitlines(keepends=True)))
+    assert name == detect_best_parser(plan) == "tilde"
+    assert "".join(lines) == plan
+
+
+class TestExecuteStream:
+    def test_statements_run_as_they_arrive(self, executor: Executor, isolated_vault: Path):
+        def statements():
+            yield {"act": "write_file a.txt", "contexts": ["A"]}
+            # 第一条语句在第二条到达之前已经执行 (修改暂存在覆盖层中)
+            assert executor.fs.read_text(isolated_vault / "a.txt") == "A"
+            yield {"act": "append_file a.txt", "contexts": ["B"]}
+
+        executor.execute_stream(statements())
+        assert (isolated_vault / "a.txt").read_text() == "AB"
+        assert executor.changed_paths == {isolated_vault / "a.txt"}
+
+    def test_bad_statement_stops_stream(self, executor: Executor, isolated_vault: Path):
+        def statements():
+            yield {"act": "write_file a.txt", "contexts": ["A"]}
+            yield {"act": "write_file 'unterminated", "contexts": ["B"]}
+            pytest.fail("解析失败后不应继续读取输入")
+
+        with pytest.raises(ExecutionError):
+            executor.execute_stream(statements())
+        assert (isolated_vault / "a.txt").read_text() == "A"